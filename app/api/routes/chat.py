@@ -7,13 +7,16 @@ from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Body
 from pydantic import BaseModel, Field, field_validator
 
-from app.core.db import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.db import get_async_db, async_unit_of_work
 from app.core.config import logger
 from app.services.openai_service import OpenAIService
-from app.core.memory_context_service import MemoryContextBuilder
-from app.repository.user import UserRepository
-from app.repository.conversation import ConversationRepository
-from app.repository.message import MessageRepository
+from app.services.history_compaction import get_history_compactor
+from app.core.memory_context_service import assemble_memory_context_async
+from app.repository.user import AsyncUserRepository
+from app.repository.conversation import AsyncConversationRepository
+from app.repository.message import AsyncMessageRepository
 from app.core.openai_constants import (
     DEFAULT_MODEL, DEFAULT_TEMPERATURE, MAX_TOKENS,
     ROLE_USER, ROLE_ASSISTANT, ROLE_SYSTEM, FREYA_SYSTEM_PROMPT
@@ -63,7 +66,7 @@ class ChatCompletionResponse(BaseModel):
 @router.post("/completions", response_model=ChatCompletionResponse)
 async def create_chat_completion(
     request: ChatCompletionRequest = Body(...),
-    db=Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a chat completion with Freya's personality and memory context.
@@ -72,31 +75,24 @@ async def create_chat_completion(
     
     # Initialize services
     openai_service = OpenAIService()
-    memory_builder = MemoryContextBuilder(db)
-    user_repo = UserRepository(db)
-    conversation_repo = ConversationRepository(db)
-    message_repo = MessageRepository(db)
+    user_repo = AsyncUserRepository(db)
+    conversation_repo = AsyncConversationRepository(db)
+    message_repo = AsyncMessageRepository(db)
     
     try:
         # Verify user exists
-        user = user_repo.get(request.user_id)
+        user = await user_repo.get(request.user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        # Get or create conversation
+        # Get the existing conversation; a new one is created with the messages below
+        conversation = None
         if request.conversation_id:
-            conversation = conversation_repo.get(request.conversation_id)
+            conversation = await conversation_repo.get(request.conversation_id)
             if not conversation:
                 raise HTTPException(status_code=404, detail="Conversation not found")
             if conversation.user_id != request.user_id:
                 raise HTTPException(status_code=403, detail="Conversation does not belong to user")
-        else:
-            # Create new conversation
-            conversation = conversation_repo.create({
-                "user_id": request.user_id,
-                "started_at": datetime.utcnow()
-            })
-            logger.info(f"Created new conversation {conversation.id} for user {request.user_id}")
         
         # Get the last user message
         user_messages = [msg for msg in request.messages if msg.role == ROLE_USER]
@@ -104,9 +100,11 @@ async def create_chat_completion(
             raise HTTPException(status_code=400, detail="No user messages found")
         
         latest_user_message = user_messages[-1].content
+        user_sent_at = datetime.utcnow()
         
         # Build memory context based on the user's query
-        memory_context = memory_builder.assemble_memory_context(
+        memory_context = await assemble_memory_context_async(
+            db,
             user_id=request.user_id,
             query=latest_user_message
         )
@@ -121,23 +119,13 @@ async def create_chat_completion(
             {"role": ROLE_SYSTEM, "content": system_message}
         ]
         
-        # Add conversation messages
-        for msg in request.messages:
-            openai_messages.append({
-                "role": msg.role,
-                "content": msg.content
-            })
-        
-        # Store the user message
-        user_msg_record = message_repo.create({
-            "conversation_id": conversation.id,
-            "user_id": request.user_id,
-            "role": ROLE_USER,
-            "content": latest_user_message,
-            "timestamp": datetime.utcnow()
-        })
+        # Add the conversation as rolling summary + recent messages
+        history = [{"role": msg.role, "content": msg.content} for msg in request.messages]
+        compactor = get_history_compactor()
+        compacted = compactor.compact(str(conversation.id) if conversation else "new", history)
+        openai_messages.extend(compacted.messages)
         
-        # Create chat completion
+        # Create chat completion (no transaction or pooled connection is held meanwhile)
         logger.info(f"Calling OpenAI API with {len(openai_messages)} messages")
         completion = openai_service.create_chat_completion(
             messages=openai_messages,
@@ -150,14 +138,35 @@ async def create_chat_completion(
         # Extract assistant response
         assistant_content = completion.choices[0].message.content
         
-        # Store the assistant message
-        assistant_msg_record = message_repo.create({
-            "conversation_id": conversation.id,
-            "user_id": request.user_id,
-            "role": ROLE_ASSISTANT,
-            "content": assistant_content,
-            "timestamp": datetime.utcnow()
-        })
+        # Stage the conversation and both messages, then commit once for the whole turn
+        async with async_unit_of_work(db):
+            if conversation is None:
+                conversation = await conversation_repo.create({
+                    "user_id": request.user_id,
+                    "started_at": user_sent_at
+                })
+                logger.info(f"Created new conversation {conversation.id} for user {request.user_id}")
+            
+            await message_repo.create({
+                "conversation_id": conversation.id,
+                "user_id": request.user_id,
+                "role": ROLE_USER,
+                "content": latest_user_message,
+                "timestamp": user_sent_at
+            })
+            await message_repo.create({
+                "conversation_id": conversation.id,
+                "user_id": request.user_id,
+                "role": ROLE_ASSISTANT,
+                "content": assistant_content,
+                "timestamp": datetime.utcnow()
+            })
+        
+        # Fold older messages into the summary in the background
+        compactor.schedule_update(
+            str(conversation.id),
+            history + [{"role": ROLE_ASSISTANT, "content": assistant_content}]
+        )
         
         # Format response to match OpenAI API structure
         response = ChatCompletionResponse(
@@ -175,7 +184,8 @@ async def create_chat_completion(
             usage={
                 "prompt_tokens": completion.usage.prompt_tokens if completion.usage else 0,
                 "completion_tokens": completion.usage.completion_tokens if completion.usage else 0,
-                "total_tokens": completion.usage.total_tokens if completion.usage else 0
+                "total_tokens": completion.usage.total_tokens if completion.usage else 0,
+                **compacted.usage()
             }
         )
         
@@ -8,6 +8,7 @@ from datetime import datetime, timezone
 from app.core.db import get_db
 from app.core.conversation_history_service import ConversationHistoryService
 from app.repository.conversation import ConversationRepository
+from app.services.bulk_delete import delete_conversation_rows, get_delete_job_manager
 
 router = APIRouter(prefix="/conversations", tags=["conversations"])
 
@@ -191,7 +192,7 @@ def search_conversations(
     return messages
 
 
-@router.delete("/{conversation_id}")
+@router.delete("/{conversation_id}", status_code=202)
 def delete_conversation(
     conversation_id: int,
     user_id: int = Query(..., description="User ID for authorization"),
@@ -201,6 +202,8 @@ def delete_conversation(
     Delete a conversation and all its messages.
     
     Requires user_id for authorization to ensure users can only delete their own conversations.
+    The rows are removed by a background job with set-based DELETE statements;
+    poll /conversations/delete-jobs/{job_id} for its progress.
     """
     repo = ConversationRepository(db)
     
@@ -213,8 +216,30 @@ def delete_conversation(
     if conversation.user_id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this conversation")
     
-    # Delete the conversation (cascades to messages due to relationship configuration)
-    repo.delete(conversation_id)
-    db.commit()  # Commit the deletion
+    # The request session is closed when the response is sent; the job opens its own
+    bind = db.get_bind()
     
-    return {"message": f"Conversation {conversation_id} deleted successfully"}
+    def delete_rows(job):
+        with Session(bind=bind) as session:
+            delete_conversation_rows(session, conversation_id, job)
+    
+    job = get_delete_job_manager().submit("postgres", conversation_id, delete_rows)
+    
+    return {
+        "message": f"Conversation {conversation_id} deletion started",
+        "job_id": job.id,
+        "status": job.status
+    }
+
+
+@router.get("/delete-jobs/{job_id}", response_model=Dict[str, Any])
+def get_delete_job(job_id: str):
+    """
+    Get the progress of a conversation delete.
+    
+    Returns the job status, rows deleted per table and timings.
+    """
+    job = get_delete_job_manager().get(job_id)
+    if job is None or job.kind != "postgres":
+        raise HTTPException(status_code=404, detail="Delete job not found")
+    return job.to_dict()
@@ -3,36 +3,59 @@ events.py - Server-Sent Events (SSE) API endpoints
 """
 from typing import AsyncGenerator, List, Dict, Any, Optional
 import asyncio
-from fastapi import APIRouter, Request, Depends, HTTPException, Query
+from fastapi import APIRouter, Request, Depends, HTTPException, Query, Header
 from fastapi.responses import StreamingResponse
 from sse_starlette.sse import EventSourceResponse
 
-from app.core.db import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.db import get_async_db, async_session_scope, async_unit_of_work
 from app.core.config import logger
-from app.services.event_service import EventService
-from app.services.event_dispatcher import EventDispatcher
+from app.services.event_service import EventService, event_id_of, parse_last_event_id
+from app.services.event_broker import get_event_broker, user_channel, conversation_channel
+from app.services.event_dispatcher import EventDispatcher, REPLY_COALESCE_WINDOW, REPLY_COALESCE_BYTES
 from app.services.openai_service import OpenAIService
-from app.core.memory_context_service import MemoryContextBuilder
-from app.core.conversation_history_service import ConversationHistoryService
-from app.repository.user import UserRepository
-from app.repository.conversation import ConversationRepository
-from app.repository.message import MessageRepository
+from app.core.memory_context_service import assemble_memory_context_async
+from app.core.conversation_history_service import get_conversation_history_async
+from app.repository.user import AsyncUserRepository
+from app.repository.conversation import AsyncConversationRepository
+from app.repository.message import AsyncMessageRepository
 from datetime import datetime
 
 from app.core.openai_constants import (
     DEFAULT_MODEL, DEFAULT_TEMPERATURE, MAX_TOKENS,
-    ROLE_USER, ROLE_ASSISTANT, ROLE_SYSTEM, FREYA_SYSTEM_PROMPT
+    ROLE_USER, ROLE_ASSISTANT, ROLE_SYSTEM, FREYA_SYSTEM_PROMPT,
+    TRUNCATED_RESPONSE_MARKER
 )
 
 
 router = APIRouter(prefix="/events", tags=["events"])
 
 
+def _fan_out(user_id: int, conversation_id: Optional[int]):
+    """Return a callback publishing chat events to the user's (and conversation's) channel."""
+    def publish(event: bytes) -> None:
+        broker = get_event_broker()
+        event_id = event_id_of(event)
+        broker.publish(user_channel(user_id), event, event_id)
+        if conversation_id:
+            broker.publish(conversation_channel(conversation_id), event, event_id)
+    return publish
+
+
+async def _prefetch_memory_context(user_id: int, query: str) -> Dict[str, Any]:
+    """Assemble memory context on a dedicated session so it can run concurrently."""
+    async with async_session_scope() as memory_db:
+        return await assemble_memory_context_async(memory_db, user_id=user_id, query=query)
+
+
 @router.get("/stream")
 async def stream_events(
     request: Request,
     user_id: int = Query(..., description="User ID for authentication and context"),
-    conversation_id: Optional[int] = Query(None, description="Conversation ID (optional, for continuing existing conversations)")
+    conversation_id: Optional[int] = Query(None, description="Conversation ID (optional, for continuing existing conversations)"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Establish an SSE connection for real-time event streaming.
@@ -44,21 +67,25 @@ async def stream_events(
     - freya:thinking - When Freya is processing a response
     - freya:reply - When Freya has a response to send
     
+    Every event has an id. A reconnecting client (EventSource does this
+    automatically) sends the last id it saw in the Last-Event-ID header and
+    first receives the events it missed, then live events.
+    
     Returns:
         EventSourceResponse: An SSE stream that will emit events
     """
-    # Verify user exists in a non-blocking way using the DB dependency
-    db = next(get_db())
-    user_repo = UserRepository(db)
-    user = user_repo.get(user_id)
+    # Verify user exists without blocking the event loop; the dependency
+    # closes the session when the request finishes
+    user_repo = AsyncUserRepository(db)
+    user = await user_repo.get(user_id)
     if not user:
         logger.error(f"User {user_id} not found when establishing SSE connection")
         raise HTTPException(status_code=404, detail="User not found")
     
     # If conversation_id provided, verify it exists and belongs to the user
     if conversation_id:
-        conversation_repo = ConversationRepository(db)
-        conversation = conversation_repo.get(conversation_id)
+        conversation_repo = AsyncConversationRepository(db)
+        conversation = await conversation_repo.get(conversation_id)
         if not conversation:
             logger.error(f"Conversation {conversation_id} not found for SSE connection")
             raise HTTPException(status_code=404, detail="Conversation not found")
@@ -68,8 +95,15 @@ async def stream_events(
     
     logger.info(f"Establishing SSE connection for user {user_id}, conversation {conversation_id or 'new'}")
     
+    # Subscribe to the conversation's events if one was given, else to every
+    # event for the user (chat replies from other tabs, server pushes)
+    channel = conversation_channel(conversation_id) if conversation_id else user_channel(user_id)
+    subscription = get_event_broker().subscribe(channel, last_event_id=parse_last_event_id(last_event_id))
+    
     # Use EventSourceResponse for proper SSE handling
-    return EventSourceResponse(EventService.event_generator(request))
+    # Heartbeats come from the shared scheduler, so sse_starlette's
+    # per-connection ping task is disabled
+    return EventSourceResponse(EventService.event_generator(request, subscription), ping=0)
 
 
 @router.post("/chat")
@@ -96,160 +130,141 @@ async def chat_with_events(
         EventSourceResponse: An SSE stream with the response events
     """
     
-    async def event_stream():
-        # Create a queue for the event dispatcher to use
-        event_queue = asyncio.Queue()
-        
-        # Create event dispatcher
+    async def process_chat(event_queue: asyncio.Queue) -> None:
+        # Runs as a supervised background task: each event is delivered as soon
+        # as it is queued, and the task is cancelled if the client disconnects
         event_dispatcher = EventDispatcher()
         
-        # Define function to yield events from the queue
-        async def generate_events():
-            while True:
-                # Wait for an event to be available
-                event = await event_queue.get()
-                yield event
-                event_queue.task_done()
-                
-                # If client disconnected, stop processing
-                if await request.is_disconnected():
-                    logger.info("Client disconnected, stopping event processing")
-                    break
-        
-        # Use the generator function directly - don't create a task
-        
         try:
-            # Access database
-            db = next(get_db())
-            user_repo = UserRepository(db)
-            conversation_repo = ConversationRepository(db)
-            message_repo = MessageRepository(db)
-            history_service = ConversationHistoryService(db)
-            
-            # Verify user exists
-            user = user_repo.get(user_id)
-            if not user:
-                error = f"User {user_id} not found"
-                logger.error(error)
-                await event_dispatcher.dispatch_error_event(event_queue, error)
-                return
-            
-            # Stream chat processing steps through event dispatcher
-            # First dispatch listening event
-            await event_dispatcher.dispatch_listening_event(event_queue)
-            
-            # Then dispatch thinking event
-            await event_dispatcher.dispatch_thinking_event(event_queue)
+            # Scope the session to the stream so its connection is returned
+            # to the pool even if the client disconnects mid-response
+            async with async_session_scope() as db:
+                user_repo = AsyncUserRepository(db)
+                conversation_repo = AsyncConversationRepository(db)
+                message_repo = AsyncMessageRepository(db)
             
-            # Delay for 1 second to give frontend time to transition
-            await asyncio.sleep(1)
-            
-            # Get or create conversation
-            if conversation_id:
-                conversation = conversation_repo.get(conversation_id)
-                if not conversation:
-                    error = f"Conversation {conversation_id} not found"
-                    logger.error(error)
-                    await event_dispatcher.dispatch_error_event(event_queue, error)
-                    return
-                if conversation.user_id != user_id:
-                    error = f"Conversation {conversation_id} does not belong to user {user_id}"
+                # Verify user exists
+                user = await user_repo.get(user_id)
+                if not user:
+                    error = f"User {user_id} not found"
                     logger.error(error)
                     await event_dispatcher.dispatch_error_event(event_queue, error)
                     return
-            else:
-                # Create new conversation
-                conversation = conversation_repo.create({
-                    "user_id": user_id,
-                    "started_at": datetime.utcnow()
-                })
-                logger.info(f"Created new conversation {conversation.id} for user {user_id}")
-            
-            # Store user message
-            user_msg_record = message_repo.create({
-                "conversation_id": conversation.id,
-                "user_id": user_id,
-                "role": ROLE_USER,
-                "content": message,
-                "timestamp": datetime.utcnow()
-            })
-            
-            # Initialize services
-            openai_service = OpenAIService()
-            memory_builder = MemoryContextBuilder(db)
-            
-            # Build memory context
-            memory_context = memory_builder.assemble_memory_context(
-                user_id=user_id,
-                query=message
-            )
             
-            # Get recent conversation history
-            recent_messages = history_service.get_conversation_history(
-                conversation_id=conversation.id,
-                limit=10,
-                skip=0
-            )
+                # Start memory assembly as soon as the message arrives, on its own
+                # session so it overlaps the thinking delay and the writes below
+                memory_task = asyncio.create_task(_prefetch_memory_context(user_id, message))
+                conversation = None
             
-            # Format conversation history for OpenAI, but exclude the message we just added
-            conversation_history = []
-            for msg in recent_messages:
-                if msg.id != user_msg_record.id and msg.role in [ROLE_USER, ROLE_ASSISTANT]:
-                    conversation_history.append({
-                        "role": msg.role,
-                        "content": msg.content
-                    })
-            
-            # Format system prompt with memory context
-            system_prompt = FREYA_SYSTEM_PROMPT
-            if memory_context and memory_context.get("formatted_context"):
-                system_prompt += "\n\n" + memory_context["formatted_context"]
-            
-            # Define an async function to get the streaming chat completion
-            async def get_streaming_completion(user_msg: str):
-                completion_stream = await openai_service.create_freya_chat_completion(
-                    user_message=user_msg,
-                    conversation_history=conversation_history,
-                    memory_context=memory_context.get("formatted_context") if memory_context else None,
-                    stream=True
-                )
+                # Prefetch stage: runs while the thinking state is on screen
+                async def get_streaming_completion(user_msg: str):
+                    nonlocal conversation
+                
+                    # Commit the conversation and user message together before the reply streams
+                    async with async_unit_of_work(db):
+                        # Get or create conversation
+                        if conversation_id:
+                            conversation = await conversation_repo.get(conversation_id)
+                            if not conversation:
+                                raise ValueError(f"Conversation {conversation_id} not found")
+                            if conversation.user_id != user_id:
+                                raise ValueError(f"Conversation {conversation_id} does not belong to user {user_id}")
+                        else:
+                            # Create new conversation
+                            conversation = await conversation_repo.create({
+                                "user_id": user_id,
+                                "started_at": datetime.utcnow()
+                            })
+                            logger.info(f"Created new conversation {conversation.id} for user {user_id}")
+                
+                        # Store user message
+                        user_msg_record = await message_repo.create({
+                            "conversation_id": conversation.id,
+                            "user_id": user_id,
+                            "role": ROLE_USER,
+                            "content": user_msg,
+                            "timestamp": datetime.utcnow()
+                        })
                 
-                # Return the generator
-                return completion_stream
+                    # Get recent conversation history
+                    recent_messages = await get_conversation_history_async(
+                        db,
+                        conversation_id=conversation.id,
+                        limit=10,
+                        skip=0
+                    )
+                
+                    # Format conversation history for OpenAI, but exclude the message we just added
+                    conversation_history = []
+                    for msg in recent_messages:
+                        if msg.id != user_msg_record.id and msg.role in [ROLE_USER, ROLE_ASSISTANT]:
+                            conversation_history.append({
+                                "role": msg.role,
+                                "content": msg.content
+                            })
+                
+                    memory_context = await memory_task
+                
+                    completion_stream = await OpenAIService().create_freya_chat_completion(
+                        user_message=user_msg,
+                        conversation_history=conversation_history,
+                        memory_context=memory_context.get("formatted_context") if memory_context else None,
+                        stream=True
+                    )
+                
+                    # Return the generator
+                    return completion_stream
             
-            # Use the event dispatcher to handle the streaming chat sequence
-            full_response = await event_dispatcher.dispatch_streaming_chat_sequence(
-                client_queue=event_queue,
-                streaming_processor=get_streaming_completion,
-                user_message=message,
-                thinking_delay=0  # We already added a delay above
-            )
+                # The dispatcher sends listening/thinking, runs the prefetch stage and
+                # holds the first reply until the thinking delay has elapsed
+                try:
+                    full_response = await event_dispatcher.dispatch_streaming_chat_sequence(
+                        client_queue=event_queue,
+                        streaming_processor=get_streaming_completion,
+                        user_message=message,
+                        thinking_delay=1.0,
+                        coalesce_window=REPLY_COALESCE_WINDOW,
+                        coalesce_bytes=REPLY_COALESCE_BYTES
+                    )
+                except asyncio.CancelledError:
+                    # Client disconnected mid-reply: the upstream stream is already
+                    # closed; keep what was sent, marked as truncated
+                    if conversation and event_dispatcher.partial_response:
+                        await message_repo.create({
+                            "conversation_id": conversation.id,
+                            "user_id": user_id,
+                            "role": ROLE_ASSISTANT,
+                            "content": event_dispatcher.partial_response + TRUNCATED_RESPONSE_MARKER,
+                            "timestamp": datetime.utcnow()
+                        })
+                        logger.info(f"Stored truncated chat response for user {user_id}, conversation {conversation.id}")
+                    raise
+                finally:
+                    if not memory_task.done():
+                        memory_task.cancel()
             
-            # Store the complete assistant response (if we got a valid response)
-            if full_response:
-                assistant_msg_record = message_repo.create({
-                    "conversation_id": conversation.id,
-                    "user_id": user_id,
-                    "role": ROLE_ASSISTANT,
-                    "content": full_response,
-                    "timestamp": datetime.utcnow()
-                })
+                # Store the complete assistant response (if we got a valid response)
+                if full_response:
+                    assistant_msg_record = await message_repo.create({
+                        "conversation_id": conversation.id,
+                        "user_id": user_id,
+                        "role": ROLE_ASSISTANT,
+                        "content": full_response,
+                        "timestamp": datetime.utcnow()
+                    })
                 
-                logger.info(f"Completed chat response for user {user_id}, conversation {conversation.id}")
+                    logger.info(f"Completed chat response for user {user_id}, conversation {conversation.id}")
             
         except Exception as e:
             logger.error(f"Error in chat event stream: {str(e)}")
             # No need to yield here, the event_dispatcher will handle the error event
             await event_dispatcher.dispatch_error_event(event_queue, str(e))
-        
-        # Send first events through the queue and then use the generator
-        # The chat sequence will continue to send events as they become available
-        
-        # Return an async generator that yields events from the queue
-        return generate_events()
     
-    # Use the async generator directly in the EventSourceResponse
-    return EventSourceResponse(event_stream())
+    # Drain the producer's bounded queue into the SSE response, sharing each
+    # event with the user's other open streams
+    return EventSourceResponse(EventService.supervised_event_stream(
+        request, process_chat, on_event=_fan_out(user_id, conversation_id)
+    ))
 
 
 @router.post("/legacy")
@@ -278,151 +293,131 @@ async def legacy_compatibility_chat(
     Returns:
         Dict: A JSON response with the full text response and metadata
     """
-    async def event_stream():
-        # Create a queue for the event dispatcher to use
-        event_queue = asyncio.Queue()
-        
-        # Create event dispatcher
+    async def process_chat(event_queue: asyncio.Queue) -> None:
+        # Runs as a supervised background task: each event is delivered as soon
+        # as it is queued, and the task is cancelled if the client disconnects
         event_dispatcher = EventDispatcher()
         
-        # Define function to yield events from the queue
-        async def generate_events():
-            while True:
-                # Wait for an event to be available
-                event = await event_queue.get()
-                yield event
-                event_queue.task_done()
-                
-                # If client disconnected, stop processing
-                if await request.is_disconnected():
-                    logger.info("Client disconnected, stopping event processing")
-                    break
-        
-        # Use the generator function directly - don't create a task
-        
         try:
             # Process the chat using the same logic as /chat endpoint
             # But for legacy compatibility, we'll add explicit browser events
             
-            # Access database
-            db = next(get_db())
-            user_repo = UserRepository(db)
-            conversation_repo = ConversationRepository(db)
-            message_repo = MessageRepository(db)
-            history_service = ConversationHistoryService(db)
+            # Scope the session to the stream so its connection is returned
+            # to the pool even if the client disconnects mid-response
+            async with async_session_scope() as db:
+                user_repo = AsyncUserRepository(db)
+                conversation_repo = AsyncConversationRepository(db)
+                message_repo = AsyncMessageRepository(db)
             
-            # Verify user exists
-            user = user_repo.get(user_id)
-            if not user:
-                error = f"User {user_id} not found"
-                logger.error(error)
-                await event_dispatcher.dispatch_error_event(event_queue, error)
-                return
-            
-            # Use the event dispatcher to handle the sequence
-            await event_dispatcher.dispatch_listening_event(event_queue)
-            
-            # Get or create conversation
-            if conversation_id:
-                conversation = conversation_repo.get(conversation_id)
-                if not conversation:
-                    error = f"Conversation {conversation_id} not found"
+                # Verify user exists
+                user = await user_repo.get(user_id)
+                if not user:
+                    error = f"User {user_id} not found"
                     logger.error(error)
                     await event_dispatcher.dispatch_error_event(event_queue, error)
                     return
-                if conversation.user_id != user_id:
-                    error = f"Conversation {conversation_id} does not belong to user {user_id}"
-                    logger.error(error)
-                    await event_dispatcher.dispatch_error_event(event_queue, error)
-                    return
-            else:
-                # Create new conversation
-                conversation = conversation_repo.create({
-                    "user_id": user_id,
-                    "started_at": datetime.utcnow()
-                })
-                logger.info(f"Created new conversation {conversation.id} for user {user_id}")
-            
-            # Store user message
-            user_msg_record = message_repo.create({
-                "conversation_id": conversation.id,
-                "user_id": user_id,
-                "role": ROLE_USER,
-                "content": message,
-                "timestamp": datetime.utcnow()
-            })
-            
-            # Initialize services
-            openai_service = OpenAIService()
-            memory_builder = MemoryContextBuilder(db)
             
-            # Build memory context and conversation history
-            memory_context = memory_builder.assemble_memory_context(
-                user_id=user_id,
-                query=message
-            )
+                # Use the event dispatcher to handle the sequence
+                await event_dispatcher.dispatch_listening_event(event_queue)
             
-            recent_messages = history_service.get_conversation_history(
-                conversation_id=conversation.id,
-                limit=10,
-                skip=0
-            )
+                # Commit the conversation and user message together before the reply streams
+                async with async_unit_of_work(db):
+                    # Get or create conversation
+                    if conversation_id:
+                        conversation = await conversation_repo.get(conversation_id)
+                        if not conversation:
+                            error = f"Conversation {conversation_id} not found"
+                            logger.error(error)
+                            await event_dispatcher.dispatch_error_event(event_queue, error)
+                            return
+                        if conversation.user_id != user_id:
+                            error = f"Conversation {conversation_id} does not belong to user {user_id}"
+                            logger.error(error)
+                            await event_dispatcher.dispatch_error_event(event_queue, error)
+                            return
+                    else:
+                        # Create new conversation
+                        conversation = await conversation_repo.create({
+                            "user_id": user_id,
+                            "started_at": datetime.utcnow()
+                        })
+                        logger.info(f"Created new conversation {conversation.id} for user {user_id}")
             
-            conversation_history = []
-            for msg in recent_messages:
-                if msg.id != user_msg_record.id and msg.role in [ROLE_USER, ROLE_ASSISTANT]:
-                    conversation_history.append({
-                        "role": msg.role,
-                        "content": msg.content
+                    # Store user message
+                    user_msg_record = await message_repo.create({
+                        "conversation_id": conversation.id,
+                        "user_id": user_id,
+                        "role": ROLE_USER,
+                        "content": message,
+                        "timestamp": datetime.utcnow()
                     })
             
-            # Format system prompt with memory context
-            system_prompt = FREYA_SYSTEM_PROMPT
-            if memory_context and memory_context.get("formatted_context"):
-                system_prompt += "\n\n" + memory_context["formatted_context"]
+                # Initialize services
+                openai_service = OpenAIService()
             
-            # Now send the thinking event before processing
-            await event_dispatcher.dispatch_thinking_event(event_queue)
+                # Build memory context and conversation history
+                memory_context = await assemble_memory_context_async(
+                    db,
+                    user_id=user_id,
+                    query=message
+                )
             
-            # Define an async function to get the complete (non-streaming) chat completion
-            async def get_completion(user_msg: str) -> str:
-                response = await openai_service.create_freya_chat_completion(
-                    user_message=user_msg,
-                    conversation_history=conversation_history,
-                    memory_context=memory_context.get("formatted_context") if memory_context else None,
-                    stream=False  # For legacy mode, we use the non-streaming API for simplicity
+                recent_messages = await get_conversation_history_async(
+                    db,
+                    conversation_id=conversation.id,
+                    limit=10,
+                    skip=0
                 )
-                return response
             
-            # Use the event dispatcher for the chat sequence
-            full_response = await event_dispatcher.dispatch_chat_sequence(
-                client_queue=event_queue,
-                message_processor=get_completion,
-                user_message=message,
-                thinking_delay=1.0
-            )
+                conversation_history = []
+                for msg in recent_messages:
+                    if msg.id != user_msg_record.id and msg.role in [ROLE_USER, ROLE_ASSISTANT]:
+                        conversation_history.append({
+                            "role": msg.role,
+                            "content": msg.content
+                        })
+            
+                # Format system prompt with memory context
+                system_prompt = FREYA_SYSTEM_PROMPT
+                if memory_context and memory_context.get("formatted_context"):
+                    system_prompt += "\n\n" + memory_context["formatted_context"]
+            
+                # Now send the thinking event before processing
+                await event_dispatcher.dispatch_thinking_event(event_queue)
             
-            # Store the assistant response
-            if full_response:
-                assistant_msg_record = message_repo.create({
-                    "conversation_id": conversation.id,
-                    "user_id": user_id,
-                    "role": ROLE_ASSISTANT, 
-                    "content": full_response,
-                    "timestamp": datetime.utcnow()
-                })
+                # Define an async function to get the complete (non-streaming) chat completion
+                async def get_completion(user_msg: str) -> str:
+                    response = await openai_service.create_freya_chat_completion(
+                        user_message=user_msg,
+                        conversation_history=conversation_history,
+                        memory_context=memory_context.get("formatted_context") if memory_context else None,
+                        stream=False  # For legacy mode, we use the non-streaming API for simplicity
+                    )
+                    return response
+            
+                # Use the event dispatcher for the chat sequence
+                full_response = await event_dispatcher.dispatch_chat_sequence(
+                    client_queue=event_queue,
+                    message_processor=get_completion,
+                    user_message=message,
+                    thinking_delay=1.0
+                )
+            
+                # Store the assistant response
+                if full_response:
+                    assistant_msg_record = await message_repo.create({
+                        "conversation_id": conversation.id,
+                        "user_id": user_id,
+                        "role": ROLE_ASSISTANT, 
+                        "content": full_response,
+                        "timestamp": datetime.utcnow()
+                    })
                 
-                logger.info(f"Completed legacy chat response for user {user_id}, conversation {conversation.id}")
+                    logger.info(f"Completed legacy chat response for user {user_id}, conversation {conversation.id}")
             
         except Exception as e:
             logger.error(f"Error in legacy chat event stream: {str(e)}")
             await event_dispatcher.dispatch_error_event(event_queue, str(e))
-        
-        # Send first events through the queue and then use the generator
-        # The chat sequence will continue to send events as they become available
-        
-        # Return an async generator that yields events from the queue
-        return generate_events()
     
-    # Use the async generator directly in the EventSourceResponse
-    return EventSourceResponse(event_stream())
\ No newline at end of file
+    # Drain the producer's bounded queue into the SSE response
+    return EventSourceResponse(EventService.supervised_event_stream(request, process_chat))
\ No newline at end of file
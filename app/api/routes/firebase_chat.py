@@ -6,8 +6,9 @@ and retrieves memory context to enhance the chat experience.
 """
 
 from typing import Dict, List, Any, Optional
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
 from pydantic import BaseModel, Field
+import asyncio
 import uuid
 from datetime import datetime
 import logging
@@ -15,11 +16,18 @@ import logging
 from app.services.firebase_service import FirebaseService
 from app.services.firebase_memory_service import FirebaseMemoryService
 from app.services.openai_service import OpenAIService
-from app.core.openai_constants import ROLE_USER, ROLE_ASSISTANT
+from app.services.history_compaction import FirestoreSummaryStore, HistoryCompactor
+from app.services.firebase_auth import ensure_claims_match, get_firebase_claims
+from app.services.bulk_delete import FirestoreConversationDeleter, get_delete_job_manager
+from app.services.json_stream import LIST_PAGE_SIZE, MAX_LIST_PAGE_SIZE, list_response, page_size
+from app.core.openai_constants import ROLE_USER, ROLE_ASSISTANT, HISTORY_FETCH_LIMIT
 from app.core.config import logger
 
 router = APIRouter()
 
+# Rolling summaries are kept on the conversation documents
+history_compactor = HistoryCompactor(store=FirestoreSummaryStore())
+
 # Models for request/response
 class ChatMessageRequest(BaseModel):
     """Request model for chat messages."""
@@ -38,11 +46,21 @@ class ChatMessageResponse(BaseModel):
         default_factory=lambda: {"listening": False, "thinking": False, "reply": True},
         description="UI state flags"
     )
+    usage: Optional[Dict[str, int]] = Field(None, description="Token usage, including prompt tokens saved by history compaction")
+
+def _completion_usage(completion) -> Dict[str, int]:
+    """Token counts reported by OpenAI for a completion."""
+    usage = getattr(completion, "usage", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "total_tokens": getattr(usage, "total_tokens", 0) or 0,
+    }
 
 @router.post("/chat", response_model=ChatMessageResponse)
 async def chat_endpoint(
     request: ChatMessageRequest,
-    authorization: Optional[str] = Header(None)
+    claims: Optional[Dict[str, Any]] = Depends(get_firebase_claims)
 ):
     """
     Simple chat endpoint that receives a message and returns a response.
@@ -56,7 +74,7 @@ async def chat_endpoint(
     
     Args:
         request: ChatMessageRequest object
-        authorization: Optional authorization header
+        claims: Verified token claims, or None without an Authorization header
         
     Returns:
         ChatMessageResponse with the AI's response
@@ -67,18 +85,8 @@ async def chat_endpoint(
         memory_service = FirebaseMemoryService()
         openai_service = OpenAIService()
         
-        # Verify user authentication if token provided
-        if authorization:
-            # Remove 'Bearer ' prefix if present
-            token = authorization.replace("Bearer ", "") if authorization.startswith("Bearer ") else authorization
-            try:
-                claims = firebase.verify_auth_token(token)
-                # Ensure user_id matches authenticated user
-                if claims.get('uid') != request.user_id:
-                    raise HTTPException(status_code=403, detail="User ID doesn't match authenticated user")
-            except Exception as e:
-                logger.error(f"Authentication error: {str(e)}")
-                raise HTTPException(status_code=401, detail="Invalid authentication token")
+        # Ensure user_id matches authenticated user
+        ensure_claims_match(claims, request.user_id)
         
         # Get or create conversation
         conversation_id = request.conversation_id
@@ -103,26 +111,34 @@ async def chat_endpoint(
             "timestamp": datetime.now()
         }
         try:
-            user_message_id = firebase.add_message(conversation_id, user_message_data)
+            user_message_id = firebase.add_message(conversation_id, user_message_data, user_id=request.user_id)
             if not user_message_id:
                 logger.warning("Failed to store user message, but continuing with request")
         except Exception as e:
             logger.error(f"Error storing user message: {str(e)}")
             # Continue with the request even if storing fails
         
-        # Get conversation history (last 10 messages)
-        history = firebase.get_conversation_messages(conversation_id, limit=10)
-        # Format for OpenAI API (excluding the message we just added)
-        # Note: Your messages use 'user' field for content, not 'content'
-        conversation_history = [
-            {"role": ROLE_USER, "content": msg.get("user", "")}
-            for msg in history if msg.get("id") != user_message_id and msg.get("user")
+        # Get recent conversation history, oldest first (excluding the message we just added)
+        history = firebase.get_conversation_messages(conversation_id, limit=HISTORY_FETCH_LIMIT)
+        history = [
+            msg for msg in reversed(history)
+            if msg.get("id") != user_message_id and msg.get("user")
         ]
+        history_ids = [msg.get("id") for msg in history]
+        # Format for OpenAI API
+        # Note: Your messages use 'user' field for content, not 'content'
+        raw_history = [{"role": ROLE_USER, "content": msg.get("user", "")} for msg in history]
+        # Send the rolling summary plus the messages it does not cover yet
+        compacted = history_compactor.compact(conversation_id, raw_history, history_ids)
+        conversation_history = compacted.messages
         
         # Retrieve memory context if requested
         memory_context = None
         if request.include_memory:
-            memory_result = memory_service.assemble_memory_context(request.user_id, request.message)
+            # Off the event loop: the semantic search waits up to its latency budget
+            memory_result = await asyncio.to_thread(
+                memory_service.assemble_memory_context, request.user_id, request.message
+            )
             memory_context = memory_result.get("formatted_context")
         
         # Get response from OpenAI
@@ -141,7 +157,7 @@ async def chat_endpoint(
             "timestamp": datetime.now()
         }
         try:
-            assistant_message_id = firebase.add_message(conversation_id, assistant_message_data)
+            assistant_message_id = firebase.add_message(conversation_id, assistant_message_data, user_id=request.user_id)
             if not assistant_message_id:
                 logger.warning("Failed to store assistant message, using temporary ID instead")
                 assistant_message_id = f"temp_{uuid.uuid4().hex}"
@@ -150,6 +166,9 @@ async def chat_endpoint(
             # Generate a temporary message ID if storage fails
             assistant_message_id = f"temp_{uuid.uuid4().hex}"
         
+        # Fold older messages into the summary in the background
+        history_compactor.schedule_update(conversation_id, raw_history, history_ids)
+        
         # Extract user facts from the message
         # This is simplified compared to the existing implementation
         # In a real implementation, you'd use more sophisticated fact extraction
@@ -161,7 +180,8 @@ async def chat_endpoint(
             conversation_id=conversation_id,
             message_id=assistant_message_id,
             timestamp=datetime.now().isoformat(),
-            state_flags={"listening": False, "thinking": False, "reply": True}
+            state_flags={"listening": False, "thinking": False, "reply": True},
+            usage={**_completion_usage(response), **compacted.usage()}
         )
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -175,7 +195,7 @@ async def chat_endpoint(
 async def get_user_conversations(
     user_id: str,
     limit: int = 10,
-    authorization: Optional[str] = Header(None)
+    claims: Optional[Dict[str, Any]] = Depends(get_firebase_claims)
 ):
     """
     Get conversations for a user.
@@ -183,7 +203,7 @@ async def get_user_conversations(
     Args:
         user_id: User ID
         limit: Maximum number of conversations to return
-        authorization: Optional authorization header
+        claims: Verified token claims, or None without an Authorization header
         
     Returns:
         List of conversation objects
@@ -192,17 +212,8 @@ async def get_user_conversations(
         # Initialize service
         firebase = FirebaseService()
         
-        # Verify user authentication if token provided
-        if authorization:
-            token = authorization.replace("Bearer ", "") if authorization.startswith("Bearer ") else authorization
-            try:
-                claims = firebase.verify_auth_token(token)
-                # Ensure user_id matches authenticated user
-                if claims.get('uid') != user_id:
-                    raise HTTPException(status_code=403, detail="User ID doesn't match authenticated user")
-            except Exception as e:
-                logger.error(f"Authentication error: {str(e)}")
-                raise HTTPException(status_code=401, detail="Invalid authentication token")
+        # Ensure user_id matches authenticated user
+        ensure_claims_match(claims, user_id)
         
         # Get conversations
         conversations = firebase.get_user_conversations(user_id, limit=limit)
@@ -216,19 +227,26 @@ async def get_user_conversations(
 @router.get("/conversations/{conversation_id}/messages")
 async def get_conversation_messages(
     conversation_id: str,
-    limit: int = 50,
-    authorization: Optional[str] = Header(None)
+    limit: int = Query(50, description=f"Page size (at most {MAX_LIST_PAGE_SIZE})"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    accept: Optional[str] = Header(None),
+    claims: Optional[Dict[str, Any]] = Depends(get_firebase_claims)
 ):
     """
     Get messages for a conversation.
     
+    The page is streamed as it is read from Firestore, as JSON or as NDJSON
+    when the client sends Accept: application/x-ndjson.
+    
     Args:
         conversation_id: Conversation ID
         limit: Maximum number of messages to return
-        authorization: Optional authorization header
+        cursor: Cursor of the previous page (optional)
+        accept: Accept header selecting JSON or NDJSON
+        claims: Verified token claims, or None without an Authorization header
         
     Returns:
-        List of message objects
+        List of message objects and the cursor of the next page
     """
     try:
         # Initialize service
@@ -239,41 +257,36 @@ async def get_conversation_messages(
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
-        # Verify user authentication if token provided
-        if authorization:
-            token = authorization.replace("Bearer ", "") if authorization.startswith("Bearer ") else authorization
-            try:
-                claims = firebase.verify_auth_token(token)
-                # Ensure user owns the conversation
-                if claims.get('uid') != conversation.get('userId'):
-                    raise HTTPException(status_code=403, detail="User doesn't own this conversation")
-            except Exception as e:
-                logger.error(f"Authentication error: {str(e)}")
-                raise HTTPException(status_code=401, detail="Invalid authentication token")
+        # Ensure user owns the conversation
+        ensure_claims_match(claims, conversation.get('userId'), "User doesn't own this conversation")
         
-        # Get messages
-        messages = firebase.get_conversation_messages(conversation_id, limit=limit)
-        return {"messages": messages}
+        # Stream messages
+        size = page_size(limit)
+        messages = firebase.stream_conversation_messages(conversation_id, limit=size + 1, start_after=cursor)
+        return list_response("messages", messages, size, accept)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error getting messages: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-@router.delete("/conversations/{conversation_id}")
+@router.delete("/conversations/{conversation_id}", status_code=202)
 async def delete_conversation(
     conversation_id: str,
-    authorization: Optional[str] = Header(None)
+    claims: Optional[Dict[str, Any]] = Depends(get_firebase_claims)
 ):
     """
-    Delete a conversation.
+    Delete a conversation with its messages and subcollections.
+    
+    The delete runs as a background job; poll /firebase/delete-jobs/{job_id}
+    for its progress.
     
     Args:
         conversation_id: Conversation ID
-        authorization: Optional authorization header
+        claims: Verified token claims, or None without an Authorization header
         
     Returns:
-        Success message
+        Job id and status of the delete
     """
     try:
         # Initialize service
@@ -284,64 +297,74 @@ async def delete_conversation(
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
-        # Verify user authentication if token provided
-        if authorization:
-            token = authorization.replace("Bearer ", "") if authorization.startswith("Bearer ") else authorization
-            try:
-                claims = firebase.verify_auth_token(token)
-                # Ensure user owns the conversation
-                if claims.get('uid') != conversation.get('userId'):
-                    raise HTTPException(status_code=403, detail="User doesn't own this conversation")
-            except Exception as e:
-                logger.error(f"Authentication error: {str(e)}")
-                raise HTTPException(status_code=401, detail="Invalid authentication token")
+        # Ensure user owns the conversation
+        ensure_claims_match(claims, conversation.get('userId'), "User doesn't own this conversation")
         
-        # Delete conversation
-        success = firebase.delete_document("conversations", conversation_id)
-        if not success:
-            raise HTTPException(status_code=500, detail="Failed to delete conversation")
+        # Delete conversation, messages and subcollections in the background
+        deleter = FirestoreConversationDeleter(firebase.db)
+        job = get_delete_job_manager().submit(
+            "firestore", conversation_id,
+            lambda job: deleter.delete_conversation(conversation_id, job, user_id=conversation.get('userId'))
+        )
         
-        return {"message": "Conversation deleted successfully"}
+        return {"message": "Conversation deletion started", "job_id": job.id, "status": job.status}
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error deleting conversation: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@router.get("/delete-jobs/{job_id}")
+async def get_delete_job(job_id: str):
+    """
+    Get the progress of a conversation delete.
+    
+    Args:
+        job_id: Job ID returned by the delete endpoint
+        
+    Returns:
+        Job status, documents deleted per collection and timings
+    """
+    job = get_delete_job_manager().get(job_id)
+    if job is None or job.kind != "firestore":
+        raise HTTPException(status_code=404, detail="Delete job not found")
+    return job.to_dict()
+
 @router.get("/topics/{user_id}")
 async def get_user_topics(
     user_id: str,
-    authorization: Optional[str] = Header(None)
+    limit: Optional[int] = Query(None, description=f"Page size (default {LIST_PAGE_SIZE}, at most {MAX_LIST_PAGE_SIZE})"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    accept: Optional[str] = Header(None),
+    claims: Optional[Dict[str, Any]] = Depends(get_firebase_claims)
 ):
     """
     Get topics for a user.
     
+    The page is streamed as it is read from Firestore, as JSON or as NDJSON
+    when the client sends Accept: application/x-ndjson.
+    
     Args:
         user_id: User ID
-        authorization: Optional authorization header
+        limit: Maximum number of topics to return
+        cursor: Cursor of the previous page (optional)
+        accept: Accept header selecting JSON or NDJSON
+        claims: Verified token claims, or None without an Authorization header
         
     Returns:
-        List of topic objects
+        List of topic objects and the cursor of the next page
     """
     try:
         # Initialize service
         firebase = FirebaseService()
         
-        # Verify user authentication if token provided
-        if authorization:
-            token = authorization.replace("Bearer ", "") if authorization.startswith("Bearer ") else authorization
-            try:
-                claims = firebase.verify_auth_token(token)
-                # Ensure user_id matches authenticated user
-                if claims.get('uid') != user_id:
-                    raise HTTPException(status_code=403, detail="User ID doesn't match authenticated user")
-            except Exception as e:
-                logger.error(f"Authentication error: {str(e)}")
-                raise HTTPException(status_code=401, detail="Invalid authentication token")
+        # Ensure user_id matches authenticated user
+        ensure_claims_match(claims, user_id)
         
-        # Get topics
-        topics = firebase.get_user_topics(user_id)
-        return {"topics": topics}
+        # Stream topics
+        size = page_size(limit)
+        topics = firebase.stream_user_topics(user_id, limit=size + 1, start_after=cursor)
+        return list_response("topics", topics, size, accept)
     except HTTPException:
         raise
     except Exception as e:
@@ -351,37 +374,38 @@ async def get_user_topics(
 @router.get("/facts/{user_id}")
 async def get_user_facts(
     user_id: str,
-    authorization: Optional[str] = Header(None)
+    limit: Optional[int] = Query(None, description=f"Page size (default {LIST_PAGE_SIZE}, at most {MAX_LIST_PAGE_SIZE})"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    accept: Optional[str] = Header(None),
+    claims: Optional[Dict[str, Any]] = Depends(get_firebase_claims)
 ):
     """
     Get facts for a user.
     
+    The page is streamed as it is read from Firestore, as JSON or as NDJSON
+    when the client sends Accept: application/x-ndjson.
+    
     Args:
         user_id: User ID
-        authorization: Optional authorization header
+        limit: Maximum number of facts to return
+        cursor: Cursor of the previous page (optional)
+        accept: Accept header selecting JSON or NDJSON
+        claims: Verified token claims, or None without an Authorization header
         
     Returns:
-        List of fact objects
+        List of fact objects and the cursor of the next page
     """
     try:
         # Initialize service
         firebase = FirebaseService()
         
-        # Verify user authentication if token provided
-        if authorization:
-            token = authorization.replace("Bearer ", "") if authorization.startswith("Bearer ") else authorization
-            try:
-                claims = firebase.verify_auth_token(token)
-                # Ensure user_id matches authenticated user
-                if claims.get('uid') != user_id:
-                    raise HTTPException(status_code=403, detail="User ID doesn't match authenticated user")
-            except Exception as e:
-                logger.error(f"Authentication error: {str(e)}")
-                raise HTTPException(status_code=401, detail="Invalid authentication token")
+        # Ensure user_id matches authenticated user
+        ensure_claims_match(claims, user_id)
         
-        # Get facts
-        facts = firebase.get_user_facts(user_id)
-        return {"facts": facts}
+        # Stream facts
+        size = page_size(limit)
+        facts = firebase.stream_user_facts(user_id, limit=size + 1, start_after=cursor)
+        return list_response("facts", facts, size, accept)
     except HTTPException:
         raise
     except Exception as e:
@@ -40,3 +40,22 @@ if USING_FIREBASE:
     logger.info("Using Firebase backend (simplified approach)")
     if not POSTGRES_URL:
         logger.info("PostgreSQL URL not set, which is fine when using Firebase")
+
+# Local vector index for semantic memory retrieval (disabled unless a directory is set)
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR")
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float32").lower()  # float32 or int8
+VECTOR_INDEX_EMBEDDER = os.getenv("VECTOR_INDEX_EMBEDDER", "openai").lower()  # openai or hashing
+
+# Snapshot directory for the Firestore-mode message search index (in memory only when unset)
+SEARCH_INDEX_DIR = os.getenv("SEARCH_INDEX_DIR")
+
+# Ask Firebase whether a token was revoked each time one is verified (not cached)
+FIREBASE_AUTH_CHECK_REVOKED = os.getenv("FIREBASE_AUTH_CHECK_REVOKED", "false").lower() in ("true", "1", "yes")
+
+# Run FirebaseService on the in-process Firestore emulator ("memory") instead of Firestore
+FIREBASE_EMULATOR = os.getenv("FIREBASE_EMULATOR", "").lower()
+FIREBASE_EMULATOR_BASE_MS = float(os.getenv("FIREBASE_EMULATOR_BASE_MS", "0"))  # Delay per RPC
+FIREBASE_EMULATOR_PER_DOC_MS = float(os.getenv("FIREBASE_EMULATOR_PER_DOC_MS", "0"))  # Extra delay per document returned
+FIREBASE_EMULATOR_JITTER_MS = float(os.getenv("FIREBASE_EMULATOR_JITTER_MS", "0"))  # Mean of the exponential jitter
+FIREBASE_EMULATOR_ERROR_RATE = float(os.getenv("FIREBASE_EMULATOR_ERROR_RATE", "0"))  # Share of RPCs that fail
+FIREBASE_EMULATOR_SEED = int(os.getenv("FIREBASE_EMULATOR_SEED")) if os.getenv("FIREBASE_EMULATOR_SEED") else None
@@ -6,6 +6,7 @@ from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import desc, func
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.conversation import Conversation
 from app.models.message import Message
@@ -197,3 +198,27 @@ class ConversationHistoryService:
             formatted_messages.append(message_dict)
             
         return formatted_messages
+
+
+
+async def get_conversation_history_async(
+    db: AsyncSession,
+    conversation_id: int,
+    limit: int = 20,
+    skip: int = 0
+) -> List[Message]:
+    """
+    Async variant of ConversationHistoryService.get_conversation_history.
+
+    Args:
+        db: Async database session
+        conversation_id: ID of the conversation to retrieve messages from
+        limit: Maximum number of messages to return
+        skip: Number of messages to skip (for pagination)
+
+    Returns:
+        List of Message objects, newest first
+    """
+    return await db.run_sync(
+        lambda session: ConversationHistoryService(session).get_conversation_history(conversation_id, limit, skip)
+    )
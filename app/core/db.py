@@ -1,10 +1,18 @@
 """
 db.py - SQLAlchemy engine and session with connection pooling for Freya backend
+
+Provides both the synchronous engine (psycopg2) used by the plain `def` routes
+and an asyncio engine (asyncpg; aiosqlite for a local SQLite POSTGRES_URL) for
+the `async def` routes, so those never run blocking database I/O on the event
+loop.
 """
 import os
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.pool import QueuePool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,15 +20,54 @@ load_dotenv()
 # Check if we're using Firebase (simplified approach)
 USING_FIREBASE = os.getenv("USE_FIREBASE", "false").lower() in ("true", "1", "yes")
 
+# Async driver for each sync URL scheme we accept in POSTGRES_URL
+ASYNC_DRIVER_SCHEMES = {
+    "postgresql+psycopg2://": "postgresql+asyncpg://",
+    "postgresql://": "postgresql+asyncpg://",
+    "postgres://": "postgresql+asyncpg://",
+    "sqlite://": "sqlite+aiosqlite://",  # Local development only
+}
+
+
+def to_async_database_url(url: str) -> str:
+    """
+    Convert a synchronous database URL to its asyncio driver equivalent.
+
+    Args:
+        url: Database URL as configured in POSTGRES_URL
+
+    Returns:
+        The same URL using the async driver (asyncpg for PostgreSQL)
+    """
+    for sync_scheme, async_scheme in ASYNC_DRIVER_SCHEMES.items():
+        if url.startswith(sync_scheme):
+            return async_scheme + url[len(sync_scheme):]
+    return url
+
+
+def async_pool_options(url: str, pool_size: int, max_overflow: int, pool_timeout: float) -> dict:
+    """
+    Pool sizing arguments for create_async_engine.
+
+    Only PostgreSQL gets a sized pool; SQLite (local development) keeps
+    SQLAlchemy's default pool, which rejects these arguments for in-memory
+    databases.
+    """
+    if not url.startswith("postgresql"):
+        return {}
+    return {"pool_size": pool_size, "max_overflow": max_overflow, "pool_timeout": pool_timeout}
+
+
 # Only set up SQLAlchemy if not using Firebase
 if not USING_FIREBASE:
     DATABASE_URL = os.getenv("POSTGRES_URL")
-    
+    ASYNC_DATABASE_URL = to_async_database_url(DATABASE_URL)
+
     # Connection pool configuration
     POOL_SIZE = 5         # Number of connections to keep in the pool
     MAX_OVERFLOW = 10     # Extra connections allowed above pool_size
     POOL_TIMEOUT = 30     # Seconds to wait before giving up on getting a connection
-    
+
     engine = create_engine(
         DATABASE_URL,
         poolclass=QueuePool,
@@ -29,17 +76,35 @@ if not USING_FIREBASE:
         pool_timeout=POOL_TIMEOUT,
         echo=False,  # Set to True for SQL debugging
     )
-    
+
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    # Async engine has its own pool; the async routes never borrow sync connections
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_pre_ping=True,
+        echo=False,
+        **async_pool_options(ASYNC_DATABASE_URL, POOL_SIZE, MAX_OVERFLOW, POOL_TIMEOUT),
+    )
+
+    # expire_on_commit=False so committed objects stay readable without an implicit (awaitable) reload
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False,
+    )
 else:
     # Dummy engine and session for Firebase mode
     import logging
     logger = logging.getLogger("freya")
     logger.info("Using Firebase mode - PostgreSQL database not initialized")
-    
+
     # Create dummy objects that won't be used
     engine = None
     SessionLocal = None
+    async_engine = None
+    AsyncSessionLocal = None
 
 def get_db():
     if USING_FIREBASE:
@@ -56,3 +121,88 @@ def get_db():
             yield db
         finally:
             db.close()
+
+
+@asynccontextmanager
+async def async_session_scope() -> AsyncIterator[Optional[AsyncSession]]:
+    """
+    Open an AsyncSession that is always closed (and its connection returned
+    to the pool) when the block exits, including on cancellation.
+
+    Use this directly in code that outlives the request dependency scope,
+    e.g. inside an SSE generator.
+
+    Usage:
+        async with async_session_scope() as db:
+            ... # await db.execute(...)
+    """
+    if USING_FIREBASE:
+        import logging
+        logger = logging.getLogger("freya")
+        logger.warning("async_session_scope() called in Firebase mode - this should not happen")
+        yield None
+        return
+
+    session = AsyncSessionLocal()
+    try:
+        yield session
+    finally:
+        # close() rolls back anything uncommitted and returns the connection
+        await session.close()
+
+
+async def get_async_db() -> AsyncIterator[Optional[AsyncSession]]:
+    """FastAPI dependency yielding an AsyncSession with guaranteed cleanup."""
+    async with async_session_scope() as db:
+        yield db
+
+
+# Session.info flag: while set, repositories stage and flush but never commit
+UNIT_OF_WORK_KEY = "unit_of_work"
+
+
+@contextmanager
+def unit_of_work(session: Session) -> Iterator[Session]:
+    """
+    Batch every repository write in the block into a single commit.
+
+    Repositories only flush inside the block (ids come back via INSERT ... RETURNING),
+    then one commit persists everything. Any exception rolls the whole block back.
+
+    Usage:
+        with unit_of_work(db):
+            conversation = ConversationRepository(db).create({...})
+            MessageRepository(db).create({"conversation_id": conversation.id, ...})
+    """
+    if session.info.get(UNIT_OF_WORK_KEY):
+        # Nested: the outermost unit of work owns the commit
+        yield session
+        return
+
+    session.info[UNIT_OF_WORK_KEY] = True
+    try:
+        yield session
+        session.commit()
+    except BaseException:
+        session.rollback()
+        raise
+    finally:
+        session.info.pop(UNIT_OF_WORK_KEY, None)
+
+
+@asynccontextmanager
+async def async_unit_of_work(session: AsyncSession) -> AsyncIterator[AsyncSession]:
+    """Async counterpart of unit_of_work for AsyncSession."""
+    if session.info.get(UNIT_OF_WORK_KEY):
+        yield session
+        return
+
+    session.info[UNIT_OF_WORK_KEY] = True
+    try:
+        yield session
+        await session.commit()
+    except BaseException:
+        await session.rollback()
+        raise
+    finally:
+        session.info.pop(UNIT_OF_WORK_KEY, None)
@@ -5,11 +5,15 @@ memory_context_service.py - Service for assembling memory context for chat compl
 import re
 from typing import Dict, List, Any
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.user_fact_service import get_relevant_facts_for_context, format_facts_for_context
 from app.core.conversation_history_service import ConversationHistoryService
 from app.repository.memory import MemoryQueryRepository
 from app.services.topic_memory_service import TopicMemoryService
 from app.services.topic_extraction import TopicExtractor
+from app.services.memory_query_classifier import classify_memory_query
+from app.services.memory_formatter import memory_formatter
+from app.services.vector_index import fact_item, get_vector_index, merge_semantic_hits, message_item
 
 
 class MemoryContextBuilder:
@@ -23,36 +27,6 @@ class MemoryContextBuilder:
     - Prioritizing memories based on query relevance
     """
 
-    # Memory query patterns for detecting when a user is asking about past conversations
-    MEMORY_QUERY_PATTERNS = [
-        # Direct memory questions
-        re.compile(r'(?i)do you remember (when|what|how|where|why|who|if|that|about|our|my|the)', re.IGNORECASE),
-        re.compile(r'(?i)what did (i|we|you) (say|tell|ask|talk|mention) (about|regarding|concerning)', re.IGNORECASE),
-        re.compile(r'(?i)(what|when) did (i|we) (discuss|talk about|mention|say)', re.IGNORECASE),
-        re.compile(r'(?i)have (i|we) (talked|spoken|discussed|mentioned) (about|regarding)', re.IGNORECASE),
-        re.compile(r'(?i)(tell|remind) me (about|what|when|how|where|why) (i|we|you) (said|mentioned|talked about)', re.IGNORECASE),
-
-        # Recall requests
-        re.compile(r'(?i)(recall|remember|recollect) (our|the|that|when|what|how|where|why|who)', re.IGNORECASE),
-        re.compile(r'(?i)(bring up|reference) (what|when|how|where|why|who|that|our|the)', re.IGNORECASE),
-
-        # Topic-specific recall
-        re.compile(r'(?i)what (did|do) you know about my', re.IGNORECASE),  # More general pattern for "what do you know about my X"
-        re.compile(r'(?i)what (have|did) (i|we) (say|tell you|mention) about (my|our|the)', re.IGNORECASE),
-
-        # Previous conversation references
-        re.compile(r'(?i)(last time|previously|earlier|before) (we|you|i) (talked|spoke|discussed|mentioned|said)', re.IGNORECASE),
-        re.compile(r'(?i)(in|during) (our|a) (previous|past|last|earlier|recent) (conversation|discussion|chat)', re.IGNORECASE),
-
-        # Fact checking
-        re.compile(r'(?i)(didn\'t|did) (i|we) (talk|speak|discuss|mention|tell you) (about|that|how|when|where|why)', re.IGNORECASE),
-        re.compile(r'(?i)am i (right|correct) (that|when i say) (you|we|i)', re.IGNORECASE),
-
-        # Additional patterns for knowledge questions
-        re.compile(r'(?i)what do you know about (my|our|the)', re.IGNORECASE),  # Direct "what do you know about" questions
-        re.compile(r'(?i)tell me what you know about (my|our|the)', re.IGNORECASE)
-    ]
-
     # Topic extraction keywords for memory queries
     MEMORY_TOPIC_KEYWORDS = {
         "family": ["family", "parent", "father", "mother", "dad", "mom", "brother", "sister", "sibling",
@@ -70,18 +44,21 @@ class MemoryContextBuilder:
                     "neighborhood", "street", "location", "place", "area", "region", "live", "living"]
     }
 
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, vector_index=None):
         """
         Initialize the MemoryContextBuilder with a database session.
 
         Args:
             db: SQLAlchemy database session
+            vector_index: Optional VectorIndex for the semantic tier (defaults to
+                the process-wide index, which is disabled unless configured)
         """
         self.db = db
         self.memory_repo = MemoryQueryRepository(db)
         self.conversation_history_service = ConversationHistoryService(db)
         self.topic_memory_service = TopicMemoryService(db)
         self.topic_extractor = TopicExtractor()
+        self.vector_index = vector_index if vector_index is not None else get_vector_index()
 
     def is_memory_query(self, query: str) -> bool:
         """
@@ -93,21 +70,7 @@ class MemoryContextBuilder:
         Returns:
             True if the query is memory-related, False otherwise
         """
-        # Check against memory query patterns
-        for pattern in self.MEMORY_QUERY_PATTERNS:
-            if pattern.search(query):
-                return True
-
-        # Check for memory-related keywords
-        memory_keywords = ["remember", "recall", "forget", "memory", "mentioned",
-                          "told", "said", "talked about", "discussed", "conversation"]
-
-        query_lower = query.lower()
-        for keyword in memory_keywords:
-            if keyword in query_lower:
-                return True
-
-        return False
+        return classify_memory_query(query)[0]
 
     def extract_topics_from_query(self, query: str, top_n: int = 3) -> List[str]:
         """
@@ -156,6 +119,21 @@ class MemoryContextBuilder:
         Returns:
             Dict containing structured memory context
         """
+        memory_context = self.collect_memory_context(user_id, query, use_advanced_scoring)
+
+        # 5. Add semantic matches from the local vector index
+        if self.vector_index is not None:
+            merge_semantic_hits(memory_context, self.vector_index.search_within(user_id, query))
+
+        return self.finish_memory_context(memory_context, user_id)
+
+    def collect_memory_context(self, user_id: int, query: str, use_advanced_scoring: bool = True) -> Dict[str, Any]:
+        """
+        Load the database tiers of a memory context (steps 1-4 of assemble_memory_context).
+
+        The facts and messages loaded are queued for semantic indexing; the
+        semantic search itself and formatting are left to the caller.
+        """
         memory_context = {
             "user_facts": [],
             "recent_memories": [],
@@ -193,424 +171,63 @@ class MemoryContextBuilder:
         if memory_context["is_memory_query"]:
             memory_context = self._prioritize_memories_for_memory_query(memory_context, query)
 
-        # 5. Format the memory context for chat completion
-        formatted_context = self.format_memory_context(memory_context, query)
-        memory_context["formatted_context"] = formatted_context
+        if self.vector_index is not None:
+            self._index_memories(user_id, relevant_facts, recent_messages)
+
+        return memory_context
 
+    def finish_memory_context(self, memory_context: Dict[str, Any], user_id: int) -> Dict[str, Any]:
+        """Add the formatted context for chat completion (step 6 of assemble_memory_context)."""
+        memory_context["formatted_context"] = self.format_memory_context(memory_context, user_id=user_id)
         return memory_context
 
-    def format_memory_context(self, memory_context: Dict[str, Any], query: str = "") -> str:
+    def _index_memories(self, user_id: int, relevant_facts, recent_messages) -> None:
+        """Queue the facts and messages loaded for this context for background embedding."""
+        items = [fact_item(fact.id, fact.fact_type, fact.value) for fact, _ in relevant_facts]
+        items.extend(
+            message_item(msg.id, msg.content, msg.timestamp.isoformat() if msg.timestamp else None)
+            for msg in recent_messages
+        )
+        self.vector_index.enqueue(user_id, items)
+
+    def format_memory_context(self, memory_context: Dict[str, Any], query: str = "", user_id=None) -> str:
         """
         Format the memory context for chat completion.
 
         This creates a structured text representation of the memory context
-        that can be included in the chat completion prompt.
+        that can be included in the chat completion prompt. Rendering is shared
+        with the other memory backend via app.services.memory_formatter.
 
         Args:
             memory_context: The memory context to format
             query: The user query (optional)
+            user_id: Owner of the memory context (optional), enables fact block caching
 
         Returns:
             Formatted memory context as a string
         """
-        is_memory_query = memory_context.get("is_memory_query", False)
-        memory_query_type = memory_context.get("memory_query_type", "general_memory_query")
-
-        # Start with a header
-        formatted_context = "### Memory Context ###\n\n"
-
-        # Format user facts
-        if memory_context["user_facts"]:
-            formatted_context += self._format_user_facts(memory_context["user_facts"])
-
-        # Format memories based on query type
-        if is_memory_query:
-            # For memory queries, format based on the query type
-            if memory_query_type in ["recall_verification", "content_recall", "fact_checking"]:
-                # For recall questions, prioritize topic memories and recent memories
-                formatted_context += self._format_topic_memories_for_recall(memory_context["topic_memories"])
-                formatted_context += self._format_recent_memories_for_recall(memory_context["recent_memories"])
-
-            elif memory_query_type in ["temporal_recall", "previous_conversation"]:
-                # For temporal questions, focus on when things were discussed
-                formatted_context += self._format_memories_with_timestamps(
-                    memory_context["recent_memories"],
-                    memory_context["topic_memories"]
-                )
-
-            elif memory_query_type == "existence_verification":
-                # For existence verification, provide a simple yes/no with evidence
-                formatted_context += self._format_memories_for_existence_verification(
-                    memory_context["topic_memories"],
-                    memory_context["recent_memories"],
-                    memory_context.get("memory_query_topics", [])
-                )
-
-            elif memory_query_type == "knowledge_query":
-                # For knowledge queries, focus on facts and topic memories
-                formatted_context += self._format_memories_for_knowledge_query(
-                    memory_context["user_facts"],
-                    memory_context["topic_memories"],
-                    memory_context.get("memory_query_topics", [])
-                )
-
-            else:
-                # Default formatting for other memory queries
-                formatted_context += self._format_default_memory_context(memory_context)
-        else:
-            # For non-memory queries, use default formatting
-            formatted_context += self._format_default_memory_context(memory_context)
-
-        return formatted_context
+        return memory_formatter.format_memory_context(memory_context, user_id=user_id)
 
     def _format_user_facts(self, facts: List[Dict[str, Any]]) -> str:
-        """
-        Format user facts for the memory context.
-
-        Args:
-            facts: List of user facts
-
-        Returns:
-            Formatted user facts as a string
-        """
-        if not facts:
-            return ""
-
-        formatted_facts = "## User Facts\n"
-
-        # Sort facts by confidence (descending)
-        sorted_facts = sorted(facts, key=lambda x: x.get("confidence", 0), reverse=True)
-
-        # Format each fact
-        for fact in sorted_facts:
-            confidence = fact.get("confidence", 0)
-            confidence_indicator = "★" * (1 + min(4, int(confidence / 20)))  # 1-5 stars based on confidence
-            formatted_facts += f"- {fact['type'].capitalize()}: {fact['value']} {confidence_indicator}\n"
-
-        return formatted_facts + "\n"
+        return memory_formatter.format_user_facts(facts)
 
     def _format_topic_memories_for_recall(self, topic_memories: List[Dict[str, Any]]) -> str:
-        """
-        Format topic memories for recall-type queries.
-
-        Args:
-            topic_memories: List of topic memories
-
-        Returns:
-            Formatted topic memories as a string
-        """
-        if not topic_memories:
-            return ""
-
-        formatted_memories = "## Topic-Related Memories\n"
-
-        # Sort topic memories by relevance (descending)
-        sorted_topics = sorted(
-            topic_memories,
-            key=lambda x: x.get("topic", {}).get("relevance", 0),
-            reverse=True
-        )
-
-        # Format each topic memory
-        for topic_memory in sorted_topics:
-            topic_name = topic_memory.get("topic", {}).get("name", "Unknown Topic")
-            relevance = topic_memory.get("topic", {}).get("relevance", 0)
-
-            # Only include topics with reasonable relevance
-            if relevance < 30:
-                continue
-
-            formatted_memories += f"### {topic_name}\n"
-
-            # Format messages for this topic
-            messages = topic_memory.get("messages", [])
-            if messages:
-                for message in messages:
-                    content = message.get("content", "")
-                    formatted_memories += f"- {content}\n"
-
-            formatted_memories += "\n"
-
-        return formatted_memories
+        return memory_formatter.format_topic_memories_for_recall(topic_memories)
 
     def _format_recent_memories_for_recall(self, recent_memories: List[Dict[str, Any]]) -> str:
-        """
-        Format recent memories for recall-type queries.
-
-        Args:
-            recent_memories: List of recent memories
-
-        Returns:
-            Formatted recent memories as a string
-        """
-        if not recent_memories:
-            return ""
-
-        formatted_memories = "## Recent Conversation History\n"
-
-        # Sort by relevance if available, otherwise assume they're already sorted by recency
-        if recent_memories and "relevance" in recent_memories[0]:
-            sorted_memories = sorted(
-                recent_memories,
-                key=lambda x: x.get("relevance", 0),
-                reverse=True
-            )
-        else:
-            sorted_memories = recent_memories
-
-        # Format each memory
-        for memory in sorted_memories[:5]:  # Limit to top 5
-            content = memory.get("content", "")
-            relevance = memory.get("relevance", 0)
-
-            # Only include memories with reasonable relevance if relevance is available
-            if "relevance" in memory and relevance < 30:
-                continue
-
-            formatted_memories += f"- {content}\n"
-
-        return formatted_memories + "\n"
+        return memory_formatter.format_recent_memories_for_recall(recent_memories)
 
     def _format_memories_with_timestamps(self, recent_memories: List[Dict[str, Any]], topic_memories: List[Dict[str, Any]]) -> str:
-        """
-        Format memories with timestamps for temporal queries.
-
-        Args:
-            recent_memories: List of recent memories
-            topic_memories: List of topic memories
-
-        Returns:
-            Formatted memories with timestamps as a string
-        """
-        if not recent_memories and not topic_memories:
-            return ""
-
-        formatted_memories = "## Conversation Timeline\n"
-
-        # Collect all messages with timestamps
-        all_messages = []
-
-        # Add recent memories
-        for memory in recent_memories:
-            if "timestamp" in memory:
-                all_messages.append({
-                    "content": memory.get("content", ""),
-                    "timestamp": memory.get("timestamp", ""),
-                    "relevance": memory.get("relevance", 0)
-                })
-
-        # Add topic memories
-        for topic_memory in topic_memories:
-            topic_name = topic_memory.get("topic", {}).get("name", "")
-            messages = topic_memory.get("messages", [])
-
-            for message in messages:
-                if "timestamp" in message:
-                    all_messages.append({
-                        "content": message.get("content", ""),
-                        "timestamp": message.get("timestamp", ""),
-                        "topic": topic_name,
-                        "relevance": topic_memory.get("topic", {}).get("relevance", 0)
-                    })
-
-        # Sort by timestamp (newest first)
-        sorted_messages = sorted(
-            all_messages,
-            key=lambda x: x.get("timestamp", ""),
-            reverse=True
-        )
-
-        # Format each message with timestamp
-        for message in sorted_messages:
-            content = message.get("content", "")
-            timestamp = message.get("timestamp", "")
-            topic = message.get("topic", "")
-
-            # Format timestamp
-            if timestamp:
-                try:
-                    # Convert ISO format to more readable format
-                    from datetime import datetime
-                    dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
-                    formatted_date = dt.strftime("%b %d, %Y")
-                    formatted_time = dt.strftime("%I:%M %p")
-                    timestamp_str = f"{formatted_date} at {formatted_time}"
-                except:
-                    # If parsing fails, use the original timestamp
-                    timestamp_str = timestamp
-            else:
-                timestamp_str = "Unknown time"
-
-            # Add topic if available
-            topic_str = f" (Topic: {topic})" if topic else ""
-
-            formatted_memories += f"- {timestamp_str}{topic_str}: {content}\n"
-
-        return formatted_memories + "\n"
+        return memory_formatter.format_memories_with_timestamps(recent_memories, topic_memories)
 
     def _format_memories_for_existence_verification(self, topic_memories: List[Dict[str, Any]], recent_memories: List[Dict[str, Any]], query_topics: List[str]) -> str:
-        """
-        Format memories for existence verification queries.
-
-        Args:
-            topic_memories: List of topic memories
-            recent_memories: List of recent memories
-            query_topics: List of topics extracted from the query
-
-        Returns:
-            Formatted memories for existence verification as a string
-        """
-        if not topic_memories and not recent_memories:
-            return "## Memory Verification\nNo relevant memories found about this topic.\n\n"
-
-        # Check if we have any relevant memories
-        has_relevant_memories = False
-
-        # Check topic memories
-        for topic_memory in topic_memories:
-            topic_name = topic_memory.get("topic", {}).get("name", "").lower()
-            relevance = topic_memory.get("topic", {}).get("relevance", 0)
-
-            # Check if topic is relevant to query
-            if relevance >= 50 or any(query_topic.lower() in topic_name for query_topic in query_topics):
-                has_relevant_memories = True
-                break
-
-        # Check recent memories if no relevant topic memories found
-        if not has_relevant_memories and recent_memories:
-            for memory in recent_memories:
-                relevance = memory.get("relevance", 0)
-                if relevance >= 50:
-                    has_relevant_memories = True
-                    break
-
-        # Format the verification result
-        formatted_memories = "## Memory Verification\n"
-
-        if has_relevant_memories:
-            formatted_memories += "Yes, we have discussed this topic before. Here are the relevant memories:\n\n"
-
-            # Add topic memories
-            if topic_memories:
-                formatted_memories += self._format_topic_memories_for_recall(topic_memories)
-
-            # Add recent memories
-            if recent_memories:
-                formatted_memories += self._format_recent_memories_for_recall(recent_memories)
-        else:
-            formatted_memories += "No, we haven't discussed this topic in detail before.\n\n"
-
-        return formatted_memories
+        return memory_formatter.format_memories_for_existence_verification(topic_memories, recent_memories, query_topics)
 
     def _format_memories_for_knowledge_query(self, user_facts: List[Dict[str, Any]], topic_memories: List[Dict[str, Any]], query_topics: List[str]) -> str:
-        """
-        Format memories for knowledge queries.
-
-        Args:
-            user_facts: List of user facts
-            topic_memories: List of topic memories
-            query_topics: List of topics extracted from the query
-
-        Returns:
-            Formatted memories for knowledge queries as a string
-        """
-        formatted_memories = "## Knowledge About User\n"
-
-        # Filter user facts by query topics
-        relevant_facts = []
-        for fact in user_facts:
-            fact_type = fact.get("type", "").lower()
-            fact_value = fact.get("value", "").lower()
-
-            # Check if fact is relevant to query topics
-            if any(query_topic.lower() in fact_type or query_topic.lower() in fact_value for query_topic in query_topics):
-                relevant_facts.append(fact)
-
-        # Format relevant facts
-        if relevant_facts:
-            formatted_memories += "### Known Facts\n"
-            for fact in relevant_facts:
-                formatted_memories += f"- {fact['type'].capitalize()}: {fact['value']}\n"
-            formatted_memories += "\n"
-
-        # Format topic memories
-        if topic_memories:
-            formatted_memories += "### Related Conversations\n"
-
-            # Filter topic memories by query topics
-            relevant_topics = []
-            for topic_memory in topic_memories:
-                topic_name = topic_memory.get("topic", {}).get("name", "").lower()
-                relevance = topic_memory.get("topic", {}).get("relevance", 0)
-
-                # Check if topic is relevant to query
-                if relevance >= 30 or any(query_topic.lower() in topic_name for query_topic in query_topics):
-                    relevant_topics.append(topic_memory)
-
-            # Format relevant topic memories
-            for topic_memory in relevant_topics:
-                topic_name = topic_memory.get("topic", {}).get("name", "")
-                messages = topic_memory.get("messages", [])
-
-                if messages:
-                    formatted_memories += f"#### {topic_name}\n"
-                    for message in messages:
-                        content = message.get("content", "")
-                        formatted_memories += f"- {content}\n"
-                    formatted_memories += "\n"
-
-        if not relevant_facts and not topic_memories:
-            formatted_memories += "I don't have much information about this topic yet.\n\n"
-
-        return formatted_memories
+        return memory_formatter.format_memories_for_knowledge_query(user_facts, topic_memories, query_topics)
 
     def _format_default_memory_context(self, memory_context: Dict[str, Any]) -> str:
-        """
-        Format default memory context for general queries.
-
-        Args:
-            memory_context: The memory context to format
-
-        Returns:
-            Formatted default memory context as a string
-        """
-        formatted_context = ""
-
-        # Format topic memories if available
-        if memory_context["topic_memories"]:
-            formatted_context += "## Relevant Topics\n"
-
-            # Sort topic memories by relevance
-            sorted_topics = sorted(
-                memory_context["topic_memories"],
-                key=lambda x: x.get("topic", {}).get("relevance", 0),
-                reverse=True
-            )
-
-            # Format each topic memory
-            for topic_memory in sorted_topics[:3]:  # Limit to top 3
-                topic_name = topic_memory.get("topic", {}).get("name", "")
-                messages = topic_memory.get("messages", [])
-
-                if messages:
-                    formatted_context += f"### {topic_name}\n"
-                    for message in messages[:2]:  # Limit to top 2 messages per topic
-                        content = message.get("content", "")
-                        formatted_context += f"- {content}\n"
-                    formatted_context += "\n"
-
-        # Format recent memories if available
-        if memory_context["recent_memories"]:
-            formatted_context += "## Recent Conversation\n"
-
-            # Format recent memories (limit to top 3)
-            for memory in memory_context["recent_memories"][:3]:
-                content = memory.get("content", "")
-                formatted_context += f"- {content}\n"
-
-            formatted_context += "\n"
-
-        return formatted_context
+        return memory_formatter.format_default_memory_context(memory_context)
 
     def _prioritize_memories_for_memory_query(self, memory_context: Dict[str, Any], query: str) -> Dict[str, Any]:
         """
@@ -807,25 +424,7 @@ class MemoryContextBuilder:
         Returns:
             Memory query type classification
         """
-        query_lower = query.lower()
-
-        # Check for specific memory query types
-        if re.search(r'(?i)do you remember', query_lower):
-            return "recall_verification"
-        elif re.search(r'(?i)what did (i|we|you) (say|tell|ask|talk|mention)', query_lower):
-            return "content_recall"
-        elif re.search(r'(?i)when did (i|we) (discuss|talk about|mention|say)', query_lower):
-            return "temporal_recall"
-        elif re.search(r'(?i)have (i|we) (talked|spoken|discussed|mentioned)', query_lower):
-            return "existence_verification"
-        elif re.search(r'(?i)what do you know about my', query_lower):
-            return "knowledge_query"
-        elif re.search(r'(?i)(last time|previously|earlier|before)', query_lower):
-            return "previous_conversation"
-        elif re.search(r'(?i)(didn\'t|did) (i|we) (talk|speak|discuss|mention|tell)', query_lower):
-            return "fact_checking"
-        else:
-            return "general_memory_query"
+        return classify_memory_query(query)[1]
 
 
 # For backward compatibility, keep the function-based approach
@@ -846,3 +445,30 @@ def assemble_memory_context(db: Session, user_id: int, query: str, use_advanced_
     """
     builder = MemoryContextBuilder(db)
     return builder.assemble_memory_context(user_id, query, use_advanced_scoring)
+
+
+async def assemble_memory_context_async(db: AsyncSession, user_id: int, query: str, use_advanced_scoring: bool = True) -> Dict[str, Any]:
+    """
+    Assemble a complete memory context using an AsyncSession.
+
+    Runs the database part of the MemoryContextBuilder pipeline through
+    AsyncSession.run_sync so the fact, history and topic queries don't block
+    the event loop, then awaits the budgeted semantic search outside it.
+
+    Args:
+        db: Async database session
+        user_id: User ID to retrieve memory for
+        query: The current user query
+        use_advanced_scoring: Whether to use advanced topic relevance scoring (default: True)
+
+    Returns:
+        Dict containing structured memory context
+    """
+    # run_sync hands the callable this same sync session, on a greenlet that may do IO
+    builder = MemoryContextBuilder(db.sync_session)
+    memory_context = await db.run_sync(
+        lambda session: builder.collect_memory_context(user_id, query, use_advanced_scoring)
+    )
+    if builder.vector_index is not None:
+        merge_semantic_hits(memory_context, await builder.vector_index.search_within_async(user_id, query))
+    return builder.finish_memory_context(memory_context, user_id)
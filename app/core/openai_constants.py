@@ -11,11 +11,24 @@ REQUEST_TIMEOUT = 30  # Timeout for API requests in seconds
 MAX_RETRIES = 3  # Maximum number of retry attempts
 RETRY_DELAY_SECONDS = 2  # Initial delay between retries
 BACKOFF_FACTOR = 2  # Exponential backoff multiplier for retries
+TRUNCATED_RESPONSE_MARKER = " [response interrupted]"  # Appended to replies cut off by a client disconnect
 
 # System prompt management
 MAX_MEMORY_CONTEXT_TOKENS = 1500  # Maximum tokens to use for memory context
 MAX_SYSTEM_PROMPT_TOKENS = 4000  # Maximum tokens for total system prompt
 
+# Conversation history compaction
+HISTORY_KEEP_LAST_MESSAGES = 6  # Most recent messages always sent verbatim
+HISTORY_SUMMARY_EVERY = 4  # Fold older messages into the rolling summary every N new messages
+HISTORY_FETCH_LIMIT = 20  # Messages fetched from Firestore per turn (must exceed the two above)
+SUMMARY_MODEL = "gpt-4.1-mini"  # Model used to write rolling summaries
+SUMMARY_MAX_TOKENS = 300  # Maximum tokens for a rolling summary
+SUMMARY_TEMPERATURE = 0.2  # Low temperature keeps summaries factual
+
+# Embeddings for semantic memory retrieval
+EMBEDDING_MODEL = "text-embedding-3-small"  # Embedding model for the local vector index
+EMBEDDING_DIMENSIONS = 256  # Shortened embedding size stored per message/fact
+
 # Roles for messages
 ROLE_SYSTEM = "system"
 ROLE_USER = "user"
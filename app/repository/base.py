@@ -1,6 +1,9 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Generic, TypeVar, Type, Optional, List
 from app.models import Base
+from app.core.db import UNIT_OF_WORK_KEY  # Set by unit_of_work / async_unit_of_work
 
 ModelType = TypeVar("ModelType", bound=Base)
 
@@ -9,6 +12,10 @@ class BaseRepository(Generic[ModelType]):
         self.db = db
         self.model = model
 
+    @property
+    def in_unit_of_work(self) -> bool:
+        return self.db.info.get(UNIT_OF_WORK_KEY) is True
+
     def get(self, id: int) -> Optional[ModelType]:
         return self.db.query(self.model).filter(self.model.id == id).first()
 
@@ -18,10 +25,21 @@ class BaseRepository(Generic[ModelType]):
     def create(self, obj_in: dict) -> ModelType:
         obj = self.model(**obj_in)
         self.db.add(obj)
+        if self.in_unit_of_work:
+            self.db.flush()  # INSERT ... RETURNING id; committed by the unit of work
+            return obj
         self.db.commit()  # Commit the transaction
         self.db.refresh(obj)
         return obj
 
+    def create_many(self, objs_in: List[dict]) -> List[ModelType]:
+        objs = [self.model(**obj_in) for obj_in in objs_in]
+        self.db.add_all(objs)
+        self.db.flush()  # Batched INSERT ... RETURNING id
+        if not self.in_unit_of_work:
+            self.db.commit()
+        return objs
+
     def update(self, db_obj: ModelType, obj_in: dict) -> ModelType:
         for field, value in obj_in.items():
             setattr(db_obj, field, value)
@@ -34,3 +52,54 @@ class BaseRepository(Generic[ModelType]):
         if obj:
             self.db.delete(obj)
             self.db.flush()  # Do not commit here
+
+
+class AsyncBaseRepository(Generic[ModelType]):
+    """Async counterpart of BaseRepository with the same commit/flush semantics."""
+
+    def __init__(self, db: AsyncSession, model: Type[ModelType]):
+        self.db = db
+        self.model = model
+
+    @property
+    def in_unit_of_work(self) -> bool:
+        return self.db.info.get(UNIT_OF_WORK_KEY) is True
+
+    async def get(self, id: int) -> Optional[ModelType]:
+        result = await self.db.execute(select(self.model).filter(self.model.id == id))
+        return result.scalars().first()
+
+    async def get_all(self) -> List[ModelType]:
+        result = await self.db.execute(select(self.model))
+        return list(result.scalars().all())
+
+    async def create(self, obj_in: dict) -> ModelType:
+        obj = self.model(**obj_in)
+        self.db.add(obj)
+        if self.in_unit_of_work:
+            await self.db.flush()  # INSERT ... RETURNING id; committed by the unit of work
+            return obj
+        await self.db.commit()  # Commit the transaction
+        await self.db.refresh(obj)
+        return obj
+
+    async def create_many(self, objs_in: List[dict]) -> List[ModelType]:
+        objs = [self.model(**obj_in) for obj_in in objs_in]
+        self.db.add_all(objs)
+        await self.db.flush()  # Batched INSERT ... RETURNING id
+        if not self.in_unit_of_work:
+            await self.db.commit()
+        return objs
+
+    async def update(self, db_obj: ModelType, obj_in: dict) -> ModelType:
+        for field, value in obj_in.items():
+            setattr(db_obj, field, value)
+        await self.db.flush()  # Apply changes but do not commit
+        await self.db.refresh(db_obj)
+        return db_obj
+
+    async def delete(self, id: int) -> None:
+        obj = await self.get(id)
+        if obj:
+            await self.db.delete(obj)
+            await self.db.flush()  # Do not commit here
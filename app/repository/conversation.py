@@ -1,6 +1,10 @@
 from app.models.conversation import Conversation
-from app.repository.base import BaseRepository
+from app.repository.base import BaseRepository, AsyncBaseRepository
 
 class ConversationRepository(BaseRepository[Conversation]):
     def __init__(self, db):
         super().__init__(db, Conversation)
+
+class AsyncConversationRepository(AsyncBaseRepository[Conversation]):
+    def __init__(self, db):
+        super().__init__(db, Conversation)
@@ -1,4 +1,5 @@
 from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import func, case, cast, Float, desc, and_, or_
 from app.models import User, Message, Topic, MessageTopic, Conversation, UserFact
 from typing import List, Optional, Tuple, Dict, Set
@@ -300,3 +301,40 @@ class MemoryQueryRepository:
         # Sort by final score and return limited results
         final_results.sort(key=lambda x: x[1], reverse=True)
         return final_results[:limit]
+
+
+class AsyncMemoryQueryRepository:
+    """
+    Async facade over MemoryQueryRepository for use with an AsyncSession.
+
+    Each query runs through AsyncSession.run_sync, so the existing ORM query and
+    scoring logic is reused unchanged while the database I/O is driven by the
+    async driver instead of blocking the event loop.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _run(self, query_fn):
+        return await self.db.run_sync(lambda session: query_fn(MemoryQueryRepository(session)))
+
+    async def search_topics_by_message_content(self, user_id: int, query: str, limit: int = 10):
+        return await self._run(lambda repo: repo.search_topics_by_message_content(user_id, query, limit))
+
+    async def get_messages_for_user_topic(self, user_id: int, topic_id: int, limit: int = 50) -> List[Message]:
+        return await self._run(lambda repo: repo.get_messages_for_user_topic(user_id, topic_id, limit))
+
+    async def get_recent_memories_for_user(self, user_id: int, limit: int = 20) -> List[Message]:
+        return await self._run(lambda repo: repo.get_recent_memories_for_user(user_id, limit))
+
+    async def get_facts_for_user(self, user_id: int) -> List[UserFact]:
+        return await self._run(lambda repo: repo.get_facts_for_user(user_id))
+
+    async def get_facts_with_relevance(self, user_id: int, query: str, limit: int = 10) -> List[Tuple[UserFact, float]]:
+        return await self._run(lambda repo: repo.get_facts_with_relevance(user_id, query, limit))
+
+    async def get_topics_for_user(self, user_id: int) -> List[Topic]:
+        return await self._run(lambda repo: repo.get_topics_for_user(user_id))
+
+    async def get_topics_with_advanced_relevance(self, user_id: int, query: str, limit: int = 10) -> List[Tuple[Topic, float]]:
+        return await self._run(lambda repo: repo.get_topics_with_advanced_relevance(user_id, query, limit))
@@ -1,6 +1,10 @@
 from app.models.message import Message
-from app.repository.base import BaseRepository
+from app.repository.base import BaseRepository, AsyncBaseRepository
 
 class MessageRepository(BaseRepository[Message]):
     def __init__(self, db):
         super().__init__(db, Message)
+
+class AsyncMessageRepository(AsyncBaseRepository[Message]):
+    def __init__(self, db):
+        super().__init__(db, Message)
@@ -1,6 +1,10 @@
 from app.models.topic import Topic
-from app.repository.base import BaseRepository
+from app.repository.base import BaseRepository, AsyncBaseRepository
 
 class TopicRepository(BaseRepository[Topic]):
     def __init__(self, db):
         super().__init__(db, Topic)
+
+class AsyncTopicRepository(AsyncBaseRepository[Topic]):
+    def __init__(self, db):
+        super().__init__(db, Topic)
@@ -1,6 +1,10 @@
 from app.models.user import User
-from app.repository.base import BaseRepository
+from app.repository.base import BaseRepository, AsyncBaseRepository
 
 class UserRepository(BaseRepository[User]):
     def __init__(self, db):
         super().__init__(db, User)
+
+class AsyncUserRepository(AsyncBaseRepository[User]):
+    def __init__(self, db):
+        super().__init__(db, User)
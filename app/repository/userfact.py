@@ -1,6 +1,10 @@
 from app.models.userfact import UserFact
-from app.repository.base import BaseRepository
+from app.repository.base import BaseRepository, AsyncBaseRepository
 
 class UserFactRepository(BaseRepository[UserFact]):
     def __init__(self, db):
         super().__init__(db, UserFact)
+
+class AsyncUserFactRepository(AsyncBaseRepository[UserFact]):
+    def __init__(self, db):
+        super().__init__(db, UserFact)
@@ -0,0 +1,300 @@
+"""
+bulk_delete.py - Cascading conversation deletes run as background jobs
+
+Deleting a conversation removes everything that hangs off it:
+
+- Firestore: messages referencing the conversation (conversationId, written
+  by FirebaseService.add_message; older messages get it from
+  scripts/migrate_firestore_fields.py) and every subcollection below the
+  conversation document are deleted in pages of batched writes, then the
+  conversation document itself. Only document ids are read. The conversation
+  document goes last, so a job that fails part way can simply be run again.
+- PostgreSQL: three set-based DELETE statements (message topics, messages,
+  conversation) in one transaction instead of the ORM cascade, which loads
+  every message into the session before deleting it row by row.
+
+Routes submit the work to the DeleteJobManager and return the job id at once;
+progress is read back with DeleteJobManager.get.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from collections import OrderedDict
+import threading
+import time
+import uuid
+
+from sqlalchemy import delete, select
+
+from app.core.config import logger
+from app.core.firebase_config import COLLECTIONS
+
+# Documents deleted per batched write (Firestore's limit per batch)
+DELETE_BATCH_SIZE = 500
+
+# Delete jobs running at the same time; the rest wait in the executor queue
+DELETE_JOB_WORKERS = 2
+
+# Finished jobs kept for status lookups before the oldest is forgotten
+DELETE_JOB_HISTORY = 1000
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+@dataclass
+class DeleteJob:
+    """State of one background delete."""
+    id: str
+    kind: str  # "firestore" or "postgres"
+    target: str
+    status: str = JOB_PENDING
+    deleted: Dict[str, int] = field(default_factory=dict)  # collection/table -> rows deleted
+    expected: Optional[int] = None  # Child documents to delete, when known up front
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JOB_DONE, JOB_FAILED)
+
+    def record(self, name: str, count: int) -> None:
+        """Add deleted rows/documents to the progress counters."""
+        self.deleted = {**self.deleted, name: self.deleted.get(name, 0) + count}
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["total_deleted"] = sum(self.deleted.values())
+        end = self.finished_at or time.time()
+        data["elapsed"] = end - self.started_at if self.started_at else 0.0
+        return data
+
+
+class DeleteJobManager:
+    """
+    Runs delete jobs on a small thread pool and keeps their progress.
+
+    A second request for a target that already has an unfinished job gets
+    that job back instead of starting another one.
+
+    Args:
+        max_workers: Jobs running at the same time
+        history: Finished jobs kept for status lookups
+    """
+
+    def __init__(self, max_workers: int = DELETE_JOB_WORKERS, history: int = DELETE_JOB_HISTORY):
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="delete-job")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, DeleteJob]" = OrderedDict()
+        self._futures: Dict[str, Future] = {}
+        self._active: Dict[tuple, str] = {}  # (kind, target) -> unfinished job id
+
+    def submit(self, kind: str, target: Any, work: Callable[[DeleteJob], None]) -> DeleteJob:
+        """
+        Start a job, or return the unfinished job for the same target.
+
+        Args:
+            kind: Backend the job deletes from
+            target: What is deleted (e.g. a conversation id)
+            work: Deletes the target, recording progress on the job it is given
+        """
+        key = (kind, str(target))
+        with self._lock:
+            active = self._active.get(key)
+            if active is not None:
+                return self._jobs[active]
+            job = DeleteJob(id=uuid.uuid4().hex, kind=kind, target=str(target))
+            self._jobs[job.id] = job
+            self._active[key] = job.id
+            self._trim()
+            self._futures[job.id] = self._executor.submit(self._run, job, work, key)
+        return job
+
+    def _run(self, job: DeleteJob, work: Callable[[DeleteJob], None], key: tuple) -> None:
+        job.started_at = time.time()
+        job.status = JOB_RUNNING
+        try:
+            work(job)
+            job.status = JOB_DONE
+            logger.info(f"Delete job {job.id} ({job.kind} {job.target}) deleted {job.deleted}")
+        except Exception as e:
+            job.error = str(e)
+            job.status = JOB_FAILED
+            logger.error(f"Delete job {job.id} ({job.kind} {job.target}) failed: {str(e)}")
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._active.pop(key, None)
+                self._futures.pop(job.id, None)
+
+    def _trim(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[DeleteJob]:
+        """Return a job by id, or None if it is unknown or was forgotten."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[DeleteJob]:
+        """Block until a job has finished (or the timeout passes) and return it."""
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            future.exception(timeout=timeout)
+        return self.get(job_id)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+_delete_job_manager: Optional[DeleteJobManager] = None
+
+
+def get_delete_job_manager() -> DeleteJobManager:
+    """Return the process-wide delete job manager."""
+    global _delete_job_manager
+    if _delete_job_manager is None:
+        _delete_job_manager = DeleteJobManager()
+    return _delete_job_manager
+
+
+def set_delete_job_manager(manager: Optional[DeleteJobManager]) -> None:
+    """Replace the process-wide delete job manager (None resets it)."""
+    global _delete_job_manager
+    _delete_job_manager = manager
+
+
+class FirestoreConversationDeleter:
+    """
+    Deletes a Firestore conversation with its messages and subcollections.
+
+    Args:
+        db: Firestore client (e.g. FirebaseService().db)
+        batch_size: Documents per batched delete
+        search_index: Message search index to remove deleted messages from
+            (defaults to the process-wide index)
+    """
+
+    def __init__(self, db, batch_size: int = DELETE_BATCH_SIZE, search_index=None):
+        self.db = db
+        self.batch_size = batch_size
+        self._search_index = search_index
+
+    @property
+    def search_index(self):
+        if self._search_index is None:
+            from app.services.message_search_index import get_message_search_index
+            self._search_index = get_message_search_index()
+        return self._search_index
+
+    def _delete_query(self, query, job: DeleteJob, name: str, recursive: bool,
+                      on_page: Optional[Callable[[List[Any]], None]] = None) -> int:
+        """Delete every document a query matches, one batch per page."""
+        total = 0
+        while True:
+            # Deleted documents drop out of the query, so each page starts at the front
+            page = list(query.select(["__name__"]).limit(self.batch_size).stream())
+            if not page:
+                return total
+            if recursive:
+                for snapshot in page:
+                    for subcollection in snapshot.reference.collections():
+                        self._delete_query(subcollection, job, f"{name}/{subcollection.id}", recursive)
+            batch = self.db.batch()
+            for snapshot in page:
+                batch.delete(snapshot.reference)
+            batch.commit()
+            if on_page:
+                on_page(page)
+            total += len(page)
+            job.record(name, len(page))
+            if len(page) < self.batch_size:
+                return total
+
+    def _count(self, query) -> Optional[int]:
+        try:
+            return int(query.count().get()[0][0].value)
+        except Exception as e:
+            logger.error(f"Error counting documents to delete: {str(e)}")
+            return None
+
+    def delete_conversation(self, conversation_id: str, job: DeleteJob,
+                            user_id: Optional[str] = None) -> Dict[str, int]:
+        """
+        Delete a conversation and everything below it.
+
+        Args:
+            conversation_id: Conversation document id
+            job: Job to record progress on
+            user_id: Owner of the conversation; their search index entries for
+                the deleted messages are removed
+
+        Returns:
+            Documents deleted per collection
+        """
+        from app.services.firebase_service import aggregation_cache
+
+        conversation_ref = self.db.collection(COLLECTIONS['conversations']).document(conversation_id)
+        messages = self.db.collection('messages').where('conversationId', '==', conversation_id)
+        job.expected = self._count(messages)
+
+        def unindex(page: List[Any]) -> None:
+            for snapshot in page:
+                self.search_index.remove_message(user_id, snapshot.id)
+
+        self._delete_query(messages, job, 'messages', recursive=False, on_page=unindex if user_id else None)
+        for subcollection in conversation_ref.collections():
+            self._delete_query(subcollection, job, f"{COLLECTIONS['conversations']}/{subcollection.id}", recursive=True)
+        conversation_ref.delete()
+        job.record(COLLECTIONS['conversations'], 1)
+
+        aggregation_cache.invalidate('messages')
+        aggregation_cache.invalidate(COLLECTIONS['conversations'])
+        return job.deleted
+
+
+def delete_conversation_rows(session, conversation_id: int, job: Optional[DeleteJob] = None) -> Dict[str, int]:
+    """
+    Delete a PostgreSQL conversation with set-based statements.
+
+    Message topics, messages and the conversation are removed by three DELETE
+    statements in one transaction; no rows are loaded into the session.
+
+    Args:
+        session: SQLAlchemy session (committed by this function)
+        conversation_id: Conversation id
+        job: Job to record progress on (optional)
+
+    Returns:
+        Rows deleted per table
+    """
+    from app.models.conversation import Conversation
+    from app.models.message import Message
+    from app.models.topic import MessageTopic
+
+    message_ids = select(Message.id).where(Message.conversation_id == conversation_id)
+    statements = [
+        (MessageTopic.__tablename__, delete(MessageTopic).where(MessageTopic.message_id.in_(message_ids))),
+        (Message.__tablename__, delete(Message).where(Message.conversation_id == conversation_id)),
+        (Conversation.__tablename__, delete(Conversation).where(Conversation.id == conversation_id)),
+    ]
+    deleted = {}
+    try:
+        for table, statement in statements:
+            result = session.execute(statement, execution_options={"synchronize_session": False})
+            deleted[table] = result.rowcount
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    if job is not None:
+        for table, count in deleted.items():
+            job.record(table, count)
+    return deleted
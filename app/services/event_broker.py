@@ -0,0 +1,269 @@
+"""
+event_broker.py - In-process publish/subscribe broker for SSE events
+
+Events are published to named channels (one per user, optionally one per
+conversation) and fanned out to every subscribed SSE stream, so several tabs
+of the same user share one reply stream and events can be pushed from outside
+a request.
+
+Each subscriber has a bounded buffer. Publishing never blocks: a subscriber
+whose buffer is full is dropped (its stream ends and the client reconnects)
+rather than slowing down the publisher or the other subscribers. The same
+event object is handed to every subscriber; nothing is copied.
+
+Published events that carry an id are also kept in a bounded per-channel
+ring buffer, kept after the last subscriber leaves, so a client reconnecting
+with Last-Event-ID gets the frames it missed replayed before live events.
+
+EventBroker is the interface the routes use. InMemoryEventBroker serves a
+single worker process; a multi-worker deployment can provide another backend
+(e.g. one relaying through Redis) and install it with set_event_broker().
+"""
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+import asyncio
+
+from app.core.config import logger
+
+# Maximum number of events buffered per subscriber before it is dropped
+SUBSCRIBER_BUFFER_SIZE = 256
+
+# Recent events kept per channel for Last-Event-ID replay
+REPLAY_BUFFER_SIZE = 256
+
+# Channels whose replay buffers are kept (least recently published dropped first)
+REPLAY_MAX_CHANNELS = 1024
+
+# Delivered to a subscriber's buffer once it has been closed
+_CLOSED = object()
+
+
+def user_channel(user_id: Any) -> str:
+    """Channel carrying every event for a user."""
+    return f"user:{user_id}"
+
+
+def conversation_channel(conversation_id: Any) -> str:
+    """Channel carrying the events of a single conversation."""
+    return f"conversation:{conversation_id}"
+
+
+class Subscription:
+    """
+    A subscriber's bounded buffer on one channel.
+
+    Iterate with `async for` (or call get()) to receive events; iteration
+    ends when the subscription is closed by the subscriber or dropped by
+    the broker.
+    """
+
+    def __init__(self, broker: "EventBroker", channel: str, maxsize: int = SUBSCRIBER_BUFFER_SIZE):
+        self.broker = broker
+        self.channel = channel
+        self.dropped = False
+        self.closed = False
+        # Set when an event is delivered; lets the heartbeat skip busy streams
+        self.active = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, event: Any, count_activity: bool = True) -> bool:
+        """
+        Buffer an event without waiting.
+
+        Args:
+            event: Event to buffer
+            count_activity: Whether the event marks the stream as active
+
+        Returns:
+            False if the buffer is full (the subscriber is too slow)
+        """
+        if self.closed:
+            return True
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            return False
+        if count_activity:
+            self.active = True
+        return True
+
+    def close(self, dropped: bool = False) -> None:
+        """Stop receiving events; a pending get() returns None."""
+        if self.closed:
+            return
+        self.closed = True
+        self.dropped = dropped
+        # Discard the backlog so the end marker is delivered at once
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(_CLOSED)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Any]:
+        """
+        Wait for the next event.
+
+        Args:
+            timeout: Seconds to wait; raises asyncio.TimeoutError when exceeded
+
+        Returns:
+            The event, or None once the subscription has been closed
+        """
+        if timeout is None:
+            event = await self._queue.get()
+        else:
+            event = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+        if event is _CLOSED:
+            # Keep the marker for any later get()
+            self._queue.put_nowait(_CLOSED)
+            return None
+        return event
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Any:
+        event = await self.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+
+class EventBroker(ABC):
+    """Interface for SSE event fan-out backends."""
+
+    @abstractmethod
+    def subscribe(
+        self,
+        channel: str,
+        maxsize: int = SUBSCRIBER_BUFFER_SIZE,
+        last_event_id: Optional[int] = None
+    ) -> Subscription:
+        """
+        Register a new subscriber on a channel.
+
+        With last_event_id, buffered events newer than that id are queued
+        for the subscriber first, followed by live events.
+        """
+
+    @abstractmethod
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove a subscriber and end its iteration."""
+
+    @abstractmethod
+    def publish(self, channel: str, event: Any, event_id: Optional[int] = None) -> int:
+        """
+        Hand an event to every subscriber of a channel without blocking.
+
+        Events with an event_id are also recorded for replay.
+
+        Returns:
+            Number of subscribers the event was delivered to
+        """
+
+
+class InMemoryEventBroker(EventBroker):
+    """
+    EventBroker for a single process and event loop.
+
+    publish() must be called from the event loop that owns the subscribers.
+    """
+
+    def __init__(self, replay_size: int = REPLAY_BUFFER_SIZE, max_replay_channels: int = REPLAY_MAX_CHANNELS):
+        self._channels: Dict[str, Set[Subscription]] = {}
+        self._history: "OrderedDict[str, Deque[Tuple[int, Any]]]" = OrderedDict()
+        self._replay_size = replay_size
+        self._max_replay_channels = max_replay_channels
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    def subscribe(
+        self,
+        channel: str,
+        maxsize: int = SUBSCRIBER_BUFFER_SIZE,
+        last_event_id: Optional[int] = None
+    ) -> Subscription:
+        subscription = Subscription(self, channel, maxsize)
+        if last_event_id is not None:
+            missed = self.replay(channel, last_event_id)
+            # A backlog larger than the buffer keeps only its newest events
+            for event in missed[-maxsize:]:
+                subscription.deliver(event)
+            logger.info(f"Replaying {len(missed)} events on {channel} after id {last_event_id}")
+        self._channels.setdefault(channel, set()).add(subscription)
+        logger.info(f"SSE subscriber added to {channel} ({len(self._channels[channel])} total)")
+        return subscription
+
+    def replay(self, channel: str, last_event_id: int) -> List[Any]:
+        """
+        Return the buffered events of a channel newer than last_event_id.
+
+        Args:
+            channel: Channel name
+            last_event_id: Id of the last event the client received
+
+        Returns:
+            Events in publish order (all buffered events if the id is older
+            than the buffer)
+        """
+        history = self._history.get(channel)
+        if not history:
+            return []
+        return [event for event_id, event in history if event_id > last_event_id]
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._channels.get(subscription.channel)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._channels[subscription.channel]
+        subscription.close()
+
+    def publish(self, channel: str, event: Any, event_id: Optional[int] = None) -> int:
+        if event_id is not None:
+            self._record(channel, event_id, event)
+        subscribers = self._channels.get(channel)
+        if not subscribers:
+            return 0
+        self.published += 1
+        delivered = 0
+        for subscription in list(subscribers):
+            if subscription.deliver(event):
+                delivered += 1
+            else:
+                logger.warning(f"Dropping slow SSE subscriber on {channel}")
+                self.dropped_subscribers += 1
+                subscribers.discard(subscription)
+                subscription.close(dropped=True)
+        if not subscribers:
+            del self._channels[channel]
+        return delivered
+
+    def _record(self, channel: str, event_id: int, event: Any) -> None:
+        """Append an event to the channel's replay buffer."""
+        history = self._history.get(channel)
+        if history is None:
+            history = self._history[channel] = deque(maxlen=self._replay_size)
+            if len(self._history) > self._max_replay_channels:
+                self._history.popitem(last=False)
+        else:
+            self._history.move_to_end(channel)
+        history.append((event_id, event))
+
+    def subscriber_count(self, channel: str) -> int:
+        """Number of live subscribers on a channel."""
+        return len(self._channels.get(channel, ()))
+
+
+_broker: EventBroker = InMemoryEventBroker()
+
+
+def get_event_broker() -> EventBroker:
+    """Return the broker used by the SSE routes."""
+    return _broker
+
+
+def set_event_broker(broker: EventBroker) -> None:
+    """Install a different broker backend (e.g. for multi-worker deployments)."""
+    global _broker
+    _broker = broker
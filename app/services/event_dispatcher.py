@@ -9,6 +9,13 @@ from fastapi import Request
 
 from app.core.config import logger
 from app.services.event_service import EventService
+from app.services.sse_frames import build_frame, listening_frame, reply_frame, thinking_frame
+
+# Reply coalescing for streaming endpoints: after the first token (always sent
+# at once), deltas are batched into one freya:reply frame until either the
+# window (seconds) has passed or the buffered text reaches the byte threshold
+REPLY_COALESCE_WINDOW = 0.04
+REPLY_COALESCE_BYTES = 512
 
 
 class EventDispatcher:
@@ -21,6 +28,9 @@ class EventDispatcher:
     def __init__(self):
         """Initialize the event dispatcher"""
         self.event_service = EventService()
+        # Text streamed so far by dispatch_streaming_chat_sequence; still
+        # readable after the sequence is cancelled mid-reply
+        self.partial_response = ""
         
     async def dispatch_listening_event(self, client_queue: asyncio.Queue) -> None:
         """
@@ -29,7 +39,7 @@ class EventDispatcher:
         Args:
             client_queue: The asyncio queue to send events to
         """
-        event = await self.event_service.create_listening_event()
+        event = listening_frame()
         await client_queue.put(event)
         logger.info("Dispatched freya:listening event")
         
@@ -40,7 +50,7 @@ class EventDispatcher:
         Args:
             client_queue: The asyncio queue to send events to
         """
-        event = await self.event_service.create_thinking_event()
+        event = thinking_frame()
         await client_queue.put(event)
         logger.info("Dispatched freya:thinking event")
         
@@ -52,9 +62,9 @@ class EventDispatcher:
             client_queue: The asyncio queue to send events to
             message: The response message to include
         """
-        event = await self.event_service.create_reply_event(message)
+        event = reply_frame(message)
         await client_queue.put(event)
-        logger.debug(f"Dispatched freya:reply event with message: {message[:30]}...")
+        logger.debug("Dispatched freya:reply event with message: %.30s...", message)
         
     async def dispatch_error_event(self, client_queue: asyncio.Queue, error_message: str) -> None:
         """
@@ -65,7 +75,7 @@ class EventDispatcher:
             error_message: The error message to include
         """
         logger.error(f"Creating error event with message: {error_message}")
-        event = await self.event_service.format_sse("error", {"message": error_message})
+        event = build_frame("error", {"message": error_message})
         logger.error(f"Formatted error event: {event}")
         await client_queue.put(event)
         logger.error(f"Dispatched error event: {error_message}")
@@ -84,10 +94,22 @@ class EventDispatcher:
             event_type: The type of event to dispatch
             data: The data to include in the event
         """
-        event = await self.event_service.format_sse(event_type, data)
+        event = build_frame(event_type, data)
         await client_queue.put(event)
         logger.info(f"Dispatched custom event: {event_type}")
         
+    @staticmethod
+    def _deadline(delay: float) -> float:
+        """Event loop time at which a delay starting now ends."""
+        return asyncio.get_running_loop().time() + delay
+    
+    @staticmethod
+    async def _wait_until(deadline: float) -> None:
+        """Sleep until the given event loop time, if it has not passed yet."""
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+    
     async def dispatch_chat_sequence(
         self,
         client_queue: asyncio.Queue,
@@ -98,15 +120,16 @@ class EventDispatcher:
         """
         Dispatch a complete chat sequence with proper event ordering:
         1. freya:listening
-        2. freya:thinking (with optional delay)
-        3. Process the message
-        4. freya:reply
+        2. freya:thinking
+        3. Process the message (starts immediately)
+        4. freya:reply, once the thinking delay has also elapsed
         
         Args:
             client_queue: The asyncio queue to send events to
             message_processor: An async function that processes the user message and returns a response
             user_message: The user's message to process
-            thinking_delay: The delay in seconds after the thinking event (gives UI time to transition)
+            thinking_delay: Minimum time in seconds the thinking state stays on screen
+                (gives UI time to transition); processing runs during it
             
         Returns:
             The final response message from the message processor
@@ -117,13 +140,14 @@ class EventDispatcher:
             
             # Send thinking event
             await self.dispatch_thinking_event(client_queue)
-            
-            # Delay for a moment to give frontend time to transition
-            await asyncio.sleep(thinking_delay)
+            display_until = self._deadline(thinking_delay)
             
             # Process the message with the provided function
             response = await message_processor(user_message)
             
+            # Give the frontend the rest of the transition time, if any is left
+            await self._wait_until(display_until)
+            
             # Send the reply event
             await self.dispatch_reply_event(client_queue, response)
             
@@ -140,48 +164,143 @@ class EventDispatcher:
         client_queue: asyncio.Queue,
         streaming_processor: Callable[[str], Awaitable[Any]],
         user_message: str,
-        thinking_delay: float = 1.0
+        thinking_delay: float = 1.0,
+        coalesce_window: float = 0.0,
+        coalesce_bytes: int = 0
     ) -> str:
         """
         Dispatch a complete streaming chat sequence with proper event ordering:
         1. freya:listening
-        2. freya:thinking (with optional delay)
-        3. Process the message with streaming response
-        4. freya:reply for each chunk
+        2. freya:thinking
+        3. Process the message with streaming response (starts immediately)
+        4. freya:reply for each batch of chunks; the first is held until the
+           thinking delay has elapsed
+        
+        The first chunk is always sent on its own as soon as it may be. Later
+        chunks are coalesced into one reply event until coalesce_window seconds
+        have passed since the oldest buffered chunk or coalesce_bytes of text
+        are buffered. The defaults (0, 0) send one event per chunk.
         
         Args:
             client_queue: The asyncio queue to send events to
             streaming_processor: An async function that returns a stream of response chunks
             user_message: The user's message to process
-            thinking_delay: The delay in seconds after the thinking event
+            thinking_delay: Minimum time in seconds the thinking state stays on screen
+            coalesce_window: Maximum time in seconds a chunk waits for company
+            coalesce_bytes: Buffered UTF-8 size that triggers an immediate send
             
         Returns:
             The complete response (concatenated from all chunks)
+            
+        If the sequence is cancelled (client disconnect), the response stream
+        is closed so the upstream completion stops, and the text received so
+        far, sent or not, stays available in self.partial_response.
         """
+        self.partial_response = ""
         try:
             # Send listening event immediately
             await self.dispatch_listening_event(client_queue)
             
             # Send thinking event
             await self.dispatch_thinking_event(client_queue)
-            
-            # Delay for a moment to give frontend time to transition
-            await asyncio.sleep(thinking_delay)
+            display_until = self._deadline(thinking_delay)
             
             # Process the message with the provided streaming function
             response_stream = await streaming_processor(user_message)
-            full_response = ""
             
-            # Stream each chunk as a reply event
-            async for chunk in response_stream:
-                if chunk:
-                    full_response += chunk
-                    await self.dispatch_reply_event(client_queue, chunk)
+            # Stream the chunks as reply events
+            try:
+                await self._stream_replies(
+                    client_queue, response_stream, display_until, coalesce_window, coalesce_bytes
+                )
+            finally:
+                # Close the stream now rather than at garbage collection, so an
+                # early exit cancels the upstream generation immediately
+                aclose = getattr(response_stream, "aclose", None)
+                if aclose is not None:
+                    await aclose()
             
-            return full_response
+            return self.partial_response
             
         except Exception as e:
             error_message = f"Error in streaming chat sequence: {str(e)}"
             logger.error(error_message)
             await self.dispatch_error_event(client_queue, error_message)
-            return ""
\ No newline at end of file
+            return ""
+
+    async def _stream_replies(
+        self,
+        client_queue: asyncio.Queue,
+        response_stream: AsyncGenerator[str, None],
+        display_until: float,
+        coalesce_window: float,
+        coalesce_bytes: int
+    ) -> None:
+        """
+        Send a response stream as coalesced freya:reply events.
+        
+        Each read runs as a task that is waited on, so neither an expiring
+        coalesce window nor a cancelled sequence cancels the stream mid-read
+        by accident. On cancellation the read in flight is cancelled
+        explicitly, and whatever it still returns is kept with the buffered
+        text in self.partial_response.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = response_stream.__aiter__()
+        buffer: List[str] = []
+        buffered_bytes = 0
+        flush_at = 0.0
+        pending = None
+        
+        async def flush() -> None:
+            nonlocal buffered_bytes
+            text = "".join(buffer)
+            buffer.clear()
+            buffered_bytes = 0
+            self.partial_response += text
+            await self.dispatch_reply_event(client_queue, text)
+        
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(chunks.__anext__())
+                timeout = max(0.0, flush_at - loop.time()) if buffer else None
+                done, _ = await asyncio.wait({pending}, timeout=timeout)
+                if not done:
+                    # Window expired while waiting for the next chunk
+                    await flush()
+                    continue
+                
+                next_chunk, pending = pending, None
+                try:
+                    chunk = next_chunk.result()
+                except StopAsyncIteration:
+                    break
+                
+                if not chunk:
+                    continue
+                
+                if not self.partial_response and not buffer:
+                    # First token: send as soon as the thinking delay allows
+                    await self._wait_until(display_until)
+                    buffer.append(chunk)
+                    await flush()
+                    continue
+                
+                if not buffer:
+                    flush_at = loop.time() + coalesce_window
+                buffer.append(chunk)
+                buffered_bytes += len(chunk.encode("utf-8"))
+                if buffered_bytes >= coalesce_bytes or loop.time() >= flush_at:
+                    await flush()
+            
+            if buffer:
+                await flush()
+        finally:
+            if pending is not None:
+                pending.cancel()
+                [late] = await asyncio.gather(pending, return_exceptions=True)
+                if isinstance(late, str):
+                    buffer.append(late)
+            # Only left over when the sequence ended early
+            self.partial_response += "".join(buffer)
@@ -0,0 +1,137 @@
+"""
+event_heartbeat.py - Shared heartbeat ticker and accounting for SSE connections
+
+Instead of every SSE connection running its own 15 second timer and polling
+request.is_disconnected(), one ticker task writes a pre-encoded heartbeat
+comment into the buffer of every registered stream that has been idle since
+the previous tick. An idle connection then costs nothing but its entry in a
+set; disconnects are noticed by the ASGI server (sse_starlette cancels the
+response) or when a heartbeat can no longer be buffered.
+"""
+from typing import Any, Dict, Optional, Set
+import asyncio
+import threading
+
+from app.core.config import logger
+from app.services.event_broker import Subscription
+from app.services.sse_frames import HEARTBEAT_FRAME
+
+# Seconds between heartbeats on an idle connection
+HEARTBEAT_INTERVAL = 15.0
+
+
+class ConnectionStats:
+    """Process-wide counters for SSE streams."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open_streams = 0
+        self.opened = 0
+        self.events_sent = 0
+        self.bytes_sent = 0
+        self.heartbeats_sent = 0
+        self.dropped = 0
+
+    def stream_opened(self) -> None:
+        with self._lock:
+            self.open_streams += 1
+            self.opened += 1
+
+    def stream_closed(self, dropped: bool = False) -> None:
+        with self._lock:
+            self.open_streams -= 1
+            if dropped:
+                self.dropped += 1
+
+    def sent(self, frame: Any) -> None:
+        """Count a frame written to a client."""
+        size = len(frame) if isinstance(frame, bytes) else len(frame.encode("utf-8"))
+        with self._lock:
+            self.events_sent += 1
+            self.bytes_sent += size
+
+    def heartbeats(self, count: int) -> None:
+        with self._lock:
+            self.heartbeats_sent += count
+
+    def snapshot(self) -> Dict[str, int]:
+        """Return the current counter values."""
+        with self._lock:
+            return {
+                "open_streams": self.open_streams,
+                "opened": self.opened,
+                "events_sent": self.events_sent,
+                "bytes_sent": self.bytes_sent,
+                "heartbeats_sent": self.heartbeats_sent,
+                "dropped": self.dropped,
+            }
+
+
+connection_stats = ConnectionStats()
+
+
+class HeartbeatScheduler:
+    """
+    One ticker task delivering heartbeats to every registered stream.
+
+    The task is started on the first registration and exits once no streams
+    are left, so an idle server runs no timers at all.
+    """
+
+    def __init__(self, interval: float = HEARTBEAT_INTERVAL, frame: Any = HEARTBEAT_FRAME,
+                 stats: Optional[ConnectionStats] = None):
+        self.interval = interval
+        self.frame = frame
+        self.stats = stats or connection_stats
+        self._streams: Set[Subscription] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, subscription: Subscription) -> None:
+        """Start sending heartbeats to a stream."""
+        self._streams.add(subscription)
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    def unregister(self, subscription: Subscription) -> None:
+        """Stop sending heartbeats to a stream."""
+        self._streams.discard(subscription)
+
+    @property
+    def stream_count(self) -> int:
+        return len(self._streams)
+
+    def tick(self) -> int:
+        """
+        Deliver one heartbeat to each stream that was idle since the last tick.
+
+        A stream whose buffer is full is dropped from the broker.
+
+        Returns:
+            Number of heartbeats delivered
+        """
+        delivered = 0
+        for subscription in list(self._streams):
+            if subscription.closed:
+                self._streams.discard(subscription)
+                continue
+            if subscription.active:
+                subscription.active = False
+                continue
+            if subscription.deliver(self.frame, count_activity=False):
+                delivered += 1
+            else:
+                logger.warning(f"Dropping unresponsive SSE stream on {subscription.channel}")
+                self._streams.discard(subscription)
+                subscription.close(dropped=True)
+                subscription.broker.unsubscribe(subscription)
+        self.stats.heartbeats(delivered)
+        return delivered
+
+    async def _run(self) -> None:
+        while self._streams:
+            await asyncio.sleep(self.interval)
+            self.tick()
+
+
+heartbeat_scheduler = HeartbeatScheduler()
@@ -1,13 +1,33 @@
 """
 event_service.py - Service for handling Server-Sent Events (SSE) formatting and emission
 """
-from typing import Dict, Any, Optional, AsyncGenerator
-import json
+from typing import Dict, Any, Optional, AsyncGenerator, Callable, Awaitable
 import asyncio
-from datetime import datetime
 from fastapi import Request
 
 from app.core.config import logger
+from app.services.event_broker import Subscription
+from app.services.event_heartbeat import HEARTBEAT_INTERVAL, connection_stats, heartbeat_scheduler
+from app.services.sse_frames import (
+    HEARTBEAT_FRAME, build_frame, event_id_of, listening_frame, reply_frame, thinking_frame
+)
+
+# Maximum number of formatted events buffered between a chat producer and the
+# SSE response; producers block on put() once it is full (backpressure)
+EVENT_QUEUE_MAXSIZE = 64
+
+# How often (seconds) an idle SSE response checks whether the client has gone
+DISCONNECT_POLL_INTERVAL = 1.0
+
+# Queued by the producer task when it finishes to end the response stream
+STREAM_END = object()
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    """Parse a Last-Event-ID header value; invalid values are ignored."""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
 
 
 class EventService:
@@ -17,71 +37,76 @@ class EventService:
     """
 
     @staticmethod
-    async def format_sse(event: str, data: Any) -> str:
+    async def format_sse(event: str, data: Any) -> bytes:
         """
         Format data as a Server-Sent Event.
         
+        Kept for async callers; new code can call sse_frames.build_frame directly.
+        
         Args:
             event: The event type (e.g., "freya:listening", "freya:thinking", "freya:reply")
             data: The data to send (will be JSON-serialized)
             
         Returns:
-            Properly formatted SSE message
+            Encoded SSE frame, with a unique increasing id
         """
-        if isinstance(data, dict) or isinstance(data, list):
-            json_data = json.dumps(data)
-        else:
-            json_data = json.dumps({"message": str(data)})
-            
-        return f"event: {event}\ndata: {json_data}\n\n"
+        return build_frame(event, data)
 
     @staticmethod
-    async def create_listening_event() -> str:
+    async def create_listening_event() -> bytes:
         """Create a 'freya:listening' event"""
-        return await EventService.format_sse(
-            "freya:listening", 
-            {
-                "timestamp": datetime.utcnow().isoformat(),
-                "state": "listening"
-            }
-        )
+        return listening_frame()
 
     @staticmethod
-    async def create_thinking_event() -> str:
+    async def create_thinking_event() -> bytes:
         """Create a 'freya:thinking' event"""
-        return await EventService.format_sse(
-            "freya:thinking", 
-            {
-                "timestamp": datetime.utcnow().isoformat(),
-                "state": "thinking"
-            }
-        )
+        return thinking_frame()
 
     @staticmethod
-    async def create_reply_event(message: str) -> str:
+    async def create_reply_event(message: str) -> bytes:
         """Create a 'freya:reply' event with the response message"""
-        return await EventService.format_sse(
-            "freya:reply", 
-            {
-                "timestamp": datetime.utcnow().isoformat(),
-                "message": message,
-                "state": "reply"
-            }
-        )
+        return reply_frame(message)
 
     @staticmethod
-    async def event_generator(request: Request) -> AsyncGenerator[str, None]:
+    async def event_generator(
+        request: Request,
+        subscription: Optional[Subscription] = None
+    ) -> AsyncGenerator[bytes, None]:
         """
         Generate SSE events while checking if the client is still connected.
         
+        With a broker subscription, events published to its channel are
+        forwarded as they arrive. Idle-time heartbeats come from the shared
+        heartbeat scheduler rather than a per-connection timer, and disconnects
+        are left to the ASGI server (sse_starlette cancels this generator), so
+        an idle connection does no work. The stream ends if the broker drops
+        the subscription, and the subscription is removed when it ends.
+        
         Args:
             request: The FastAPI request object
+            subscription: Optional broker subscription to forward
             
         Yields:
             Formatted SSE events
         """
+        if subscription is not None:
+            connection_stats.stream_opened()
+            heartbeat_scheduler.register(subscription)
+            try:
+                event = build_frame("connection", {"status": "established"})
+                while event is not None:
+                    connection_stats.sent(event)
+                    yield event
+                    event = await subscription.get()
+                logger.info(f"SSE subscription on {subscription.channel} closed")
+            finally:
+                heartbeat_scheduler.unregister(subscription)
+                subscription.broker.unsubscribe(subscription)
+                connection_stats.stream_closed(dropped=subscription.dropped)
+            return
+        
         # Send initial connection established event
-        yield await EventService.format_sse("connection", {"status": "established"})
+        yield build_frame("connection", {"status": "established"})
         
         # Keep the connection alive
         while True:
@@ -91,7 +116,70 @@ class EventService:
                 break
                 
             # Send a heartbeat comment every 15 seconds to keep the connection alive
-            yield ": heartbeat\n\n"
+            yield HEARTBEAT_FRAME
             
             # Wait before the next heartbeat
-            await asyncio.sleep(15)
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    @staticmethod
+    async def supervised_event_stream(
+        request: Request,
+        producer: Callable[[asyncio.Queue], Awaitable[None]],
+        maxsize: int = EVENT_QUEUE_MAXSIZE,
+        poll_interval: float = DISCONNECT_POLL_INTERVAL,
+        on_event: Optional[Callable[[bytes], Any]] = None
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Run a producer as a background task and yield its events as they arrive.
+        
+        The producer receives a bounded queue and puts formatted SSE events on
+        it while this generator drains the queue into the response, so each
+        event reaches the client as soon as it is produced. The stream ends
+        when the producer returns. If the producer raises, an error event is
+        sent first. If the client disconnects (or the response is cancelled),
+        the producer task is cancelled.
+        
+        Args:
+            request: The FastAPI request object
+            producer: Async function that puts events on the queue it is given
+            maxsize: Maximum number of buffered events
+            poll_interval: Seconds between disconnect checks while idle
+            on_event: Optional callback given every event as it is sent,
+                e.g. to publish it to other subscribers through the broker
+            
+        Yields:
+            Formatted SSE events
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        
+        async def supervise() -> None:
+            try:
+                await producer(queue)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in event producer: {str(e)}", exc_info=True)
+                await queue.put(build_frame("error", {"message": str(e)}))
+            await queue.put(STREAM_END)
+        
+        task = asyncio.create_task(supervise())
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        logger.info("Client disconnected, cancelling event producer")
+                        break
+                    continue
+                
+                if event is STREAM_END:
+                    break
+                if on_event is not None:
+                    on_event(event)
+                yield event
+        finally:
+            if not task.done():
+                task.cancel()
+            # Wait for the producer to unwind (closing its DB session) before returning
+            await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,292 @@
+"""
+firebase_auth.py - Async Firebase ID token verification for the Firebase routes
+
+Verifying a Firebase ID token checks an RSA signature, which is CPU work that
+would otherwise run on the event loop for every request. FirebaseAuthVerifier
+runs verification in a worker thread, shares one verification between
+concurrent requests carrying the same token, and caches the verified claims by
+token hash until the token's exp.
+
+Cached claims outlive a server-side revocation, so the verifier has hooks to
+drop them: revoke_token for a single token and revoke_user for every token a
+user obtained before the revocation (matching Firebase revoke_refresh_tokens).
+
+Routes use the get_firebase_claims dependency together with
+ensure_claims_match.
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import threading
+import time
+
+from fastapi import Header, HTTPException
+
+from app.core.config import logger
+
+# Verified tokens kept before the least recently used is evicted
+AUTH_CACHE_SIZE = 10000
+
+# Seconds before exp at which a cached token is no longer trusted
+AUTH_EXPIRY_LEEWAY = 30
+
+
+class TokenRevokedError(Exception):
+    """Raised for a token that was revoked through FirebaseAuthVerifier."""
+
+
+def token_key(token: str) -> str:
+    """Cache key for a token; raw tokens are never kept in memory."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def parse_bearer(authorization: str) -> str:
+    """Return the token of an Authorization header, with or without the Bearer prefix."""
+    return authorization[7:] if authorization.startswith("Bearer ") else authorization
+
+
+class AuthStats:
+    """Process-wide counters for token verification."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.coalesced = 0
+        self.verifications = 0
+        self.failures = 0
+        self.revoked_rejections = 0
+        self.verify_seconds = 0.0
+        self.max_verify_seconds = 0.0
+
+    def hit(self) -> None:
+        with self._lock:
+            self.cache_hits += 1
+
+    def miss(self, coalesced: bool = False) -> None:
+        with self._lock:
+            self.cache_misses += 1
+            if coalesced:
+                self.coalesced += 1
+
+    def verified(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.verifications += 1
+            self.verify_seconds += seconds
+            self.max_verify_seconds = max(self.max_verify_seconds, seconds)
+            if not ok:
+                self.failures += 1
+
+    def revoked(self) -> None:
+        with self._lock:
+            self.revoked_rejections += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the current counter values, hit rate and verification latency."""
+        with self._lock:
+            lookups = self.cache_hits + self.cache_misses
+            return {
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "cache_hit_rate": self.cache_hits / lookups if lookups else 0.0,
+                "coalesced": self.coalesced,
+                "verifications": self.verifications,
+                "failures": self.failures,
+                "revoked_rejections": self.revoked_rejections,
+                "avg_verify_ms": 1000 * self.verify_seconds / self.verifications if self.verifications else 0.0,
+                "max_verify_ms": 1000 * self.max_verify_seconds,
+            }
+
+
+auth_stats = AuthStats()
+
+
+class FirebaseAuthVerifier:
+    """
+    Verifies Firebase ID tokens off the event loop with a bounded claims cache.
+
+    Args:
+        verify: Blocking function returning the claims of a token (defaults to
+            FirebaseService().verify_auth_token)
+        max_entries: Maximum number of cached tokens
+        check_revoked: Ask Firebase whether the token was revoked on every
+            verification (one extra request per cache miss)
+        clock: Time source returning epoch seconds
+        stats: Counters to update (defaults to the shared auth_stats)
+    """
+
+    def __init__(self, verify: Optional[Callable[[str], Dict[str, Any]]] = None,
+                 max_entries: int = AUTH_CACHE_SIZE, check_revoked: bool = False,
+                 clock: Callable[[], float] = time.time, stats: Optional[AuthStats] = None):
+        self._verify = verify
+        self.max_entries = max_entries
+        self.check_revoked = check_revoked
+        self.clock = clock
+        self.stats = stats or auth_stats
+        self._lock = threading.Lock()
+        # token hash -> (claims, exp)
+        self._cache: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        # token hash -> exp, for tokens revoked before they expire
+        self._revoked_tokens: Dict[str, float] = {}
+        # uid -> epoch seconds; tokens issued before are rejected
+        self._revoked_users: Dict[str, float] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _verify_blocking(self, token: str) -> Dict[str, Any]:
+        if self._verify is None:
+            from app.services.firebase_service import FirebaseService
+            firebase = FirebaseService()
+            return firebase.verify_auth_token(token, check_revoked=self.check_revoked)
+        return self._verify(token)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def _is_revoked(self, key: str, claims: Dict[str, Any]) -> bool:
+        if key in self._revoked_tokens:
+            return True
+        revoked_at = self._revoked_users.get(claims.get("uid"))
+        issued_at = claims.get("auth_time") or claims.get("iat") or 0
+        return revoked_at is not None and issued_at < revoked_at
+
+    def _cached(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            claims, exp = entry
+            if exp - AUTH_EXPIRY_LEEWAY <= self.clock():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return claims
+
+    def _store(self, key: str, claims: Dict[str, Any]) -> None:
+        exp = claims.get("exp")
+        if not isinstance(exp, (int, float)):
+            return
+        with self._lock:
+            self._cache[key] = (claims, float(exp))
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    async def _verify_and_cache(self, key: str, token: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            claims = await asyncio.to_thread(self._verify_blocking, token)
+        except Exception:
+            self.stats.verified(time.perf_counter() - started, ok=False)
+            raise
+        self.stats.verified(time.perf_counter() - started, ok=True)
+        if not self._is_revoked(key, claims):
+            self._store(key, claims)
+        return claims
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """
+        Return the verified claims of a token.
+
+        Raises:
+            TokenRevokedError: If the token was revoked through this verifier
+            Exception: Whatever the verify function raises for an invalid token
+        """
+        key = token_key(token)
+        claims = self._cached(key)
+        if claims is not None:
+            self.stats.hit()
+        else:
+            task = self._inflight.get(key)
+            self.stats.miss(coalesced=task is not None)
+            if task is None:
+                task = asyncio.ensure_future(self._verify_and_cache(key, token))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            claims = await asyncio.shield(task)
+
+        if self._is_revoked(key, claims):
+            self.stats.revoked()
+            raise TokenRevokedError("Token has been revoked")
+        return claims
+
+    def revoke_token(self, token: str, exp: Optional[float] = None) -> None:
+        """Drop a token from the cache and reject it until it expires."""
+        key = token_key(token)
+        with self._lock:
+            entry = self._cache.pop(key, None)
+            now = self.clock()
+            if exp is None:
+                exp = entry[1] if entry else now + 3600  # ID tokens live at most an hour
+            self._revoked_tokens = {k: e for k, e in self._revoked_tokens.items() if e > now}
+            self._revoked_tokens[key] = exp
+
+    def revoke_user(self, uid: str, revoked_at: Optional[float] = None) -> int:
+        """
+        Reject every token a user obtained before revoked_at (default: now).
+
+        Call this alongside firebase_admin.auth.revoke_refresh_tokens.
+
+        Returns:
+            Number of cached tokens dropped
+        """
+        with self._lock:
+            self._revoked_users[uid] = self.clock() if revoked_at is None else revoked_at
+            keys = [k for k, (claims, _) in self._cache.items() if claims.get("uid") == uid]
+            for key in keys:
+                del self._cache[key]
+            return len(keys)
+
+    def clear(self) -> None:
+        """Drop every cached token."""
+        with self._lock:
+            self._cache.clear()
+
+
+_auth_verifier: Optional[FirebaseAuthVerifier] = None
+
+
+def get_auth_verifier() -> FirebaseAuthVerifier:
+    """Return the process-wide token verifier."""
+    global _auth_verifier
+    if _auth_verifier is None:
+        from app.core.config import FIREBASE_AUTH_CHECK_REVOKED
+        _auth_verifier = FirebaseAuthVerifier(check_revoked=FIREBASE_AUTH_CHECK_REVOKED)
+    return _auth_verifier
+
+
+def set_auth_verifier(verifier: Optional[FirebaseAuthVerifier]) -> None:
+    """Replace the process-wide token verifier (None resets it)."""
+    global _auth_verifier
+    _auth_verifier = verifier
+
+
+async def get_firebase_claims(authorization: Optional[str] = Header(None)) -> Optional[Dict[str, Any]]:
+    """
+    FastAPI dependency returning the verified claims of the request's token.
+
+    Authentication is optional on the Firebase routes: without an
+    Authorization header this returns None.
+
+    Raises:
+        HTTPException: 401 if the token is invalid, expired or revoked
+    """
+    if not authorization:
+        return None
+    try:
+        return await get_auth_verifier().verify(parse_bearer(authorization))
+    except Exception as e:
+        logger.error(f"Authentication error: {str(e)}")
+        raise HTTPException(status_code=401, detail="Invalid authentication token")
+
+
+def ensure_claims_match(claims: Optional[Dict[str, Any]], user_id: Optional[str],
+                        detail: str = "User ID doesn't match authenticated user") -> None:
+    """
+    Check that an authenticated request acts for its own user.
+
+    Raises:
+        HTTPException: 403 if claims are present and their uid differs from user_id
+    """
+    if claims is not None and claims.get("uid") != user_id:
+        raise HTTPException(status_code=403, detail=detail)
@@ -10,8 +10,14 @@ from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta, timezone
 import logging
 
-from app.services.firebase_service import FirebaseService
+from app.services.firebase_service import (
+    CONVERSATION_FIELDS, FACT_FIELDS, MESSAGE_FIELDS, TOPIC_FIELDS, FirebaseService
+)
 from app.services.topic_extraction import TopicExtractor
+from app.services.memory_query_classifier import classify_memory_query
+from app.services.memory_formatter import memory_formatter
+from app.services.message_search_index import get_message_search_index
+from app.services.vector_index import fact_item, get_vector_index, merge_semantic_hits, message_item
 from app.core.config import logger
 from app.core.firebase_config import COLLECTIONS
 
@@ -26,25 +32,6 @@ class FirebaseMemoryService:
     - Building comprehensive memory context
     """
     
-    # Memory query patterns for detecting when a user is asking about past conversations
-    MEMORY_QUERY_PATTERNS = [
-        re.compile(r'(?i)do you remember (when|what|how|where|why|who|if|that|about|our|my|the)', re.IGNORECASE),
-        re.compile(r'(?i)what did (i|we|you) (say|tell|ask|talk|mention) (about|regarding|concerning)', re.IGNORECASE),
-        re.compile(r'(?i)(what|when) did (i|we) (discuss|talk about|mention|say)', re.IGNORECASE),
-        re.compile(r'(?i)have (i|we) (talked|spoken|discussed|mentioned) (about|regarding)', re.IGNORECASE),
-        re.compile(r'(?i)(tell|remind) me (about|what|when|how|where|why) (i|we|you) (said|mentioned|talked about)', re.IGNORECASE),
-        re.compile(r'(?i)(recall|remember|recollect) (our|the|that|when|what|how|where|why|who)', re.IGNORECASE),
-        re.compile(r'(?i)(bring up|reference) (what|when|how|where|why|who|that|our|the)', re.IGNORECASE),
-        re.compile(r'(?i)what (did|do) you know about my', re.IGNORECASE),
-        re.compile(r'(?i)what (have|did) (i|we) (say|tell you|mention) about (my|our|the)', re.IGNORECASE),
-        re.compile(r'(?i)(last time|previously|earlier|before) (we|you|i) (talked|spoke|discussed|mentioned|said)', re.IGNORECASE),
-        re.compile(r'(?i)(in|during) (our|a) (previous|past|last|earlier|recent) (conversation|discussion|chat)', re.IGNORECASE),
-        re.compile(r'(?i)(didn\'t|did) (i|we) (talk|speak|discuss|mention|tell you) (about|that|how|when|where|why)', re.IGNORECASE),
-        re.compile(r'(?i)am i (right|correct) (that|when i say) (you|we|i)', re.IGNORECASE),
-        re.compile(r'(?i)what do you know about (my|our|the)', re.IGNORECASE),
-        re.compile(r'(?i)tell me what you know about (my|our|the)', re.IGNORECASE)
-    ]
-
     # Topic extraction keywords for memory queries
     MEMORY_TOPIC_KEYWORDS = {
         "family": ["family", "parent", "father", "mother", "dad", "mom", "brother", "sister", "sibling",
@@ -62,12 +49,23 @@ class FirebaseMemoryService:
                     "neighborhood", "street", "location", "place", "area", "region", "live", "living"]
     }
     
-    def __init__(self):
+    # Best scoring topics whose message counts feed the frequency factor
+    FREQUENCY_CANDIDATES = 10
+    
+    def __init__(self, vector_index=None, search_index=None):
         """
         Initialize the FirebaseMemoryService.
+        
+        Args:
+            vector_index: Optional VectorIndex for the semantic tier (defaults to
+                the process-wide index, which is disabled unless configured)
+            search_index: Optional MessageSearchIndex for keyword search (defaults
+                to the process-wide index)
         """
         self.firebase = FirebaseService()
         self.topic_extractor = TopicExtractor()
+        self.vector_index = vector_index if vector_index is not None else get_vector_index()
+        self.search_index = search_index if search_index is not None else get_message_search_index()
     
     def is_memory_query(self, query: str) -> bool:
         """
@@ -79,21 +77,7 @@ class FirebaseMemoryService:
         Returns:
             True if the query is memory-related, False otherwise
         """
-        # Check against memory query patterns
-        for pattern in self.MEMORY_QUERY_PATTERNS:
-            if pattern.search(query):
-                return True
-        
-        # Check for memory-related keywords
-        memory_keywords = ["remember", "recall", "forget", "memory", "mentioned",
-                          "told", "said", "talked about", "discussed", "conversation"]
-        
-        query_lower = query.lower()
-        for keyword in memory_keywords:
-            if keyword in query_lower:
-                return True
-        
-        return False
+        return classify_memory_query(query)[0]
     
     def extract_topics_from_query(self, query: str, top_n: int = 3) -> List[str]:
         """
@@ -143,10 +127,17 @@ class FirebaseMemoryService:
             List of user facts
         """
         # Get all facts (we'll filter by user ID if that field exists)
-        facts = self.firebase.get_user_facts(user_id)
+        facts = self.firebase.get_user_facts(user_id, fields=FACT_FIELDS)
         
         logger.info(f"Retrieved {len(facts)} facts from Firestore for user {user_id}")
         
+        # Facts are already loaded, so indexing them costs no extra reads
+        if self.vector_index is not None:
+            self.vector_index.enqueue(user_id, (
+                fact_item(fact.get('id') or fact.get('value'), fact.get('type', ''), fact.get('value', ''), fact.get('confidence'))
+                for fact in facts
+            ))
+        
         # If no query provided, return facts directly
         if not query:
             return facts[:limit]
@@ -251,44 +242,27 @@ class FirebaseMemoryService:
             List of recent messages
         """
         # Get recent conversations for the user
-        conversations = self.firebase.get_user_conversations(user_id, limit=10)
+        conversations = self.firebase.get_user_conversations(user_id, limit=10, fields=CONVERSATION_FIELDS)
         
-        # Calculate cutoff date (make it timezone-aware)
-        cutoff_date = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+        # Timestamps are epoch seconds (normalized by FirebaseService._doc_to_dict)
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=max_age_days)).timestamp()
         
         # Collect messages from each conversation
         all_messages = []
         for conv in conversations:
             conv_id = conv.get('id')
-            messages = self.firebase.get_conversation_messages(conv_id, limit=10)
+            messages = self.firebase.get_conversation_messages(conv_id, limit=10, fields=MESSAGE_FIELDS)
             
-            # Filter by timestamp if available
+            # Filter by timestamp if available; messages without one are included
             for msg in messages:
                 timestamp = msg.get('timestamp')
-                if timestamp:
-                    # Convert timestamp to datetime if needed
-                    if not isinstance(timestamp, datetime):
-                        if hasattr(timestamp, 'seconds'):
-                            # Convert Firestore timestamp to datetime (UTC)
-                            timestamp = datetime.fromtimestamp(timestamp.seconds, tz=timezone.utc)
-                    else:
-                        # If it's already a datetime, ensure it has timezone info
-                        if timestamp.tzinfo is None:
-                            # Assume UTC for naive datetime
-                            timestamp = timestamp.replace(tzinfo=timezone.utc)
-                    
-                    # Check if message is within cutoff
-                    if timestamp > cutoff_date:
-                        # Add conversation info to message
-                        msg['conversation_id'] = conv_id
-                        all_messages.append(msg)
-                else:
-                    # If no timestamp, include anyway
+                if timestamp is None or timestamp > cutoff:
+                    # Add conversation info to message
                     msg['conversation_id'] = conv_id
                     all_messages.append(msg)
         
         # Sort messages by timestamp (newest first)
-        all_messages.sort(key=lambda x: x.get('timestamp', 0), reverse=True)
+        all_messages.sort(key=lambda x: x.get('timestamp') or 0, reverse=True)
         
         # Return limited results
         return all_messages[:limit]
@@ -307,7 +281,7 @@ class FirebaseMemoryService:
             List of topic memories
         """
         # Get all topics for the user
-        topics = self.firebase.get_user_topics(user_id)
+        topics = self.firebase.get_user_topics(user_id, fields=TOPIC_FIELDS)
         
         # If no topics, return empty list
         if not topics:
@@ -316,10 +290,26 @@ class FirebaseMemoryService:
         # Score topics by relevance to query
         scored_topics = self._score_topics_by_relevance(topics, query)
         
-        # Sort by score and limit
+        # Sort by score, add the frequency factor to the best candidates, and limit
+        scored_topics.sort(key=lambda x: x[1], reverse=True)
+        scored_topics = self._add_topic_frequency(scored_topics[:self.FREQUENCY_CANDIDATES])
         scored_topics.sort(key=lambda x: x[1], reverse=True)
         top_topics = [topic for topic, _ in scored_topics[:topic_limit]]
         
+        # Messages carry no topicIds yet, so use the user's search index when it has messages
+        use_search_index = len(self.search_index.for_user(user_id)) > 0
+        if not use_search_index:
+            # One array_contains_any query for all topics, grouped client-side
+            messages_by_topic = self.firebase.query_grouped_by_array_values(
+                COLLECTIONS['messages'],
+                'topicIds',
+                [topic.get('id') for topic in top_topics if topic.get('id')],
+                per_value_limit=message_limit,
+                order_by='timestamp',
+                desc=True,
+                select=MESSAGE_FIELDS
+            )
+        
         # Get messages for each topic
         topic_memories = []
         for topic in top_topics:
@@ -327,13 +317,10 @@ class FirebaseMemoryService:
             topic_name = topic.get('name', '')
             
             # Get messages for this topic
-            messages = self.firebase.query_collection(
-                COLLECTIONS['messages'],
-                filters=[('topicIds', 'array_contains', topic_id)],
-                order_by='timestamp',
-                desc=True,
-                limit=message_limit
-            )
+            if use_search_index:
+                messages = self.search_index.search(user_id, f"{topic_name} {query}", limit=message_limit)
+            else:
+                messages = messages_by_topic.get(topic_id, [])
             
             # Add to topic memories
             topic_memories.append({
@@ -367,6 +354,7 @@ class FirebaseMemoryService:
         query_topics_lower = [t.lower() for t in query_topics]
         
         # Score topics
+        now = datetime.now(timezone.utc).timestamp()
         scored_topics = []
         for topic in topics:
             topic_name = topic.get('name', '').lower()
@@ -391,19 +379,9 @@ class FirebaseMemoryService:
                     base_score += 0.5
             
             # Add recency factor if available
-            if 'lastUsed' in topic:
-                last_used = topic['lastUsed']
-                # Convert to datetime if needed
-                if not isinstance(last_used, datetime):
-                    if hasattr(last_used, 'seconds'):
-                        last_used = datetime.fromtimestamp(last_used.seconds, tz=timezone.utc)
-                else:
-                    # If it's already a datetime, ensure it has timezone info
-                    if last_used.tzinfo is None:
-                        last_used = last_used.replace(tzinfo=timezone.utc)
-                
-                # Calculate days since last used
-                days_ago = (datetime.now(timezone.utc) - last_used).days
+            if topic.get('lastUsed') is not None:
+                # Calculate days since last used (lastUsed is epoch seconds)
+                days_ago = int((now - topic['lastUsed']) // 86400)
                 # More recent topics get higher scores
                 recency_factor = max(0, 0.5 - (days_ago * 0.05))  # Decrease by 0.05 per day
                 base_score += recency_factor
@@ -417,6 +395,42 @@ class FirebaseMemoryService:
         
         return scored_topics
     
+    def _add_topic_frequency(self, scored_topics: List[Tuple[Dict[str, Any], float]]) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Add a frequency factor (how often a topic appears in messages) to topic scores.
+        
+        Mirrors the PostgreSQL ranking: up to 0.5 for the most used topic,
+        scaled by message count. Counts are server-side aggregations, so no
+        message documents are read. Firestore aggregations cannot share a query
+        across different array_contains filters, so each topic costs one count;
+        the counts run concurrently and stay cached while messages are added,
+        and are skipped while no message carries topicIds (one cached
+        existence check).
+        
+        Args:
+            scored_topics: List of (topic, score) tuples
+            
+        Returns:
+            List of (topic, score) tuples with the factor added
+        """
+        topic_ids = [topic.get('id') for topic, _ in scored_topics if topic.get('id')]
+        if not topic_ids:
+            return scored_topics
+        if not self.firebase.document_exists(COLLECTIONS['messages'], [('topicIds', '!=', None)]):
+            return scored_topics
+        
+        counts = self.firebase.count_by_array_values(COLLECTIONS['messages'], 'topicIds', topic_ids)
+        max_count = max(counts.values(), default=0)
+        if not max_count:
+            return scored_topics
+        
+        boosted = []
+        for topic, score in scored_topics:
+            score += 0.5 * counts.get(topic.get('id'), 0) / max_count
+            topic['relevance_score'] = score
+            boosted.append((topic, score))
+        return boosted
+    
     def assemble_memory_context(self, user_id: str, query: str) -> Dict[str, Any]:
         """
         Assemble a complete memory context for a chat completion request.
@@ -474,16 +488,42 @@ class FirebaseMemoryService:
                 "messages": formatted_messages
             })
         
-        # 4. If this is a memory query, prioritize memories
+        # 4. If this is a memory query, add keyword matches from the search index and prioritize
+        self.search_index.add_messages(user_id, recent_messages)
         if memory_context["is_memory_query"]:
+            self._add_search_matches(memory_context, self.search_index.search(user_id, query, limit=5))
             memory_context = self._prioritize_memories_for_memory_query(memory_context, query)
         
-        # 5. Format the memory context
-        formatted_context = self.format_memory_context(memory_context, query)
+        # 5. Add semantic matches from the local vector index
+        if self.vector_index is not None:
+            self._index_messages(user_id, recent_messages, topic_results)
+            merge_semantic_hits(memory_context, self.vector_index.search_within(user_id, query))
+        
+        # 6. Format the memory context
+        formatted_context = self.format_memory_context(memory_context, query, user_id=user_id)
         memory_context["formatted_context"] = formatted_context
         
         return memory_context
     
+    def _add_search_matches(self, memory_context: Dict[str, Any], matches: List[Dict[str, Any]]):
+        """Put search index matches not already present first in recent_memories."""
+        known = {memory.get('content') for memory in memory_context["recent_memories"]}
+        found = [
+            {"content": match['content'], "user_id": "", "timestamp": match.get('timestamp', '')}
+            for match in matches if match['content'] not in known
+        ]
+        memory_context["recent_memories"] = found + memory_context["recent_memories"]
+    
+    def _index_messages(self, user_id: str, recent_messages: List[Dict[str, Any]], topic_results: List[Dict[str, Any]]):
+        """Queue the messages loaded for this context for background embedding."""
+        messages = list(recent_messages)
+        for topic_memory in topic_results:
+            messages.extend(topic_memory.get('messages', []))
+        self.vector_index.enqueue(user_id, (
+            message_item(msg.get('id'), msg.get('content', ''), msg.get('timestamp'))
+            for msg in messages if msg.get('id')
+        ))
+    
     def _prioritize_memories_for_memory_query(self, memory_context: Dict[str, Any], query: str) -> Dict[str, Any]:
         """
         Adjust memory context for memory-specific queries.
@@ -516,444 +556,43 @@ class FirebaseMemoryService:
         Returns:
             Memory query type classification
         """
-        query_lower = query.lower()
-        
-        # Check for specific memory query types
-        if re.search(r'(?i)do you remember', query_lower):
-            return "recall_verification"
-        elif re.search(r'(?i)what did (i|we|you) (say|tell|ask|talk|mention)', query_lower):
-            return "content_recall"
-        elif re.search(r'(?i)when did (i|we) (discuss|talk about|mention|say)', query_lower):
-            return "temporal_recall"
-        elif re.search(r'(?i)have (i|we) (talked|spoken|discussed|mentioned)', query_lower):
-            return "existence_verification"
-        elif re.search(r'(?i)what do you know about my', query_lower):
-            return "knowledge_query"
-        elif re.search(r'(?i)(last time|previously|earlier|before)', query_lower):
-            return "previous_conversation"
-        elif re.search(r'(?i)(didn\'t|did) (i|we) (talk|speak|discuss|mention|tell)', query_lower):
-            return "fact_checking"
-        else:
-            return "general_memory_query"
+        return classify_memory_query(query)[1]
     
-    def format_memory_context(self, memory_context: Dict[str, Any], query: str = "") -> str:
+    def format_memory_context(self, memory_context: Dict[str, Any], query: str = "", user_id=None) -> str:
         """
         Format the memory context for chat completion.
-        
+    
         This creates a structured text representation of the memory context
-        that can be included in the chat completion prompt.
-        
+        that can be included in the chat completion prompt. Rendering is shared
+        with the other memory backend via app.services.memory_formatter.
+    
         Args:
             memory_context: The memory context to format
             query: The user query (optional)
-            
+            user_id: Owner of the memory context (optional), enables fact block caching
+    
         Returns:
             Formatted memory context as a string
         """
-        is_memory_query = memory_context.get("is_memory_query", False)
-        memory_query_type = memory_context.get("memory_query_type", "general_memory_query")
-        
-        # Start with a header
-        formatted_context = "### Memory Context ###\n\n"
-        
-        # Format user facts if available
-        if memory_context["user_facts"]:
-            formatted_context += self._format_user_facts(memory_context["user_facts"])
-        
-        # Format memories based on query type
-        if is_memory_query:
-            # For memory queries, format based on the query type
-            if memory_query_type in ["recall_verification", "content_recall", "fact_checking"]:
-                # For recall questions, prioritize topic memories and recent memories
-                formatted_context += self._format_topic_memories_for_recall(memory_context["topic_memories"])
-                formatted_context += self._format_recent_memories_for_recall(memory_context["recent_memories"])
-                
-            elif memory_query_type in ["temporal_recall", "previous_conversation"]:
-                # For temporal questions, focus on when things were discussed
-                formatted_context += self._format_memories_with_timestamps(
-                    memory_context["recent_memories"],
-                    memory_context["topic_memories"]
-                )
-                
-            elif memory_query_type == "existence_verification":
-                # For existence verification, provide a simple yes/no with evidence
-                formatted_context += self._format_memories_for_existence_verification(
-                    memory_context["topic_memories"],
-                    memory_context["recent_memories"],
-                    memory_context.get("memory_query_topics", [])
-                )
-                
-            elif memory_query_type == "knowledge_query":
-                # For knowledge queries, focus on facts and topic memories
-                formatted_context += self._format_memories_for_knowledge_query(
-                    memory_context["user_facts"],
-                    memory_context["topic_memories"],
-                    memory_context.get("memory_query_topics", [])
-                )
-                
-            else:
-                # Default formatting for other memory queries
-                formatted_context += self._format_default_memory_context(memory_context)
-        else:
-            # For non-memory queries, use default formatting
-            formatted_context += self._format_default_memory_context(memory_context)
-            
-        return formatted_context
+        return memory_formatter.format_memory_context(memory_context, user_id=user_id)
     
     def _format_user_facts(self, facts: List[Dict[str, Any]]) -> str:
-        """
-        Format user facts for the memory context.
-        
-        Args:
-            facts: List of user facts
-            
-        Returns:
-            Formatted user facts as a string
-        """
-        if not facts:
-            return ""
-        
-        formatted_facts = "## User Facts\n"
-        
-        # Sort facts by confidence (descending)
-        sorted_facts = sorted(facts, key=lambda x: x.get("confidence", 0), reverse=True)
-        
-        # Format each fact
-        for fact in sorted_facts:
-            confidence = fact.get("confidence", 0)
-            confidence_indicator = "★" * (1 + min(4, int(confidence / 20)))  # 1-5 stars based on confidence
-            formatted_facts += f"- {fact['type'].capitalize()}: {fact['value']} {confidence_indicator}\n"
-        
-        return formatted_facts + "\n"
+        return memory_formatter.format_user_facts(facts)
     
     def _format_topic_memories_for_recall(self, topic_memories: List[Dict[str, Any]]) -> str:
-        """
-        Format topic memories for recall-type queries.
-        
-        Args:
-            topic_memories: List of topic memories
-            
-        Returns:
-            Formatted topic memories as a string
-        """
-        if not topic_memories:
-            return ""
-        
-        formatted_memories = "## Topic-Related Memories\n"
-        
-        # Sort topic memories by relevance (descending)
-        sorted_topics = sorted(
-            topic_memories,
-            key=lambda x: x.get("topic", {}).get("relevance", 0),
-            reverse=True
-        )
-        
-        # Format each topic memory
-        for topic_memory in sorted_topics:
-            topic_name = topic_memory.get("topic", {}).get("name", "Unknown Topic")
-            relevance = topic_memory.get("topic", {}).get("relevance", 0)
-            
-            # Only include topics with reasonable relevance
-            if relevance < 30:
-                continue
-            
-            formatted_memories += f"### {topic_name}\n"
-            
-            # Format messages for this topic
-            messages = topic_memory.get("messages", [])
-            if messages:
-                for message in messages:
-                    content = message.get("content", "")
-                    formatted_memories += f"- {content}\n"
-            
-            formatted_memories += "\n"
-        
-        return formatted_memories
+        return memory_formatter.format_topic_memories_for_recall(topic_memories)
     
     def _format_recent_memories_for_recall(self, recent_memories: List[Dict[str, Any]]) -> str:
-        """
-        Format recent memories for recall-type queries.
-        
-        Args:
-            recent_memories: List of recent memories
-            
-        Returns:
-            Formatted recent memories as a string
-        """
-        if not recent_memories:
-            return ""
-        
-        formatted_memories = "## Recent Conversation History\n"
-        
-        # Sort by relevance if available, otherwise assume they're already sorted by recency
-        if recent_memories and "relevance" in recent_memories[0]:
-            sorted_memories = sorted(
-                recent_memories,
-                key=lambda x: x.get("relevance", 0),
-                reverse=True
-            )
-        else:
-            sorted_memories = recent_memories
-        
-        # Format each memory
-        for memory in sorted_memories[:5]:  # Limit to top 5
-            content = memory.get("content", "")
-            relevance = memory.get("relevance", 0)
-            
-            # Only include memories with reasonable relevance if relevance is available
-            if "relevance" in memory and relevance < 30:
-                continue
-            
-            formatted_memories += f"- {content}\n"
-        
-        return formatted_memories + "\n"
+        return memory_formatter.format_recent_memories_for_recall(recent_memories)
     
     def _format_memories_with_timestamps(self, recent_memories: List[Dict[str, Any]], topic_memories: List[Dict[str, Any]]) -> str:
-        """
-        Format memories with timestamps for temporal queries.
-        
-        Args:
-            recent_memories: List of recent memories
-            topic_memories: List of topic memories
-            
-        Returns:
-            Formatted memories with timestamps as a string
-        """
-        if not recent_memories and not topic_memories:
-            return ""
-        
-        formatted_memories = "## Conversation Timeline\n"
-        
-        # Collect all messages with timestamps
-        all_messages = []
-        
-        # Add recent memories
-        for memory in recent_memories:
-            if "timestamp" in memory:
-                all_messages.append({
-                    "content": memory.get("content", ""),
-                    "timestamp": memory.get("timestamp", ""),
-                    "relevance": memory.get("relevance", 0)
-                })
-        
-        # Add topic memories
-        for topic_memory in topic_memories:
-            topic_name = topic_memory.get("topic", {}).get("name", "")
-            messages = topic_memory.get("messages", [])
-            
-            for message in messages:
-                if "timestamp" in message:
-                    all_messages.append({
-                        "content": message.get("content", ""),
-                        "timestamp": message.get("timestamp", ""),
-                        "topic": topic_name,
-                        "relevance": topic_memory.get("topic", {}).get("relevance", 0)
-                    })
-        
-        # Sort by timestamp (newest first)
-        sorted_messages = sorted(
-            all_messages,
-            key=lambda x: x.get("timestamp", ""),
-            reverse=True
-        )
-        
-        # Format each message with timestamp
-        for message in sorted_messages:
-            content = message.get("content", "")
-            timestamp = message.get("timestamp", "")
-            topic = message.get("topic", "")
-            
-            # Format timestamp
-            if timestamp:
-                try:
-                    # Convert ISO format to more readable format
-                    if isinstance(timestamp, str):
-                        dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
-                    elif isinstance(timestamp, datetime):
-                        dt = timestamp
-                    else:
-                        # If it's a Firestore timestamp, convert to datetime
-                        if hasattr(timestamp, 'seconds'):
-                            dt = datetime.fromtimestamp(timestamp.seconds, tz=timezone.utc)
-                        else:
-                            dt = datetime.now(timezone.utc)  # Fallback
-                    
-                    formatted_date = dt.strftime("%b %d, %Y")
-                    formatted_time = dt.strftime("%I:%M %p")
-                    timestamp_str = f"{formatted_date} at {formatted_time}"
-                except:
-                    # If parsing fails, use the original timestamp
-                    timestamp_str = str(timestamp)
-            else:
-                timestamp_str = "Unknown time"
-            
-            # Add topic if available
-            topic_str = f" (Topic: {topic})" if topic else ""
-            
-            formatted_memories += f"- {timestamp_str}{topic_str}: {content}\n"
-        
-        return formatted_memories + "\n"
+        return memory_formatter.format_memories_with_timestamps(recent_memories, topic_memories)
     
     def _format_memories_for_existence_verification(self, topic_memories: List[Dict[str, Any]], recent_memories: List[Dict[str, Any]], query_topics: List[str]) -> str:
-        """
-        Format memories for existence verification queries.
-        
-        Args:
-            topic_memories: List of topic memories
-            recent_memories: List of recent memories
-            query_topics: List of topics extracted from the query
-            
-        Returns:
-            Formatted memories for existence verification as a string
-        """
-        if not topic_memories and not recent_memories:
-            return "## Memory Verification\nNo relevant memories found about this topic.\n\n"
-        
-        # Check if we have any relevant memories
-        has_relevant_memories = False
-        
-        # Check topic memories
-        for topic_memory in topic_memories:
-            topic_name = topic_memory.get("topic", {}).get("name", "").lower()
-            relevance = topic_memory.get("topic", {}).get("relevance", 0)
-            
-            # Check if topic is relevant to query
-            if relevance >= 50 or any(query_topic.lower() in topic_name for query_topic in query_topics):
-                has_relevant_memories = True
-                break
-        
-        # Check recent memories if no relevant topic memories found
-        if not has_relevant_memories and recent_memories:
-            for memory in recent_memories:
-                relevance = memory.get("relevance", 0)
-                if relevance >= 50:
-                    has_relevant_memories = True
-                    break
-        
-        # Format the verification result
-        formatted_memories = "## Memory Verification\n"
-        
-        if has_relevant_memories:
-            formatted_memories += "Yes, we have discussed this topic before. Here are the relevant memories:\n\n"
-            
-            # Add topic memories
-            if topic_memories:
-                formatted_memories += self._format_topic_memories_for_recall(topic_memories)
-            
-            # Add recent memories
-            if recent_memories:
-                formatted_memories += self._format_recent_memories_for_recall(recent_memories)
-        else:
-            formatted_memories += "No, we haven't discussed this topic in detail before.\n\n"
-        
-        return formatted_memories
+        return memory_formatter.format_memories_for_existence_verification(topic_memories, recent_memories, query_topics)
     
     def _format_memories_for_knowledge_query(self, user_facts: List[Dict[str, Any]], topic_memories: List[Dict[str, Any]], query_topics: List[str]) -> str:
-        """
-        Format memories for knowledge queries.
-        
-        Args:
-            user_facts: List of user facts
-            topic_memories: List of topic memories
-            query_topics: List of topics extracted from the query
-            
-        Returns:
-            Formatted memories for knowledge queries as a string
-        """
-        formatted_memories = "## Knowledge About User\n"
-        
-        # Filter user facts by query topics
-        relevant_facts = []
-        for fact in user_facts:
-            fact_type = fact.get("type", "").lower()
-            fact_value = fact.get("value", "").lower()
-            
-            # Check if fact is relevant to query topics
-            if any(query_topic.lower() in fact_type or query_topic.lower() in fact_value for query_topic in query_topics):
-                relevant_facts.append(fact)
-        
-        # Format relevant facts
-        if relevant_facts:
-            formatted_memories += "### Known Facts\n"
-            for fact in relevant_facts:
-                formatted_memories += f"- {fact['type'].capitalize()}: {fact['value']}\n"
-            formatted_memories += "\n"
-        
-        # Format topic memories
-        if topic_memories:
-            formatted_memories += "### Related Conversations\n"
-            
-            # Filter topic memories by query topics
-            relevant_topics = []
-            for topic_memory in topic_memories:
-                topic_name = topic_memory.get("topic", {}).get("name", "").lower()
-                relevance = topic_memory.get("topic", {}).get("relevance", 0)
-                
-                # Check if topic is relevant to query
-                if relevance >= 30 or any(query_topic.lower() in topic_name for query_topic in query_topics):
-                    relevant_topics.append(topic_memory)
-            
-            # Format relevant topic memories
-            for topic_memory in relevant_topics:
-                topic_name = topic_memory.get("topic", {}).get("name", "")
-                messages = topic_memory.get("messages", [])
-                
-                if messages:
-                    formatted_memories += f"#### {topic_name}\n"
-                    for message in messages:
-                        content = message.get("content", "")
-                        formatted_memories += f"- {content}\n"
-                    formatted_memories += "\n"
-        
-        if not relevant_facts and not topic_memories:
-            formatted_memories += "I don't have much information about this topic yet.\n\n"
-        
-        return formatted_memories
+        return memory_formatter.format_memories_for_knowledge_query(user_facts, topic_memories, query_topics)
     
     def _format_default_memory_context(self, memory_context: Dict[str, Any]) -> str:
-        """
-        Format default memory context for general queries.
-        
-        Args:
-            memory_context: The memory context to format
-            
-        Returns:
-            Formatted default memory context as a string
-        """
-        formatted_context = ""
-        
-        # Format topic memories if available
-        if memory_context["topic_memories"]:
-            formatted_context += "## Relevant Topics\n"
-            
-            # Sort topic memories by relevance
-            sorted_topics = sorted(
-                memory_context["topic_memories"],
-                key=lambda x: x.get("topic", {}).get("relevance", 0),
-                reverse=True
-            )
-            
-            # Format each topic memory
-            for topic_memory in sorted_topics[:3]:  # Limit to top 3
-                topic_name = topic_memory.get("topic", {}).get("name", "")
-                messages = topic_memory.get("messages", [])
-                
-                if messages:
-                    formatted_context += f"### {topic_name}\n"
-                    for message in messages[:2]:  # Limit to top 2 messages per topic
-                        content = message.get("content", "")
-                        formatted_context += f"- {content}\n"
-                    formatted_context += "\n"
-        
-        # Format recent memories if available
-        if memory_context["recent_memories"]:
-            formatted_context += "## Recent Conversation\n"
-            
-            # Format recent memories (limit to top 3)
-            for memory in memory_context["recent_memories"][:3]:
-                content = memory.get("content", "")
-                formatted_context += f"- {content}\n"
-            
-            formatted_context += "\n"
-        
-        return formatted_context
\ No newline at end of file
+        return memory_formatter.format_default_memory_context(memory_context)
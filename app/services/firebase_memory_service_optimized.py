@@ -8,15 +8,16 @@ This service provides optimized memory retrieval and assembly:
 - Cached topic extraction
 """
 
-import re
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta, timezone
 import logging
 import concurrent.futures
 from functools import lru_cache
 
+from app.services.firebase_service import FACT_FIELDS, TOPIC_FIELDS
 from app.services.firebase_service_optimized import OptimizedFirebaseService
 from app.services.topic_extraction import TopicExtractor
+from app.services.memory_query_classifier import classify_memory_query
 from app.core.config import logger
 from app.core.firebase_config import COLLECTIONS
 
@@ -31,44 +32,19 @@ class OptimizedFirebaseMemoryService:
     - Reduced memory allocations
     """
     
-    # Pre-compiled regex patterns (class level for efficiency)
-    MEMORY_PATTERNS = [
-        re.compile(pattern, re.IGNORECASE) for pattern in [
-            r'do you remember (when|what|how|where|why|who|if|that|about|our|my|the)',
-            r'what did (i|we|you) (say|tell|ask|talk|mention) (about|regarding|concerning)',
-            r'(what|when) did (i|we) (discuss|talk about|mention|say)',
-            r'have (i|we) (talked|spoken|discussed|mentioned) (about|regarding)',
-            r'(tell|remind) me (about|what|when|how|where|why) (i|we|you) (said|mentioned|talked about)',
-            r'(recall|remember|recollect) (our|the|that|when|what|how|where|why|who)',
-            r'what (did|do) you know about my',
-            r'(last time|previously|earlier|before) (we|you|i) (talked|spoke|discussed|mentioned|said)',
-            r'(in|during) (our|a) (previous|past|last|earlier|recent) (conversation|discussion|chat)',
-        ]
-    ]
-    
     def __init__(self):
         """Initialize the optimized memory service."""
         self.firebase = OptimizedFirebaseService()
         self.topic_extractor = TopicExtractor()
         self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=5)
     
-    @lru_cache(maxsize=128)
     def is_memory_query(self, query: str) -> bool:
         """
         Cached detection of memory-related queries.
         
-        Uses LRU cache to avoid re-processing common queries.
+        Uses the shared classifier, whose LRU cache avoids re-processing common queries.
         """
-        # Quick keyword check first
-        query_lower = query.lower()
-        memory_keywords = {"remember", "recall", "forget", "memory", "mentioned",
-                          "told", "said", "talked about", "discussed", "conversation"}
-        
-        if any(keyword in query_lower for keyword in memory_keywords):
-            return True
-        
-        # Pattern matching
-        return any(pattern.search(query) for pattern in self.MEMORY_PATTERNS)
+        return classify_memory_query(query)[0]
     
     @lru_cache(maxsize=64)
     def extract_topics_from_query(self, query: str, top_n: int = 3) -> List[str]:
@@ -127,7 +103,7 @@ class OptimizedFirebaseMemoryService:
         def get_facts():
             if is_memory_query or query_topics:
                 return self._get_relevant_user_facts(user_id, query, limit=5)
-            return self.firebase.get_user_facts(user_id)[:3]  # Fewer facts for non-memory queries
+            return self.firebase.get_user_facts(user_id, fields=FACT_FIELDS)[:3]  # Fewer facts for non-memory queries
         
         def get_recent():
             if is_memory_query:
@@ -173,7 +149,7 @@ class OptimizedFirebaseMemoryService:
     def _get_relevant_user_facts(self, user_id: str, query: str, limit: int = 5) -> List[Dict[str, Any]]:
         """Get user facts with optimized relevance scoring."""
         # Get all facts from optimized service (cached)
-        all_facts = self.firebase.get_user_facts(user_id)
+        all_facts = self.firebase.get_user_facts(user_id, fields=FACT_FIELDS)
         
         if not query or not all_facts:
             return all_facts[:limit]
@@ -235,7 +211,7 @@ class OptimizedFirebaseMemoryService:
                                     topic_limit: int = 3, message_limit: int = 3) -> List[Dict[str, Any]]:
         """Get topic memories with optimized querying."""
         # Get all user topics
-        all_topics = self.firebase.get_user_topics(user_id)
+        all_topics = self.firebase.get_user_topics(user_id, fields=TOPIC_FIELDS)
         
         if not all_topics:
             return []
@@ -243,6 +219,7 @@ class OptimizedFirebaseMemoryService:
         # Score topics based on query relevance
         scored_topics = []
         query_topics_lower = [t.lower() for t in query_topics]
+        now = datetime.now(timezone.utc).timestamp()
         
         for topic in all_topics:
             topic_name = topic.get('name', '').lower()
@@ -256,11 +233,9 @@ class OptimizedFirebaseMemoryService:
                 score += 1.5
             
             # Recency bonus
-            if 'lastUsed' in topic:
-                last_used = topic['lastUsed']
-                if isinstance(last_used, datetime):
-                    days_ago = (datetime.now(timezone.utc) - last_used).days
-                    score += max(0, 0.5 - (days_ago * 0.05))
+            if topic.get('lastUsed') is not None:
+                days_ago = int((now - topic['lastUsed']) // 86400)
+                score += max(0, 0.5 - (days_ago * 0.05))
             
             if score > 0.5:
                 topic['relevance_score'] = score
@@ -275,14 +250,14 @@ class OptimizedFirebaseMemoryService:
         topic_ids = [t.get('id') for t in top_topics if t.get('id')]
         
         if topic_ids:
-            # Use optimized topic query
-            messages = self.firebase.query_messages_by_topics(topic_ids, user_id, 
-                                                            limit=message_limit * len(topic_ids))
+            # One array_contains_any query, grouped by topic client-side
+            messages_by_topic = self.firebase.query_messages_grouped_by_topics(
+                topic_ids, user_id, per_topic_limit=message_limit
+            )
             
-            # Group messages by topic
             for topic in top_topics:
                 topic_id = topic.get('id')
-                topic_messages = [m for m in messages if topic_id in m.get('topicIds', [])][:message_limit]
+                topic_messages = messages_by_topic.get(topic_id, [])
                 
                 if topic_messages:
                     topic_memories.append({
@@ -297,24 +272,8 @@ class OptimizedFirebaseMemoryService:
         return topic_memories
     
     def _classify_memory_query_type(self, query: str) -> str:
-        """Classify memory query type with cached pattern matching."""
-        query_lower = query.lower()
-        
-        # Use early returns for efficiency
-        if "do you remember" in query_lower:
-            return "recall_verification"
-        elif re.search(r'what did (i|we|you) (say|tell|ask|talk|mention)', query_lower):
-            return "content_recall"
-        elif re.search(r'when did (i|we) (discuss|talk about|mention|say)', query_lower):
-            return "temporal_recall"
-        elif re.search(r'have (i|we) (talked|spoken|discussed|mentioned)', query_lower):
-            return "existence_verification"
-        elif "what do you know about my" in query_lower:
-            return "knowledge_query"
-        elif any(term in query_lower for term in ["last time", "previously", "earlier", "before"]):
-            return "previous_conversation"
-        else:
-            return "general_memory_query"
+        """Classify memory query type with the shared (cached) classifier."""
+        return classify_memory_query(query)[1]
     
     def _format_memory_context_optimized(self, memory_context: Dict[str, Any], query: str) -> str:
         """Format memory context with optimized string building."""
@@ -6,7 +6,11 @@ This service provides a connection to Firebase and methods for interacting with
 
 import os
 import logging
-from typing import Dict, List, Any, Optional, Union, Tuple
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Any, Optional, Union, Tuple
 from datetime import datetime, timezone
 
 # Firebase Admin SDK imports
@@ -15,13 +19,201 @@ try:
     from firebase_admin import credentials, firestore, auth
     from google.cloud.firestore_v1 import DocumentReference, DocumentSnapshot
     from google.cloud.firestore_v1.collection import CollectionReference
+    from google.protobuf.timestamp_pb2 import Timestamp
 except ImportError as e:
     # Provide a helpful error message if dependencies are missing
     print(f"Error importing Firebase dependencies: {str(e)}. Please run: pip install firebase-admin google-cloud-firestore")
     raise
 
 from app.core.firebase_config import FIREBASE_CONFIG, COLLECTIONS, get_service_account_credentials
-from app.core.config import logger
+from app.core.config import logger, FIREBASE_EMULATOR
+from app.services.message_search_index import get_message_search_index
+
+
+def to_epoch(value: Any) -> Any:
+    """
+    Convert a timestamp value to epoch seconds.
+    
+    Firestore returns timestamps as DatetimeWithNanoseconds (a datetime
+    subclass); raw protobuf timestamps expose seconds/nanos. Naive datetimes
+    are treated as UTC. Any other value is returned unchanged.
+    
+    Args:
+        value: Field value read from Firestore
+        
+    Returns:
+        Epoch seconds as a float, or the original value
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    if isinstance(value, Timestamp):
+        return value.seconds + value.nanos / 1e9
+    return value
+
+
+def normalize_timestamps(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Replace every timestamp field of a decoded document with epoch seconds, in place.
+    
+    Done once at decode time so that filtering, scoring and sorting downstream
+    are plain numeric comparisons.
+    
+    Args:
+        data: Document data
+        
+    Returns:
+        The same dictionary
+    """
+    for key, value in data.items():
+        if isinstance(value, (datetime, Timestamp)):
+            data[key] = to_epoch(value)
+    return data
+
+
+# Firestore accepts at most this many values in one array_contains_any filter
+ARRAY_CONTAINS_ANY_LIMIT = 10
+
+# Fields the memory services read; their queries project to these with select.
+# The document id is always returned.
+FACT_FIELDS = ['type', 'value', 'confidence', 'timestamp']
+MESSAGE_FIELDS = ['user', 'content', 'userId', 'timestamp']
+TOPIC_FIELDS = ['name', 'lastUsed']
+CONVERSATION_FIELDS = ['updatedAt']
+
+
+def group_by_array_field(docs: List[Dict[str, Any]], field: str, values: List[Any],
+                         per_value_limit: Optional[int] = None) -> Dict[Any, List[Dict[str, Any]]]:
+    """
+    Group documents by the values of an array field, keeping query order.
+    
+    A document whose array holds several of the values appears in each group.
+    
+    Args:
+        docs: Documents, already in the wanted order
+        field: Array field to group by
+        values: Values to group under (others are ignored)
+        per_value_limit: Maximum documents kept per value (optional)
+        
+    Returns:
+        Dict mapping each value to its documents
+    """
+    groups = {value: [] for value in values}
+    for doc in docs:
+        for value in doc.get(field) or []:
+            group = groups.get(value)
+            if group is not None and (per_value_limit is None or len(group) < per_value_limit):
+                group.append(doc)
+    return groups
+
+
+class ArrayQueryStats:
+    """
+    Process-wide counters for grouped array_contains_any queries.
+    
+    Savings are measured against issuing one array_contains query per value:
+    queries_saved counts avoided round-trips, reads_saved avoided document
+    reads (documents shared by several values, and the one-read minimum that
+    Firestore charges for a query without results).
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.queries_saved = 0
+        self.reads = 0
+        self.reads_saved = 0
+    
+    def record(self, queries: int, queries_saved: int, reads: int, reads_saved: int) -> None:
+        with self._lock:
+            self.queries += queries
+            self.queries_saved += queries_saved
+            self.reads += reads
+            self.reads_saved += reads_saved
+    
+    def snapshot(self) -> Dict[str, int]:
+        """Return the current counter values."""
+        with self._lock:
+            return {
+                "queries": self.queries,
+                "queries_saved": self.queries_saved,
+                "reads": self.reads,
+                "reads_saved": self.reads_saved,
+            }
+
+
+array_query_stats = ArrayQueryStats()
+
+
+# Seconds an aggregation result is reused, and how many results are kept
+AGGREGATION_CACHE_TTL = 60
+AGGREGATION_CACHE_SIZE = 1024
+
+# Collections written on every chat turn: new documents leave their cached
+# aggregations alone (they expire with the TTL), so counts stay cached
+TTL_ONLY_AGGREGATION_COLLECTIONS = frozenset({'messages'})
+
+# Aggregation queries count_by_array_values runs at once
+COUNT_CONCURRENCY = 10
+
+
+class AggregationCache:
+    """
+    Process-wide TTL cache for count/sum/avg aggregation results.
+    
+    Entries are keyed by collection, aggregation and query. Writes made
+    through FirebaseService drop the cached results of their collection, so
+    a cached count is only stale for changes made by other processes, or for
+    up to the TTL after documents are added to a collection in
+    TTL_ONLY_AGGREGATION_COLLECTIONS.
+    """
+    
+    def __init__(self, ttl: float = AGGREGATION_CACHE_TTL, max_entries: int = AGGREGATION_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Tuple) -> Tuple[bool, Any]:
+        """Return (found, value) for a cache key."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+    
+    def set(self, key: Tuple, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, collection: Optional[str] = None) -> None:
+        """Drop the cached results of a collection (or all results)."""
+        with self._lock:
+            if collection is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[0] == collection]:
+                del self._entries[key]
+    
+    def snapshot(self) -> Dict[str, int]:
+        """Return the current counter values."""
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+aggregation_cache = AggregationCache()
+
 
 class FirebaseService:
     """
@@ -56,7 +248,16 @@ class FirebaseService:
     def _init_firebase(self):
         """
         Initialize Firebase with admin credentials.
+        
+        With FIREBASE_EMULATOR=memory the in-process Firestore emulator is
+        used instead and no credentials are needed.
         """
+        if FIREBASE_EMULATOR == "memory":
+            from app.services.firestore_emulator import InMemoryFirestore, LatencyModel
+            self.app = None
+            self.db = InMemoryFirestore(latency=LatencyModel.from_config())
+            logger.info("Using the in-memory Firestore emulator")
+            return
         try:
             # Check if Firebase Admin SDK is already initialized
             if not firebase_admin._apps:
@@ -101,12 +302,16 @@ class FirebaseService:
             logger.error("Run: pip install firebase-admin google-cloud-firestore")
             raise
     
-    def verify_auth_token(self, id_token: str) -> Dict[str, Any]:
+    def verify_auth_token(self, id_token: str, check_revoked: bool = False) -> Dict[str, Any]:
         """
         Verify a Firebase authentication token.
         
+        This is blocking (signature check, periodic key fetch); async code
+        should go through app.services.firebase_auth instead.
+        
         Args:
             id_token: Firebase ID token
+            check_revoked: Whether to also ask Firebase if the token was revoked
             
         Returns:
             Dictionary with user claims
@@ -115,7 +320,7 @@ class FirebaseService:
             firebase_admin.auth.InvalidIdTokenError: If the token is invalid
         """
         try:
-            return auth.verify_id_token(id_token)
+            return auth.verify_id_token(id_token, check_revoked=check_revoked)
         except Exception as e:
             logger.error(f"Error verifying auth token: {str(e)}")
             raise
@@ -134,7 +339,7 @@ class FirebaseService:
         try:
             doc_ref = self.db.collection(collection).document(doc_id)
             doc = doc_ref.get()
-            return doc.to_dict() if doc.exists else None
+            return normalize_timestamps(doc.to_dict() or {}) if doc.exists else None
         except Exception as e:
             logger.error(f"Error getting document {collection}/{doc_id}: {str(e)}")
             return None
@@ -152,6 +357,8 @@ class FirebaseService:
         """
         try:
             doc_ref = self.db.collection(collection).add(data)[1]
+            if collection not in TTL_ONLY_AGGREGATION_COLLECTIONS:
+                aggregation_cache.invalidate(collection)
             return doc_ref.id
         except Exception as e:
             logger.error(f"Error adding document to {collection}: {str(e)}")
@@ -173,6 +380,7 @@ class FirebaseService:
         try:
             doc_ref = self.db.collection(collection).document(doc_id)
             doc_ref.set(data, merge=merge)
+            aggregation_cache.invalidate(collection)
             return True
         except Exception as e:
             logger.error(f"Error setting document {collection}/{doc_id}: {str(e)}")
@@ -193,6 +401,7 @@ class FirebaseService:
         try:
             doc_ref = self.db.collection(collection).document(doc_id)
             doc_ref.update(data)
+            aggregation_cache.invalidate(collection)
             return True
         except Exception as e:
             logger.error(f"Error updating document {collection}/{doc_id}: {str(e)}")
@@ -212,13 +421,38 @@ class FirebaseService:
         try:
             doc_ref = self.db.collection(collection).document(doc_id)
             doc_ref.delete()
+            aggregation_cache.invalidate(collection)
             return True
         except Exception as e:
             logger.error(f"Error deleting document {collection}/{doc_id}: {str(e)}")
             return False
     
+    def _build_query(self, query, filters: Optional[List[Tuple[str, str, Any]]] = None,
+                     order_by: Optional[str] = None, desc: bool = False,
+                     limit: Optional[int] = None, select: Optional[List[str]] = None):
+        """Apply filters, ordering, limit and projection to a collection reference."""
+        # Apply filters
+        for field, op, value in filters or []:
+            query = query.where(field, op, value)
+        
+        # Apply ordering
+        if order_by:
+            direction = firestore.Query.DESCENDING if desc else firestore.Query.ASCENDING
+            query = query.order_by(order_by, direction=direction)
+        
+        # Apply limit
+        if limit is not None:
+            query = query.limit(limit)
+        
+        # Only transfer the listed fields
+        if select is not None:
+            query = query.select(select)
+        
+        return query
+    
     def query_collection(self, collection: str, filters: List[Tuple[str, str, Any]], order_by: Optional[str] = None, 
-                        desc: bool = False, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+                        desc: bool = False, limit: Optional[int] = None,
+                        select: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
         Query a collection with filters.
         
@@ -228,26 +462,13 @@ class FirebaseService:
             order_by: Field to order by (optional)
             desc: Whether to order in descending order (default: False)
             limit: Maximum number of results (optional)
+            select: Fields to return (optional, default: whole documents)
             
         Returns:
             List of document dictionaries
         """
         try:
-            # Start with collection reference
-            query = self.db.collection(collection)
-            
-            # Apply filters
-            for field, op, value in filters:
-                query = query.where(field, op, value)
-            
-            # Apply ordering
-            if order_by:
-                direction = firestore.Query.DESCENDING if desc else firestore.Query.ASCENDING
-                query = query.order_by(order_by, direction=direction)
-            
-            # Apply limit
-            if limit is not None:
-                query = query.limit(limit)
+            query = self._build_query(self.db.collection(collection), filters, order_by, desc, limit, select)
             
             # Execute query
             docs = query.stream()
@@ -256,10 +477,286 @@ class FirebaseService:
             logger.error(f"Error querying collection {collection}: {str(e)}")
             return []
     
+    def stream_collection(self, collection: str, filters: Optional[List[Tuple[str, str, Any]]] = None,
+                          order_by: Optional[str] = None, desc: bool = False,
+                          limit: Optional[int] = None, select: Optional[List[str]] = None,
+                          page_size: Optional[int] = None,
+                          start_after: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the documents of a query one at a time instead of building a list.
+        
+        With page_size, the query is read in pages that resume after the last
+        document of the previous page, so no single server stream has to stay
+        open for the whole collection.
+        
+        start_after is a cursor: the id of the last document a previous call
+        returned. That document is read once to position the query.
+        
+        Args:
+            collection: Collection name
+            filters: List of filter tuples (field, operator, value) (optional)
+            order_by: Field to order by (optional)
+            desc: Whether to order in descending order (default: False)
+            limit: Maximum number of results (optional)
+            select: Fields to return (optional, default: whole documents)
+            page_size: Documents per page (optional, default: one stream)
+            start_after: Document id to resume after (optional)
+            
+        Yields:
+            Document dictionaries
+            
+        Raises:
+            Any Firestore error, also after documents were yielded, so a
+            failed read is never mistaken for the end of the results
+        """
+        if page_size and select is not None and order_by:
+            # Resuming after a document needs its order_by value
+            select = list(dict.fromkeys(list(select) + [order_by]))
+        try:
+            query = self._build_query(self.db.collection(collection), filters, order_by, desc, None, select)
+            last = None
+            if start_after is not None:
+                last = self.db.collection(collection).document(start_after).get()
+                if not last.exists:
+                    logger.warning(f"Cursor document {collection}/{start_after} not found")
+                    return
+                query = query.start_after(last)
+            if not page_size:
+                if limit is not None:
+                    query = query.limit(limit)
+                for doc in query.stream():
+                    yield self._doc_to_dict(doc)
+                return
+            
+            remaining = limit
+            while remaining is None or remaining > 0:
+                size = page_size if remaining is None else min(page_size, remaining)
+                page = query.limit(size)
+                if last is not None:
+                    page = page.start_after(last)
+                count = 0
+                for doc in page.stream():
+                    count += 1
+                    last = doc
+                    yield self._doc_to_dict(doc)
+                if remaining is not None:
+                    remaining -= count
+                if count < size:
+                    return
+        except Exception as e:
+            logger.error(f"Error streaming collection {collection}: {str(e)}")
+            raise
+    
+    def _aggregate(self, collection: str, kind: str, field: Optional[str] = None,
+                   filters: Optional[List[Tuple[str, str, Any]]] = None,
+                   limit: Optional[int] = None, use_cache: bool = True) -> Any:
+        """
+        Run a count, sum or avg aggregation on the server.
+        
+        Only the aggregate value is transferred; Firestore bills one read per
+        batch of up to 1000 index entries scanned instead of one per document.
+        
+        Returns:
+            The aggregate value, or None if the query failed
+        """
+        key = (collection, kind, field, repr(filters or []), limit)
+        if use_cache:
+            found, value = aggregation_cache.get(key)
+            if found:
+                return value
+        
+        try:
+            query = self._build_query(self.db.collection(collection), filters, limit=limit)
+            if kind == 'count':
+                aggregation = query.count(alias=kind)
+            elif kind == 'sum':
+                aggregation = query.sum(field, alias=kind)
+            elif kind == 'avg':
+                aggregation = query.avg(field, alias=kind)
+            else:
+                raise ValueError(f"Unknown aggregation: {kind}")
+            value = aggregation.get()[0][0].value
+        except Exception as e:
+            logger.error(f"Error aggregating {kind} on collection {collection}: {str(e)}")
+            return None
+        
+        aggregation_cache.set(key, value)
+        return value
+    
+    def count_documents(self, collection: str, filters: Optional[List[Tuple[str, str, Any]]] = None,
+                        limit: Optional[int] = None, use_cache: bool = True) -> int:
+        """
+        Count the documents matching a query without reading them.
+        
+        Args:
+            collection: Collection name
+            filters: List of filter tuples (field, operator, value) (optional)
+            limit: Stop counting at this many documents (optional)
+            use_cache: Whether to reuse a recent result (default: True)
+            
+        Returns:
+            Number of matching documents (0 if the query failed)
+        """
+        return int(self._aggregate(collection, 'count', filters=filters, limit=limit, use_cache=use_cache) or 0)
+    
+    def sum_field(self, collection: str, field: str, filters: Optional[List[Tuple[str, str, Any]]] = None,
+                  use_cache: bool = True) -> float:
+        """
+        Sum a numeric field over the documents matching a query.
+        
+        Args:
+            collection: Collection name
+            field: Numeric field to sum
+            filters: List of filter tuples (field, operator, value) (optional)
+            use_cache: Whether to reuse a recent result (default: True)
+            
+        Returns:
+            Sum of the field (0 if the query failed)
+        """
+        return self._aggregate(collection, 'sum', field, filters, use_cache=use_cache) or 0
+    
+    def avg_field(self, collection: str, field: str, filters: Optional[List[Tuple[str, str, Any]]] = None,
+                  use_cache: bool = True) -> Optional[float]:
+        """
+        Average a numeric field over the documents matching a query.
+        
+        Args:
+            collection: Collection name
+            field: Numeric field to average
+            filters: List of filter tuples (field, operator, value) (optional)
+            use_cache: Whether to reuse a recent result (default: True)
+            
+        Returns:
+            Average of the field, or None if no document has a numeric value
+        """
+        return self._aggregate(collection, 'avg', field, filters, use_cache=use_cache)
+    
+    def document_exists(self, collection: str, filters: List[Tuple[str, str, Any]],
+                        use_cache: bool = True) -> bool:
+        """Check whether any document matches a query, counting at most one."""
+        return self.count_documents(collection, filters, limit=1, use_cache=use_cache) > 0
+    
+    def count_by_array_values(self, collection: str, field: str, values: List[Any],
+                              filters: Optional[List[Tuple[str, str, Any]]] = None,
+                              use_cache: bool = True) -> Dict[Any, int]:
+        """
+        Count the documents whose array field holds each value.
+        
+        Firestore runs one aggregation per filter, so the counts are issued
+        concurrently (up to COUNT_CONCURRENCY at a time).
+        
+        Args:
+            collection: Collection name
+            field: Array field to match (e.g. 'topicIds')
+            values: Values to count
+            filters: Additional filter tuples (optional)
+            use_cache: Whether to reuse recent results (default: True)
+            
+        Returns:
+            Dict mapping each value to its document count
+        """
+        values = list(dict.fromkeys(values))
+        if not values:
+            return {}
+        
+        def count(value: Any) -> int:
+            return self.count_documents(
+                collection, list(filters or []) + [(field, 'array_contains', value)], use_cache=use_cache
+            )
+        
+        if len(values) == 1:
+            return {values[0]: count(values[0])}
+        with ThreadPoolExecutor(max_workers=min(len(values), COUNT_CONCURRENCY)) as executor:
+            return dict(zip(values, executor.map(count, values)))
+    
+    def query_grouped_by_array_values(self, collection: str, field: str, values: List[Any],
+                                      per_value_limit: int, filters: Optional[List[Tuple[str, str, Any]]] = None,
+                                      order_by: Optional[str] = None, desc: bool = False,
+                                      select: Optional[List[str]] = None) -> Dict[Any, List[Dict[str, Any]]]:
+        """
+        Fetch the top documents for several array values with array_contains_any.
+        
+        Issues one query per ARRAY_CONTAINS_ANY_LIMIT values (usually a single
+        query) instead of one array_contains query per value, then groups the
+        results client-side. Each query is limited to per_value_limit
+        documents per value it covers, so one busy value can fill a query;
+        when a query hits its limit, the values it left with fewer than
+        per_value_limit documents are re-queried one by one.
+        
+        Args:
+            collection: Collection name
+            field: Array field to match (e.g. 'topicIds')
+            values: Values to match
+            per_value_limit: Maximum documents kept per value
+            filters: Additional filter tuples (optional)
+            order_by: Field to order by (optional)
+            desc: Whether to order in descending order (default: False)
+            select: Fields to return (optional); field and order_by are
+                always included since grouping and merging need them
+            
+        Returns:
+            Dict mapping each value to its documents
+        """
+        values = list(dict.fromkeys(values))
+        if not values:
+            return {}
+        if select is not None:
+            select = list(dict.fromkeys(list(select) + [f for f in (field, order_by) if f]))
+        
+        docs: Dict[str, Dict[str, Any]] = {}
+        truncated: List[Any] = []
+        queries = reads = 0
+        for start in range(0, len(values), ARRAY_CONTAINS_ANY_LIMIT):
+            chunk = values[start:start + ARRAY_CONTAINS_ANY_LIMIT]
+            results = self.query_collection(
+                collection,
+                filters=list(filters or []) + [(field, 'array_contains_any', chunk)],
+                order_by=order_by,
+                desc=desc,
+                limit=per_value_limit * len(chunk),
+                select=select
+            )
+            queries += 1
+            reads += max(1, len(results))
+            if len(results) >= per_value_limit * len(chunk):
+                truncated.extend(chunk)
+            for doc in results:
+                docs.setdefault(doc.get('id'), doc)
+        
+        ordered = list(docs.values())
+        if queries > 1 and order_by:
+            ordered.sort(key=lambda doc: doc.get(order_by) or 0, reverse=desc)
+        groups = group_by_array_field(ordered, field, values, per_value_limit)
+        
+        # Other values may have crowded these out of a query that hit its limit
+        for value in truncated:
+            if len(groups[value]) < per_value_limit:
+                groups[value] = self.query_collection(
+                    collection,
+                    filters=list(filters or []) + [(field, 'array_contains', value)],
+                    order_by=order_by,
+                    desc=desc,
+                    limit=per_value_limit,
+                    select=select
+                )
+                queries += 1
+                reads += max(1, len(groups[value]))
+        
+        per_value_reads = sum(max(1, len(group)) for group in groups.values())
+        array_query_stats.record(
+            queries=queries,
+            queries_saved=max(0, len(values) - queries),
+            reads=reads,
+            reads_saved=max(0, per_value_reads - reads)
+        )
+        return groups
+    
     def _doc_to_dict(self, doc: DocumentSnapshot) -> Dict[str, Any]:
         """
         Convert a Firestore DocumentSnapshot to a dictionary, adding the ID.
         
+        Timestamp fields are normalized to epoch seconds (see to_epoch).
+        
         Args:
             doc: Firestore DocumentSnapshot
             
@@ -269,6 +766,7 @@ class FirebaseService:
         data = doc.to_dict()
         if data is None:
             data = {}
+        normalize_timestamps(data)
         data['id'] = doc.id
         return data
     
@@ -276,7 +774,8 @@ class FirebaseService:
                           filters: List[Tuple[str, str, Any]] = None, 
                           order_by: Optional[str] = None,
                           desc: bool = False,
-                          limit: Optional[int] = None) -> List[Dict[str, Any]]:
+                          limit: Optional[int] = None,
+                          select: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
         Query a subcollection.
         
@@ -288,6 +787,7 @@ class FirebaseService:
             order_by: Field to order by (optional)
             desc: Whether to order in descending order (default: False)
             limit: Maximum number of results (optional)
+            select: Fields to return (optional, default: whole documents)
             
         Returns:
             List of document dictionaries
@@ -295,20 +795,7 @@ class FirebaseService:
         try:
             # Start with subcollection reference
             query = self.db.collection(parent_collection).document(parent_id).collection(sub_collection)
-            
-            # Apply filters
-            if filters:
-                for field, op, value in filters:
-                    query = query.where(field, op, value)
-            
-            # Apply ordering
-            if order_by:
-                direction = firestore.Query.DESCENDING if desc else firestore.Query.ASCENDING
-                query = query.order_by(order_by, direction=direction)
-            
-            # Apply limit
-            if limit is not None:
-                query = query.limit(limit)
+            query = self._build_query(query, filters, order_by, desc, limit, select)
             
             # Execute query
             docs = query.stream()
@@ -365,13 +852,15 @@ class FirebaseService:
         """
         return self.get_document(COLLECTIONS['conversations'], conversation_id)
     
-    def get_user_conversations(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+    def get_user_conversations(self, user_id: str, limit: int = 10,
+                               fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
         Get conversations for a user.
         
         Args:
             user_id: User ID
             limit: Maximum number of conversations to return
+            fields: Fields to return (optional, default: whole documents)
             
         Returns:
             List of conversation dictionaries
@@ -381,10 +870,12 @@ class FirebaseService:
             filters=[('userId', '==', user_id)],
             order_by='updatedAt',
             desc=True,
-            limit=limit
+            limit=limit,
+            select=fields
         )
     
-    def get_conversation_messages(self, conversation_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+    def get_conversation_messages(self, conversation_id: str, limit: int = 50,
+                                  fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
         Get messages for a conversation.
         
@@ -394,6 +885,7 @@ class FirebaseService:
         Args:
             conversation_id: Conversation ID (not used in filtering since messages don't have conversationId)
             limit: Maximum number of messages to return
+            fields: Fields to return (optional, default: whole documents)
             
         Returns:
             List of message dictionaries
@@ -405,21 +897,26 @@ class FirebaseService:
                 filters=[],  # No conversationId filtering available
                 order_by='timestamp',
                 desc=True,
-                limit=limit
+                limit=limit,
+                select=fields
             )
         except Exception as e:
             logger.error(f"Error getting messages: {str(e)}")
             return []
     
-    def add_message(self, conversation_id: str, message_data: Dict[str, Any]) -> Optional[str]:
+    def add_message(self, conversation_id: str, message_data: Dict[str, Any], user_id: Optional[str] = None) -> Optional[str]:
         """
         Add a message to the messages collection.
         
         Based on your Firestore structure, messages are independent documents.
+        They carry conversationId (and userId when known) so conversation
+        deletes and per-user exports can find them.
         
         Args:
-            conversation_id: Conversation ID (for reference, but not stored in message)
+            conversation_id: Conversation ID, stored as conversationId
             message_data: Message data (should contain 'user' field with message content)
+            user_id: Owner of the message; when given, it is stored as userId
+                and the message is added to the user's search index
             
         Returns:
             New message ID if successful, None otherwise
@@ -427,11 +924,26 @@ class FirebaseService:
         # Ensure timestamp is set
         if 'timestamp' not in message_data:
             message_data['timestamp'] = firestore.SERVER_TIMESTAMP
+        message_data.setdefault('conversationId', conversation_id)
+        if user_id:
+            message_data.setdefault('userId', user_id)
         
         # Add directly to messages collection (not as subcollection)
-        return self.add_document('messages', message_data)
+        message_id = self.add_document('messages', message_data)
+        
+        if message_id and user_id:
+            timestamp = message_data['timestamp']
+            timestamp = to_epoch(timestamp) if isinstance(timestamp, (datetime, Timestamp)) else time.time()
+            try:
+                get_message_search_index().add_message(
+                    user_id, message_id, message_data.get('user') or message_data.get('content'), timestamp
+                )
+            except Exception as e:
+                logger.error(f"Error indexing message {message_id}: {str(e)}")
+        
+        return message_id
     
-    def get_user_facts(self, user_id: str) -> List[Dict[str, Any]]:
+    def get_user_facts(self, user_id: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
         Get facts for a user.
         
@@ -442,6 +954,7 @@ class FirebaseService:
         
         Args:
             user_id: User ID (e.g., "Sencere")
+            fields: Fields to return (optional, default: whole documents)
             
         Returns:
             List of fact dictionaries
@@ -454,7 +967,8 @@ class FirebaseService:
                 'userFacts',
                 filters=[],  # No userId filter since it's not visible in your structure
                 order_by='timestamp',
-                desc=True
+                desc=True,
+                select=fields
             )
         except Exception as e:
             logger.error(f"Error getting user facts: {str(e)}")
@@ -476,17 +990,90 @@ class FirebaseService:
         
         return self.add_document(COLLECTIONS['user_facts'], fact_data)
     
-    def get_user_topics(self, user_id: str) -> List[Dict[str, Any]]:
+    def get_user_topics(self, user_id: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
         Get topics for a user.
         
         Args:
             user_id: User ID
+            fields: Fields to return (optional, default: whole documents)
             
         Returns:
             List of topic dictionaries
         """
         return self.query_collection(
             COLLECTIONS['topics'],
-            filters=[('userId', '==', user_id)]
+            filters=[('userId', '==', user_id)],
+            select=fields
+        )
+    
+    def stream_user_facts(self, user_id: str, limit: Optional[int] = None, start_after: Optional[str] = None,
+                          fields: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield a user's facts lazily, newest first (see get_user_facts).
+        
+        Args:
+            user_id: User ID
+            limit: Maximum number of facts (optional)
+            start_after: Id of the last fact of the previous page (optional)
+            fields: Fields to return (optional, default: whole documents)
+            
+        Yields:
+            Fact dictionaries
+        """
+        return self.stream_collection(
+            'userFacts',
+            filters=[],  # Same as get_user_facts
+            order_by='timestamp',
+            desc=True,
+            limit=limit,
+            select=fields,
+            start_after=start_after
+        )
+    
+    def stream_user_topics(self, user_id: str, limit: Optional[int] = None, start_after: Optional[str] = None,
+                           fields: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield a user's topics lazily, in document id order.
+        
+        Args:
+            user_id: User ID
+            limit: Maximum number of topics (optional)
+            start_after: Id of the last topic of the previous page (optional)
+            fields: Fields to return (optional, default: whole documents)
+            
+        Yields:
+            Topic dictionaries
+        """
+        return self.stream_collection(
+            COLLECTIONS['topics'],
+            filters=[('userId', '==', user_id)],
+            limit=limit,
+            select=fields,
+            start_after=start_after
+        )
+    
+    def stream_conversation_messages(self, conversation_id: str, limit: Optional[int] = None,
+                                     start_after: Optional[str] = None,
+                                     fields: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield messages lazily, newest first (see get_conversation_messages).
+        
+        Args:
+            conversation_id: Conversation ID (not used in filtering, as in get_conversation_messages)
+            limit: Maximum number of messages (optional)
+            start_after: Id of the last message of the previous page (optional)
+            fields: Fields to return (optional, default: whole documents)
+            
+        Yields:
+            Message dictionaries
+        """
+        return self.stream_collection(
+            'messages',
+            filters=[],  # No conversationId filtering available
+            order_by='timestamp',
+            desc=True,
+            limit=limit,
+            select=fields,
+            start_after=start_after
         )
\ No newline at end of file
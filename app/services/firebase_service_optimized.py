@@ -27,7 +27,7 @@ except ImportError as e:
     raise
 
 from app.core.firebase_config import FIREBASE_CONFIG, COLLECTIONS
-from app.services.firebase_service import FirebaseService
+from app.services.firebase_service import ARRAY_CONTAINS_ANY_LIMIT, MESSAGE_FIELDS, FirebaseService
 from app.core.config import logger
 
 class OptimizedFirebaseService(FirebaseService):
@@ -83,7 +83,7 @@ class OptimizedFirebaseService(FirebaseService):
                 del self._cache[key]
             logger.info(f"Cleared {len(keys_to_remove)} cache entries matching pattern: {pattern}")
     
-    def get_user_facts(self, user_id: str) -> List[Dict[str, Any]]:
+    def get_user_facts(self, user_id: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
         Get facts for a user with caching and proper filtering.
         
@@ -91,8 +91,9 @@ class OptimizedFirebaseService(FirebaseService):
         - Cache results for 5 minutes
         - Filter by userId at Firestore level (when field exists)
         - Order by timestamp for consistency
+        - Only transfer the requested fields
         """
-        cache_key = self._get_cache_key('userFacts', 'get', user_id)
+        cache_key = self._get_cache_key('userFacts', 'get', f"{user_id}:{','.join(fields or ['*'])}")
         
         # Check cache first
         cached_data = self._get_from_cache(cache_key)
@@ -116,7 +117,8 @@ class OptimizedFirebaseService(FirebaseService):
                     'userFacts',
                     filters=[('userId', '==', user_id)],
                     order_by='timestamp',
-                    desc=True
+                    desc=True,
+                    select=fields
                 )
                 
                 # If no results and userId might not exist on documents,
@@ -127,7 +129,8 @@ class OptimizedFirebaseService(FirebaseService):
                         'userFacts',
                         filters=[],
                         order_by='timestamp',
-                        desc=True
+                        desc=True,
+                        select=fields
                     )
                     
                     # Filter in memory as fallback
@@ -141,7 +144,8 @@ class OptimizedFirebaseService(FirebaseService):
                     'userFacts',
                     filters=[],
                     order_by='timestamp',
-                    desc=True
+                    desc=True,
+                    select=fields
                 )
             
             # Cache the results
@@ -318,7 +322,7 @@ class OptimizedFirebaseService(FirebaseService):
         Query messages that contain any of the specified topics.
         
         Optimizations:
-        - Use array-contains-any for efficient topic queries
+        - Use array_contains_any for efficient topic queries
         - Cache results by topic combination
         """
         if not topic_ids:
@@ -333,41 +337,52 @@ class OptimizedFirebaseService(FirebaseService):
         if cached_data is not None:
             return cached_data
         
-        try:
-            # Firestore supports array-contains-any for up to 10 values
-            if len(topic_ids) <= 10:
-                messages = self.db.collection('messages')\
-                    .where('topicIds', 'array-contains-any', topic_ids)\
-                    .order_by('timestamp', direction=firestore.Query.DESCENDING)\
-                    .limit(limit)\
-                    .stream()
-                
-                results = [self._doc_to_dict(doc) for doc in messages]
-            else:
-                # For more than 10 topics, batch the queries
-                all_results = []
-                for i in range(0, len(topic_ids), 10):
-                    batch_topics = topic_ids[i:i+10]
-                    messages = self.db.collection('messages')\
-                        .where('topicIds', 'array-contains-any', batch_topics)\
-                        .order_by('timestamp', direction=firestore.Query.DESCENDING)\
-                        .limit(limit)\
-                        .stream()
-                    
-                    all_results.extend([self._doc_to_dict(doc) for doc in messages])
-                
-                # Sort and limit combined results
-                all_results.sort(key=lambda x: x.get('timestamp', 0), reverse=True)
-                results = all_results[:limit]
-            
-            # Cache results
-            self._set_cache(cache_key, results)
-            
-            return results
-            
-        except Exception as e:
-            logger.error(f"Error querying messages by topics: {str(e)}")
-            return []
+        # Firestore supports array_contains_any for up to 10 values, so batch larger sets
+        all_results = {}
+        for i in range(0, len(topic_ids), ARRAY_CONTAINS_ANY_LIMIT):
+            batch_topics = topic_ids[i:i + ARRAY_CONTAINS_ANY_LIMIT]
+            for doc in self.query_collection(
+                'messages',
+                filters=[('topicIds', 'array_contains_any', batch_topics)],
+                order_by='timestamp',
+                desc=True,
+                limit=limit
+            ):
+                all_results.setdefault(doc.get('id'), doc)
+        
+        # Sort and limit combined results
+        results = sorted(all_results.values(), key=lambda x: x.get('timestamp') or 0, reverse=True)[:limit]
+        
+        # Cache results
+        self._set_cache(cache_key, results)
+        
+        return results
+    
+    def query_messages_grouped_by_topics(self, topic_ids: List[str], user_id: str,
+                                         per_topic_limit: int = 3) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get the most recent messages of each topic.
+        
+        Optimizations:
+        - One array_contains_any query per 10 topics instead of one query per topic
+        - Results grouped client-side, top per_topic_limit kept per topic
+        - Cache results by topic combination
+        """
+        if not topic_ids:
+            return {}
+        
+        cache_key = self._get_cache_key('messages', 'topics_grouped',
+                                       f"{user_id}:{','.join(sorted(topic_ids))}:{per_topic_limit}")
+        cached_data = self._get_from_cache(cache_key)
+        if cached_data is not None:
+            return cached_data
+        
+        groups = self.query_grouped_by_array_values(
+            'messages', 'topicIds', topic_ids, per_topic_limit,
+            order_by='timestamp', desc=True, select=MESSAGE_FIELDS
+        )
+        self._set_cache(cache_key, groups)
+        return groups
     
     def get_recent_messages_optimized(self, user_id: str, max_age_days: int = 30, 
                                     limit: int = 50) -> List[Dict[str, Any]]:
@@ -411,7 +426,8 @@ class OptimizedFirebaseService(FirebaseService):
                     .where('conversationId', 'in', batch_ids)\
                     .where('timestamp', '>', cutoff)\
                     .order_by('timestamp', direction=firestore.Query.DESCENDING)\
-                    .limit(limit)
+                    .limit(limit)\
+                    .select(MESSAGE_FIELDS + ['conversationId'])
                 
                 messages = query.stream()
                 all_messages.extend([self._doc_to_dict(doc) for doc in messages])
@@ -429,7 +445,8 @@ class OptimizedFirebaseService(FirebaseService):
                             ],
                             order_by='timestamp',
                             desc=True,
-                            limit=10
+                            limit=10,
+                            select=MESSAGE_FIELDS + ['conversationId']
                         )
                         all_messages.extend(messages)
                     except:
@@ -437,7 +454,7 @@ class OptimizedFirebaseService(FirebaseService):
                         continue
         
         # Sort all messages by timestamp and limit
-        all_messages.sort(key=lambda x: x.get('timestamp', 0), reverse=True)
+        all_messages.sort(key=lambda x: x.get('timestamp') or 0, reverse=True)
         results = all_messages[:limit]
         
         # Cache results
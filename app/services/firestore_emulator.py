@@ -0,0 +1,1120 @@
+"""
+firestore_emulator.py - In-process Firestore client with secondary indexes and a latency model
+
+InMemoryFirestore implements the part of the google-cloud-firestore client
+API this codebase uses (collections, documents, queries, cursors, batched
+writes and count/sum/avg aggregations), so FirebaseService and everything
+built on it runs unchanged against it. Set FIREBASE_EMULATOR=memory to make
+FirebaseService use it, or build a service with create_emulated_firebase_service.
+
+Query semantics follow Firestore:
+
+- Values order by type first (null < bool < number < timestamp < string <
+  bytes < reference < geopoint < array < map); range filters only match values
+  of the operand's type; ints and floats compare as numbers.
+- order_by drops documents that lack the field; ties (and queries without
+  order_by) are ordered by document id, in the direction of the last order_by.
+  An inequality filter without order_by orders by that field.
+- != and not_in skip missing and null fields; in, not_in and
+  array_contains_any take at most DISJUNCTION_LIMIT values; a query holds at
+  most one array_contains/array_contains_any.
+- Cursors (start_at/start_after/end_at/end_before) accept snapshots or
+  {field: value} dicts over the order_by fields.
+
+Indexes are built the first time a query needs them and kept up to date on
+every write afterwards:
+
+- equality: field value -> document ids, for ==, in and (per element)
+  array_contains/array_contains_any
+- ordered: sorted (== field values, order field value, id) entries, like
+  Firestore's composite indexes. The == filters of a query select one run of
+  entries, which is walked from the cursor or range bound and stopped at the
+  limit, so "newest N for a user" touches about N entries.
+
+Other indexed filters are probed during the walk (the most selective one is
+materialized when the query is not walked). Queries with several order_by
+fields or directions sort their candidates. load() bulk-inserts documents and
+drops the indexes, which are rebuilt on the next query.
+
+LatencyModel adds a configurable delay per RPC (base + per document +
+exponential jitter) and injects errors at a given rate; EmulatorStats counts
+RPCs, document reads/writes, index use and scanned documents.
+"""
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import cmp_to_key
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import random
+import threading
+import time
+import uuid
+
+from google.api_core import exceptions as api_exceptions
+from google.cloud.firestore_v1 import transforms
+
+# Values allowed in one in / not_in / array_contains_any filter
+DISJUNCTION_LIMIT = 30
+
+# Operations allowed in one batched write
+BATCH_LIMIT = 500
+
+# Index entries Firestore bills as one read in an aggregation
+AGGREGATION_ENTRIES_PER_READ = 1000
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+
+_MISSING = object()
+_MAX_ID = "\U0010ffff"  # Sorts after every document id
+_TOP = (99,)  # Sorts after every value key
+_SCALARS = frozenset((str, int, float, bool, type(None), bytes))
+
+EQUALITY_OPS = ("==", "in")
+ARRAY_OPS = ("array_contains", "array_contains_any")
+RANGE_OPS = ("<", "<=", ">", ">=")
+INEQUALITY_OPS = RANGE_OPS + ("!=", "not_in")
+
+
+# --- Values ----------------------------------------------------------------
+
+def value_key(value: Any) -> Tuple:
+    """Sort/equality key of a field value in Firestore's cross-type order."""
+    if value is None:
+        return (0,)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return (3, value.timestamp())
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, bytes):
+        return (5, value)
+    if hasattr(value, "path") and hasattr(value, "collection"):  # DocumentReference
+        return (6, value.path)
+    if hasattr(value, "latitude") and hasattr(value, "longitude"):  # GeoPoint
+        return (7, (value.latitude, value.longitude))
+    if isinstance(value, (list, tuple)):
+        return (8, tuple(value_key(v) for v in value))
+    if isinstance(value, dict):
+        return (9, tuple(sorted((k, value_key(v)) for k, v in value.items())))
+    raise TypeError(f"Unsupported Firestore value: {type(value).__name__}")
+
+
+def _copy(value: Any) -> Any:
+    """Copy the containers of a document value (leaves are immutable)."""
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def get_field(data: Dict[str, Any], path: str) -> Any:
+    """Value at a dotted field path, or _MISSING."""
+    value: Any = data
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _set_field(data: Dict[str, Any], path: str, value: Any) -> None:
+    parts = path.split(".")
+    for part in parts[:-1]:
+        child = data.get(part)
+        if not isinstance(child, dict):
+            child = data[part] = {}
+        data = child
+    data[parts[-1]] = value
+
+
+def _delete_field(data: Dict[str, Any], path: str) -> None:
+    parts = path.split(".")
+    for part in parts[:-1]:
+        data = data.get(part)
+        if not isinstance(data, dict):
+            return
+    data.pop(parts[-1], None)
+
+
+def _apply_transform(current: Any, value: Any, now: datetime) -> Any:
+    """Resolve SERVER_TIMESTAMP, Increment, ArrayUnion and ArrayRemove."""
+    if type(value) in _SCALARS:
+        return value
+    if value is transforms.SERVER_TIMESTAMP:
+        return now
+    if isinstance(value, transforms.Increment):
+        base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+        return base + value.value
+    if isinstance(value, transforms.ArrayUnion):
+        result = list(current) if isinstance(current, list) else []
+        keys = {value_key(v) for v in result}
+        for v in value.values:
+            if value_key(v) not in keys:
+                result.append(v)
+                keys.add(value_key(v))
+        return result
+    if isinstance(value, transforms.ArrayRemove):
+        remove = {value_key(v) for v in value.values}
+        return [v for v in current if value_key(v) not in remove] if isinstance(current, list) else []
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)  # Firestore stores naive datetimes as UTC
+    if isinstance(value, dict):
+        return {k: _apply_transform(None, v, now) for k, v in value.items() if v is not transforms.DELETE_FIELD}
+    if isinstance(value, list):
+        return [_apply_transform(None, v, now) for v in value]
+    return value
+
+
+def _write_fields(target: Dict[str, Any], updates: Dict[str, Any], now: datetime,
+                  dotted: bool = False, merge: bool = False) -> None:
+    """
+    Write fields into a document dict.
+
+    dotted treats keys as field paths (update); merge merges nested maps into
+    existing ones instead of replacing them (set with merge=True).
+    """
+    for key, value in updates.items():
+        if dotted:
+            if value is transforms.DELETE_FIELD:
+                _delete_field(target, key)
+            else:
+                current = get_field(target, key)
+                _set_field(target, key, _apply_transform(None if current is _MISSING else current, value, now))
+        elif value is transforms.DELETE_FIELD:
+            target.pop(key, None)
+        elif merge and isinstance(value, dict) and isinstance(target.get(key), dict):
+            _write_fields(target[key], value, now, merge=True)
+        else:
+            target[key] = _apply_transform(target.get(key), value, now)
+
+
+# --- Latency, errors and stats ---------------------------------------------
+
+@dataclass
+class LatencyModel:
+    """
+    Delay and failure model applied to every emulated RPC.
+
+    Each RPC sleeps base_ms + per_doc_ms * documents + jitter, where jitter is
+    exponentially distributed with mean jitter_ms (a long tail, like real
+    network latency). With probability error_rate the RPC raises one of errors
+    instead of running.
+    """
+    base_ms: float = 0.0
+    per_doc_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    errors: Tuple[type, ...] = (api_exceptions.ServiceUnavailable, api_exceptions.DeadlineExceeded)
+    seed: Optional[int] = None
+    _random: random.Random = field(default=None, init=False, repr=False)
+
+    def __post_init__(self):
+        self._random = random.Random(self.seed)
+
+    @classmethod
+    def from_config(cls) -> "LatencyModel":
+        """Build from the FIREBASE_EMULATOR_* settings in app.core.config."""
+        from app.core import config
+
+        return cls(
+            base_ms=config.FIREBASE_EMULATOR_BASE_MS,
+            per_doc_ms=config.FIREBASE_EMULATOR_PER_DOC_MS,
+            jitter_ms=config.FIREBASE_EMULATOR_JITTER_MS,
+            error_rate=config.FIREBASE_EMULATOR_ERROR_RATE,
+            seed=config.FIREBASE_EMULATOR_SEED,
+        )
+
+    def delay(self, documents: int = 0) -> float:
+        """Seconds one RPC returning this many documents takes."""
+        ms = self.base_ms + self.per_doc_ms * documents
+        if self.jitter_ms > 0:
+            ms += self._random.expovariate(1.0 / self.jitter_ms)
+        return ms / 1000.0
+
+    def error(self) -> Optional[Exception]:
+        """The error to raise for the next RPC, if any."""
+        if self.error_rate > 0 and self._random.random() < self.error_rate:
+            return self._random.choice(self.errors)("Injected by the Firestore emulator")
+        return None
+
+
+class EmulatorStats:
+    """Counters for one emulated Firestore client."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rpcs = 0
+        self.reads = 0
+        self.writes = 0
+        self.errors = 0
+        self.index_lookups = 0  # Equality/array filters answered from an index
+        self.ordered_walks = 0  # Queries served by walking an ordered index
+        self.sorts = 0  # Queries that sorted their candidates
+        self.scanned = 0  # Documents examined by queries
+        self.latency_seconds = 0.0
+
+    def add(self, **counts) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the current counter values."""
+        with self._lock:
+            return {
+                "rpcs": self.rpcs,
+                "reads": self.reads,
+                "writes": self.writes,
+                "errors": self.errors,
+                "index_lookups": self.index_lookups,
+                "ordered_walks": self.ordered_walks,
+                "sorts": self.sorts,
+                "scanned": self.scanned,
+                "latency_seconds": round(self.latency_seconds, 6),
+            }
+
+
+# --- Storage and indexes ---------------------------------------------------
+
+OrderedKey = Tuple[Tuple[str, ...], str]  # (equality field paths, order field path)
+
+
+def _ordered_entry(doc_id: str, data: Dict[str, Any], index: OrderedKey) -> Optional[Tuple]:
+    """(equality keys, order key, id) entry of an ordered index, or None if a field is missing."""
+    prefix = []
+    for path in index[0]:
+        value = get_field(data, path)
+        if value is _MISSING:
+            return None
+        prefix.append(value_key(value))
+    value = get_field(data, index[1])
+    if value is _MISSING:
+        return None
+    return (tuple(prefix), value_key(value), doc_id)
+
+
+def _element_keys(value: Any) -> Set[Tuple]:
+    return {value_key(v) for v in value} if isinstance(value, list) else set()
+
+
+class _Collection:
+    """
+    Documents of one collection path with lazily built secondary indexes.
+
+    Ordered indexes are keyed by (equality fields, order field): entries sort
+    by the equality field values first, so documents matching a set of ==
+    filters form one contiguous run ordered by the order field (Firestore's
+    composite indexes). An index without equality fields is a single-field
+    index.
+    """
+
+    def __init__(self):
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.times: Dict[str, Tuple[datetime, datetime]] = {}  # id -> (create_time, update_time)
+        self.ids: List[str] = []  # Sorted document ids
+        self.equality: Dict[str, Dict[Tuple, Set[str]]] = {}
+        self.arrays: Dict[str, Dict[Tuple, Set[str]]] = {}
+        self.ordered: Dict[OrderedKey, List[Tuple]] = {}
+
+    # Index maintenance
+
+    def _reindex(self, doc_id: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        """Move a document's index entries from its old to its new data (None: absent)."""
+        for path, index in self.equality.items():
+            before = get_field(old, path) if old is not None else _MISSING
+            after = get_field(new, path) if new is not None else _MISSING
+            before = None if before is _MISSING else value_key(before)
+            after = None if after is _MISSING else value_key(after)
+            if before != after:
+                if before is not None:
+                    _discard(index, before, doc_id)
+                if after is not None:
+                    index.setdefault(after, set()).add(doc_id)
+        for path, index in self.arrays.items():
+            before = _element_keys(get_field(old, path)) if old is not None else set()
+            after = _element_keys(get_field(new, path)) if new is not None else set()
+            for key in before - after:
+                _discard(index, key, doc_id)
+            for key in after - before:
+                index.setdefault(key, set()).add(doc_id)
+        for key, entries in self.ordered.items():
+            before = _ordered_entry(doc_id, old, key) if old is not None else None
+            after = _ordered_entry(doc_id, new, key) if new is not None else None
+            if before == after:
+                continue
+            if before is not None:
+                i = bisect_left(entries, before)
+                if i < len(entries) and entries[i] == before:
+                    del entries[i]
+            if after is not None:
+                insort(entries, after)
+
+    def put(self, doc_id: str, data: Dict[str, Any], now: datetime) -> None:
+        old = self.docs.get(doc_id)
+        if old is not None:
+            self.times[doc_id] = (self.times[doc_id][0], now)
+        else:
+            insort(self.ids, doc_id)
+            self.times[doc_id] = (now, now)
+        self.docs[doc_id] = data
+        self._reindex(doc_id, old, data)
+
+    def remove(self, doc_id: str) -> bool:
+        old = self.docs.pop(doc_id, None)
+        if old is None:
+            return False
+        self._reindex(doc_id, old, None)
+        del self.times[doc_id]
+        del self.ids[bisect_left(self.ids, doc_id)]
+        return True
+
+    def load(self, docs: Dict[str, Dict[str, Any]], now: datetime) -> None:
+        """Bulk insert; indexes are dropped and rebuilt on demand."""
+        for doc_id, data in docs.items():
+            if doc_id not in self.docs:
+                self.times[doc_id] = (now, now)
+            self.docs[doc_id] = data
+        self.ids = sorted(self.docs)
+        self.equality.clear()
+        self.arrays.clear()
+        self.ordered.clear()
+
+    # Index access (built on first use)
+
+    def equality_index(self, path: str) -> Dict[Tuple, Set[str]]:
+        index = self.equality.get(path)
+        if index is None:
+            index = self.equality[path] = {}
+            for doc_id, data in self.docs.items():
+                value = get_field(data, path)
+                if value is not _MISSING:
+                    index.setdefault(value_key(value), set()).add(doc_id)
+        return index
+
+    def array_index(self, path: str) -> Dict[Tuple, Set[str]]:
+        index = self.arrays.get(path)
+        if index is None:
+            index = self.arrays[path] = {}
+            for doc_id, data in self.docs.items():
+                for key in _element_keys(get_field(data, path)):
+                    index.setdefault(key, set()).add(doc_id)
+        return index
+
+    def ordered_index(self, equality_paths: Tuple[str, ...], path: str) -> List[Tuple]:
+        key = (equality_paths, path)
+        entries = self.ordered.get(key)
+        if entries is None:
+            entries = [_ordered_entry(doc_id, data, key) for doc_id, data in self.docs.items()]
+            entries = self.ordered[key] = sorted(e for e in entries if e is not None)
+        return entries
+
+
+def _discard(index: Dict[Tuple, Set[str]], key: Tuple, doc_id: str) -> None:
+    ids = index.get(key)
+    if ids is not None:
+        ids.discard(doc_id)
+        if not ids:
+            del index[key]
+
+
+# --- Snapshots and references ----------------------------------------------
+
+class AggregationResult:
+    def __init__(self, alias: str, value: Any):
+        self.alias = alias
+        self.value = value
+
+
+class EmulatedSnapshot:
+    """DocumentSnapshot stand-in holding a private copy of the document."""
+
+    def __init__(self, reference: "EmulatedDocumentReference", data: Optional[Dict[str, Any]],
+                 times: Optional[Tuple[datetime, datetime]] = None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.create_time, self.update_time = times or (None, None)
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return _copy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        value = get_field(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return _copy(value)
+
+
+class EmulatedDocumentReference:
+    def __init__(self, client: "InMemoryFirestore", collection_path: str, doc_id: str):
+        self._client = client
+        self._collection_path = collection_path
+        self.id = doc_id
+        self.path = f"{collection_path}/{doc_id}"
+
+    @property
+    def parent(self) -> "EmulatedQuery":
+        return self._client.collection(self._collection_path)
+
+    def collection(self, name: str) -> "EmulatedQuery":
+        return self._client.collection(f"{self.path}/{name}")
+
+    def collections(self) -> List["EmulatedQuery"]:
+        return self._client._subcollections(self.path)
+
+    def get(self, field_paths: Optional[List[str]] = None, **kwargs) -> EmulatedSnapshot:
+        return self._client._get(self, field_paths)
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False) -> None:
+        self._client._commit([("set", self, document_data, merge)])
+
+    def create(self, document_data: Dict[str, Any]) -> None:
+        self._client._commit([("create", self, document_data, False)])
+
+    def update(self, field_updates: Dict[str, Any], **kwargs) -> None:
+        self._client._commit([("update", self, field_updates, False)])
+
+    def delete(self, **kwargs) -> None:
+        self._client._commit([("delete", self, None, False)])
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, EmulatedDocumentReference) and other.path == self.path
+
+    def __hash__(self) -> int:
+        return hash(self.path)
+
+
+# --- Queries ---------------------------------------------------------------
+
+@dataclass(frozen=True)
+class _Cursor:
+    values: Tuple  # Keys of the order fields (a prefix is allowed)
+    before: bool  # start_at / end_before: the cursor position itself is excluded from "before"
+
+
+class EmulatedAggregation:
+    def __init__(self, query: "EmulatedQuery", aggregations: List[Tuple[str, Optional[str], str]]):
+        self._query = query
+        self._aggregations = aggregations
+
+    def count(self, alias: Optional[str] = None) -> "EmulatedAggregation":
+        return EmulatedAggregation(self._query, self._aggregations + [("count", None, alias or "field_1")])
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> "EmulatedAggregation":
+        return EmulatedAggregation(self._query, self._aggregations + [("sum", field_ref, alias or "field_1")])
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> "EmulatedAggregation":
+        return EmulatedAggregation(self._query, self._aggregations + [("avg", field_ref, alias or "field_1")])
+
+    def get(self, **kwargs) -> List[List[AggregationResult]]:
+        return [self._query._client._aggregate(self._query, self._aggregations)]
+
+    def stream(self, **kwargs) -> Iterator[List[AggregationResult]]:
+        yield from self.get()
+
+
+class EmulatedQuery:
+    """CollectionReference and Query stand-in; every method returns a new query."""
+
+    def __init__(self, client: "InMemoryFirestore", path: str, filters: Tuple = (), orders: Tuple = (),
+                 limit: Optional[int] = None, offset: int = 0, projection: Optional[Tuple[str, ...]] = None,
+                 start: Optional[Any] = None, end: Optional[Any] = None):
+        self._client = client
+        self._path = path
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._offset = offset
+        self._projection = projection
+        self._start = start  # (cursor value, before) as given; resolved at run time
+        self._end = end
+
+    def _copy(self, **changes) -> "EmulatedQuery":
+        state = dict(filters=self._filters, orders=self._orders, limit=self._limit, offset=self._offset,
+                     projection=self._projection, start=self._start, end=self._end)
+        state.update(changes)
+        return EmulatedQuery(self._client, self._path, **state)
+
+    # CollectionReference API
+
+    @property
+    def id(self) -> str:
+        return self._path.rsplit("/", 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> EmulatedDocumentReference:
+        return EmulatedDocumentReference(self._client, self._path, document_id or uuid.uuid4().hex[:20])
+
+    def add(self, document_data: Dict[str, Any], document_id: Optional[str] = None):
+        reference = self.document(document_id)
+        reference.create(document_data)
+        return self._client._now(), reference
+
+    def list_documents(self) -> List[EmulatedDocumentReference]:
+        return [self.document(doc_id) for doc_id in self._client._collection(self._path).ids]
+
+    # Query API
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None, value: Any = None,
+              *, filter=None) -> "EmulatedQuery":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        op = op_string.replace("-", "_")
+        if op in ("in", "not_in", "array_contains_any"):
+            if not isinstance(value, (list, tuple)) or not value:
+                raise api_exceptions.InvalidArgument(f"'{op}' needs a non-empty list")
+            if len(value) > DISJUNCTION_LIMIT:
+                raise api_exceptions.InvalidArgument(f"'{op}' supports up to {DISJUNCTION_LIMIT} values")
+        elif op not in EQUALITY_OPS + ARRAY_OPS + INEQUALITY_OPS:
+            raise ValueError(f"Unsupported operator: {op_string}")
+        filters = self._filters + ((field_path, op, value),)
+        ops = [f[1] for f in filters]
+        if sum(o in ARRAY_OPS for o in ops) > 1:
+            raise api_exceptions.InvalidArgument("A query can hold only one array_contains/array_contains_any")
+        if "not_in" in ops and ("!=" in ops or "in" in ops or ops.count("not_in") > 1):
+            raise api_exceptions.InvalidArgument("not_in cannot be combined with !=, in or another not_in")
+        return self._copy(filters=filters)
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> "EmulatedQuery":
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int) -> "EmulatedQuery":
+        return self._copy(limit=count)
+
+    def offset(self, num_to_skip: int) -> "EmulatedQuery":
+        return self._copy(offset=num_to_skip)
+
+    def select(self, field_paths: Iterable[str]) -> "EmulatedQuery":
+        return self._copy(projection=tuple(field_paths))
+
+    def start_at(self, document_fields_or_snapshot) -> "EmulatedQuery":
+        return self._copy(start=(document_fields_or_snapshot, True))
+
+    def start_after(self, document_fields_or_snapshot) -> "EmulatedQuery":
+        return self._copy(start=(document_fields_or_snapshot, False))
+
+    def end_before(self, document_fields_or_snapshot) -> "EmulatedQuery":
+        return self._copy(end=(document_fields_or_snapshot, True))
+
+    def end_at(self, document_fields_or_snapshot) -> "EmulatedQuery":
+        return self._copy(end=(document_fields_or_snapshot, False))
+
+    def stream(self, **kwargs) -> Iterator[EmulatedSnapshot]:
+        yield from self._client._run_query(self)
+
+    def get(self, **kwargs) -> List[EmulatedSnapshot]:
+        return list(self.stream())
+
+    def count(self, alias: Optional[str] = None) -> EmulatedAggregation:
+        return EmulatedAggregation(self, []).count(alias)
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> EmulatedAggregation:
+        return EmulatedAggregation(self, []).sum(field_ref, alias)
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> EmulatedAggregation:
+        return EmulatedAggregation(self, []).avg(field_ref, alias)
+
+
+class EmulatedBatch:
+    """WriteBatch stand-in; commit applies every operation or none."""
+
+    def __init__(self, client: "InMemoryFirestore"):
+        self._client = client
+        self._operations: List[Tuple] = []
+
+    def __len__(self) -> int:
+        return len(self._operations)
+
+    def set(self, reference, document_data: Dict[str, Any], merge: bool = False) -> None:
+        self._operations.append(("set", reference, document_data, merge))
+
+    def create(self, reference, document_data: Dict[str, Any]) -> None:
+        self._operations.append(("create", reference, document_data, False))
+
+    def update(self, reference, field_updates: Dict[str, Any], **kwargs) -> None:
+        self._operations.append(("update", reference, field_updates, False))
+
+    def delete(self, reference, **kwargs) -> None:
+        self._operations.append(("delete", reference, None, False))
+
+    def commit(self, **kwargs) -> List[Any]:
+        if len(self._operations) > BATCH_LIMIT:
+            raise api_exceptions.InvalidArgument(f"A batch holds at most {BATCH_LIMIT} writes")
+        # Like WriteBatch, keep the writes when the commit fails so it can be retried
+        self._client._commit(self._operations)
+        self._operations = []
+        return []
+
+
+# --- Client ----------------------------------------------------------------
+
+class InMemoryFirestore:
+    """
+    Firestore client stand-in backed by indexed in-memory collections.
+
+    Args:
+        latency: Delay and error model applied to every RPC (default: none)
+        stats: Counters to update (default: a fresh EmulatorStats)
+        clock: Time source for server timestamps
+    """
+
+    def __init__(self, latency: Optional[LatencyModel] = None, stats: Optional[EmulatorStats] = None,
+                 clock: Callable[[], datetime] = lambda: datetime.now(timezone.utc)):
+        self.latency = latency or LatencyModel()
+        self.stats = stats or EmulatorStats()
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._collections: Dict[str, _Collection] = {}
+
+    # Client API
+
+    def collection(self, *path: str) -> EmulatedQuery:
+        return EmulatedQuery(self, "/".join(path))
+
+    def document(self, *path: str) -> EmulatedDocumentReference:
+        full = "/".join(path)
+        collection_path, _, doc_id = full.rpartition("/")
+        return EmulatedDocumentReference(self, collection_path, doc_id)
+
+    def collections(self) -> List[EmulatedQuery]:
+        with self._lock:
+            return [self.collection(p) for p in sorted(self._collections)
+                    if "/" not in p and self._collections[p].docs]
+
+    def batch(self) -> EmulatedBatch:
+        return EmulatedBatch(self)
+
+    def get_all(self, references: Iterable[EmulatedDocumentReference], field_paths=None, **kwargs):
+        for reference in references:
+            yield reference.get(field_paths)
+
+    def load(self, collection: str, documents: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Bulk-load documents without RPC accounting (for seeding load tests).
+
+        Indexes of the collection are rebuilt on the next query that needs them.
+        """
+        now = self._now()
+        with self._lock:
+            self._collection(collection).load(
+                {doc_id: {k: _apply_transform(None, v, now) for k, v in data.items()}
+                 for doc_id, data in documents.items()}, now
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(c.docs) for c in self._collections.values())
+
+    # Internals
+
+    def _now(self) -> datetime:
+        return self.clock()
+
+    def _collection(self, path: str) -> _Collection:
+        collection = self._collections.get(path)
+        if collection is None:
+            collection = self._collections[path] = _Collection()
+        return collection
+
+    def _subcollections(self, doc_path: str) -> List[EmulatedQuery]:
+        prefix = doc_path + "/"
+        with self._lock:
+            return [self.collection(p) for p in sorted(self._collections)
+                    if p.startswith(prefix) and "/" not in p[len(prefix):] and self._collections[p].docs]
+
+    def _rpc(self, documents: int = 0) -> None:
+        """Apply the latency/error model to one RPC."""
+        error = self.latency.error()
+        seconds = self.latency.delay(documents)
+        if seconds > 0:
+            time.sleep(seconds)
+        self.stats.add(rpcs=1, latency_seconds=seconds, errors=1 if error else 0)
+        if error is not None:
+            raise error
+
+    def _get(self, reference: EmulatedDocumentReference, field_paths: Optional[List[str]]) -> EmulatedSnapshot:
+        self._rpc(1)
+        with self._lock:
+            collection = self._collections.get(reference._collection_path)
+            data = collection.docs.get(reference.id) if collection else None
+            times = collection.times.get(reference.id) if data is not None else None
+            if data is not None:
+                data = _project(data, field_paths) if field_paths is not None else _copy(data)
+        self.stats.add(reads=1)
+        return EmulatedSnapshot(reference, data, times)
+
+    def _commit(self, operations: List[Tuple]) -> None:
+        self._rpc()
+        now = self._now()
+        with self._lock:
+            # Validate first so the batch applies completely or not at all
+            for kind, reference, _, _ in operations:
+                exists = reference.id in self._collection(reference._collection_path).docs
+                if kind == "update" and not exists:
+                    raise api_exceptions.NotFound(f"No document to update: {reference.path}")
+                if kind == "create" and exists:
+                    raise api_exceptions.AlreadyExists(f"Document already exists: {reference.path}")
+            for kind, reference, data, merge in operations:
+                collection = self._collection(reference._collection_path)
+                if kind == "delete":
+                    collection.remove(reference.id)
+                    continue
+                current = collection.docs.get(reference.id)
+                if kind == "update":
+                    document = _copy(current)
+                    _write_fields(document, data, now, dotted=True)
+                elif merge and current is not None:
+                    document = _copy(current)
+                    _write_fields(document, data, now, merge=True)
+                else:
+                    document = {}
+                    _write_fields(document, data, now)
+                collection.put(reference.id, document, now)
+        self.stats.add(writes=len(operations))
+
+    def _aggregate(self, query: EmulatedQuery, aggregations: List[Tuple[str, Optional[str], str]]):
+        with self._lock:
+            if all(kind == "count" for kind, _, _ in aggregations):
+                docs = None
+                matched = self._count(query)
+            else:
+                collection = self._collections.get(query._path)
+                docs = [collection.docs[doc_id] for doc_id, _ in self._execute(query)]
+                matched = len(docs)
+        self._rpc()
+        values = []
+        for kind, field_path, alias in aggregations:
+            if kind == "count":
+                values.append(AggregationResult(alias, matched))
+                continue
+            numbers = [v for v in (get_field(d, field_path) for d in docs)
+                       if isinstance(v, (int, float)) and not isinstance(v, bool)]
+            if kind == "sum":
+                values.append(AggregationResult(alias, sum(numbers)))
+            else:
+                values.append(AggregationResult(alias, sum(numbers) / len(numbers) if numbers else None))
+        self.stats.add(reads=max(1, -(-matched // AGGREGATION_ENTRIES_PER_READ)))
+        return values
+
+    def _run_query(self, query: EmulatedQuery) -> Iterator[EmulatedSnapshot]:
+        with self._lock:
+            results = self._execute(query)
+            collection = self._collections.get(query._path)
+            snapshots = [
+                EmulatedSnapshot(EmulatedDocumentReference(self, query._path, doc_id),
+                                 _project(collection.docs[doc_id], query._projection), collection.times[doc_id])
+                for doc_id, _ in results
+            ]
+        self._rpc(len(snapshots))
+        self.stats.add(reads=max(1, len(snapshots)))
+        yield from snapshots
+
+    # Query planning and execution (caller holds the lock)
+
+    def _effective_orders(self, query: EmulatedQuery) -> List[Tuple[str, bool]]:
+        """Order fields as (path, descending), with the implicit ones Firestore adds."""
+        orders = [(path, direction == DESCENDING) for path, direction in query._orders]
+        if not orders:
+            inequality = [f[0] for f in query._filters if f[1] in INEQUALITY_OPS]
+            if inequality:
+                orders = [(inequality[0], False)]
+        if not orders or orders[-1][0] != "__name__":
+            orders.append(("__name__", orders[-1][1] if orders else False))
+        return orders
+
+    def _resolve_cursor(self, cursor, orders: List[Tuple[str, bool]]) -> Optional[_Cursor]:
+        if cursor is None:
+            return None
+        value, before = cursor
+        if isinstance(value, EmulatedSnapshot):
+            data = value._data or {}
+            keys = []
+            for path, _ in orders:
+                if path == "__name__":
+                    keys.append(value.id)
+                else:
+                    field_value = get_field(data, path)
+                    if field_value is _MISSING:
+                        raise ValueError(f"Cursor snapshot has no value for order field {path}")
+                    keys.append(value_key(field_value))
+            return _Cursor(tuple(keys), before)
+        if isinstance(value, dict):
+            keys = []
+            for path, _ in orders:
+                if path not in value:
+                    break
+                item = value[path]
+                keys.append((item.id if hasattr(item, "id") else item) if path == "__name__" else value_key(item))
+            return _Cursor(tuple(keys), before)
+        if isinstance(value, (list, tuple)):
+            return _Cursor(tuple(v if path == "__name__" else value_key(v)
+                                 for (path, _), v in zip(orders, value)), before)
+        raise TypeError("Cursor must be a snapshot, dict or list of values")
+
+    @staticmethod
+    def _compare(a: Tuple, b: Tuple, orders: List[Tuple[str, bool]]) -> int:
+        """Compare order keys (b may be a cursor prefix) in query order."""
+        for i, value in enumerate(b):
+            if a[i] != value:
+                result = -1 if a[i] < value else 1
+                return -result if orders[i][1] else result
+        return 0
+
+    def _index_groups(self, collection: _Collection, filters) -> Tuple[List[Tuple[int, List[Set[str]]]], List]:
+        """
+        Look up equality and array filters in indexes.
+
+        Returns one (size, id sets) group per indexed filter, most selective
+        first (a document matches a filter if it is in any of its sets), and
+        the filters left to check per document.
+        """
+        groups = []
+        residual = []
+        for path, op, value in filters:
+            if path == "__name__" or op not in EQUALITY_OPS + ARRAY_OPS:
+                residual.append((path, op, value))
+                continue
+            index = collection.equality_index(path) if op in EQUALITY_OPS else collection.array_index(path)
+            values = [value] if op in ("==", "array_contains") else value
+            parts = [index[k] for k in {value_key(v) for v in values} if k in index]
+            groups.append((sum(len(p) for p in parts), parts))
+        if groups:
+            self.stats.add(index_lookups=len(groups))
+        groups.sort(key=lambda g: g[0])
+        return groups, residual
+
+    @staticmethod
+    def _intersect(groups: List[Tuple[int, List[Set[str]]]]) -> Set[str]:
+        """Ids matching every group: the smallest is materialized, the rest only probed."""
+        candidates = set().union(*groups[0][1])
+        for _, parts in groups[1:]:
+            if not candidates:
+                break
+            candidates = {doc_id for doc_id in candidates if any(doc_id in p for p in parts)}
+        return candidates
+
+    def _count(self, query: EmulatedQuery) -> int:
+        """Number of matching documents; index-only filters are counted without a scan."""
+        collection = self._collections.get(query._path)
+        if collection is None:
+            return 0
+        if query._orders or query._start or query._end or query._offset:
+            return len(self._execute(query))
+        groups, residual = self._index_groups(collection, query._filters)
+        if residual:
+            return len(self._execute(query))
+        matched = len(self._intersect(groups)) if groups else len(collection.docs)
+        return matched if query._limit is None else min(matched, query._limit)
+
+    def _execute(self, query: EmulatedQuery) -> List[Tuple[str, Tuple]]:
+        """Return (doc_id, order key) pairs of the query result."""
+        collection = self._collections.get(query._path)
+        if collection is None or not collection.docs:
+            return []
+        orders = self._effective_orders(query)
+        start = self._resolve_cursor(query._start, orders)
+        end = self._resolve_cursor(query._end, orders)
+        explicit = [o for o in orders if o[0] != "__name__"]
+        descending = orders[-1][1]
+        mixed = any(desc != descending for _, desc in orders)
+
+        # == filters next to a single order field are served by a composite index
+        filters = list(query._filters)
+        equality: Tuple[str, ...] = ()
+        prefix: Tuple = ((),)
+        if len(explicit) == 1 and not mixed:
+            eq = [f for f in filters if f[1] == "==" and f[0] not in ("__name__", explicit[0][0])]
+            if eq and len({f[0] for f in eq}) == len(eq):
+                eq.sort(key=lambda f: f[0])
+                equality = tuple(f[0] for f in eq)
+                prefix = (tuple(value_key(f[2]) for f in eq),)
+                filters = [f for f in filters if f not in eq]
+        groups, residual = self._index_groups(collection, filters)
+        if groups and groups[0][0] == 0:
+            return []
+
+        results: List[Tuple[str, Tuple]] = []
+        state = {"skip": query._offset, "scanned": 0}
+        limit = query._limit
+
+        def accept(doc_id: str, key: Tuple) -> bool:
+            """Add a document in result order; return False once the page is full."""
+            state["scanned"] += 1
+            if start is not None:
+                c = self._compare(key, start.values, orders)
+                if c < 0 or (c == 0 and not start.before):
+                    return True
+            if end is not None:
+                c = self._compare(key, end.values, orders)
+                if c > 0 or (c == 0 and end.before):
+                    return False
+            if residual:
+                data = collection.docs[doc_id]
+                if not all(_matches(doc_id, data, f) for f in residual):
+                    return True
+            if state["skip"]:
+                state["skip"] -= 1
+                return True
+            results.append((doc_id, key))
+            return limit is None or len(results) < limit
+
+        try:
+            if mixed or len(explicit) > 1 or (explicit and not equality and groups
+                                              and groups[0][0] * 8 < len(collection.docs)):
+                # Several order fields or directions, or few candidates: sort them
+                self.stats.add(sorts=1)
+                keyed = []
+                for doc_id in (self._intersect(groups) if groups else collection.docs):
+                    data = collection.docs[doc_id]
+                    key = []
+                    for path, _ in orders:
+                        value = doc_id if path == "__name__" else get_field(data, path)
+                        if value is _MISSING:
+                            break
+                        key.append(value if path == "__name__" else value_key(value))
+                    else:
+                        keyed.append((tuple(key), doc_id))
+                keyed.sort(key=cmp_to_key(lambda x, y: self._compare(x[0], y[0], orders)))
+                for key, doc_id in keyed:
+                    if not accept(doc_id, key):
+                        break
+                return results
+
+            if explicit:
+                # Walk the ordered index from the cursor or range bound
+                path = explicit[0][0]
+                entries = collection.ordered_index(equality, path)
+                self.stats.add(ordered_walks=1)
+                lo, hi = _range_bounds(entries, prefix, [f for f in filters if f[0] == path and f[1] in RANGE_OPS])
+                if start is not None and start.values:
+                    if descending:
+                        hi = min(hi, bisect_right(entries, prefix + (start.values[0], _MAX_ID)))
+                    else:
+                        lo = max(lo, bisect_left(entries, prefix + (start.values[0],)))
+                walk = range(hi - 1, lo - 1, -1) if descending else range(lo, hi)
+                for i in walk:
+                    _, key, doc_id = entries[i]
+                    if groups and not all(any(doc_id in p for p in parts) for _, parts in groups):
+                        continue
+                    if not accept(doc_id, (key, doc_id)):
+                        break
+                return results
+
+            # Document id order
+            if groups:
+                ids = sorted(self._intersect(groups), reverse=descending)
+            else:
+                all_ids, lo, hi = collection.ids, 0, len(collection.ids)
+                if start is not None and start.values:
+                    if descending:
+                        hi = bisect_right(all_ids, start.values[0])
+                    else:
+                        lo = bisect_left(all_ids, start.values[0])
+                ids = (all_ids[i] for i in (range(hi - 1, lo - 1, -1) if descending else range(lo, hi)))
+            for doc_id in ids:
+                if not accept(doc_id, (doc_id,)):
+                    break
+            return results
+        finally:
+            self.stats.add(scanned=state["scanned"])
+
+
+def _range_bounds(entries: List[Tuple], prefix: Tuple, filters: List[Tuple[str, str, Any]]) -> Tuple[int, int]:
+    """
+    Slice of an ordered index holding the equality prefix and satisfying range filters.
+
+    Range filters only match values of the operand's type.
+    """
+    lo, hi = bisect_left(entries, prefix), bisect_left(entries, prefix + (_TOP,))
+    for _, op, value in filters:
+        key = value_key(value)
+        lo = max(lo, bisect_left(entries, prefix + ((key[0],),)))
+        hi = min(hi, bisect_left(entries, prefix + ((key[0] + 1,),)))
+        if op == ">":
+            lo = max(lo, bisect_right(entries, prefix + (key, _MAX_ID)))
+        elif op == ">=":
+            lo = max(lo, bisect_left(entries, prefix + (key,)))
+        elif op == "<":
+            hi = min(hi, bisect_left(entries, prefix + (key,)))
+        elif op == "<=":
+            hi = min(hi, bisect_right(entries, prefix + (key, _MAX_ID)))
+    return lo, max(lo, hi)
+
+
+def _matches(doc_id: str, data: Dict[str, Any], condition: Tuple[str, str, Any]) -> bool:
+    """Evaluate one filter against a document."""
+    path, op, operand = condition
+    value = doc_id if path == "__name__" else get_field(data, path)
+    if value is _MISSING:
+        return False
+    if path == "__name__":
+        operand = [getattr(v, "id", v) for v in operand] if isinstance(operand, (list, tuple)) \
+            else getattr(operand, "id", operand)
+        key = (4, value)
+        to_key = lambda v: (4, v)
+    else:
+        key = value_key(value)
+        to_key = value_key
+    if op == "==":
+        return key == to_key(operand)
+    if op == "!=":
+        return value is not None and key != to_key(operand)
+    if op == "in":
+        return key in {to_key(v) for v in operand}
+    if op == "not_in":
+        return value is not None and key not in {to_key(v) for v in operand}
+    if op in ARRAY_OPS:
+        if not isinstance(value, list):
+            return False
+        elements = {value_key(v) for v in value}
+        operands = [operand] if op == "array_contains" else operand
+        return any(value_key(v) in elements for v in operands)
+    operand_key = to_key(operand)
+    if key[0] != operand_key[0]:
+        return False  # Range filters only match values of the operand's type
+    if op == "<":
+        return key < operand_key
+    if op == "<=":
+        return key <= operand_key
+    if op == ">":
+        return key > operand_key
+    return key >= operand_key
+
+
+def _project(data: Dict[str, Any], fields: Optional[Iterable[str]]) -> Dict[str, Any]:
+    if fields is None:
+        return _copy(data)
+    projected: Dict[str, Any] = {}
+    for path in fields:
+        if path == "__name__":
+            continue
+        value = get_field(data, path)
+        if value is not _MISSING:
+            _set_field(projected, path, _copy(value))
+    return projected
+
+
+def create_emulated_firebase_service(db: Optional[InMemoryFirestore] = None):
+    """
+    Return a FirebaseService that runs on an in-memory client.
+
+    The instance is independent of the FirebaseService singleton; use
+    FIREBASE_EMULATOR=memory to make FirebaseService() itself use the emulator.
+    """
+    from app.services.firebase_service import FirebaseService
+
+    service = object.__new__(FirebaseService)
+    service._initialized = True
+    service.app = None
+    service.db = db if db is not None else InMemoryFirestore(latency=LatencyModel.from_config())
+    return service
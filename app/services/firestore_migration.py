@@ -0,0 +1,309 @@
+"""
+firestore_migration.py - Resumable bulk field migrations over Firestore collections
+
+A migration walks a collection in document-id order, one page per query, each
+page starting after the last document id of the previous one. A transform
+returns the field updates a document needs (or None). Updates go through a
+BulkWriter (batched writes where it is unavailable) that is flushed at the end
+of every page, so at most one page of writes is in flight. After each flushed
+page the last document id and the counters are written to a JSON checkpoint
+file; an interrupted run resumes from there instead of starting over.
+
+A dry run reads one sample page, extrapolates over a server-side count and
+reports the reads, writes, cost and time the real run would take.
+"""
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+import json
+import os
+import threading
+import time
+
+from app.core.config import logger
+
+# Documents read per query page (and written per flush)
+MIGRATION_PAGE_SIZE = 500
+
+# Firestore accepts at most this many writes in one batch
+BATCH_WRITE_LIMIT = 500
+
+# Attempts per document write before it counts as an error
+MAX_WRITE_ATTEMPTS = 5
+
+# BulkWriter throughput ceiling; Firestore's 500/50/5 rule ramps up from 500
+MAX_OPS_PER_SECOND = 2000
+
+# List prices used for dry-run estimates, in USD per 100,000 operations
+# (Firestore Standard edition, multi-region; adjust for the project's location)
+READ_COST_PER_100K = 0.06
+WRITE_COST_PER_100K = 0.18
+
+Transform = Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+
+@dataclass
+class MigrationProgress:
+    """Progress of one collection; this is what the checkpoint stores."""
+    collection: str
+    processed: int = 0
+    updated: int = 0
+    errors: int = 0
+    last_id: Optional[str] = None
+    done: bool = False
+    elapsed: float = 0.0  # Seconds spent over all runs
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+
+@dataclass
+class MigrationEstimate:
+    """What a migration would cost, extrapolated from a sample page."""
+    collection: str
+    documents: int
+    sampled: int
+    sample_updates: int
+    estimated_updates: int
+    reads: int
+    writes: int
+    cost_usd: float
+    seconds: float
+    examples: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class MigrationCheckpoint:
+    """
+    Per-collection progress persisted to a JSON file.
+
+    Args:
+        path: Checkpoint file, or None to keep progress in memory only
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._progress: Dict[str, Dict[str, Any]] = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._progress = json.load(f)
+
+    def get(self, collection: str) -> MigrationProgress:
+        """Return the saved progress of a collection (fresh if none)."""
+        with self._lock:
+            saved = self._progress.get(collection)
+        return MigrationProgress(**saved) if saved else MigrationProgress(collection)
+
+    def save(self, progress: MigrationProgress) -> None:
+        """Record progress, replacing the file atomically."""
+        with self._lock:
+            self._progress[progress.collection] = asdict(progress)
+            self._write()
+
+    def reset(self, collection: Optional[str] = None) -> None:
+        """Forget the progress of a collection (or of all collections)."""
+        with self._lock:
+            if collection is None:
+                self._progress.clear()
+            else:
+                self._progress.pop(collection, None)
+            self._write()
+
+    def _write(self) -> None:
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._progress, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+class _BatchedWriter:
+    """BulkWriter stand-in built on batched writes."""
+
+    def __init__(self, db):
+        self.db = db
+        self._batch = None
+        self._pending = 0
+        self.errors = 0
+
+    def update(self, reference, data: Dict[str, Any]) -> None:
+        if self._batch is None:
+            self._batch = self.db.batch()
+        self._batch.update(reference, data)
+        self._pending += 1
+        if self._pending >= BATCH_WRITE_LIMIT:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._batch is None:
+            return
+        batch, pending = self._batch, self._pending
+        self._batch, self._pending = None, 0
+        for attempt in range(1, MAX_WRITE_ATTEMPTS + 1):
+            try:
+                batch.commit()
+                return
+            except Exception as e:
+                if attempt == MAX_WRITE_ATTEMPTS:
+                    logger.error(f"Batch of {pending} writes failed: {str(e)}")
+                    self.errors += pending
+                    return
+                time.sleep(min(2 ** attempt * 0.1, 5))
+
+    def close(self) -> None:
+        self.flush()
+
+
+class FirestoreMigrationEngine:
+    """
+    Pages through collections with cursors and bulk-writes field updates.
+
+    Args:
+        db: Firestore client (e.g. FirebaseService().db)
+        checkpoint: Where progress is saved (default: in memory only)
+        page_size: Documents per page
+        use_bulk_writer: Use BulkWriter when the client has one
+        max_ops_per_second: BulkWriter throughput ceiling
+        on_progress: Called with the progress after every page
+    """
+
+    def __init__(self, db, checkpoint: Optional[MigrationCheckpoint] = None,
+                 page_size: int = MIGRATION_PAGE_SIZE, use_bulk_writer: bool = True,
+                 max_ops_per_second: int = MAX_OPS_PER_SECOND,
+                 on_progress: Optional[Callable[[MigrationProgress], None]] = None):
+        self.db = db
+        self.checkpoint = checkpoint or MigrationCheckpoint()
+        self.page_size = page_size
+        self.use_bulk_writer = use_bulk_writer
+        self.max_ops_per_second = max_ops_per_second
+        self.on_progress = on_progress
+
+    def _page(self, collection: str, after_id: Optional[str], select: Optional[List[str]],
+              size: int) -> List[Any]:
+        query = self.db.collection(collection).order_by("__name__")
+        if select is not None:
+            query = query.select(select)
+        if after_id is not None:
+            query = query.start_after({"__name__": after_id})
+        return list(query.limit(size).stream())
+
+    def _writer(self):
+        """Return a BulkWriter (or batched stand-in) and a function reading its error count."""
+        if self.use_bulk_writer and hasattr(self.db, "bulk_writer"):
+            from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions
+
+            writer = self.db.bulk_writer(BulkWriterOptions(
+                initial_ops_per_second=min(500, self.max_ops_per_second),
+                max_ops_per_second=self.max_ops_per_second,
+            ))
+            errors = [0]
+
+            def on_error(failure, _writer) -> bool:
+                if failure.attempts < MAX_WRITE_ATTEMPTS:
+                    return True
+                logger.error(f"Write to {failure.operation.reference.path} failed: {failure.message}")
+                errors[0] += 1
+                return False
+
+            writer.on_write_error(on_error)
+            return writer, lambda: errors[0]
+
+        writer = _BatchedWriter(self.db)
+        return writer, lambda: writer.errors
+
+    def run(self, collection: str, transform: Transform,
+            select: Optional[List[str]] = None) -> MigrationProgress:
+        """
+        Apply a transform to every document of a collection, resuming from the checkpoint.
+
+        Args:
+            collection: Collection name
+            transform: Returns the updates for a document dict (with 'id'), or None
+            select: Fields the transform reads (optional, default: whole documents)
+
+        Returns:
+            Final progress of the collection
+        """
+        progress = self.checkpoint.get(collection)
+        if progress.done:
+            logger.info(f"Migration of {collection} already complete; reset the checkpoint to rerun")
+            return progress
+
+        writer, errors = self._writer()
+        try:
+            while True:
+                started = time.perf_counter()
+                page = self._page(collection, progress.last_id, select, self.page_size)
+                updated = 0
+                for snapshot in page:
+                    data = snapshot.to_dict() or {}
+                    data["id"] = snapshot.id
+                    updates = transform(data)
+                    if updates:
+                        writer.update(snapshot.reference, updates)
+                        updated += 1
+                # Checkpoint only after the page's writes are durable
+                writer.flush()
+
+                progress.processed += len(page)
+                progress.updated += updated
+                progress.errors = errors()
+                if page:
+                    progress.last_id = page[-1].id
+                progress.done = len(page) < self.page_size
+                progress.elapsed += time.perf_counter() - started
+                self.checkpoint.save(progress)
+                if self.on_progress:
+                    self.on_progress(progress)
+                if progress.done:
+                    return progress
+        finally:
+            writer.close()
+
+    def estimate(self, collection: str, transform: Transform, select: Optional[List[str]] = None,
+                 total: Optional[int] = None, examples: int = 5) -> MigrationEstimate:
+        """
+        Estimate a migration from one sample page without writing anything.
+
+        Args:
+            collection: Collection name
+            transform: Same transform as for run
+            select: Fields the transform reads (optional)
+            total: Document count (default: a server-side count aggregation)
+            examples: Number of sample updates to include
+
+        Returns:
+            MigrationEstimate for the whole collection
+        """
+        started = time.perf_counter()
+        page = self._page(collection, None, select, self.page_size)
+        read_seconds = time.perf_counter() - started
+
+        sample_updates = []
+        for snapshot in page:
+            data = snapshot.to_dict() or {}
+            data["id"] = snapshot.id
+            updates = transform(data)
+            if updates:
+                sample_updates.append({"id": snapshot.id, "updates": updates})
+
+        if total is None:
+            total = int(self.db.collection(collection).count().get()[0][0].value)
+        ratio = len(sample_updates) / len(page) if page else 0.0
+        estimated_updates = round(total * ratio)
+        reads = total + 1  # the final (short or empty) page query bills at least one read
+        read_rate = len(page) / read_seconds if page and read_seconds > 0 else float("inf")
+        seconds = total / read_rate + estimated_updates / self.max_ops_per_second
+        return MigrationEstimate(
+            collection=collection,
+            documents=total,
+            sampled=len(page),
+            sample_updates=len(sample_updates),
+            estimated_updates=estimated_updates,
+            reads=reads,
+            writes=estimated_updates,
+            cost_usd=(reads * READ_COST_PER_100K + estimated_updates * WRITE_COST_PER_100K) / 100_000,
+            seconds=seconds,
+            examples=sample_updates[:examples],
+        )
@@ -0,0 +1,427 @@
+"""
+history_compaction.py - Rolling summaries in place of raw conversation history
+
+Every conversation keeps a stored rolling summary of its older messages. A
+prompt carries that summary as one system message plus only the messages the
+summary does not cover yet - never fewer than HISTORY_KEEP_LAST_MESSAGES - so
+prompt size stays flat however long a session runs. Once HISTORY_SUMMARY_EVERY
+more messages have aged out of the verbatim window, a background task folds
+them into the summary; the request that triggers it does not wait. Until a
+conversation's first summary is written, its raw history is sent unchanged.
+
+Summaries are written by a Summarizer: OpenAISummarizer in production, while
+any deterministic implementation (see tests/mocks/summarizer.py) can stand in
+for tests and local runs.
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+import asyncio
+import hashlib
+import threading
+
+from app.core.config import logger
+from app.core.openai_constants import (
+    HISTORY_KEEP_LAST_MESSAGES, HISTORY_SUMMARY_EVERY, ROLE_SYSTEM, ROLE_USER,
+    SUMMARY_MAX_TOKENS, SUMMARY_MODEL, SUMMARY_TEMPERATURE
+)
+
+# Summaries kept by InMemorySummaryStore before the least recently used is evicted
+SUMMARY_STORE_MAX_CONVERSATIONS = 4096
+
+# Fixed per-message cost of the chat format, in tokens
+MESSAGE_TOKEN_OVERHEAD = 4
+
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+
+SUMMARIZER_PROMPT = (
+    "You maintain a running summary of a conversation between a user and Freya. "
+    "Merge the new messages into the existing summary. Keep names, facts, plans, "
+    "feelings and open questions; drop small talk. Write at most a few short "
+    "paragraphs in the third person."
+)
+
+Message = Dict[str, str]
+
+
+def estimate_tokens(messages: Sequence[Message]) -> int:
+    """
+    Estimate the prompt tokens of a list of chat messages.
+
+    Uses the common 4 characters per token approximation plus a fixed
+    per-message overhead, which is close enough to compare prompt sizes.
+    """
+    return sum(
+        MESSAGE_TOKEN_OVERHEAD + (len(message.get("content") or "") + 3) // 4
+        for message in messages
+    )
+
+
+def message_key(message: Message) -> str:
+    """Stable key for a message that has no id of its own."""
+    raw = f"{message.get('role')}\n{message.get('content')}".encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+
+@dataclass
+class ConversationSummary:
+    """Rolling summary of a conversation's older messages."""
+    text: str
+    through: Optional[str] = None  # Key of the last message folded into the summary
+    message_count: int = 0  # Messages folded in so far
+
+
+@dataclass
+class CompactedHistory:
+    """History to send to the model, with its size before and after compaction."""
+    messages: List[Message]
+    original_tokens: int
+    compacted_tokens: int
+    summarized_messages: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.original_tokens - self.compacted_tokens)
+
+    def usage(self) -> Dict[str, int]:
+        """Savings in the shape of an OpenAI usage block."""
+        return {
+            "history_tokens_original": self.original_tokens,
+            "history_tokens_sent": self.compacted_tokens,
+            "prompt_tokens_saved": self.tokens_saved,
+        }
+
+
+class Summarizer(ABC):
+    """Writes rolling conversation summaries."""
+
+    @abstractmethod
+    def summarize(self, previous: Optional[str], messages: List[Message]) -> str:
+        """
+        Fold messages into a summary.
+
+        Args:
+            previous: The summary so far, if any
+            messages: Messages to add, oldest first
+
+        Returns:
+            The new summary text
+        """
+
+
+class OpenAISummarizer(Summarizer):
+    """Summarizer backed by a small OpenAI chat model."""
+
+    def __init__(self, openai_service=None, model: str = SUMMARY_MODEL,
+                 max_tokens: int = SUMMARY_MAX_TOKENS):
+        if openai_service is None:
+            from app.services.openai_service import OpenAIService
+            openai_service = OpenAIService()
+        self.openai_service = openai_service
+        self.model = model
+        self.max_tokens = max_tokens
+
+    def summarize(self, previous: Optional[str], messages: List[Message]) -> str:
+        transcript = "\n".join(f"{m.get('role')}: {m.get('content')}" for m in messages)
+        request = f"Existing summary:\n{previous or '(none)'}\n\nNew messages:\n{transcript}"
+        completion = self.openai_service.create_chat_completion(
+            messages=[
+                {"role": ROLE_SYSTEM, "content": SUMMARIZER_PROMPT},
+                {"role": ROLE_USER, "content": request},
+            ],
+            model=self.model,
+            temperature=SUMMARY_TEMPERATURE,
+            max_tokens=self.max_tokens,
+        )
+        return self.openai_service.get_message_content(completion).strip()
+
+
+class SummaryStore(ABC):
+    """Where rolling summaries are kept, keyed by conversation."""
+
+    @abstractmethod
+    def get(self, conversation_key: str) -> Optional[ConversationSummary]:
+        """Return the summary of a conversation, or None."""
+
+    @abstractmethod
+    def put(self, conversation_key: str, summary: ConversationSummary) -> None:
+        """Store the summary of a conversation."""
+
+
+class InMemorySummaryStore(SummaryStore):
+    """Process-local summary store with least recently used eviction."""
+
+    def __init__(self, max_conversations: int = SUMMARY_STORE_MAX_CONVERSATIONS):
+        self.max_conversations = max_conversations
+        self._summaries: "OrderedDict[str, ConversationSummary]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conversation_key: str) -> Optional[ConversationSummary]:
+        with self._lock:
+            summary = self._summaries.get(conversation_key)
+            if summary is not None:
+                self._summaries.move_to_end(conversation_key)
+            return summary
+
+    def put(self, conversation_key: str, summary: ConversationSummary) -> None:
+        with self._lock:
+            self._summaries[conversation_key] = summary
+            self._summaries.move_to_end(conversation_key)
+            while len(self._summaries) > self.max_conversations:
+                self._summaries.popitem(last=False)
+
+
+class FirestoreSummaryStore(SummaryStore):
+    """
+    Keeps summaries on the conversation document in Firestore.
+
+    An in-process cache sits in front, so each conversation is read from
+    Firestore at most once per process; conversations without a summary are
+    cached as empty summaries for the same reason.
+    """
+
+    def __init__(self, firebase=None, cache: Optional[InMemorySummaryStore] = None):
+        self._firebase = firebase
+        self.cache = cache or InMemorySummaryStore()
+
+    @property
+    def firebase(self):
+        if self._firebase is None:
+            from app.services.firebase_service import FirebaseService
+            self._firebase = FirebaseService()
+        return self._firebase
+
+    def get(self, conversation_key: str) -> Optional[ConversationSummary]:
+        summary = self.cache.get(conversation_key)
+        if summary is None:
+            doc = self.firebase.get_document("conversations", conversation_key) or {}
+            summary = ConversationSummary(
+                text=doc.get("historySummary") or "",
+                through=doc.get("historySummaryThrough"),
+                message_count=doc.get("historySummaryCount") or 0,
+            )
+            self.cache.put(conversation_key, summary)
+        return summary if summary.text else None
+
+    def put(self, conversation_key: str, summary: ConversationSummary) -> None:
+        self.cache.put(conversation_key, summary)
+        self.firebase.update_document("conversations", conversation_key, {
+            "historySummary": summary.text,
+            "historySummaryThrough": summary.through,
+            "historySummaryCount": summary.message_count,
+        })
+
+
+class CompactionStats:
+    """Process-wide counters for history compaction."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.compactions = 0
+        self.tokens_original = 0
+        self.tokens_sent = 0
+        self.summaries_written = 0
+        self.summary_failures = 0
+
+    def record(self, history: CompactedHistory) -> None:
+        with self._lock:
+            self.compactions += 1
+            self.tokens_original += history.original_tokens
+            self.tokens_sent += history.compacted_tokens
+
+    def summary_written(self) -> None:
+        with self._lock:
+            self.summaries_written += 1
+
+    def summary_failed(self) -> None:
+        with self._lock:
+            self.summary_failures += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        """Return the current counter values."""
+        with self._lock:
+            return {
+                "compactions": self.compactions,
+                "tokens_original": self.tokens_original,
+                "tokens_sent": self.tokens_sent,
+                "tokens_saved": max(0, self.tokens_original - self.tokens_sent),
+                "summaries_written": self.summaries_written,
+                "summary_failures": self.summary_failures,
+            }
+
+
+compaction_stats = CompactionStats()
+
+
+class HistoryCompactor:
+    """
+    Replaces raw history with a rolling summary plus the recent messages.
+
+    Messages are identified by key so that the summary stays anchored when the
+    history window slides: Firestore callers pass document ids, other callers
+    get content-derived keys from message_key().
+    """
+
+    def __init__(self, summarizer: Optional[Summarizer] = None, store: Optional[SummaryStore] = None,
+                 keep_last: int = HISTORY_KEEP_LAST_MESSAGES,
+                 summarize_every: int = HISTORY_SUMMARY_EVERY,
+                 stats: Optional[CompactionStats] = None):
+        self._summarizer = summarizer
+        self.store = store or InMemorySummaryStore()
+        self.keep_last = keep_last
+        self.summarize_every = summarize_every
+        self.stats = stats or compaction_stats
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    @property
+    def summarizer(self) -> Summarizer:
+        if self._summarizer is None:
+            self._summarizer = OpenAISummarizer()
+        return self._summarizer
+
+    @staticmethod
+    def _keys(history: Sequence[Message], keys: Optional[Sequence[str]]) -> List[str]:
+        return list(keys) if keys is not None else [message_key(m) for m in history]
+
+    @staticmethod
+    def _unsummarized_from(summary: Optional[ConversationSummary], keys: List[str]) -> int:
+        """Index of the first message the summary does not cover."""
+        if summary is not None and summary.through in keys:
+            # First occurrence: a repeated message can only make us resend
+            # covered messages, never skip uncovered ones
+            return keys.index(summary.through) + 1
+        return 0
+
+    def compact(self, conversation_key: str, history: Sequence[Message],
+                keys: Optional[Sequence[str]] = None) -> CompactedHistory:
+        """
+        Build the history to send for a conversation.
+
+        Args:
+            conversation_key: Key of the conversation in the summary store
+            history: Prior messages, oldest first
+            keys: Optional message ids, parallel to history
+
+        Returns:
+            CompactedHistory with the messages to send and the token savings
+        """
+        history = list(history)
+        keys = self._keys(history, keys)
+        summary = self.store.get(conversation_key)
+        start = self._unsummarized_from(summary, keys)
+
+        tail = history[start:]
+        if summary is not None and len(tail) >= self.keep_last + self.summarize_every:
+            # The summary is behind (update pending or failed); cap the raw part.
+            # Without a summary nothing would stand in for the older messages,
+            # so the raw history is sent until the first summary is written.
+            tail = history[-self.keep_last:] if self.keep_last else []
+
+        messages: List[Message] = []
+        if summary is not None:
+            messages.append({"role": ROLE_SYSTEM, "content": SUMMARY_HEADER + summary.text})
+        messages.extend(tail)
+
+        compacted = CompactedHistory(
+            messages=messages,
+            original_tokens=estimate_tokens(history),
+            compacted_tokens=estimate_tokens(messages),
+            summarized_messages=len(history) - len(tail),
+        )
+        self.stats.record(compacted)
+        return compacted
+
+    def _pending_range(self, summary: Optional[ConversationSummary], keys: List[str]):
+        start = self._unsummarized_from(summary, keys)
+        end = len(keys) - self.keep_last
+        return start, end
+
+    def needs_update(self, conversation_key: str, history: Sequence[Message],
+                     keys: Optional[Sequence[str]] = None) -> bool:
+        """Whether enough messages have left the verbatim window to refresh the summary."""
+        keys = self._keys(history, keys)
+        start, end = self._pending_range(self.store.get(conversation_key), keys)
+        return end - start >= self.summarize_every
+
+    async def update(self, conversation_key: str, history: Sequence[Message],
+                     keys: Optional[Sequence[str]] = None) -> Optional[ConversationSummary]:
+        """
+        Fold the messages that left the verbatim window into the summary.
+
+        The summarizer runs in a worker thread.
+
+        Returns:
+            The new summary, or None if no update was due
+        """
+        history = list(history)
+        keys = self._keys(history, keys)
+        summary = self.store.get(conversation_key)
+        start, end = self._pending_range(summary, keys)
+        if end - start < self.summarize_every:
+            return None
+
+        chunk = history[start:end]
+        text = await asyncio.to_thread(
+            self.summarizer.summarize, summary.text if summary else None, chunk
+        )
+        updated = ConversationSummary(
+            text=text,
+            through=keys[end - 1],
+            message_count=(summary.message_count if summary else 0) + len(chunk),
+        )
+        self.store.put(conversation_key, updated)
+        self.stats.summary_written()
+        logger.debug("Folded %d messages into the summary of %s", len(chunk), conversation_key)
+        return updated
+
+    async def _update_logged(self, conversation_key: str, history: List[Message], keys: List[str]) -> None:
+        try:
+            await self.update(conversation_key, history, keys)
+        except Exception as e:
+            self.stats.summary_failed()
+            logger.error(f"Error updating summary for conversation {conversation_key}: {str(e)}")
+
+    def schedule_update(self, conversation_key: str, history: Sequence[Message],
+                        keys: Optional[Sequence[str]] = None) -> Optional[asyncio.Task]:
+        """
+        Start a background summary update if one is due and none is running.
+
+        Returns:
+            The update task, or None if nothing was started
+        """
+        history = list(history)
+        keys = self._keys(history, keys)
+        running = self._pending.get(conversation_key)
+        if running is not None and not running.done():
+            return None
+        if not self.needs_update(conversation_key, history, keys):
+            return None
+
+        task = asyncio.get_running_loop().create_task(
+            self._update_logged(conversation_key, history, keys)
+        )
+        self._pending[conversation_key] = task
+        task.add_done_callback(lambda done: self._forget(conversation_key, done))
+        return task
+
+    def _forget(self, conversation_key: str, task: asyncio.Task) -> None:
+        if self._pending.get(conversation_key) is task:
+            del self._pending[conversation_key]
+
+
+_history_compactor: Optional[HistoryCompactor] = None
+
+
+def get_history_compactor() -> HistoryCompactor:
+    """Return the process-wide compactor with in-memory summaries."""
+    global _history_compactor
+    if _history_compactor is None:
+        _history_compactor = HistoryCompactor()
+    return _history_compactor
+
+
+def set_history_compactor(compactor: Optional[HistoryCompactor]) -> None:
+    """Replace the process-wide compactor (None resets it)."""
+    global _history_compactor
+    _history_compactor = compactor
@@ -0,0 +1,133 @@
+"""
+json_stream.py - Streamed JSON list responses with a page-size cap and a cursor
+
+List endpoints hand a lazy document iterator to list_response instead of
+building a list. Items are encoded as they arrive and written in small chunks,
+so a request holds one chunk in memory whatever the size of the result.
+
+Two formats are served:
+
+- JSON (default): the usual {"<key>": [...], "next_cursor": ...} object,
+  written as a chunked array.
+- NDJSON (Accept: application/x-ndjson): one item per line, followed by a
+  {"next_cursor": ...} line when there are more results.
+
+A page holds at most max_page_size items. The iterator should be asked for one
+item more than the page size: if that item exists, the id of the last item of
+the page is returned as next_cursor, to be passed back as the cursor query
+parameter.
+"""
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+from app.services.sse_frames import encode_json
+
+# Items per page when the client does not ask for a page size
+LIST_PAGE_SIZE = 500
+
+# Largest page a client can ask for
+MAX_LIST_PAGE_SIZE = 1000
+
+# Items encoded per chunk written to the socket
+STREAM_CHUNK_ITEMS = 64
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def page_size(limit: Optional[int], default: int = LIST_PAGE_SIZE) -> int:
+    """Clamp a requested page size to 1..MAX_LIST_PAGE_SIZE."""
+    if limit is None:
+        limit = default
+    return max(1, min(limit, MAX_LIST_PAGE_SIZE))
+
+
+def wants_ndjson(accept: Optional[str]) -> bool:
+    """Whether an Accept header asks for NDJSON."""
+    return bool(accept) and NDJSON_MEDIA_TYPE in accept
+
+
+def encode_item(item: Any) -> bytes:
+    """Encode one item, converting values the JSON encoder does not support."""
+    try:
+        return encode_json(item)
+    except TypeError:
+        return encode_json(jsonable_encoder(item))
+
+
+class CursorPage:
+    """
+    Iterates at most size items of a lazy iterator and records the next cursor.
+
+    next_cursor is set once iteration ends, if the iterator had more items.
+    """
+
+    def __init__(self, items: Iterable[Dict[str, Any]], size: int):
+        self.items = items
+        self.size = size
+        self.count = 0
+        self.next_cursor: Optional[str] = None
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        last = None
+        for item in self.items:
+            if self.count == self.size:
+                self.next_cursor = last.get("id") if last else None
+                break
+            self.count += 1
+            last = item
+            yield item
+        close = getattr(self.items, "close", None)
+        if close:
+            close()  # Stop a generator that still has a server stream open
+
+
+def json_array_chunks(key: str, page: CursorPage, chunk_items: int = STREAM_CHUNK_ITEMS) -> Iterator[bytes]:
+    """Yield {"<key>": [...], "next_cursor": ...} in chunks of encoded items."""
+    chunk = [b'{' + encode_json(key) + b':[']
+    for item in page:
+        if page.count > 1:
+            chunk.append(b',')
+        chunk.append(encode_item(item))
+        if len(chunk) >= 2 * chunk_items:
+            yield b''.join(chunk)
+            chunk = []
+    chunk.append(b'],"next_cursor":' + encode_json(page.next_cursor) + b'}')
+    yield b''.join(chunk)
+
+
+def ndjson_chunks(page: CursorPage, chunk_items: int = STREAM_CHUNK_ITEMS) -> Iterator[bytes]:
+    """Yield one item per line, then a next_cursor line if there are more results."""
+    chunk = []
+    for item in page:
+        chunk.append(encode_item(item))
+        chunk.append(b'\n')
+        if len(chunk) >= 2 * chunk_items:
+            yield b''.join(chunk)
+            chunk = []
+    if page.next_cursor is not None:
+        chunk.append(encode_json({"next_cursor": page.next_cursor}) + b'\n')
+    if chunk:
+        yield b''.join(chunk)
+
+
+def list_response(key: str, items: Iterable[Dict[str, Any]], size: int,
+                  accept: Optional[str] = None) -> StreamingResponse:
+    """
+    Stream a page of items as JSON or NDJSON.
+
+    Args:
+        key: Name of the list in the JSON object (e.g. "facts")
+        items: Lazy iterator over at most size + 1 items
+        size: Page size
+        accept: Request Accept header
+
+    Returns:
+        StreamingResponse; Starlette iterates the blocking iterator in a
+        worker thread
+    """
+    page = CursorPage(items, size)
+    if wants_ndjson(accept):
+        return StreamingResponse(ndjson_chunks(page), media_type=NDJSON_MEDIA_TYPE)
+    return StreamingResponse(json_array_chunks(key, page), media_type="application/json")
@@ -0,0 +1,499 @@
+"""
+memory_export.py - Streaming per-user memory export and batched import
+
+An export reads one user's conversations, messages, facts and topics from
+Firestore or PostgreSQL a page at a time and writes every record as soon as it
+is read, so memory stays bounded by the page size whatever the size of the
+user. Layout of an export directory:
+
+    manifest.json                 backend, user, record counts, format
+    conversations.jsonl.gz        one JSON record per line
+    topics.jsonl.gz
+    messages.jsonl.gz
+    facts.jsonl.gz
+    message_topics.jsonl.gz       PostgreSQL only: message/topic links
+
+With format="parquet" each table is written as <kind>.parquet instead
+(requires pyarrow) for offline analysis; import reads JSONL exports only.
+
+Values JSON cannot represent are tagged so an import restores them:
+datetimes as {"$date": iso}, Firestore document references as {"$ref": path}.
+
+Imports go back to the backend the export came from. Firestore documents keep
+their ids and are written with batched writes, so re-running an import is
+idempotent. PostgreSQL rows get new ids from multi-row INSERT ... RETURNING
+batches; references between the tables are remapped on the way in and topics
+are matched by name.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import base64
+import gzip
+import json
+import os
+import time
+
+from app.core.firebase_config import COLLECTIONS
+from app.services.sse_frames import encode_json
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Records read per page (Firestore query or database cursor batch)
+EXPORT_PAGE_SIZE = 500
+
+# Records written per batched write / INSERT statement (Firestore's batch limit)
+IMPORT_BATCH_SIZE = 500
+
+# Conversation ids per 'in' query when exporting Firestore messages
+CONVERSATIONS_PER_QUERY = 10
+
+# Rows buffered per Parquet row group
+PARQUET_ROW_GROUP = 10000
+
+# Tables in dependency order: rows only reference tables listed before them
+KINDS = ("conversations", "topics", "messages", "facts", "message_topics")
+
+# Firestore collection of each kind
+FIRESTORE_COLLECTIONS = {
+    "conversations": COLLECTIONS["conversations"],
+    "topics": COLLECTIONS["topics"],
+    "messages": COLLECTIONS["messages"],
+    "facts": COLLECTIONS["user_facts"],
+}
+
+MANIFEST = "manifest.json"
+
+Record = Tuple[str, Dict[str, Any]]
+
+
+def encode_value(value: Any) -> Any:
+    """Convert a field value to JSON-compatible data, tagging datetimes and references."""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return {"$date": value.isoformat()}
+    if isinstance(value, dict):
+        return {k: encode_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(v) for v in value]
+    if isinstance(value, bytes):
+        return {"$bytes": base64.b64encode(value).decode("ascii")}
+    if hasattr(value, "path") and hasattr(value, "collection"):  # Firestore DocumentReference
+        return {"$ref": value.path}
+    return value
+
+
+def decode_value(value: Any, db=None) -> Any:
+    """Reverse encode_value; references are restored when a Firestore client is given."""
+    if isinstance(value, dict):
+        if len(value) == 1:
+            if "$date" in value:
+                return datetime.fromisoformat(value["$date"])
+            if "$bytes" in value:
+                return base64.b64decode(value["$bytes"])
+            if "$ref" in value:
+                return db.document(value["$ref"]) if db is not None else value["$ref"]
+        return {k: decode_value(v, db) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode_value(v, db) for v in value]
+    return value
+
+
+@dataclass
+class TransferStats:
+    """Records and bytes moved by an export or import."""
+    counts: Dict[str, int] = field(default_factory=dict)
+    skipped: Dict[str, int] = field(default_factory=dict)
+    bytes: int = 0  # Size of the written files (exports only)
+    started: float = field(default_factory=time.perf_counter)
+    elapsed: float = 0.0
+
+    @property
+    def records(self) -> int:
+        return sum(self.counts.values())
+
+    @property
+    def records_per_second(self) -> float:
+        return self.records / self.elapsed if self.elapsed else 0.0
+
+    def add(self, kind: str, count: int = 1) -> None:
+        self.counts[kind] = self.counts.get(kind, 0) + count
+        self.elapsed = time.perf_counter() - self.started
+
+    def skip(self, kind: str, count: int = 1) -> None:
+        self.skipped[kind] = self.skipped.get(kind, 0) + count
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "counts": dict(self.counts),
+            "skipped": dict(self.skipped),
+            "records": self.records,
+            "bytes": self.bytes,
+            "seconds": round(self.elapsed, 3),
+            "records_per_second": round(self.records_per_second, 1),
+        }
+
+
+# --- Sources ---------------------------------------------------------------
+
+def _firestore_pages(query, page_size: int) -> Iterator[Any]:
+    """Yield the snapshots of a query, one page per request, in document id order."""
+    query = query.order_by("__name__")
+    last_id = None
+    while True:
+        page = query if last_id is None else query.start_after({"__name__": last_id})
+        snapshots = list(page.limit(page_size).stream())
+        yield from snapshots
+        if len(snapshots) < page_size:
+            return
+        last_id = snapshots[-1].id
+
+
+def firestore_records(db, user_id: str, page_size: int = EXPORT_PAGE_SIZE) -> Iterator[Record]:
+    """
+    Yield a user's Firestore documents as (kind, record) pairs.
+
+    Conversations, topics and facts are selected by their userId field.
+    Messages are selected by the conversationId of the exported conversations,
+    since older messages carry no userId; messages without a conversationId
+    (written before scripts/migrate_firestore_fields.py added it) are not
+    exported.
+    """
+    conversation_ids: List[str] = []
+    for kind, collection in FIRESTORE_COLLECTIONS.items():
+        if kind == "messages":
+            queries = [
+                db.collection(collection).where("conversationId", "in", conversation_ids[i:i + CONVERSATIONS_PER_QUERY])
+                for i in range(0, len(conversation_ids), CONVERSATIONS_PER_QUERY)
+            ]
+        else:
+            queries = [db.collection(collection).where("userId", "==", user_id)]
+        for query in queries:
+            for snapshot in _firestore_pages(query, page_size):
+                if kind == "conversations":
+                    conversation_ids.append(snapshot.id)
+                yield kind, {"id": snapshot.id, **encode_value(snapshot.to_dict() or {})}
+
+
+def _postgres_statements(user_id: int):
+    """(kind, SELECT) pairs for a user's rows, using columns only (no ORM objects)."""
+    from sqlalchemy import select
+    from app.models.conversation import Conversation
+    from app.models.message import Message
+    from app.models.topic import MessageTopic, Topic
+    from app.models.userfact import UserFact
+
+    user_messages = select(Message.id).where(Message.user_id == user_id)
+    message_columns = [c for c in Message.__table__.c if c.name != "content_tsv"]  # Maintained by the database
+    return [
+        ("conversations", select(*Conversation.__table__.c).where(Conversation.user_id == user_id)
+            .order_by(Conversation.id)),
+        ("topics", select(*Topic.__table__.c).where(Topic.id.in_(
+            select(MessageTopic.topic_id).where(MessageTopic.message_id.in_(user_messages))
+        )).order_by(Topic.id)),
+        ("messages", select(*message_columns).where(Message.user_id == user_id).order_by(Message.id)),
+        ("facts", select(*UserFact.__table__.c).where(UserFact.user_id == user_id).order_by(UserFact.id)),
+        ("message_topics", select(*MessageTopic.__table__.c).where(MessageTopic.message_id.in_(user_messages))
+            .order_by(MessageTopic.message_id, MessageTopic.topic_id)),
+    ]
+
+
+def postgres_records(session, user_id: int, page_size: int = EXPORT_PAGE_SIZE) -> Iterator[Record]:
+    """Yield a user's PostgreSQL rows as (kind, record) pairs through server-side cursors."""
+    for kind, statement in _postgres_statements(user_id):
+        result = session.execute(statement.execution_options(yield_per=page_size))
+        for row in result:
+            yield kind, encode_value(dict(row._mapping))
+
+
+# --- Writers ---------------------------------------------------------------
+
+class JsonlWriter:
+    """Writes records as gzip-compressed JSON lines."""
+
+    extension = ".jsonl.gz"
+
+    def __init__(self, path: str):
+        self._file = gzip.open(path, "wb")
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._file.write(encode_json(record) + b"\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetWriter:
+    """
+    Writes records as Parquet row groups.
+
+    The schema is inferred from the first row group; later fields missing from
+    it are dropped. Nested values are stored as JSON strings.
+    """
+
+    extension = ".parquet"
+
+    def __init__(self, path: str, row_group: int = PARQUET_ROW_GROUP):
+        if pyarrow is None:
+            raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+        self.path = path
+        self.row_group = row_group
+        self._rows: List[Dict[str, Any]] = []
+        self._writer = None
+
+    @staticmethod
+    def _flat(record: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: encode_json(v).decode("utf-8") if isinstance(v, (dict, list)) else v
+                for k, v in record.items()}
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._rows.append(self._flat(record))
+        if len(self._rows) >= self.row_group:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+        if self._writer is None:
+            table = pyarrow.Table.from_pylist(self._rows)
+            self._writer = pyarrow.parquet.ParquetWriter(self.path, table.schema, compression="zstd")
+        else:
+            table = pyarrow.Table.from_pylist(self._rows, schema=self._writer.schema)
+        self._writer.write_table(table)
+        self._rows = []
+
+    def close(self) -> None:
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+
+WRITERS = {"jsonl": JsonlWriter, "parquet": ParquetWriter}
+
+
+def export_records(records: Iterable[Record], out_dir: str, manifest: Dict[str, Any],
+                   fmt: str = "jsonl", progress_every: int = EXPORT_PAGE_SIZE,
+                   on_progress: Optional[Callable[[TransferStats], None]] = None) -> TransferStats:
+    """
+    Write (kind, record) pairs to an export directory as they arrive.
+
+    Args:
+        records: Record source (firestore_records or postgres_records)
+        out_dir: Directory to create
+        manifest: Backend and user information for manifest.json
+        fmt: "jsonl" or "parquet"
+        progress_every: Records between on_progress calls
+        on_progress: Called with the running stats
+
+    Returns:
+        Export statistics
+    """
+    writer_class = WRITERS[fmt]
+    os.makedirs(out_dir, exist_ok=True)
+    stats = TransferStats()
+    writers: Dict[str, Any] = {}
+    try:
+        for kind, record in records:
+            writer = writers.get(kind)
+            if writer is None:
+                writer = writers[kind] = writer_class(os.path.join(out_dir, kind + writer_class.extension))
+            writer.write(record)
+            stats.add(kind)
+            if on_progress and stats.records % progress_every == 0:
+                on_progress(stats)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    stats.bytes = sum(os.path.getsize(os.path.join(out_dir, kind + writer_class.extension)) for kind in writers)
+    stats.elapsed = time.perf_counter() - stats.started
+
+    with open(os.path.join(out_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump({
+            **manifest,
+            "format": fmt,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "counts": stats.counts,
+        }, f, indent=2)
+    return stats
+
+
+# --- Import ----------------------------------------------------------------
+
+def read_manifest(in_dir: str) -> Dict[str, Any]:
+    with open(os.path.join(in_dir, MANIFEST), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_records(in_dir: str) -> Iterator[Record]:
+    """Yield the (kind, record) pairs of a JSONL export in dependency order, one line at a time."""
+    manifest = read_manifest(in_dir)
+    if manifest.get("format", "jsonl") != "jsonl":
+        raise ValueError(f"Only JSONL exports can be imported (this one is {manifest['format']})")
+    for kind in KINDS:
+        path = os.path.join(in_dir, kind + JsonlWriter.extension)
+        if not os.path.exists(path):
+            continue
+        with gzip.open(path, "rb") as f:
+            for line in f:
+                yield kind, json.loads(line)
+
+
+def _batches(records: Iterable[Record], size: int) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """Group consecutive records of the same kind into batches of at most size."""
+    kind, batch = None, []
+    for record_kind, record in records:
+        if batch and (record_kind != kind or len(batch) >= size):
+            yield kind, batch
+            batch = []
+        kind = record_kind
+        batch.append(record)
+    if batch:
+        yield kind, batch
+
+
+def import_firestore(db, records: Iterable[Record], user_id: Optional[str] = None,
+                     batch_size: int = IMPORT_BATCH_SIZE,
+                     on_progress: Optional[Callable[[TransferStats], None]] = None) -> TransferStats:
+    """
+    Write exported documents back to Firestore with batched writes.
+
+    Args:
+        db: Firestore client
+        records: Records from read_records
+        user_id: Replace the userId of every document (optional, default: keep)
+        batch_size: Documents per batched write
+        on_progress: Called with the running stats after every batch
+
+    Returns:
+        Import statistics
+    """
+    stats = TransferStats()
+    for kind, batch in _batches(records, batch_size):
+        collection = FIRESTORE_COLLECTIONS.get(kind)
+        if collection is None:
+            stats.skip(kind, len(batch))
+            continue
+        writes = db.batch()
+        for record in batch:
+            data = decode_value(record, db)
+            doc_id = data.pop("id")
+            if user_id is not None:
+                data["userId"] = user_id
+            writes.set(db.collection(collection).document(doc_id), data)
+        writes.commit()
+        stats.add(kind, len(batch))
+        if on_progress:
+            on_progress(stats)
+    return stats
+
+
+def import_postgres(session, records: Iterable[Record], user_id: int,
+                    batch_size: int = IMPORT_BATCH_SIZE,
+                    on_progress: Optional[Callable[[TransferStats], None]] = None) -> TransferStats:
+    """
+    Insert exported rows into PostgreSQL for a user with multi-row INSERTs.
+
+    Each batch is committed on its own. Conversations, messages and facts get
+    new ids; message topic links follow the remapped ids and topics are matched
+    to existing topics by name. Rows referencing something that was not
+    imported are skipped.
+
+    Args:
+        session: SQLAlchemy session
+        records: Records from read_records
+        user_id: User that receives the rows
+        batch_size: Rows per INSERT
+        on_progress: Called with the running stats after every batch
+
+    Returns:
+        Import statistics
+    """
+    from sqlalchemy import insert, select
+    from app.models.conversation import Conversation
+    from app.models.message import Message
+    from app.models.topic import MessageTopic, Topic
+    from app.models.userfact import UserFact
+
+    tables = {
+        "conversations": Conversation.__table__,
+        "messages": Message.__table__,
+        "facts": UserFact.__table__,
+    }
+    # Old id -> new id; ints only, so a million messages cost tens of megabytes
+    id_maps: Dict[str, Dict[int, int]] = {"conversations": {}, "topics": {}, "messages": {}}
+
+    def insert_returning_ids(table, rows: List[Dict[str, Any]]) -> List[int]:
+        statement = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+        return list(session.execute(statement, rows).scalars())
+
+    stats = TransferStats()
+    try:
+        for kind, batch in _batches(records, batch_size):
+            batch = [decode_value(record) for record in batch]
+            if kind == "topics":
+                names = {record["name"]: record["id"] for record in batch}
+                existing = dict(session.execute(
+                    select(Topic.name, Topic.id).where(Topic.name.in_(list(names)))
+                ).all())
+                missing = [name for name in names if name not in existing]
+                if missing:
+                    new_ids = insert_returning_ids(Topic.__table__, [{"name": name} for name in missing])
+                    existing.update(zip(missing, new_ids))
+                for name, old_id in names.items():
+                    id_maps["topics"][old_id] = existing[name]
+                count = len(batch)
+            elif kind == "message_topics":
+                rows = [
+                    {"message_id": id_maps["messages"][r["message_id"]], "topic_id": id_maps["topics"][r["topic_id"]]}
+                    for r in batch if r["message_id"] in id_maps["messages"] and r["topic_id"] in id_maps["topics"]
+                ]
+                if rows:
+                    session.execute(insert(MessageTopic.__table__), rows)
+                stats.skip(kind, len(batch) - len(rows))
+                count = len(rows)
+            elif kind in tables:
+                rows = []
+                old_ids = []
+                for record in batch:
+                    old_id = record.pop("id", None)
+                    record["user_id"] = user_id
+                    if kind == "messages":
+                        conversation_id = id_maps["conversations"].get(record.get("conversation_id"))
+                        if conversation_id is None:
+                            stats.skip(kind)
+                            continue
+                        record["conversation_id"] = conversation_id
+                    rows.append(record)
+                    old_ids.append(old_id)
+                if rows:
+                    new_ids = insert_returning_ids(tables[kind], rows)
+                    if kind in id_maps:
+                        id_maps[kind].update(zip(old_ids, new_ids))
+                count = len(rows)
+            else:
+                stats.skip(kind, len(batch))
+                continue
+            session.commit()
+            stats.add(kind, count)
+            if on_progress:
+                on_progress(stats)
+    except Exception:
+        session.rollback()
+        raise
+    return stats
+
+
+def format_stats(label: str, stats: TransferStats) -> str:
+    """One-line throughput report."""
+    counts = ", ".join(f"{kind}={count}" for kind, count in stats.counts.items()) or "nothing"
+    line = f"{label}: {stats.records} records ({counts}) in {stats.elapsed:.1f}s, {stats.records_per_second:.0f} records/sec"
+    if stats.bytes:
+        line += f", {stats.bytes / 1e6:.1f} MB"
+    if stats.skipped:
+        line += f", skipped {stats.skipped}"
+    return line
@@ -0,0 +1,382 @@
+"""
+memory_formatter.py - Shared memory context formatting
+
+Renders the memory context dict produced by MemoryContextBuilder (PostgreSQL)
+and FirebaseMemoryService (Firestore) into the text block that is appended to
+Freya's system prompt.
+
+Each memory list is normalized once per call: timestamps are parsed a single
+time, topic memories are sorted by relevance once and shared by every section
+that needs them, and output is collected in a list and joined at the end.
+Rendered user fact blocks are cached per user and reused while the facts are
+unchanged.
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+RECALL_QUERY_TYPES = ("recall_verification", "content_recall", "fact_checking")
+TEMPORAL_QUERY_TYPES = ("temporal_recall", "previous_conversation")
+
+# Lookup tables for format_timestamp (strftime is the slowest part of timeline rendering)
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+_HOURS_12 = tuple(f"{(hour % 12) or 12:02d}" for hour in range(24))
+
+
+def parse_timestamp(timestamp: Any) -> Optional[datetime]:
+    """
+    Parse a memory timestamp into a datetime.
+
+    Accepts ISO 8601 strings (including a trailing "Z"), datetime objects,
+    Firestore timestamps (anything with a ``seconds`` attribute) and epoch
+    seconds.
+
+    Args:
+        timestamp: Timestamp value from a memory record
+
+    Returns:
+        The parsed datetime, or None if the value cannot be parsed
+    """
+    if isinstance(timestamp, datetime):
+        return timestamp
+    if isinstance(timestamp, str):
+        try:
+            return datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    if hasattr(timestamp, "seconds"):
+        return datetime.fromtimestamp(timestamp.seconds, tz=timezone.utc)
+    return None
+
+
+def format_timestamp(dt: datetime) -> str:
+    """
+    Format a datetime like ``strftime("%b %d, %Y at %I:%M %p")`` (e.g. "May 15, 2023 at 10:00 AM").
+
+    Args:
+        dt: The datetime to format
+
+    Returns:
+        The formatted timestamp
+    """
+    return (
+        f"{_MONTHS[dt.month - 1]} {dt.day:02d}, {dt.year} at "
+        f"{_HOURS_12[dt.hour]}:{dt.minute:02d} {'PM' if dt.hour >= 12 else 'AM'}"
+    )
+
+
+def _sort_key(dt: Optional[datetime]) -> Tuple[int, float]:
+    """Sort key placing unparseable timestamps last when sorting newest first."""
+    if dt is None:
+        return (0, 0.0)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (1, dt.timestamp())
+
+
+def _topic_relevance(topic_memory: Dict[str, Any]) -> float:
+    return topic_memory.get("topic", {}).get("relevance", 0)
+
+
+class MemoryFormatter:
+    """
+    Formats memory context for chat completion prompts.
+
+    One instance is shared by the PostgreSQL and Firestore memory services.
+    """
+
+    def __init__(self, fact_cache_size: int = 1024):
+        """
+        Initialize the formatter.
+
+        Args:
+            fact_cache_size: Maximum number of users whose rendered fact block is cached
+        """
+        self._fact_cache: "OrderedDict[Hashable, Tuple[Tuple, str]]" = OrderedDict()
+        self._fact_cache_size = fact_cache_size
+        self._fact_cache_lock = Lock()
+
+    def format_memory_context(self, memory_context: Dict[str, Any], user_id: Optional[Hashable] = None) -> str:
+        """
+        Format the memory context for chat completion.
+
+        Args:
+            memory_context: The memory context to format
+            user_id: Owner of the memory context, enables the per-user fact block cache
+
+        Returns:
+            Formatted memory context as a string
+        """
+        is_memory_query = memory_context.get("is_memory_query", False)
+        memory_query_type = memory_context.get("memory_query_type", "general_memory_query")
+        user_facts = memory_context["user_facts"]
+        topic_memories = memory_context["topic_memories"]
+        recent_memories = memory_context["recent_memories"]
+
+        parts = ["### Memory Context ###\n\n"]
+
+        if user_facts:
+            parts.append(self.format_user_facts(user_facts, user_id))
+
+        # Sorted once and shared by every section below
+        sorted_topics = sorted(topic_memories, key=_topic_relevance, reverse=True)
+
+        if not is_memory_query:
+            self._render_default(parts, sorted_topics, recent_memories)
+        elif memory_query_type in RECALL_QUERY_TYPES:
+            self._render_topic_recall(parts, sorted_topics)
+            self._render_recent_recall(parts, recent_memories)
+        elif memory_query_type in TEMPORAL_QUERY_TYPES:
+            self._render_timeline(parts, recent_memories, topic_memories)
+        elif memory_query_type == "existence_verification":
+            self._render_existence_verification(
+                parts, sorted_topics, recent_memories, memory_context.get("memory_query_topics", [])
+            )
+        elif memory_query_type == "knowledge_query":
+            self._render_knowledge(
+                parts, user_facts, topic_memories, memory_context.get("memory_query_topics", [])
+            )
+        else:
+            self._render_default(parts, sorted_topics, recent_memories)
+
+        return "".join(parts)
+
+    def format_user_facts(self, facts: List[Dict[str, Any]], user_id: Optional[Hashable] = None) -> str:
+        """
+        Format user facts, sorted by confidence, with 1-5 star confidence indicators.
+
+        Args:
+            facts: List of user facts
+            user_id: If given, the rendered block is cached for this user until the facts change
+
+        Returns:
+            Formatted user facts as a string
+        """
+        if not facts:
+            return ""
+
+        if user_id is None:
+            return self._render_user_facts(facts)
+
+        signature = tuple((fact.get("type"), fact.get("value"), fact.get("confidence", 0)) for fact in facts)
+        with self._fact_cache_lock:
+            cached = self._fact_cache.get(user_id)
+            if cached is not None and cached[0] == signature:
+                self._fact_cache.move_to_end(user_id)
+                return cached[1]
+
+        rendered = self._render_user_facts(facts)
+        with self._fact_cache_lock:
+            self._fact_cache[user_id] = (signature, rendered)
+            self._fact_cache.move_to_end(user_id)
+            while len(self._fact_cache) > self._fact_cache_size:
+                self._fact_cache.popitem(last=False)
+        return rendered
+
+    def invalidate_user_facts(self, user_id: Optional[Hashable] = None):
+        """
+        Drop cached fact blocks.
+
+        Args:
+            user_id: User to invalidate, or None to clear the whole cache
+        """
+        with self._fact_cache_lock:
+            if user_id is None:
+                self._fact_cache.clear()
+            else:
+                self._fact_cache.pop(user_id, None)
+
+    def format_topic_memories_for_recall(self, topic_memories: List[Dict[str, Any]]) -> str:
+        """Format topic memories (relevance >= 30) for recall-type queries."""
+        parts: List[str] = []
+        self._render_topic_recall(parts, sorted(topic_memories, key=_topic_relevance, reverse=True))
+        return "".join(parts)
+
+    def format_recent_memories_for_recall(self, recent_memories: List[Dict[str, Any]]) -> str:
+        """Format the top 5 recent memories for recall-type queries."""
+        parts: List[str] = []
+        self._render_recent_recall(parts, recent_memories)
+        return "".join(parts)
+
+    def format_memories_with_timestamps(self, recent_memories: List[Dict[str, Any]], topic_memories: List[Dict[str, Any]]) -> str:
+        """Format recent and topic memories as a newest-first timeline for temporal queries."""
+        parts: List[str] = []
+        self._render_timeline(parts, recent_memories, topic_memories)
+        return "".join(parts)
+
+    def format_memories_for_existence_verification(self, topic_memories: List[Dict[str, Any]], recent_memories: List[Dict[str, Any]], query_topics: List[str]) -> str:
+        """Format a yes/no answer with supporting memories for existence verification queries."""
+        parts: List[str] = []
+        self._render_existence_verification(
+            parts, sorted(topic_memories, key=_topic_relevance, reverse=True), recent_memories, query_topics
+        )
+        return "".join(parts)
+
+    def format_memories_for_knowledge_query(self, user_facts: List[Dict[str, Any]], topic_memories: List[Dict[str, Any]], query_topics: List[str]) -> str:
+        """Format facts and conversations related to the query topics for knowledge queries."""
+        parts: List[str] = []
+        self._render_knowledge(parts, user_facts, topic_memories, query_topics)
+        return "".join(parts)
+
+    def format_default_memory_context(self, memory_context: Dict[str, Any]) -> str:
+        """Format the top topics and recent conversation for general queries."""
+        parts: List[str] = []
+        self._render_default(
+            parts,
+            sorted(memory_context["topic_memories"], key=_topic_relevance, reverse=True),
+            memory_context["recent_memories"]
+        )
+        return "".join(parts)
+
+    def _render_user_facts(self, facts: List[Dict[str, Any]]) -> str:
+        lines = ["## User Facts\n"]
+        for fact in sorted(facts, key=lambda x: x.get("confidence", 0), reverse=True):
+            confidence = fact.get("confidence", 0)
+            confidence_indicator = "★" * (1 + min(4, int(confidence / 20)))  # 1-5 stars based on confidence
+            lines.append(f"- {fact['type'].capitalize()}: {fact['value']} {confidence_indicator}\n")
+        lines.append("\n")
+        return "".join(lines)
+
+    def _render_topic_recall(self, parts: List[str], sorted_topics: List[Dict[str, Any]]):
+        if not sorted_topics:
+            return
+
+        parts.append("## Topic-Related Memories\n")
+        for topic_memory in sorted_topics:
+            topic = topic_memory.get("topic", {})
+            # Only include topics with reasonable relevance
+            if topic.get("relevance", 0) < 30:
+                continue
+
+            parts.append(f"### {topic.get('name', 'Unknown Topic')}\n")
+            parts.extend(f"- {message.get('content', '')}\n" for message in topic_memory.get("messages", []))
+            parts.append("\n")
+
+    def _render_recent_recall(self, parts: List[str], recent_memories: List[Dict[str, Any]]):
+        if not recent_memories:
+            return
+
+        # Sort by relevance if available, otherwise they're already sorted by recency
+        if "relevance" in recent_memories[0]:
+            recent_memories = sorted(recent_memories, key=lambda x: x.get("relevance", 0), reverse=True)
+
+        parts.append("## Recent Conversation History\n")
+        for memory in recent_memories[:5]:
+            # Only include memories with reasonable relevance if relevance is available
+            if "relevance" in memory and memory["relevance"] < 30:
+                continue
+            parts.append(f"- {memory.get('content', '')}\n")
+        parts.append("\n")
+
+    def _render_timeline(self, parts: List[str], recent_memories: List[Dict[str, Any]], topic_memories: List[Dict[str, Any]]):
+        if not recent_memories and not topic_memories:
+            return
+
+        # (parsed timestamp, raw timestamp, topic name, content), parsed exactly once
+        entries = []
+        for memory in recent_memories:
+            if "timestamp" in memory:
+                timestamp = memory["timestamp"]
+                entries.append((parse_timestamp(timestamp) if timestamp else None, timestamp, "", memory.get("content", "")))
+
+        for topic_memory in topic_memories:
+            topic_name = topic_memory.get("topic", {}).get("name", "")
+            for message in topic_memory.get("messages", []):
+                if "timestamp" in message:
+                    timestamp = message["timestamp"]
+                    entries.append((parse_timestamp(timestamp) if timestamp else None, timestamp, topic_name, message.get("content", "")))
+
+        # Newest first
+        entries.sort(key=lambda entry: _sort_key(entry[0]), reverse=True)
+
+        parts.append("## Conversation Timeline\n")
+        for dt, timestamp, topic, content in entries:
+            if dt is not None:
+                timestamp_str = format_timestamp(dt)
+            elif timestamp:
+                # If parsing fails, use the original timestamp
+                timestamp_str = str(timestamp)
+            else:
+                timestamp_str = "Unknown time"
+
+            topic_str = f" (Topic: {topic})" if topic else ""
+            parts.append(f"- {timestamp_str}{topic_str}: {content}\n")
+        parts.append("\n")
+
+    def _render_existence_verification(self, parts: List[str], sorted_topics: List[Dict[str, Any]], recent_memories: List[Dict[str, Any]], query_topics: List[str]):
+        if not sorted_topics and not recent_memories:
+            parts.append("## Memory Verification\nNo relevant memories found about this topic.\n\n")
+            return
+
+        query_topics_lower = [query_topic.lower() for query_topic in query_topics]
+        has_relevant_memories = any(
+            _topic_relevance(topic_memory) >= 50
+            or any(query_topic in topic_memory.get("topic", {}).get("name", "").lower() for query_topic in query_topics_lower)
+            for topic_memory in sorted_topics
+        ) or any(memory.get("relevance", 0) >= 50 for memory in recent_memories)
+
+        parts.append("## Memory Verification\n")
+        if has_relevant_memories:
+            parts.append("Yes, we have discussed this topic before. Here are the relevant memories:\n\n")
+            self._render_topic_recall(parts, sorted_topics)
+            self._render_recent_recall(parts, recent_memories)
+        else:
+            parts.append("No, we haven't discussed this topic in detail before.\n\n")
+
+    def _render_knowledge(self, parts: List[str], user_facts: List[Dict[str, Any]], topic_memories: List[Dict[str, Any]], query_topics: List[str]):
+        query_topics_lower = [query_topic.lower() for query_topic in query_topics]
+        parts.append("## Knowledge About User\n")
+
+        # Facts relevant to the query topics
+        relevant_facts = []
+        for fact in user_facts:
+            fact_type = fact.get("type", "").lower()
+            fact_value = fact.get("value", "").lower()
+            if any(query_topic in fact_type or query_topic in fact_value for query_topic in query_topics_lower):
+                relevant_facts.append(fact)
+
+        if relevant_facts:
+            parts.append("### Known Facts\n")
+            parts.extend(f"- {fact['type'].capitalize()}: {fact['value']}\n" for fact in relevant_facts)
+            parts.append("\n")
+
+        if topic_memories:
+            parts.append("### Related Conversations\n")
+            for topic_memory in topic_memories:
+                topic = topic_memory.get("topic", {})
+                topic_name = topic.get("name", "")
+                topic_name_lower = topic_name.lower()
+                if not (topic.get("relevance", 0) >= 30 or any(query_topic in topic_name_lower for query_topic in query_topics_lower)):
+                    continue
+
+                messages = topic_memory.get("messages", [])
+                if messages:
+                    parts.append(f"#### {topic_name}\n")
+                    parts.extend(f"- {message.get('content', '')}\n" for message in messages)
+                    parts.append("\n")
+
+        if not relevant_facts and not topic_memories:
+            parts.append("I don't have much information about this topic yet.\n\n")
+
+    def _render_default(self, parts: List[str], sorted_topics: List[Dict[str, Any]], recent_memories: List[Dict[str, Any]]):
+        if sorted_topics:
+            parts.append("## Relevant Topics\n")
+            for topic_memory in sorted_topics[:3]:  # Limit to top 3
+                messages = topic_memory.get("messages", [])
+                if messages:
+                    parts.append(f"### {topic_memory.get('topic', {}).get('name', '')}\n")
+                    parts.extend(f"- {message.get('content', '')}\n" for message in messages[:2])  # Top 2 per topic
+                    parts.append("\n")
+
+        if recent_memories:
+            parts.append("## Recent Conversation\n")
+            parts.extend(f"- {memory.get('content', '')}\n" for memory in recent_memories[:3])
+            parts.append("\n")
+
+
+# Shared instance used by both memory services
+memory_formatter = MemoryFormatter()
@@ -0,0 +1,174 @@
+"""
+memory_query_classifier.py - Shared memory query intent classification
+
+Used by both the PostgreSQL (MemoryContextBuilder) and Firestore
+(FirebaseMemoryService) memory paths, so the detection patterns and the
+query type rules live in exactly one place.
+
+Each rule set is compiled into a single alternation: one search decides
+whether a query is a memory query, and only memory queries pay for the
+query type scan.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Memory query patterns for detecting when a user is asking about past conversations
+MEMORY_QUERY_PATTERNS = [
+    # Direct memory questions
+    r'do you remember (when|what|how|where|why|who|if|that|about|our|my|the)',
+    r'what did (i|we|you) (say|tell|ask|talk|mention) (about|regarding|concerning)',
+    r'(what|when) did (i|we) (discuss|talk about|mention|say)',
+    r'have (i|we) (talked|spoken|discussed|mentioned) (about|regarding)',
+    r'(tell|remind) me (about|what|when|how|where|why) (i|we|you) (said|mentioned|talked about)',
+
+    # Recall requests
+    r'(recall|remember|recollect) (our|the|that|when|what|how|where|why|who)',
+    r'(bring up|reference) (what|when|how|where|why|who|that|our|the)',
+
+    # Topic-specific recall
+    r'what (did|do) you know about my',
+    r'what (have|did) (i|we) (say|tell you|mention) about (my|our|the)',
+
+    # Previous conversation references
+    r'(last time|previously|earlier|before) (we|you|i) (talked|spoke|discussed|mentioned|said)',
+    r'(in|during) (our|a) (previous|past|last|earlier|recent) (conversation|discussion|chat)',
+
+    # Fact checking
+    r'(didn\'t|did) (i|we) (talk|speak|discuss|mention|tell you) (about|that|how|when|where|why)',
+    r'am i (right|correct) (that|when i say) (you|we|i)',
+
+    # Additional patterns for knowledge questions
+    r'what do you know about (my|our|the)',
+    r'tell me what you know about (my|our|the)',
+]
+
+# Memory-related keywords that mark a query as a memory query on their own
+MEMORY_KEYWORDS = ["remember", "recall", "forget", "memory", "mentioned",
+                   "told", "said", "talked about", "discussed", "conversation"]
+
+# Query type rules, highest priority first
+MEMORY_QUERY_TYPE_RULES = [
+    ("recall_verification", r'do you remember'),
+    ("content_recall", r'what did (i|we|you) (say|tell|ask|talk|mention)'),
+    ("temporal_recall", r'when did (i|we) (discuss|talk about|mention|say)'),
+    ("existence_verification", r'have (i|we) (talked|spoken|discussed|mentioned)'),
+    ("knowledge_query", r'what do you know about my'),
+    ("previous_conversation", r'(last time|previously|earlier|before)'),
+    ("fact_checking", r'(didn\'t|did) (i|we) (talk|speak|discuss|mention|tell)'),
+]
+
+GENERAL_MEMORY_QUERY = "general_memory_query"
+
+
+class MemoryQueryClassifier:
+    """
+    Classifies user queries as memory queries and assigns a memory query type.
+
+    Patterns are matched against the lowercased query. Detection patterns are
+    anchored at word starts, which lets the regex engine skip most positions;
+    keywords still match anywhere (e.g. "unforgettable" contains "forget").
+    Query type rules become named groups inside zero-width lookaheads, so a
+    single scan finds every rule that matches and the highest priority one wins.
+    """
+
+    def __init__(
+        self,
+        memory_patterns: Optional[List[str]] = None,
+        memory_keywords: Optional[List[str]] = None,
+        type_rules: Optional[List[Tuple[str, str]]] = None
+    ):
+        """
+        Initialize the classifier and compile its patterns.
+
+        Args:
+            memory_patterns: Lowercase regex sources that identify memory queries
+            memory_keywords: Lowercase keywords that identify memory queries
+            type_rules: (query_type, lowercase regex source) pairs, highest priority first
+        """
+        memory_patterns = MEMORY_QUERY_PATTERNS if memory_patterns is None else memory_patterns
+        memory_keywords = MEMORY_KEYWORDS if memory_keywords is None else memory_keywords
+        type_rules = MEMORY_QUERY_TYPE_RULES if type_rules is None else type_rules
+
+        alternatives = []
+        if memory_patterns:
+            alternatives.append(r"\b(?:" + "|".join(f"(?:{p})" for p in memory_patterns) + ")")
+        if memory_keywords:
+            alternatives.extend(re.escape(k) for k in memory_keywords)
+        types = "|".join(f"(?P<{name}>{pattern})" for name, pattern in type_rules)
+
+        self.type_names: List[str] = [name for name, _ in type_rules]
+        self.type_rank: Dict[str, int] = {name: rank for rank, name in enumerate(self.type_names)}
+        self.detect_pattern = re.compile("|".join(alternatives) or r"(?!)")
+        self.type_pattern = re.compile(rf"\b(?=(?:{types}))" if types else r"(?!)")
+
+    def classify(self, query: str) -> Tuple[bool, str]:
+        """
+        Classify a query.
+
+        Args:
+            query: The user query to analyze
+
+        Returns:
+            Tuple of (is_memory_query, memory_query_type). Non-memory queries are
+            always "general_memory_query", as is any memory query no type rule matches.
+        """
+        query_lower = query.lower()
+        if self.detect_pattern.search(query_lower) is None:
+            return False, GENERAL_MEMORY_QUERY
+        return True, self._query_type(query_lower)
+
+    def is_memory_query(self, query: str) -> bool:
+        """
+        Detect if a query is asking about past conversations or memories.
+
+        Args:
+            query: The user query to analyze
+
+        Returns:
+            True if the query is memory-related, False otherwise
+        """
+        return self.detect_pattern.search(query.lower()) is not None
+
+    def classify_query_type(self, query: str) -> str:
+        """
+        Classify the type of memory query, without checking it is one.
+
+        Args:
+            query: The user query
+
+        Returns:
+            Memory query type classification
+        """
+        return self._query_type(query.lower())
+
+    def _query_type(self, query_lower: str) -> str:
+        best_rank = len(self.type_names)
+        for match in self.type_pattern.finditer(query_lower):
+            rank = self.type_rank[match.lastgroup]
+            if rank < best_rank:
+                best_rank = rank
+                if rank == 0:
+                    break
+        if best_rank < len(self.type_names):
+            return self.type_names[best_rank]
+        return GENERAL_MEMORY_QUERY
+
+
+# Shared default instance
+memory_query_classifier = MemoryQueryClassifier()
+
+
+@lru_cache(maxsize=256)
+def classify_memory_query(query: str) -> Tuple[bool, str]:
+    """
+    Classify a query with the shared classifier, caching repeated queries.
+
+    Args:
+        query: The user query to analyze
+
+    Returns:
+        Tuple of (is_memory_query, memory_query_type)
+    """
+    return memory_query_classifier.classify(query)
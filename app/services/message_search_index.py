@@ -0,0 +1,295 @@
+"""
+message_search_index.py - Incremental per-user BM25 index over message text
+
+Firestore has no full-text search, so in Firestore mode every user gets an
+in-process inverted index over their messages (the counterpart of the
+content_tsv column in PostgreSQL mode). FirebaseService.add_message updates it
+as messages are stored, and a lookup returns the best matching messages with
+their text, so recall needs no Firestore reads at all.
+
+Persistence is a gzipped JSON snapshot per user under SEARCH_INDEX_DIR. Only
+the messages are written; postings are rebuilt when a snapshot is loaded.
+Snapshots are written every SNAPSHOT_EVERY updates, when a user's index is
+evicted from memory, and at exit.
+"""
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import atexit
+import gzip
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import threading
+
+from app.core.config import logger
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Updates to a user's index between snapshots
+SNAPSHOT_EVERY = 20
+
+# User indexes kept in memory before the least recently used is evicted
+MAX_LOADED_USERS = 512
+
+STOP_WORDS = frozenset("""
+a an and are as at be been but by can did do does for from had has have he her him his how i i'm
+if in is it it's its just me my of on or our she so that the their them then there they this to
+was we were what when where which who why will with you your
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stop words or possessive endings."""
+    tokens = []
+    for token in _TOKEN_RE.findall((text or "").lower()):
+        if token.endswith("'s"):
+            token = token[:-2]
+        token = token.strip("'")
+        if token and token not in STOP_WORDS:
+            tokens.append(token)
+    return tokens
+
+
+class UserBM25Index:
+    """Inverted index with BM25 scoring over one user's messages."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # message id -> (text, timestamp, token count)
+        self.docs: Dict[str, Tuple[str, Any, int]] = {}
+        # term -> {message id: term frequency}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def __contains__(self, message_id: str) -> bool:
+        return message_id in self.docs
+
+    def add(self, message_id: str, text: str, timestamp: Any = None) -> bool:
+        """
+        Index a message, replacing any earlier version with the same id.
+
+        Returns:
+            True if the index changed
+        """
+        with self.lock:
+            existing = self.docs.get(message_id)
+            if existing is not None and existing[0] == text:
+                return False
+            if existing is not None:
+                self._remove(message_id)
+            counts = Counter(tokenize(text))
+            length = sum(counts.values())
+            self.docs[message_id] = (text, timestamp, length)
+            self.total_length += length
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[message_id] = tf
+            return True
+
+    def remove(self, message_id: str) -> bool:
+        """Remove a message; returns True if it was indexed."""
+        with self.lock:
+            if message_id not in self.docs:
+                return False
+            self._remove(message_id)
+            return True
+
+    def _remove(self, message_id: str) -> None:
+        text, _, length = self.docs.pop(message_id)
+        self.total_length -= length
+        for term in set(tokenize(text)):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(message_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Return the messages that best match a query.
+
+        Returns:
+            Up to limit dicts with id, content, timestamp and score, best first
+        """
+        terms = set(tokenize(query))
+        with self.lock:
+            count = len(self.docs)
+            if not terms or not count:
+                return []
+            avg_length = self.total_length / count
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                for message_id, tf in postings.items():
+                    length = self.docs[message_id][2]
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[message_id] = scores.get(message_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [
+                {"id": message_id, "content": self.docs[message_id][0],
+                 "timestamp": self.docs[message_id][1], "score": score}
+                for message_id, score in best
+            ]
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"version": 1, "messages": [[i, text, ts] for i, (text, ts, _) in self.docs.items()]}
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict[str, Any]) -> "UserBM25Index":
+        index = cls()
+        for message_id, text, timestamp in snapshot.get("messages", []):
+            index.add(message_id, text, timestamp)
+        return index
+
+
+class MessageSearchIndex:
+    """
+    Per-user BM25 indexes with optional snapshot persistence.
+
+    Args:
+        root: Directory for snapshots, or None to keep indexes in memory only
+    """
+
+    def __init__(self, root: Optional[str] = None, snapshot_every: int = SNAPSHOT_EVERY,
+                 max_loaded_users: int = MAX_LOADED_USERS):
+        self.root = root
+        self.snapshot_every = snapshot_every
+        self.max_loaded_users = max_loaded_users
+        self._users: "OrderedDict[str, UserBM25Index]" = OrderedDict()
+        self._dirty: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        if root:
+            os.makedirs(root, exist_ok=True)
+
+    def _snapshot_path(self, user_key: str) -> str:
+        return os.path.join(self.root, hashlib.sha1(user_key.encode("utf-8")).hexdigest()[:16] + ".json.gz")
+
+    def for_user(self, user_id: Any) -> UserBM25Index:
+        """Return a user's index, loading its snapshot on first use."""
+        key = str(user_id)
+        with self._lock:
+            index = self._users.get(key)
+            if index is None:
+                index = self._load(key)
+                self._users[key] = index
+                while len(self._users) > self.max_loaded_users:
+                    evicted, _ = next(iter(self._users.items()))
+                    self._save(evicted)
+                    self._users.pop(evicted)
+            self._users.move_to_end(key)
+            return index
+
+    def _load(self, user_key: str) -> UserBM25Index:
+        if not self.root or not os.path.exists(self._snapshot_path(user_key)):
+            return UserBM25Index()
+        try:
+            with gzip.open(self._snapshot_path(user_key), "rt", encoding="utf-8") as f:
+                return UserBM25Index.from_snapshot(json.load(f))
+        except Exception as e:
+            logger.error(f"Error loading search index snapshot for {user_key}: {str(e)}")
+            return UserBM25Index()
+
+    def _save(self, user_key: str) -> None:
+        changes = self._dirty.pop(user_key, 0)
+        if not self.root or not changes:
+            return
+        index = self._users.get(user_key)
+        if index is None:
+            return
+        path = self._snapshot_path(user_key)
+        tmp = path + ".tmp"
+        try:
+            with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                json.dump(index.to_snapshot(), f, separators=(",", ":"), default=str)
+            os.replace(tmp, path)
+        except Exception as e:
+            self._dirty[user_key] = self._dirty.get(user_key, 0) + changes
+            logger.error(f"Error writing search index snapshot for {user_key}: {str(e)}")
+
+    def _touched(self, user_key: str, changes: int) -> None:
+        with self._lock:
+            self._dirty[user_key] = self._dirty.get(user_key, 0) + changes
+            if self._dirty[user_key] >= self.snapshot_every:
+                self._save(user_key)
+
+    def add_message(self, user_id: Any, message_id: str, text: str, timestamp: Any = None) -> bool:
+        """Index one message for a user."""
+        if not message_id or not text:
+            return False
+        changed = self.for_user(user_id).add(message_id, text, timestamp)
+        if changed:
+            self._touched(str(user_id), 1)
+        return changed
+
+    def add_messages(self, user_id: Any, messages: Iterable[Dict[str, Any]]) -> int:
+        """
+        Index already loaded Firestore messages, skipping known ids.
+
+        Returns:
+            Number of messages added
+        """
+        index = self.for_user(user_id)
+        added = 0
+        for message in messages:
+            message_id = message.get("id")
+            text = message.get("content") or message.get("user")
+            if message_id and text and message_id not in index:
+                added += index.add(message_id, text, message.get("timestamp"))
+        if added:
+            self._touched(str(user_id), added)
+        return added
+
+    def remove_message(self, user_id: Any, message_id: str) -> bool:
+        """Remove a message from a user's index."""
+        removed = self.for_user(user_id).remove(message_id)
+        if removed:
+            self._touched(str(user_id), 1)
+        return removed
+
+    def search(self, user_id: Any, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Return a user's messages that best match a query."""
+        return self.for_user(user_id).search(query, limit)
+
+    def flush(self) -> None:
+        """Write snapshots of every index with unsaved changes."""
+        with self._lock:
+            for user_key in list(self._dirty):
+                self._save(user_key)
+
+
+_message_search_index: Optional[MessageSearchIndex] = None
+
+
+def get_message_search_index() -> MessageSearchIndex:
+    """
+    Return the process-wide message search index.
+
+    Snapshots go to SEARCH_INDEX_DIR when set; otherwise the index lives in
+    memory only. Unsaved changes are written at exit.
+    """
+    global _message_search_index
+    if _message_search_index is None:
+        from app.core.config import SEARCH_INDEX_DIR
+        _message_search_index = MessageSearchIndex(SEARCH_INDEX_DIR)
+        atexit.register(_message_search_index.flush)
+    return _message_search_index
+
+
+def set_message_search_index(index: Optional[MessageSearchIndex]) -> None:
+    """Replace the process-wide message search index (None resets it)."""
+    global _message_search_index
+    _message_search_index = index
@@ -19,6 +19,10 @@ class MockFirebaseService:
     
     This class simulates Firebase functionality without making actual API calls.
     It stores data in memory for the duration of the application.
+    
+    For load tests use the Firestore emulator instead (FIREBASE_EMULATOR=memory,
+    see app/services/firestore_emulator.py): it runs the real FirebaseService
+    queries against indexed in-memory collections.
     """
     
     _instance = None
@@ -127,7 +131,8 @@ class MockFirebaseService:
         return False
     
     def query_collection(self, collection: str, filters: List[Tuple[str, str, Any]], order_by: Optional[str] = None, 
-                        desc: bool = False, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+                        desc: bool = False, limit: Optional[int] = None,
+                        select: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """Query the mock storage."""
         if collection not in self._storage:
             return []
@@ -148,6 +153,8 @@ class MockFirebaseService:
                 docs = [doc for doc in docs if field in doc and doc[field] <= value]
             elif op == "array_contains":
                 docs = [doc for doc in docs if field in doc and value in doc[field]]
+            elif op == "array_contains_any":
+                docs = [doc for doc in docs if field in doc and any(v in doc[field] for v in value)]
         
         # Apply ordering
         if order_by:
@@ -157,13 +164,61 @@ class MockFirebaseService:
         if limit:
             docs = docs[:limit]
         
+        # Apply projection
+        if select is not None:
+            docs = [{k: v for k, v in doc.items() if k == "id" or k in select} for doc in docs]
+        
         return docs
     
+    def stream_collection(self, collection: str, filters: Optional[List[Tuple[str, str, Any]]] = None,
+                          order_by: Optional[str] = None, desc: bool = False,
+                          limit: Optional[int] = None, select: Optional[List[str]] = None,
+                          page_size: Optional[int] = None, start_after: Optional[str] = None):
+        """Yield documents from the mock storage one at a time."""
+        docs = self.query_collection(collection, filters or [], order_by, desc, None, select)
+        if start_after is not None:
+            ids = [doc.get("id") for doc in docs]
+            docs = docs[ids.index(start_after) + 1:] if start_after in ids else []
+        yield from docs[:limit] if limit else docs
+    
+    def count_documents(self, collection: str, filters: Optional[List[Tuple[str, str, Any]]] = None,
+                        limit: Optional[int] = None, use_cache: bool = True) -> int:
+        """Count documents in the mock storage."""
+        return len(self.query_collection(collection, filters or [], limit=limit))
+    
+    def sum_field(self, collection: str, field: str, filters: Optional[List[Tuple[str, str, Any]]] = None,
+                  use_cache: bool = True) -> float:
+        """Sum a numeric field in the mock storage."""
+        docs = self.query_collection(collection, filters or [])
+        return sum(doc[field] for doc in docs if isinstance(doc.get(field), (int, float)))
+    
+    def avg_field(self, collection: str, field: str, filters: Optional[List[Tuple[str, str, Any]]] = None,
+                  use_cache: bool = True) -> Optional[float]:
+        """Average a numeric field in the mock storage."""
+        docs = self.query_collection(collection, filters or [])
+        values = [doc[field] for doc in docs if isinstance(doc.get(field), (int, float))]
+        return sum(values) / len(values) if values else None
+    
+    def document_exists(self, collection: str, filters: List[Tuple[str, str, Any]],
+                        use_cache: bool = True) -> bool:
+        """Check whether any mock document matches."""
+        return self.count_documents(collection, filters, limit=1) > 0
+    
+    def count_by_array_values(self, collection: str, field: str, values: List[Any],
+                              filters: Optional[List[Tuple[str, str, Any]]] = None,
+                              use_cache: bool = True) -> Dict[Any, int]:
+        """Count mock documents per array value."""
+        return {
+            value: self.count_documents(collection, list(filters or []) + [(field, "array_contains", value)])
+            for value in dict.fromkeys(values)
+        }
+    
     def subcollection_query(self, parent_collection: str, parent_id: str, sub_collection: str, 
                           filters: List[Tuple[str, str, Any]] = None, 
                           order_by: Optional[str] = None,
                           desc: bool = False,
-                          limit: Optional[int] = None) -> List[Dict[str, Any]]:
+                          limit: Optional[int] = None,
+                          select: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """Query a subcollection in the mock storage."""
         # For simplicity, we'll store messages in a flat structure with conversation_id field
         if sub_collection == "messages":
@@ -194,6 +249,10 @@ class MockFirebaseService:
             if limit:
                 messages = messages[:limit]
             
+            # Apply projection
+            if select is not None:
+                messages = [{k: v for k, v in msg.items() if k == "id" or k in select} for msg in messages]
+            
             return messages
         
         return []
@@ -240,7 +299,8 @@ class MockFirebaseService:
         """Get a conversation by ID."""
         return self.get_document("conversations", conversation_id)
     
-    def get_user_conversations(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+    def get_user_conversations(self, user_id: str, limit: int = 10,
+                               fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """Get conversations for a user."""
         convs = []
         
@@ -257,7 +317,8 @@ class MockFirebaseService:
         # Apply limit
         return convs[:limit]
     
-    def get_conversation_messages(self, conversation_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+    def get_conversation_messages(self, conversation_id: str, limit: int = 50,
+                                  fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """Get messages for a conversation."""
         # Get conversation
         conv = self.get_document("conversations", conversation_id)
@@ -277,17 +338,39 @@ class MockFirebaseService:
         """Add a message to a conversation."""
         return self.add_to_subcollection("conversations", conversation_id, "messages", message_data)
     
-    def get_user_facts(self, user_id: str) -> List[Dict[str, Any]]:
+    def get_user_facts(self, user_id: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """Get facts for a user."""
-        return self.query_collection("user_facts", [("userId", "==", user_id)])
+        return self.query_collection("user_facts", [("userId", "==", user_id)], select=fields)
     
     def add_user_fact(self, fact_data: Dict[str, Any]) -> str:
         """Add a user fact."""
         return self.add_document("user_facts", fact_data)
     
-    def get_user_topics(self, user_id: str) -> List[Dict[str, Any]]:
+    def get_user_topics(self, user_id: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """Get topics for a user."""
-        return self.query_collection("topics", [("userId", "==", user_id)])
+        return self.query_collection("topics", [("userId", "==", user_id)], select=fields)
+    
+    def stream_user_facts(self, user_id: str, limit: Optional[int] = None, start_after: Optional[str] = None,
+                          fields: Optional[List[str]] = None):
+        """Yield facts for a user."""
+        return self.stream_collection("user_facts", [("userId", "==", user_id)], limit=limit,
+                                      select=fields, start_after=start_after)
+    
+    def stream_user_topics(self, user_id: str, limit: Optional[int] = None, start_after: Optional[str] = None,
+                           fields: Optional[List[str]] = None):
+        """Yield topics for a user."""
+        return self.stream_collection("topics", [("userId", "==", user_id)], limit=limit,
+                                      select=fields, start_after=start_after)
+    
+    def stream_conversation_messages(self, conversation_id: str, limit: Optional[int] = None,
+                                     start_after: Optional[str] = None, fields: Optional[List[str]] = None):
+        """Yield messages for a conversation."""
+        conversation = self.get_document("conversations", conversation_id) or {}
+        messages = self.get_conversation_messages(conversation_id, limit=len(conversation.get("messages", [])))
+        if start_after is not None:
+            ids = [msg.get("id") for msg in messages]
+            messages = messages[ids.index(start_after) + 1:] if start_after in ids else []
+        return iter(messages[:limit] if limit else messages)
 
 class MockMemoryService:
     """
@@ -5,6 +5,7 @@ import os
 import logging
 import time
 import asyncio
+import threading
 from typing import Dict, List, Optional, Union, Any, Generator, AsyncGenerator
 
 from openai import OpenAI, APIError, RateLimitError, APIConnectionError, InternalServerError
@@ -19,6 +20,41 @@ from app.core.openai_constants import (
 )
 
 
+class StreamCancellationStats:
+    """
+    Process-wide counters for streaming completions closed before they finished.
+    
+    Saved tokens are estimated as the unused generation budget: max_tokens
+    minus the content deltas already received (one delta is roughly one token).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.cancelled_streams = 0
+        self.tokens_received = 0
+        self.tokens_saved = 0
+
+    def record(self, tokens_received: int, max_tokens: int) -> None:
+        """Record one cancelled stream."""
+        with self._lock:
+            self.cancelled_streams += 1
+            self.tokens_received += tokens_received
+            self.tokens_saved += max(0, max_tokens - tokens_received)
+
+    def snapshot(self) -> Dict[str, int]:
+        """Return the current counter values."""
+        with self._lock:
+            return {
+                "cancelled_streams": self.cancelled_streams,
+                "tokens_received": self.tokens_received,
+                "tokens_saved": self.tokens_saved,
+            }
+
+
+# Shared by every OpenAIService instance
+stream_cancellation_stats = StreamCancellationStats()
+
+
 class OpenAIService:
     """
     Service for interacting with the OpenAI API.
@@ -102,27 +138,94 @@ class OpenAIService:
                 self.logger.error(f"Unexpected error in OpenAI API call: {str(e)}")
                 raise
 
-    async def handle_streaming_response(self, streaming_response) -> AsyncGenerator[str, None]:
+    async def handle_streaming_response(self, streaming_response, max_tokens: int = MAX_TOKENS) -> AsyncGenerator[str, None]:
         """
         Process a streaming response from the OpenAI API asynchronously.
         
+        Chunks are read from the blocking OpenAI stream in a worker thread, so
+        waiting for the next chunk never blocks the event loop. If the
+        generator is closed or cancelled before the stream is exhausted (e.g.
+        the client disconnected), the upstream HTTP stream is closed so OpenAI
+        stops generating, and the cancellation is recorded in
+        stream_cancellation_stats. A cancelled read is not abandoned: closing
+        the stream ends it, and the chunk it had already taken is yielded as
+        the last one before the cancellation is re-raised.
+        
         Args:
             streaming_response: The streaming response from OpenAI
+            max_tokens: Generation budget of the request, for the saved-token estimate
             
         Returns:
             AsyncGenerator yielding content chunks as they arrive
         """
+        received = 0
+        cancelled = False
+        chunks = iter(streaming_response)
         try:
-            for chunk in streaming_response:
-                if chunk.choices and chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
-                    # Small delay to avoid blocking the event loop
-                    await asyncio.sleep(0)
+            while True:
+                read = asyncio.ensure_future(asyncio.to_thread(next, chunks, None))
+                try:
+                    chunk = await asyncio.shield(read)
+                except asyncio.CancelledError:
+                    cancelled = True
+                    self.close_stream(streaming_response)
+                    try:
+                        content = self._chunk_content(await read)
+                    except Exception:
+                        content = None  # The read failed because the stream was closed
+                    received += 1 if content else 0
+                    self._record_cancellation(received, max_tokens)
+                    if content:
+                        yield content
+                    raise
+                if chunk is None:
+                    break
+                content = self._chunk_content(chunk)
+                if content:
+                    received += 1
                     yield content
+        except GeneratorExit:
+            if not cancelled:
+                self.cancel_stream(streaming_response, received, max_tokens)
+            raise
         except Exception as e:
             self.logger.error(f"Error processing streaming response: {str(e)}")
             raise
 
+    @staticmethod
+    def _chunk_content(chunk) -> Optional[str]:
+        if chunk is not None and chunk.choices and chunk.choices[0].delta.content:
+            return chunk.choices[0].delta.content
+        return None
+
+    def cancel_stream(self, streaming_response, tokens_received: int, max_tokens: int) -> None:
+        """
+        Close an unfinished upstream stream and record the tokens it saved.
+        
+        Args:
+            streaming_response: The streaming response from OpenAI
+            tokens_received: Content deltas received before cancelling
+            max_tokens: Generation budget of the request
+        """
+        self.close_stream(streaming_response)
+        self._record_cancellation(tokens_received, max_tokens)
+
+    def close_stream(self, streaming_response) -> None:
+        """Close the upstream HTTP stream, which also ends a read waiting on it."""
+        close = getattr(streaming_response, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                self.logger.warning(f"Error closing OpenAI stream: {str(e)}")
+
+    def _record_cancellation(self, tokens_received: int, max_tokens: int) -> None:
+        stream_cancellation_stats.record(tokens_received, max_tokens)
+        self.logger.info(
+            f"Cancelled OpenAI stream after {tokens_received} chunks "
+            f"(~{max(0, max_tokens - tokens_received)} tokens saved)"
+        )
+
     async def create_freya_chat_completion(
         self,
         user_message: str,
@@ -165,7 +268,7 @@ class OpenAIService:
         
         # Handle streaming vs. non-streaming responses
         if stream:
-            return self.handle_streaming_response(response)
+            return self.handle_streaming_response(response, max_tokens=MAX_TOKENS)
         return response
         
     def get_message_content(self, completion: ChatCompletion) -> str:
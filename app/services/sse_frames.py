@@ -0,0 +1,143 @@
+"""
+sse_frames.py - Synchronous builder for pre-encoded Server-Sent Event frames
+
+Frames are built as bytes ready for the ASGI send (sse_starlette passes bytes
+through untouched). The constant parts of every frame - the "event:" line, the
+"data:" prefix and the fixed keys of the freya:* payloads - are encoded once
+and cached, so building a frame is one JSON encode of the variable values and
+one bytes join.
+
+JSON encoding is pluggable: orjson is used when installed, otherwise the
+standard library; set_json_encoder() installs any callable returning bytes.
+"""
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+from datetime import datetime
+import itertools
+import json
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JsonEncoder = Callable[[Any], bytes]
+
+
+def stdlib_json_encoder(obj: Any) -> bytes:
+    """Encode with the standard library json module."""
+    return json.dumps(obj).encode("utf-8")
+
+
+_json_encoder: JsonEncoder = orjson.dumps if orjson is not None else stdlib_json_encoder
+
+
+def set_json_encoder(encoder: Optional[JsonEncoder]) -> None:
+    """Install a JSON encoder returning bytes; None restores the default."""
+    global _json_encoder
+    if encoder is None:
+        encoder = orjson.dumps if orjson is not None else stdlib_json_encoder
+    _json_encoder = encoder
+
+
+def encode_json(obj: Any) -> bytes:
+    """Encode an object with the installed JSON encoder."""
+    return _json_encoder(obj)
+
+
+# Comment frame sent to idle connections; ignored by EventSource
+HEARTBEAT_FRAME = b": heartbeat\n\n"
+
+_END = b"\n\n"
+
+# Source of SSE event ids. Ids increase monotonically within the process and
+# are seeded from the clock (ms) so they keep increasing across restarts.
+_event_ids = itertools.count(int(time.time() * 1000))
+
+# Cached b"\nevent: <name>\ndata: " per event name
+_prefixes: Dict[str, bytes] = {}
+
+
+def _prefix(event: str) -> bytes:
+    prefix = _prefixes.get(event)
+    if prefix is None:
+        prefix = _prefixes[event] = f"\nevent: {event}\ndata: ".encode("utf-8")
+    return prefix
+
+
+def _id_line() -> bytes:
+    return b"id: %d" % next(_event_ids)
+
+
+def _timestamp() -> bytes:
+    return datetime.utcnow().isoformat().encode("ascii")
+
+
+def build_frame(event: str, data: Any) -> bytes:
+    """
+    Build a complete SSE frame with a unique increasing id.
+
+    Args:
+        event: The event type (e.g., "freya:listening", "freya:reply")
+        data: Dict or list to JSON-encode; other values are sent as {"message": str(data)}
+
+    Returns:
+        Encoded frame
+    """
+    if not isinstance(data, (dict, list)):
+        data = {"message": str(data)}
+    return b"".join((_id_line(), _prefix(event), _json_encoder(data), _END))
+
+
+def _state_frame(event: str, state: str) -> Callable[[], bytes]:
+    """Return a builder for a {"timestamp", "state"} frame with its constant parts pre-encoded."""
+    head = _prefix(event) + b'{"timestamp":"'
+    tail = b'","state":"' + state.encode("ascii") + b'"}' + _END
+
+    def build() -> bytes:
+        return b"".join((_id_line(), head, _timestamp(), tail))
+    return build
+
+
+listening_frame = _state_frame("freya:listening", "listening")
+thinking_frame = _state_frame("freya:thinking", "thinking")
+
+_REPLY_HEAD = _prefix("freya:reply") + b'{"timestamp":"'
+_REPLY_MESSAGE = b'","message":'
+_REPLY_TAIL = b',"state":"reply"}' + _END
+
+
+def reply_frame(message: Union[str, Iterable[str]]) -> bytes:
+    """
+    Build a freya:reply frame.
+
+    Args:
+        message: Reply text, or several chunks to send as one message; chunks
+            are joined once, straight into the encoded frame
+
+    Returns:
+        Encoded frame
+    """
+    if not isinstance(message, str):
+        message = "".join(message)
+    return b"".join((
+        _id_line(), _REPLY_HEAD, _timestamp(), _REPLY_MESSAGE,
+        _json_encoder(message), _REPLY_TAIL
+    ))
+
+
+def event_id_of(frame: Union[bytes, str]) -> Optional[int]:
+    """
+    Return the id of a frame.
+
+    Args:
+        frame: Encoded SSE frame
+
+    Returns:
+        The event id, or None for frames without one (e.g. heartbeats)
+    """
+    if isinstance(frame, str):
+        frame = frame.encode("utf-8")
+    if not frame.startswith(b"id: "):
+        return None
+    return int(frame[4:frame.index(b"\n")])
@@ -0,0 +1,686 @@
+"""
+vector_index.py - Local per-user vector index for semantic memory retrieval
+
+Keyword retrieval misses recall queries that share no words with the stored
+message. This module adds a semantic tier: message and fact embeddings are
+kept per user in a compact matrix on disk - float32, or int8 with one scale
+per row - memory-mapped for search, and scored with a blocked top-k cosine
+search that handles a batch of queries per pass over the matrix.
+
+Layout of a user's directory:
+    vectors.f32 / vectors.i8   row-major embeddings, appended in place
+    scales.f32                 per-row dequantization scales (int8 only)
+    meta.jsonl                 one JSON line per row: id, kind, text and extras
+
+New memories are queued and embedded in background batches, so indexing
+never blocks a request. Searches from the memory services run with a latency
+budget and return nothing rather than hold up a reply.
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+import numpy as np
+
+from app.core.config import logger
+from app.core.openai_constants import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL
+
+# Rows scored per block, bounding temporary memory for large indexes
+SEARCH_BLOCK_ROWS = 65536
+
+# Background embedding batches
+EMBED_BATCH_SIZE = 64
+EMBED_BATCH_DELAY = 0.5  # Seconds to wait for a batch to fill
+
+# Open per-user indexes kept before the least recently used is closed
+MAX_OPEN_USER_INDEXES = 256
+
+# Query embeddings remembered for repeated searches
+QUERY_CACHE_SIZE = 1024
+
+# Semantic tier used by the memory services
+SEMANTIC_SEARCH_BUDGET = 0.25  # Seconds a memory service waits for semantic results
+SEMANTIC_MEMORY_LIMIT = 3  # Hits merged into a memory context
+SEMANTIC_MIN_SCORE = 0.35  # Minimum cosine similarity for a hit to be used
+
+DTYPES = ("float32", "int8")
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+# (id, kind, text, extra metadata)
+IndexItem = Tuple[str, str, str, Dict[str, Any]]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows; zero rows stay zero."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+class Embedder(ABC):
+    """Turns texts into fixed-size embeddings."""
+
+    dim: int
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Embed a batch of texts.
+
+        Returns:
+            float32 array of shape (len(texts), dim) with unit-length rows
+        """
+
+
+class HashingEmbedder(Embedder):
+    """
+    Deterministic local embedder based on feature hashing.
+
+    Words and character trigrams are hashed into signed buckets, so related
+    word forms ("hike", "hiking") land close together. It needs no model or
+    network access, which makes it suitable for tests and offline runs.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIMENSIONS):
+        self.dim = dim
+
+    def _features(self, text: str) -> Iterable[Tuple[str, float]]:
+        for word in _TOKEN_RE.findall(text.lower()):
+            yield word, 1.0
+            padded = f"<{word}>"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3], 0.5
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text or ""):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                sign = 1.0 if digest >> 63 else -1.0
+                vectors[row, digest % self.dim] += sign * weight
+        return _normalize(vectors)
+
+
+class OpenAIEmbedder(Embedder):
+    """Embedder backed by the OpenAI embeddings API."""
+
+    def __init__(self, openai_service=None, model: str = EMBEDDING_MODEL, dim: int = EMBEDDING_DIMENSIONS):
+        if openai_service is None:
+            from app.services.openai_service import OpenAIService
+            openai_service = OpenAIService()
+        self.client = openai_service.client
+        self.model = model
+        self.dim = dim
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        response = self.client.embeddings.create(model=self.model, input=list(texts), dimensions=self.dim)
+        vectors = np.array([item.embedding for item in response.data], dtype=np.float32)
+        return _normalize(vectors)
+
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantize unit-length rows to int8 with one scale per row.
+
+    Returns:
+        (int8 rows, float32 scales) with rows * scales approximating vectors
+    """
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    rows = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return rows, scales.astype(np.float32)
+
+
+class UserVectorIndex:
+    """
+    Append-only embedding matrix for one user, memory-mapped for search.
+
+    Rows are appended to the vector file before their metadata line, so a
+    crash mid-append leaves at most orphan vector rows, which are truncated
+    away when the index is next opened.
+    """
+
+    def __init__(self, path: str, dim: int, dtype: str = "float32"):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}; expected one of {DTYPES}")
+        self.path = path
+        self.dim = dim
+        self.dtype = dtype
+        os.makedirs(path, exist_ok=True)
+        self._vector_file = os.path.join(path, "vectors.i8" if dtype == "int8" else "vectors.f32")
+        self._scale_file = os.path.join(path, "scales.f32")
+        self._meta_file = os.path.join(path, "meta.jsonl")
+        self._lock = threading.Lock()
+        self._meta: List[Dict[str, Any]] = []
+        self._ids = set()
+        self._matrix: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._load_meta()
+
+    def _load_meta(self) -> None:
+        if not os.path.exists(self._meta_file):
+            return
+        with open(self._meta_file, "rb") as f:
+            data = f.read()
+        # A crash mid-append can leave a partial last line; drop it with its row
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            self._truncate(self._meta_file, complete)
+        for line in data[:complete].decode("utf-8").splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                self._meta.append(entry)
+                self._ids.add(entry["id"])
+        # Drop rows written by an append that never recorded its metadata
+        row_bytes = self.dim * (1 if self.dtype == "int8" else 4)
+        self._truncate(self._vector_file, len(self._meta) * row_bytes)
+        if self.dtype == "int8":
+            self._truncate(self._scale_file, len(self._meta) * 4)
+
+    @staticmethod
+    def _truncate(path: str, size: int) -> None:
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            os.truncate(path, size)
+
+    def close(self) -> None:
+        """Release the memory maps; the files stay on disk for the next open."""
+        with self._lock:
+            self._matrix = None
+            self._scales = None
+
+    def __len__(self) -> int:
+        return len(self._meta)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._ids
+
+    def add(self, items: Sequence[IndexItem], vectors: np.ndarray) -> int:
+        """
+        Append embedded items, skipping ids already in the index.
+
+        Returns:
+            Number of rows added
+        """
+        with self._lock:
+            keep = [i for i, item in enumerate(items) if item[0] not in self._ids]
+            if not keep:
+                return 0
+            vectors = np.ascontiguousarray(vectors[keep], dtype=np.float32)
+            if self.dtype == "int8":
+                rows, scales = quantize(vectors)
+                with open(self._scale_file, "ab") as f:
+                    f.write(scales.tobytes())
+            else:
+                rows = vectors
+            with open(self._vector_file, "ab") as f:
+                f.write(rows.tobytes())
+            with open(self._meta_file, "a", encoding="utf-8") as f:
+                for i in keep:
+                    item_id, kind, text, extra = items[i]
+                    entry = {"id": item_id, "kind": kind, "text": text, **extra}
+                    f.write(json.dumps(entry, default=str) + "\n")
+                    self._meta.append(entry)
+                    self._ids.add(item_id)
+            # Remap on the next search
+            self._matrix = None
+            self._scales = None
+            return len(keep)
+
+    def _mapped(self) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        with self._lock:
+            count = len(self._meta)
+            if self._matrix is None and count:
+                dtype = np.int8 if self.dtype == "int8" else np.float32
+                self._matrix = np.memmap(self._vector_file, dtype=dtype, mode="r", shape=(count, self.dim))
+                if self.dtype == "int8":
+                    self._scales = np.memmap(self._scale_file, dtype=np.float32, mode="r", shape=(count,))
+            return self._matrix, self._scales
+
+    def search(self, queries: np.ndarray, k: int) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """
+        Top-k cosine search for a batch of unit-length queries.
+
+        The matrix is scored in blocks of SEARCH_BLOCK_ROWS rows; each block is
+        one matrix product for all queries followed by a partial sort.
+
+        Args:
+            queries: float32 array of shape (m, dim)
+            k: Results per query
+
+        Returns:
+            For each query, up to k (metadata, score) pairs, best first
+        """
+        matrix, scales = self._mapped()
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if matrix is None or k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(matrix), SEARCH_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+            scores = queries @ block.T
+            if scales is not None:
+                scores *= scales[start:start + len(block)]
+            rows = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+            best_scores = np.concatenate((best_scores, scores), axis=1)
+            best_rows = np.concatenate((best_rows, rows), axis=1)
+            if best_scores.shape[1] > k:
+                top = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+                best_rows = np.take_along_axis(best_rows, top, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        results = []
+        for scores, rows, ranking in zip(best_scores, best_rows, order):
+            results.append([(self._meta[rows[i]], float(scores[i])) for i in ranking])
+        return results
+
+
+class VectorIndexStats:
+    """Process-wide counters for the vector index."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.embedded = 0
+        self.embed_batches = 0
+        self.embed_failures = 0
+        self.searches = 0
+        self.budget_misses = 0
+
+    def batch(self, count: int) -> None:
+        with self._lock:
+            self.embed_batches += 1
+            self.embedded += count
+
+    def embed_failed(self) -> None:
+        with self._lock:
+            self.embed_failures += 1
+
+    def search(self, within_budget: bool) -> None:
+        with self._lock:
+            self.searches += 1
+            if not within_budget:
+                self.budget_misses += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        """Return the current counter values."""
+        with self._lock:
+            return {
+                "embedded": self.embedded,
+                "embed_batches": self.embed_batches,
+                "embed_failures": self.embed_failures,
+                "searches": self.searches,
+                "budget_misses": self.budget_misses,
+            }
+
+
+class VectorIndex:
+    """
+    Per-user vector indexes under one directory, with background embedding.
+
+    enqueue() hands items to a worker thread that embeds them in batches of
+    up to EMBED_BATCH_SIZE (waiting at most EMBED_BATCH_DELAY for a batch to
+    fill) and appends them to the owning user's index.
+
+    At most max_open_users indexes are kept open. The least recently used
+    index is closed once no thread is using it, so one user's files are
+    never opened by two UserVectorIndex objects at once.
+    """
+
+    def __init__(self, root: str, embedder: Embedder, dtype: str = "float32",
+                 batch_size: int = EMBED_BATCH_SIZE, batch_delay: float = EMBED_BATCH_DELAY,
+                 max_open_users: int = MAX_OPEN_USER_INDEXES):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}; expected one of {DTYPES}")
+        self.root = root
+        self.embedder = embedder
+        self.dtype = dtype
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.max_open_users = max_open_users
+        self.stats = VectorIndexStats()
+        self._indexes: "OrderedDict[str, UserVectorIndex]" = OrderedDict()
+        self._indexes_lock = threading.Lock()
+        self._index_users: Dict[str, int] = {}
+        self._queue: "queue.Queue[Tuple[str, IndexItem]]" = queue.Queue()
+        self._queued = set()
+        self._queued_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="vector-search")
+
+    def user_index(self, user_id: Any) -> UserVectorIndex:
+        """
+        Open (or create) the index of a user.
+
+        The index may be closed once it is evicted; keep it only for a short
+        inspection.
+        """
+        key = str(user_id)
+        with self._indexes_lock:
+            index = self._open_index(key)
+            self._evict_indexes(keep=key)
+            return index
+
+    @contextmanager
+    def _using_index(self, user_id: Any) -> Iterator[UserVectorIndex]:
+        """Open the index of a user and keep it from being evicted while in use."""
+        key = str(user_id)
+        with self._indexes_lock:
+            index = self._open_index(key)
+            self._index_users[key] = self._index_users.get(key, 0) + 1
+        try:
+            yield index
+        finally:
+            with self._indexes_lock:
+                self._index_users[key] -= 1
+                if not self._index_users[key]:
+                    del self._index_users[key]
+                self._evict_indexes()
+
+    def _open_index(self, key: str) -> UserVectorIndex:
+        # Caller holds _indexes_lock
+        index = self._indexes.get(key)
+        if index is None:
+            safe = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+            index = UserVectorIndex(os.path.join(self.root, safe), self.embedder.dim, self.dtype)
+            self._indexes[key] = index
+        self._indexes.move_to_end(key)
+        return index
+
+    def _evict_indexes(self, keep: Optional[str] = None) -> None:
+        # Caller holds _indexes_lock; indexes in use stay open past the limit
+        excess = len(self._indexes) - self.max_open_users
+        if excess <= 0:
+            return
+        idle = [key for key in self._indexes if key not in self._index_users and key != keep]
+        for key in idle[:excess]:
+            self._indexes.pop(key).close()
+
+    def add(self, user_id: Any, items: Sequence[IndexItem]) -> int:
+        """Embed items now and add them to a user's index."""
+        with self._using_index(user_id) as index:
+            items = [item for item in items if item[0] not in index and item[2]]
+            if not items:
+                return 0
+            vectors = self.embedder.embed([item[2] for item in items])
+            return index.add(items, vectors)
+
+    def enqueue(self, user_id: Any, items: Iterable[IndexItem]) -> int:
+        """
+        Queue items for background embedding, skipping known and queued ids.
+
+        Returns:
+            Number of items queued
+        """
+        queued = 0
+        with self._using_index(user_id) as index:
+            for item in items:
+                key = (str(user_id), item[0])
+                if not item[2] or item[0] in index:
+                    continue
+                with self._queued_lock:
+                    if key in self._queued:
+                        continue
+                    self._queued.add(key)
+                self._queue.put((str(user_id), item))
+                queued += 1
+        if queued:
+            self._ensure_worker()
+        return queued
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run_worker, name="vector-embedder", daemon=True)
+            self._worker.start()
+
+    def _run_worker(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_delay
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._embed_batch(batch)
+
+    def _embed_batch(self, batch: List[Tuple[str, IndexItem]]) -> None:
+        try:
+            # One embedding call for the whole batch, whichever users it spans
+            vectors = self.embedder.embed([item[2] for _, item in batch])
+            by_user: Dict[str, List[int]] = {}
+            for row, (user_id, _) in enumerate(batch):
+                by_user.setdefault(user_id, []).append(row)
+            for user_id, rows in by_user.items():
+                with self._using_index(user_id) as index:
+                    index.add([batch[row][1] for row in rows], vectors[rows])
+            self.stats.batch(len(batch))
+        except Exception as e:
+            self.stats.embed_failed()
+            logger.error(f"Error embedding batch of {len(batch)} memories: {str(e)}")
+        finally:
+            with self._queued_lock:
+                for user_id, item in batch:
+                    self._queued.discard((user_id, item[0]))
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every queued item has been embedded.
+
+        Returns:
+            False if the timeout expired first
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _embed_queries(self, queries: Sequence[str]) -> np.ndarray:
+        vectors: List[Optional[np.ndarray]] = []
+        missing = []
+        with self._query_cache_lock:
+            for i, text in enumerate(queries):
+                cached = self._query_cache.get(text)
+                if cached is not None:
+                    self._query_cache.move_to_end(text)
+                else:
+                    missing.append(i)
+                vectors.append(cached)
+        if missing:
+            embedded = self.embedder.embed([queries[i] for i in missing])
+            with self._query_cache_lock:
+                for i, vector in zip(missing, embedded):
+                    vectors[i] = vector
+                    self._query_cache[queries[i]] = vector
+                while len(self._query_cache) > QUERY_CACHE_SIZE:
+                    self._query_cache.popitem(last=False)
+        return np.stack(vectors)
+
+    def search(self, user_id: Any, queries: Union[str, Sequence[str]], k: int = SEMANTIC_MEMORY_LIMIT,
+               kinds: Optional[Sequence[str]] = None) -> Union[List[Dict[str, Any]], List[List[Dict[str, Any]]]]:
+        """
+        Search a user's index.
+
+        Args:
+            user_id: Owner of the index
+            queries: One query, or a batch of queries searched in one pass
+            k: Results per query
+            kinds: Optional item kinds to keep (e.g. ["message"])
+
+        Returns:
+            Hits ({"id", "kind", "text", "score", ...}) best first; a list of
+            hit lists when a batch of queries was given
+        """
+        single = isinstance(queries, str)
+        batch = [queries] if single else list(queries)
+        with self._using_index(user_id) as index:
+            if not batch or not len(index):
+                return [] if single else [[] for _ in batch]
+            # Over-fetch when filtering by kind
+            fetch = k if kinds is None else k * 4
+            found = index.search(self._embed_queries(batch), fetch)
+
+        results = []
+        for hits in found:
+            selected = [
+                {**meta, "score": score}
+                for meta, score in hits
+                if kinds is None or meta.get("kind") in kinds
+            ]
+            results.append(selected[:k])
+        return results[0] if single else results
+
+    def search_within(self, user_id: Any, query: str, budget: float = SEMANTIC_SEARCH_BUDGET,
+                      k: int = SEMANTIC_MEMORY_LIMIT, min_score: float = SEMANTIC_MIN_SCORE) -> List[Dict[str, Any]]:
+        """
+        Search with a latency budget, blocking the calling thread.
+
+        The search runs on a worker thread; if it has not finished within the
+        budget the caller gets no hits (the search still completes and warms
+        the query cache for the next call). The caller waits up to the budget,
+        so async code should use search_within_async instead.
+
+        Returns:
+            Hits scoring at least min_score, best first
+        """
+        future = self._executor.submit(self.search, user_id, query, k)
+        try:
+            hits = future.result(timeout=budget)
+        except FutureTimeoutError:
+            return self._budget_missed(user_id, budget)
+        except Exception as e:
+            return self._search_failed(e)
+        return self._within_budget(hits, min_score)
+
+    async def search_within_async(self, user_id: Any, query: str, budget: float = SEMANTIC_SEARCH_BUDGET,
+                                  k: int = SEMANTIC_MEMORY_LIMIT,
+                                  min_score: float = SEMANTIC_MIN_SCORE) -> List[Dict[str, Any]]:
+        """
+        Awaitable search_within: the event loop stays free while the search runs.
+
+        Returns:
+            Hits scoring at least min_score, best first
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            hits = await asyncio.wait_for(loop.run_in_executor(self._executor, self.search, user_id, query, k), budget)
+        except asyncio.TimeoutError:
+            return self._budget_missed(user_id, budget)
+        except Exception as e:
+            return self._search_failed(e)
+        return self._within_budget(hits, min_score)
+
+    def _within_budget(self, hits: List[Dict[str, Any]], min_score: float) -> List[Dict[str, Any]]:
+        self.stats.search(within_budget=True)
+        return [hit for hit in hits if hit["score"] >= min_score]
+
+    def _budget_missed(self, user_id: Any, budget: float) -> List[Dict[str, Any]]:
+        self.stats.search(within_budget=False)
+        logger.debug("Semantic memory search for %s exceeded its %.2fs budget", user_id, budget)
+        return []
+
+    def _search_failed(self, error: Exception) -> List[Dict[str, Any]]:
+        self.stats.search(within_budget=True)
+        logger.error(f"Error searching vector index: {str(error)}")
+        return []
+
+def message_item(message_id: Any, content: str, timestamp: Any = None) -> IndexItem:
+    """Index item for a stored message."""
+    return f"message:{message_id}", "message", content or "", {"timestamp": timestamp}
+
+
+def fact_item(fact_id: Any, fact_type: str, value: str, confidence: Any = None) -> IndexItem:
+    """Index item for a user fact."""
+    extra = {"type": fact_type, "value": value}
+    if confidence is not None:
+        extra["confidence"] = confidence
+    return f"fact:{fact_id}", "fact", f"{fact_type}: {value}" if value else "", extra
+
+
+def merge_semantic_hits(memory_context: Dict[str, Any], hits: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Add semantic hits to a memory context.
+
+    Message hits not already present are put first in recent_memories, fact
+    hits are appended to user_facts, and all hits are kept under
+    semantic_memories.
+    """
+    memory_context["semantic_memories"] = hits
+    known_contents = {memory.get("content") for memory in memory_context["recent_memories"]}
+    known_facts = {(fact.get("type"), fact.get("value")) for fact in memory_context["user_facts"]}
+
+    semantic_messages = []
+    for hit in hits:
+        if hit.get("kind") == "fact":
+            key = (hit.get("type"), hit.get("value"))
+            if key not in known_facts:
+                known_facts.add(key)
+                memory_context["user_facts"].append({
+                    "type": hit.get("type", ""),
+                    "value": hit.get("value", ""),
+                    "confidence": hit.get("confidence", 70),
+                })
+        elif hit.get("text") not in known_contents:
+            known_contents.add(hit.get("text"))
+            semantic_messages.append({
+                "content": hit.get("text", ""),
+                "user_id": hit.get("user_id", ""),
+                "timestamp": hit.get("timestamp", ""),
+                "relevance": int(round(hit["score"] * 100)),
+                "source": "semantic",
+            })
+    memory_context["recent_memories"] = semantic_messages + memory_context["recent_memories"]
+    return memory_context
+
+
+_vector_index: Optional[VectorIndex] = None
+_vector_index_configured = False
+
+
+def get_vector_index() -> Optional[VectorIndex]:
+    """
+    Return the process-wide vector index, or None when it is disabled.
+
+    The index is enabled by setting VECTOR_INDEX_DIR; VECTOR_INDEX_DTYPE and
+    VECTOR_INDEX_EMBEDDER select the storage type and embedder.
+    """
+    global _vector_index, _vector_index_configured
+    if not _vector_index_configured:
+        from app.core.config import VECTOR_INDEX_DIR, VECTOR_INDEX_DTYPE, VECTOR_INDEX_EMBEDDER
+        if VECTOR_INDEX_DIR:
+            embedder = HashingEmbedder() if VECTOR_INDEX_EMBEDDER == "hashing" else OpenAIEmbedder()
+            _vector_index = VectorIndex(VECTOR_INDEX_DIR, embedder, dtype=VECTOR_INDEX_DTYPE)
+        _vector_index_configured = True
+    return _vector_index
+
+
+def set_vector_index(index: Optional[VectorIndex]) -> None:
+    """Replace the process-wide vector index (None disables the tier)."""
+    global _vector_index, _vector_index_configured
+    _vector_index = index
+    _vector_index_configured = True
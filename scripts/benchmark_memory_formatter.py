@@ -0,0 +1,88 @@
+"""
+benchmark_memory_formatter.py - Benchmark memory context formatting
+
+Times MemoryFormatter.format_memory_context for every memory query type on
+contexts holding hundreds of memories, with and without the per-user fact
+block cache.
+
+Usage:
+    python scripts/benchmark_memory_formatter.py [iterations]
+"""
+
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.memory_formatter import MemoryFormatter
+
+QUERY_TYPES = [
+    (False, "general_memory_query"),
+    (True, "content_recall"),
+    (True, "temporal_recall"),
+    (True, "existence_verification"),
+    (True, "knowledge_query"),
+]
+
+SIZES = [100, 500, 1000]
+
+
+def build_context(size: int, seed: int = 42):
+    """Build a memory context with `size` recent memories and `size` topic messages."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def message(i):
+        ts = (start + timedelta(minutes=rng.randint(0, 60 * 24 * 90))).isoformat().replace("+00:00", "Z")
+        return {"content": f"Message {i} about work and family plans", "timestamp": ts,
+                "relevance": rng.randint(0, 100)}
+
+    topics = ["work", "family", "health", "hobbies", "travel", "education", "finance", "music"]
+    per_topic = max(1, size // len(topics))
+    return {
+        "user_facts": [
+            {"type": rng.choice(topics), "value": f"Fact {i} about the user", "confidence": rng.randint(0, 100)}
+            for i in range(max(5, size // 10))
+        ],
+        "recent_memories": [message(i) for i in range(size)],
+        "topic_memories": [
+            {"topic": {"name": name.capitalize(), "relevance": rng.randint(0, 100)},
+             "messages": [message(i) for i in range(per_topic)]}
+            for name in topics
+        ],
+        "memory_query_topics": ["work", "family"],
+    }
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    formatter = MemoryFormatter()
+
+    print(f"=== Memory context formatting ({iterations} iterations) ===")
+    print(f"{'Memories':>8}  {'Query type':<24} {'Cold (ms)':>10} {'Cached facts (ms)':>18}")
+    print("-" * 64)
+
+    for size in SIZES:
+        context = build_context(size)
+        for is_memory_query, query_type in QUERY_TYPES:
+            context["is_memory_query"] = is_memory_query
+            context["memory_query_type"] = query_type
+
+            def cold():
+                formatter.invalidate_user_facts()
+                formatter.format_memory_context(context, user_id="bench")
+
+            def warm():
+                formatter.format_memory_context(context, user_id="bench")
+
+            cold_ms = timeit.timeit(cold, number=iterations) / iterations * 1000
+            warm_ms = timeit.timeit(warm, number=iterations) / iterations * 1000
+            print(f"{size:>8}  {query_type:<24} {cold_ms:>10.3f} {warm_ms:>18.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+benchmark_memory_query_classifier.py - Micro-benchmark for memory query classification
+
+Compares the shared MemoryQueryClassifier (one compiled alternation per rule
+set) against the previous approach (one regex search per pattern, a keyword
+loop, then a second pass of per-type regexes).
+
+Usage:
+    python scripts/benchmark_memory_query_classifier.py [iterations]
+"""
+
+import re
+import sys
+import timeit
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.memory_query_classifier import (
+    MemoryQueryClassifier,
+    MEMORY_QUERY_PATTERNS,
+    MEMORY_KEYWORDS,
+    MEMORY_QUERY_TYPE_RULES,
+)
+
+QUERIES = [
+    "Do you remember what I told you about my job?",
+    "What did I say about my family?",
+    "Have we talked about my health before?",
+    "Didn't I tell you about my new car?",
+    "What's the weather like today?",
+    "Can you help me write a cover letter for a software engineering position at a startup?",
+    "I had a long day at work and my boss kept piling on more tasks, what should I cook tonight?",
+    "Tell me a joke.",
+]
+
+LEGACY_PATTERNS = [re.compile(p, re.IGNORECASE) for p in MEMORY_QUERY_PATTERNS]
+LEGACY_TYPE_RULES = [(name, re.compile(p, re.IGNORECASE)) for name, p in MEMORY_QUERY_TYPE_RULES]
+
+
+def legacy_classify(query):
+    """Per-pattern loops, as previously implemented in each memory service."""
+    is_memory = False
+    for pattern in LEGACY_PATTERNS:
+        if pattern.search(query):
+            is_memory = True
+            break
+    if not is_memory:
+        query_lower = query.lower()
+        for keyword in MEMORY_KEYWORDS:
+            if keyword in query_lower:
+                is_memory = True
+                break
+
+    query_type = "general_memory_query"
+    if is_memory:
+        for name, pattern in LEGACY_TYPE_RULES:
+            if pattern.search(query):
+                query_type = name
+                break
+    return is_memory, query_type
+
+
+def run(label, func, iterations):
+    elapsed = timeit.timeit(lambda: [func(q) for q in QUERIES], number=iterations)
+    per_query_us = elapsed / (iterations * len(QUERIES)) * 1_000_000
+    print(f"{label:<30} {per_query_us:8.2f} µs/query")
+    return per_query_us
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    classifier = MemoryQueryClassifier()
+
+    # Sanity check: both implementations agree
+    for query in QUERIES:
+        assert classifier.classify(query) == legacy_classify(query), query
+
+    print(f"=== Memory query classification ({len(QUERIES)} queries x {iterations}) ===")
+    legacy = run("Per-pattern loops", legacy_classify, iterations)
+    detect = run("Compiled (detect only)", classifier.is_memory_query, iterations)
+    combined = run("Compiled (detect + type)", classifier.classify, iterations)
+
+    print(f"\nDetection speedup:      {legacy / detect:.1f}x")
+    print(f"Classification speedup: {legacy / combined:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
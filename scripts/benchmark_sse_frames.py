@@ -0,0 +1,112 @@
+"""
+benchmark_sse_frames.py - Micro-benchmark for SSE frame construction
+
+Compares the previous per-event path (async format_sse with a fresh dict,
+json.dumps and an f-string, wrapped by the async create_*_event helpers)
+against the synchronous pre-encoded builder in app.services.sse_frames, with
+both the standard library and orjson encoders.
+
+Usage:
+    python scripts/benchmark_sse_frames.py [frames]
+"""
+
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services import sse_frames
+
+MESSAGES = ["Hello", " there", ", how", " was", " your", " day", "?", ' "quoted"\n']
+
+
+async def legacy_format_sse(event, data):
+    """Previous EventService.format_sse."""
+    if isinstance(data, dict) or isinstance(data, list):
+        json_data = json.dumps(data)
+    else:
+        json_data = json.dumps({"message": str(data)})
+    return f"event: {event}\ndata: {json_data}\n\n"
+
+
+async def legacy_create_reply_event(message):
+    """Previous EventService.create_reply_event."""
+    return await legacy_format_sse(
+        "freya:reply",
+        {"timestamp": datetime.utcnow().isoformat(), "message": message, "state": "reply"}
+    )
+
+
+async def legacy_create_thinking_event():
+    """Previous EventService.create_thinking_event."""
+    return await legacy_format_sse(
+        "freya:thinking",
+        {"timestamp": datetime.utcnow().isoformat(), "state": "thinking"}
+    )
+
+
+async def run_legacy(frames):
+    # Frames were handed to the ASGI server as str and encoded there
+    for i in range(frames):
+        (await legacy_create_reply_event(MESSAGES[i % len(MESSAGES)])).encode("utf-8")
+
+
+def run_builder(frames):
+    reply_frame = sse_frames.reply_frame
+    for i in range(frames):
+        reply_frame(MESSAGES[i % len(MESSAGES)])
+
+
+async def run_legacy_static(frames):
+    for _ in range(frames):
+        (await legacy_create_thinking_event()).encode("utf-8")
+
+
+def run_builder_static(frames):
+    thinking_frame = sse_frames.thinking_frame
+    for _ in range(frames):
+        thinking_frame()
+
+
+def rate(func, frames):
+    start = time.perf_counter()
+    func(frames)
+    return frames / (time.perf_counter() - start)
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    print(f"=== SSE frame construction ({frames} frames) ===")
+    print(f"{'Path':<36} {'reply frames/s':>15} {'thinking frames/s':>18}")
+    print("-" * 71)
+
+    legacy_reply = rate(lambda n: asyncio.run(run_legacy(n)), frames)
+    legacy_static = rate(lambda n: asyncio.run(run_legacy_static(n)), frames)
+    print(f"{'async format_sse + json.dumps':<36} {legacy_reply:>15,.0f} {legacy_static:>18,.0f}")
+
+    sse_frames.set_json_encoder(sse_frames.stdlib_json_encoder)
+    stdlib_reply = rate(run_builder, frames)
+    stdlib_static = rate(run_builder_static, frames)
+    print(f"{'sse_frames (stdlib json)':<36} {stdlib_reply:>15,.0f} {stdlib_static:>18,.0f}")
+
+    sse_frames.set_json_encoder(None)
+    if sse_frames.orjson is not None:
+        fast_reply = rate(run_builder, frames)
+        fast_static = rate(run_builder_static, frames)
+        print(f"{'sse_frames (orjson)':<36} {fast_reply:>15,.0f} {fast_static:>18,.0f}")
+    else:
+        fast_reply, fast_static = stdlib_reply, stdlib_static
+        print("orjson not installed; skipping")
+
+    print(f"\nReply speedup:    {fast_reply / legacy_reply:.1f}x")
+    print(f"Thinking speedup: {fast_static / legacy_static:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+export_user_memory.py - Export one user's conversations, messages, facts and topics
+
+Records are streamed from Firestore or PostgreSQL into gzip-compressed JSONL
+files (or Parquet with --format parquet, which needs pyarrow) with bounded
+memory; see app/services/memory_export.py for the layout.
+
+Usage:
+    python scripts/export_user_memory.py --backend firestore --user-id Sencere --out exports/sencere
+    python scripts/export_user_memory.py --backend postgres --user-id 1 --out exports/user-1
+    python scripts/export_user_memory.py --backend postgres --user-id 1 --out exports/user-1 --format parquet
+"""
+
+import argparse
+import logging
+
+from app.services.memory_export import (
+    EXPORT_PAGE_SIZE, WRITERS, export_records, firestore_records, format_stats, postgres_records
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+def main():
+    """Export a user's memories."""
+    parser = argparse.ArgumentParser(description="Export a user's memories as compressed JSONL or Parquet")
+    parser.add_argument("--backend", choices=["firestore", "postgres"], required=True, help="Backend to read from")
+    parser.add_argument("--user-id", required=True, help="User to export (an integer id for postgres)")
+    parser.add_argument("--out", required=True, help="Export directory to create")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="jsonl", help="Output format (default: jsonl)")
+    parser.add_argument("--page-size", type=int, default=EXPORT_PAGE_SIZE, help="Records read per page")
+    args = parser.parse_args()
+    
+    print(f"📦 Exporting {args.backend} user {args.user_id} to {args.out} ({args.format})")
+    
+    def on_progress(stats):
+        print(format_stats("  progress", stats))
+    
+    progress_every = args.page_size * 10
+    if args.backend == "firestore":
+        from app.services.firebase_service import FirebaseService
+        records = firestore_records(FirebaseService().db, args.user_id, args.page_size)
+        stats = export_records(records, args.out, {"backend": "firestore", "user_id": args.user_id},
+                               args.format, progress_every, on_progress)
+    else:
+        from app.core.db import SessionLocal
+        user_id = int(args.user_id)
+        with SessionLocal() as session:
+            records = postgres_records(session, user_id, args.page_size)
+            stats = export_records(records, args.out, {"backend": "postgres", "user_id": user_id},
+                                   args.format, progress_every, on_progress)
+    
+    print(f"\n✅ {format_stats('Exported', stats)}")
+
+if __name__ == "__main__":
+    main()
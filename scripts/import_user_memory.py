@@ -0,0 +1,52 @@
+"""
+import_user_memory.py - Import a user export written by export_user_memory.py
+
+The export goes back to the backend it was taken from, using batched writes
+(Firestore) or multi-row INSERTs (PostgreSQL). Only JSONL exports can be
+imported.
+
+Usage:
+    python scripts/import_user_memory.py --in exports/sencere
+    python scripts/import_user_memory.py --in exports/sencere --user-id Sencere-staging
+    python scripts/import_user_memory.py --in exports/user-1 --user-id 7
+"""
+
+import argparse
+import logging
+
+from app.services.memory_export import (
+    IMPORT_BATCH_SIZE, format_stats, import_firestore, import_postgres, read_manifest, read_records
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+def main():
+    """Import a user's memories."""
+    parser = argparse.ArgumentParser(description="Import a user export with batched writes")
+    parser.add_argument("--in", dest="in_dir", required=True, help="Export directory")
+    parser.add_argument("--user-id", help="User that receives the data (default: the exported user)")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Records per batched write")
+    args = parser.parse_args()
+    
+    manifest = read_manifest(args.in_dir)
+    backend = manifest["backend"]
+    print(f"📥 Importing {backend} export of user {manifest['user_id']} ({manifest.get('counts')})")
+    
+    def on_progress(stats):
+        print(format_stats("  progress", stats))
+    
+    records = read_records(args.in_dir)
+    if backend == "firestore":
+        from app.services.firebase_service import FirebaseService
+        stats = import_firestore(FirebaseService().db, records, args.user_id, args.batch_size, on_progress)
+    else:
+        from app.core.db import SessionLocal
+        user_id = int(args.user_id if args.user_id is not None else manifest["user_id"])
+        with SessionLocal() as session:
+            stats = import_postgres(session, records, user_id, args.batch_size, on_progress)
+    
+    print(f"\n✅ {format_stats('Imported', stats)}")
+
+if __name__ == "__main__":
+    main()
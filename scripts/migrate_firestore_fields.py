@@ -5,26 +5,65 @@ This script adds:
 - userId field to userFacts documents
 - conversationId field to messages documents
 - topicIds array field to messages documents
+
+Collections are migrated in pages with bulk writes (see
+app/services/firestore_migration.py). Progress is checkpointed after every
+page, so rerunning after a failure resumes where the last run stopped.
+
+Usage:
+    python scripts/migrate_firestore_fields.py --dry-run
+    python scripts/migrate_firestore_fields.py --user-id Sencere
+    python scripts/migrate_firestore_fields.py --reset   # start over
 """
 
+import argparse
 import logging
 from datetime import datetime, timezone
 from typing import Dict, List, Any, Optional
 import time
 
 from app.services.firebase_service import FirebaseService
+from app.services.firestore_migration import (
+    MIGRATION_PAGE_SIZE, FirestoreMigrationEngine, MigrationCheckpoint, MigrationEstimate, MigrationProgress
+)
 from app.services.topic_extraction import TopicExtractor
 from app.core.config import logger
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+DEFAULT_CHECKPOINT = "firestore_migration_checkpoint.json"
+
+def print_progress(progress: MigrationProgress):
+    """Print one progress line per migrated page."""
+    print(f"  {progress.collection}: {progress.processed} processed, {progress.updated} updated, "
+          f"{progress.errors} errors, {progress.docs_per_second:.0f} docs/sec")
+
+def print_estimate(estimate: MigrationEstimate):
+    """Print the dry-run estimate of a collection."""
+    print(f"  Documents: {estimate.documents}")
+    print(f"  Sample: {estimate.sample_updates}/{estimate.sampled} documents need updates")
+    print(f"  Estimated updates: {estimate.estimated_updates}")
+    print(f"  Estimated operations: {estimate.reads} reads, {estimate.writes} writes "
+          f"(~${estimate.cost_usd:.4f})")
+    print(f"  Estimated duration: {estimate.seconds:.1f} seconds")
+    for example in estimate.examples:
+        print(f"  Would update {example['id']} with: {example['updates']}")
+
 class FirestoreMigration:
     """Handle Firestore document migrations."""
     
-    def __init__(self):
+    def __init__(self, checkpoint_path: Optional[str] = DEFAULT_CHECKPOINT, page_size: int = MIGRATION_PAGE_SIZE,
+                 use_bulk_writer: bool = True):
         self.firebase = FirebaseService()
         self.topic_extractor = TopicExtractor()
+        self.engine = FirestoreMigrationEngine(
+            self.firebase.db,
+            checkpoint=MigrationCheckpoint(checkpoint_path),
+            page_size=page_size,
+            use_bulk_writer=use_bulk_writer,
+            on_progress=print_progress
+        )
         self.stats = {
             'user_facts_migrated': 0,
             'messages_migrated': 0,
@@ -32,97 +71,65 @@ class FirestoreMigration:
             'start_time': datetime.now()
         }
     
+    def _run(self, collection: str, transform, select: List[str], dry_run: bool) -> Optional[MigrationProgress]:
+        """Estimate or run the migration of one collection."""
+        if dry_run:
+            print_estimate(self.engine.estimate(collection, transform, select=select))
+            return None
+        
+        progress = self.engine.run(collection, transform, select=select)
+        self.stats['errors'] += progress.errors
+        print(f"\nMigrated {progress.updated} {collection} documents "
+              f"({progress.processed} scanned in {progress.elapsed:.1f}s, {progress.docs_per_second:.0f} docs/sec)")
+        return progress
+    
     def migrate_user_facts(self, user_id: str, dry_run: bool = True):
         """
         Add userId field to userFacts documents.
         
         Args:
             user_id: The user ID to add to facts
-            dry_run: If True, only simulate the migration
+            dry_run: If True, only estimate the migration
         """
         print(f"\n{'[DRY RUN] ' if dry_run else ''}Migrating userFacts collection...")
         
-        # Get all user facts
-        facts = self.firebase.query_collection('userFacts', filters=[], limit=1000)
-        print(f"Found {len(facts)} userFacts documents")
-        
-        migrated = 0
-        for fact in facts:
-            fact_id = fact.get('id')
-            
-            # Check if userId field exists
-            if 'userId' not in fact:
-                if dry_run:
-                    print(f"  Would add userId='{user_id}' to fact {fact_id}")
-                else:
-                    # Add userId field
-                    success = self.firebase.update_document('userFacts', fact_id, {'userId': user_id})
-                    if success:
-                        print(f"  ✓ Added userId to fact {fact_id}")
-                        migrated += 1
-                    else:
-                        print(f"  ✗ Failed to update fact {fact_id}")
-                        self.stats['errors'] += 1
-            else:
-                print(f"  - Fact {fact_id} already has userId: {fact.get('userId')}")
+        def transform(fact: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            return None if 'userId' in fact else {'userId': user_id}
         
-        self.stats['user_facts_migrated'] = migrated
-        print(f"\nMigrated {migrated} userFacts documents")
+        progress = self._run('userFacts', transform, ['userId'], dry_run)
+        if progress:
+            self.stats['user_facts_migrated'] = progress.updated
+    
+    def _default_conversation_id(self) -> Optional[str]:
+        """Most recently updated conversation, read once with a single-document query."""
+        conversations = self.firebase.query_collection(
+            'conversations', filters=[], order_by='updatedAt', desc=True, limit=1, select=['updatedAt']
+        )
+        return conversations[0].get('id') if conversations else None
     
     def migrate_messages(self, dry_run: bool = True):
         """
         Add conversationId and topicIds fields to messages.
         
         Args:
-            dry_run: If True, only simulate the migration
+            dry_run: If True, only estimate the migration
         """
         print(f"\n{'[DRY RUN] ' if dry_run else ''}Migrating messages collection...")
         
-        # Get all messages
-        messages = self.firebase.query_collection('messages', filters=[], limit=1000)
-        print(f"Found {len(messages)} messages documents")
-        
-        # Get all conversations to map messages
-        conversations = self.firebase.query_collection('conversations', filters=[], limit=100)
-        print(f"Found {len(conversations)} conversations")
-        
-        # Create a simple mapping strategy
-        # In a real migration, you'd need more sophisticated logic
-        default_conversation_id = None
-        if conversations:
-            # Use the most recent conversation as default
-            # Handle datetime comparisons safely
-            def get_sort_key(conv):
-                updated_at = conv.get('updatedAt')
-                if updated_at is None:
-                    return datetime.min.replace(tzinfo=timezone.utc)
-                elif hasattr(updated_at, 'seconds'):
-                    # Firestore timestamp
-                    return datetime.fromtimestamp(updated_at.seconds, tz=timezone.utc)
-                elif isinstance(updated_at, datetime):
-                    # Ensure timezone aware
-                    if updated_at.tzinfo is None:
-                        return updated_at.replace(tzinfo=timezone.utc)
-                    return updated_at
-                else:
-                    return datetime.min.replace(tzinfo=timezone.utc)
-            
-            conversations.sort(key=get_sort_key, reverse=True)
-            default_conversation_id = conversations[0].get('id')
+        # Messages don't record their conversation, so the most recent one is
+        # used for all of them. In a real migration, you'd need more
+        # sophisticated logic
+        default_conversation_id = self._default_conversation_id()
+        if default_conversation_id:
             print(f"Using conversation {default_conversation_id} as default")
         
-        migrated = 0
-        for msg in messages:
-            msg_id = msg.get('id')
+        def transform(msg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
             content = msg.get('user', '')  # Messages use 'user' field for content
             updates = {}
             
             # Check if conversationId field exists
-            if 'conversationId' not in msg:
-                # In a real migration, you'd determine the correct conversation
-                # For now, we'll use the default
-                if default_conversation_id:
-                    updates['conversationId'] = default_conversation_id
+            if 'conversationId' not in msg and default_conversation_id:
+                updates['conversationId'] = default_conversation_id
             
             # Check if topicIds field exists
             if 'topicIds' not in msg and content:
@@ -133,23 +140,11 @@ class FirestoreMigration:
                     # For now, we'll use topic names as IDs
                     updates['topicIds'] = topics
             
-            # Apply updates if needed
-            if updates:
-                if dry_run:
-                    print(f"  Would update message {msg_id} with: {updates}")
-                else:
-                    success = self.firebase.update_document('messages', msg_id, updates)
-                    if success:
-                        print(f"  ✓ Updated message {msg_id}")
-                        migrated += 1
-                    else:
-                        print(f"  ✗ Failed to update message {msg_id}")
-                        self.stats['errors'] += 1
-            else:
-                print(f"  - Message {msg_id} already has required fields")
+            return updates or None
         
-        self.stats['messages_migrated'] = migrated
-        print(f"\nMigrated {migrated} messages documents")
+        progress = self._run('messages', transform, ['user', 'conversationId', 'topicIds'], dry_run)
+        if progress:
+            self.stats['messages_migrated'] = progress.updated
     
     def add_indexes_instructions(self):
         """Print instructions for adding Firestore indexes."""
@@ -204,23 +199,25 @@ class FirestoreMigration:
         """Verify the migration was successful."""
         print("\n🔍 Verifying Migration...")
         
-        # Check userFacts
-        facts_with_userId = 0
-        facts = self.firebase.query_collection('userFacts', filters=[], limit=100)
-        for fact in facts:
-            if 'userId' in fact:
-                facts_with_userId += 1
+        # Check userFacts (server-side counts, no documents are read)
+        total_facts = self.firebase.count_documents('userFacts', use_cache=False)
+        facts_with_userId = self.firebase.count_documents(
+            'userFacts', filters=[('userId', '!=', None)], use_cache=False
+        )
         
-        print(f"\nUserFacts: {facts_with_userId}/{len(facts)} have userId field")
+        print(f"\nUserFacts: {facts_with_userId}/{total_facts} have userId field")
         
         # Check messages
-        messages_with_fields = 0
-        messages = self.firebase.query_collection('messages', filters=[], limit=100)
-        for msg in messages:
-            if 'conversationId' in msg or 'topicIds' in msg:
-                messages_with_fields += 1
+        total_messages = self.firebase.count_documents('messages', use_cache=False)
+        messages_with_conversation = self.firebase.count_documents(
+            'messages', filters=[('conversationId', '!=', None)], use_cache=False
+        )
+        messages_with_topics = self.firebase.count_documents(
+            'messages', filters=[('topicIds', '!=', None)], use_cache=False
+        )
         
-        print(f"Messages: {messages_with_fields}/{len(messages)} have new fields")
+        print(f"Messages: {messages_with_conversation}/{total_messages} have conversationId, "
+              f"{messages_with_topics}/{total_messages} have topicIds")
         
         # Test optimized queries
         print("\n🧪 Testing Optimized Queries...")
@@ -275,41 +272,43 @@ class FirestoreMigration:
 
 def main():
     """Main migration function."""
+    parser = argparse.ArgumentParser(description="Add missing fields to Firestore documents")
+    parser.add_argument("--user-id", default="Sencere", help="User ID to add to userFacts (default: Sencere)")
+    parser.add_argument("--dry-run", action="store_true", help="Estimate the migration without writing")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Progress file used to resume")
+    parser.add_argument("--page-size", type=int, default=MIGRATION_PAGE_SIZE, help="Documents per page")
+    parser.add_argument("--no-bulk-writer", action="store_true", help="Use batched writes instead of BulkWriter")
+    parser.add_argument("--reset", action="store_true", help="Ignore saved progress and start over")
+    args = parser.parse_args()
+    
     print("🔥 Firestore Field Migration Tool")
     print("=" * 60)
     
     # Initialize migration
-    migration = FirestoreMigration()
+    migration = FirestoreMigration(
+        checkpoint_path=args.checkpoint, page_size=args.page_size, use_bulk_writer=not args.no_bulk_writer
+    )
+    if args.reset:
+        migration.engine.checkpoint.reset()
     
-    # Configuration
-    user_id = "Sencere"  # Default user ID
-    dry_run = False  # Set to False to actually perform migration
-    
-    if dry_run:
+    if args.dry_run:
         print("\n⚠️  DRY RUN MODE - No changes will be made")
-        print("Set dry_run=False to perform actual migration\n")
+        print("Run without --dry-run to perform actual migration\n")
     else:
         print("\n⚠️  PRODUCTION MODE - Changes will be made to Firestore!")
-        print("Proceeding with migration...")
-        # Auto-confirm for automated execution
-        # response = input("Are you sure you want to continue? (yes/no): ")
-        # if response.lower() != 'yes':
-        #     print("Migration cancelled.")
-        #     return
+        print(f"Progress is saved to {args.checkpoint}; rerun to resume after a failure")
     
     # Run migrations
-    migration.migrate_user_facts(user_id, dry_run=dry_run)
-    migration.migrate_messages(dry_run=dry_run)
+    migration.migrate_user_facts(args.user_id, dry_run=args.dry_run)
+    migration.migrate_messages(dry_run=args.dry_run)
     
     # Add index instructions
     migration.add_indexes_instructions()
     
     # Verify if not dry run
-    if not dry_run:
-        migration.verify_migration(user_id)
-    
-    # Print summary
-    migration.print_summary()
+    if not args.dry_run:
+        migration.verify_migration(args.user_id)
+        migration.print_summary()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -286,15 +286,23 @@ class FirestoreOptimizer:
         
         # Current approach: fetch all then filter
         all_messages = self.firebase.query_collection('messages', filters=[], limit=100)
-        filtered_messages = [m for m in all_messages if m.get('timestamp', datetime.min) > cutoff]
+        filtered_messages = [m for m in all_messages if (m.get('timestamp') or 0) > cutoff.timestamp()]
         
         current_time = time.time() - start_time
         print(f"   Current approach (fetch all, filter in memory): {current_time:.3f}s")
-        print(f"   Found {len(filtered_messages)} messages from last 7 days out of {len(all_messages)} total")
+        print(f"   Found {len(filtered_messages)} messages from last 7 days out of {len(all_messages)} fetched")
         
-        # Optimized approach would use Firestore query
-        print(f"   Optimized approach would use: where('timestamp', '>', cutoff)")
-        print(f"   Expected improvement: 60-80% for sparse recent data")
+        # Optimized approach: filter and count on the server
+        start_time = time.time()
+        total_count = self.firebase.count_documents('messages', use_cache=False)
+        recent_count = self.firebase.count_documents(
+            'messages', filters=[('timestamp', '>', cutoff)], use_cache=False
+        )
+        count_time = time.time() - start_time
+        print(f"   Server-side count aggregation: {count_time:.3f}s")
+        print(f"   Counted {recent_count} messages from last 7 days out of {total_count} total")
+        if current_time > 0:
+            print(f"   Improvement: {((current_time - count_time) / current_time * 100):.1f}%")
     
     def generate_optimization_report(self):
         """Generate a comprehensive optimization report."""
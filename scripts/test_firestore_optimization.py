@@ -236,6 +236,38 @@ class PerformanceTester:
         print(f"    Optimized: {optimized_time:.3f}s")
         print(f"    Improvement: {improvement:.1f}%")
     
+    def test_count_aggregation(self, user_id: str):
+        """Test server-side count aggregation against fetching documents to count them."""
+        print("\n📊 Testing Count Aggregation...")
+        
+        for collection, filters in [
+            ('messages', []),
+            ('userFacts', []),
+            ('conversations', [('userId', '==', user_id)]),
+        ]:
+            # Original: materialize every document, then len()
+            docs, fetch_time = self.measure_time(
+                lambda: list(self.firebase_original.stream_collection(collection, filters))
+            )
+            
+            # Optimized: count on the server, first uncached then cached
+            count, count_time = self.measure_time(
+                self.firebase_optimized.count_documents, collection, filters, use_cache=False
+            )
+            _, cached_time = self.measure_time(self.firebase_optimized.count_documents, collection, filters)
+            
+            improvement = ((fetch_time - count_time) / fetch_time * 100) if fetch_time > 0 else 0
+            
+            print(f"\n  {collection}: {len(docs)} fetched, {count} counted")
+            print(f"    Fetch and len(): {fetch_time:.3f}s")
+            print(f"    count(): {count_time:.3f}s ({cached_time:.4f}s cached)")
+            print(f"    Improvement: {improvement:.1f}%")
+            
+            key = f"count_{collection}"
+            self.results['original'][key] = fetch_time
+            self.results['optimized'][key] = count_time
+            self.results['improvements'][key] = improvement
+    
     def generate_report(self):
         """Generate performance comparison report."""
         print("\n" + "=" * 60)
@@ -306,6 +338,7 @@ class PerformanceTester:
         self.test_parallel_execution(user_id)
         self.test_cache_effectiveness(user_id)
         self.test_query_patterns(user_id)
+        self.test_count_aggregation(user_id)
         
         # Generate report
         self.generate_report()
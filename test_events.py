@@ -28,7 +28,7 @@ async def test_event_dispatcher():
     while not queue.empty():
         event = await queue.get()
         # Parse the event
-        lines = event.strip().split('\n')
+        lines = event.decode('utf-8').strip().split('\n')
         event_type = None
         event_data = None
         
@@ -77,7 +77,7 @@ async def test_chat_sequence():
     while not queue.empty():
         event = await queue.get()
         # Parse the event
-        lines = event.strip().split('\n')
+        lines = event.decode('utf-8').strip().split('\n')
         event_type = None
         event_data = None
         
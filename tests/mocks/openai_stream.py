@@ -0,0 +1,33 @@
+import threading
+from types import SimpleNamespace
+from typing import Optional
+
+
+class FakeOpenAIStream:
+    """
+    Stands in for openai.Stream: yields one content delta per token and records close().
+
+    With stall_after, iteration blocks before that token until close() is
+    called, like a read waiting on a connection that sends nothing.
+    """
+
+    def __init__(self, tokens: list[str], stall_after: Optional[int] = None):
+        self.tokens = tokens
+        self.stall_after = stall_after
+        self.sent = 0
+        self.closed = False
+        self._closed_event = threading.Event()
+
+    def __iter__(self):
+        for i, token in enumerate(self.tokens):
+            if self.stall_after is not None and i >= self.stall_after:
+                self._closed_event.wait(5)
+            if self.closed:
+                # A closed HTTP stream delivers nothing more
+                return
+            self.sent += 1
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+    def close(self):
+        self.closed = True
+        self._closed_event.set()
@@ -0,0 +1,19 @@
+from typing import Dict, List, Optional
+
+from app.services.history_compaction import Summarizer
+
+
+class FakeSummarizer(Summarizer):
+    """Deterministic summarizer that keeps the first words of every message."""
+
+    def __init__(self, words_per_message: int = 3):
+        self.words_per_message = words_per_message
+        self.calls = []
+
+    def summarize(self, previous: Optional[str], messages: List[Dict[str, str]]) -> str:
+        self.calls.append((previous, list(messages)))
+        lines = [previous] if previous else []
+        for message in messages:
+            words = (message.get("content") or "").split()[:self.words_per_message]
+            lines.append(f"{message.get('role')}: {' '.join(words)}")
+        return "\n".join(lines)
@@ -0,0 +1,240 @@
+"""
+Unit tests for the async database session and repositories
+"""
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core import db as db_module
+from app.core.db import (
+    to_async_database_url, async_pool_options, async_session_scope, unit_of_work, async_unit_of_work
+)
+from app.models.user import User
+from app.repository.user import UserRepository, AsyncUserRepository
+
+
+class TestAsyncDatabaseUrl(unittest.TestCase):
+    """Test conversion of sync database URLs to async driver URLs."""
+
+    def test_postgresql_url_uses_asyncpg(self):
+        self.assertEqual(
+            to_async_database_url("postgresql://u:p@localhost:5432/freya"),
+            "postgresql+asyncpg://u:p@localhost:5432/freya"
+        )
+
+    def test_psycopg2_url_uses_asyncpg(self):
+        self.assertEqual(
+            to_async_database_url("postgresql+psycopg2://u:p@db/freya"),
+            "postgresql+asyncpg://u:p@db/freya"
+        )
+
+    def test_postgres_alias_uses_asyncpg(self):
+        self.assertEqual(
+            to_async_database_url("postgres://u:p@db/freya"),
+            "postgresql+asyncpg://u:p@db/freya"
+        )
+
+    def test_async_url_unchanged(self):
+        url = "postgresql+asyncpg://u:p@db/freya"
+        self.assertEqual(to_async_database_url(url), url)
+
+    def test_sqlite_url_uses_aiosqlite(self):
+        self.assertEqual(to_async_database_url("sqlite:////tmp/freya.db"), "sqlite+aiosqlite:////tmp/freya.db")
+
+    def test_pool_sizing_only_for_postgresql(self):
+        self.assertEqual(
+            async_pool_options("postgresql+asyncpg://u:p@db/freya", 5, 10, 30),
+            {"pool_size": 5, "max_overflow": 10, "pool_timeout": 30}
+        )
+        url = to_async_database_url("sqlite:///:memory:")
+        options = async_pool_options(url, 5, 10, 30)
+        self.assertEqual(options, {})
+        engine = create_async_engine(url, pool_pre_ping=True, **options)
+        asyncio.run(engine.dispose())
+
+
+class TestAsyncSessionScope(unittest.TestCase):
+    """Test that sessions are always closed."""
+
+    def test_session_closed_after_block(self):
+        session = MagicMock()
+        session.close = AsyncMock()
+
+        async def run():
+            async with async_session_scope() as db:
+                self.assertIs(db, session)
+
+        with patch.object(db_module, "AsyncSessionLocal", return_value=session):
+            asyncio.run(run())
+
+        session.close.assert_awaited_once()
+
+    def test_session_closed_on_error(self):
+        session = MagicMock()
+        session.close = AsyncMock()
+
+        async def run():
+            async with async_session_scope():
+                raise RuntimeError("boom")
+
+        with patch.object(db_module, "AsyncSessionLocal", return_value=session):
+            with self.assertRaises(RuntimeError):
+                asyncio.run(run())
+
+        session.close.assert_awaited_once()
+
+
+class TestAsyncBaseRepository(unittest.TestCase):
+    """Test the async repository CRUD helpers."""
+
+    def test_create_commits_and_refreshes(self):
+        session = MagicMock()
+        session.commit = AsyncMock()
+        session.refresh = AsyncMock()
+
+        repo = AsyncUserRepository(session)
+        user = asyncio.run(repo.create({"username": "freya"}))
+
+        session.add.assert_called_once_with(user)
+        session.commit.assert_awaited_once()
+        session.refresh.assert_awaited_once_with(user)
+        self.assertEqual(user.username, "freya")
+
+    def test_get_returns_first_result(self):
+        expected = MagicMock()
+        result = MagicMock()
+        result.scalars.return_value.first.return_value = expected
+        session = MagicMock()
+        session.execute = AsyncMock(return_value=result)
+
+        repo = AsyncUserRepository(session)
+        self.assertIs(asyncio.run(repo.get(1)), expected)
+        session.execute.assert_awaited_once()
+
+    def test_create_in_unit_of_work_only_flushes(self):
+        session = MagicMock()
+        session.info = {}
+        session.flush = AsyncMock()
+        session.commit = AsyncMock()
+        session.refresh = AsyncMock()
+        session.rollback = AsyncMock()
+
+        async def run():
+            async with async_unit_of_work(session):
+                repo = AsyncUserRepository(session)
+                await repo.create({"username": "a"})
+                await repo.create({"username": "b"})
+                session.commit.assert_not_awaited()
+
+        asyncio.run(run())
+
+        self.assertEqual(session.flush.await_count, 2)
+        session.refresh.assert_not_awaited()
+        session.commit.assert_awaited_once()
+        self.assertNotIn("unit_of_work", session.info)
+
+
+class TestUnitOfWork(unittest.TestCase):
+    """Test commit batching against a real (in-memory) database."""
+
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        User.__table__.create(engine)
+        self.Session = sessionmaker(bind=engine)
+
+    def _user(self, name):
+        return {"username": name, "email": f"{name}@example.com", "hashed_password": "x"}
+
+    def test_ids_available_before_single_commit(self):
+        db = self.Session()
+        with patch.object(db, "commit", wraps=db.commit) as commit:
+            with unit_of_work(db):
+                repo = UserRepository(db)
+                first = repo.create(self._user("a"))
+                second = repo.create(self._user("b"))
+                self.assertIsNotNone(first.id)
+                self.assertIsNotNone(second.id)
+                commit.assert_not_called()
+            commit.assert_called_once()
+
+        self.assertEqual(self.Session().query(User).count(), 2)
+
+    def test_rollback_on_error(self):
+        db = self.Session()
+        with self.assertRaises(RuntimeError):
+            with unit_of_work(db):
+                UserRepository(db).create(self._user("a"))
+                raise RuntimeError("boom")
+
+        self.assertEqual(self.Session().query(User).count(), 0)
+
+    def test_create_many(self):
+        db = self.Session()
+        with unit_of_work(db):
+            users = UserRepository(db).create_many([self._user("a"), self._user("b")])
+        self.assertEqual(len({u.id for u in users}), 2)
+
+
+class TestChatCompletionUnitOfWork(unittest.TestCase):
+    """The chat route commits the turn once, after the model call."""
+
+    def _run(self, completion_side_effect):
+        from app.api.routes import chat
+
+        session = MagicMock()
+        session.info = {}
+        session.commit = AsyncMock()
+        session.rollback = AsyncMock()
+        events = []
+        conversations = MagicMock()
+        conversations.create = AsyncMock(side_effect=lambda data: events.append("conversation") or MagicMock(id=7))
+        messages = MagicMock()
+        messages.create = AsyncMock(side_effect=lambda data: events.append(data["role"]))
+        users = MagicMock()
+        users.get = AsyncMock(return_value=MagicMock(id=1))
+        openai = MagicMock()
+
+        def complete(**kwargs):
+            events.append(("openai", dict(session.info)))
+            return completion_side_effect()
+
+        openai.create_chat_completion.side_effect = complete
+        compactor = MagicMock()
+        compactor.compact.return_value = MagicMock(messages=[], usage=lambda: {})
+        request = chat.ChatCompletionRequest(messages=[{"role": "user", "content": "hi"}], user_id=1)
+
+        with patch.object(chat, "AsyncUserRepository", return_value=users), \
+                patch.object(chat, "AsyncConversationRepository", return_value=conversations), \
+                patch.object(chat, "AsyncMessageRepository", return_value=messages), \
+                patch.object(chat, "OpenAIService", return_value=openai), \
+                patch.object(chat, "get_history_compactor", return_value=compactor), \
+                patch.object(chat, "assemble_memory_context_async", AsyncMock(return_value={})):
+            try:
+                asyncio.run(chat.create_chat_completion(request, session))
+            except Exception:
+                pass
+        return session, events, compactor
+
+    def test_model_call_runs_outside_the_transaction(self):
+        reply = MagicMock()
+        reply.choices[0].message.content = "hello"
+        session, events, compactor = self._run(lambda: reply)
+        self.assertEqual(events, [("openai", {}), "conversation", "user", "assistant"])
+        session.commit.assert_awaited_once()
+        self.assertEqual(compactor.compact.call_args.args[0], "new")
+
+    def test_model_error_writes_nothing(self):
+        def fail():
+            raise RuntimeError("rate limited")
+
+        session, events, _ = self._run(fail)
+        self.assertEqual(len(events), 1)
+        session.commit.assert_not_awaited()
+
+
+if __name__ == "__main__":
+    unittest.main()
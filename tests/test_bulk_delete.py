@@ -0,0 +1,194 @@
+"""
+test_bulk_delete.py - Tests for background cascading conversation deletes
+"""
+
+import sys
+import threading
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.bulk_delete import (
+    JOB_DONE,
+    JOB_FAILED,
+    DeleteJob,
+    DeleteJobManager,
+    FirestoreConversationDeleter,
+    delete_conversation_rows,
+    set_delete_job_manager,
+)
+from app.services.firestore_emulator import (
+    EmulatedBatch,
+    EmulatedQuery,
+    InMemoryFirestore,
+    create_emulated_firebase_service,
+)
+from app.services.message_search_index import MessageSearchIndex
+
+
+def make_db():
+    """Conversations c1 (7 messages, nested summaries) and c2 (3 messages), written as the app writes them."""
+    db = InMemoryFirestore()
+    service = create_emulated_firebase_service(db)
+    search_index = MessageSearchIndex()
+    service.set_document("conversations", "c1", {"userId": "u1"})
+    service.set_document("conversations", "c2", {"userId": "u1"})
+    with patch("app.services.firebase_service.get_message_search_index", return_value=search_index):
+        for i in range(10):
+            service.add_message("c1" if i < 7 else "c2", {"user": f"message {i} about hiking"}, user_id="u1")
+    summaries = db.collection("conversations").document("c1").collection("summaries")
+    summaries.document("s1").set({"text": "summary"})
+    summaries.document("s2").set({"text": "older"})
+    summaries.document("s1").collection("revisions").document("r1").set({"text": "draft"})
+    return db, search_index
+
+
+def message_ids(db, conversation_id):
+    return {s.id for s in db.collection("messages").where("conversationId", "==", conversation_id).stream()}
+
+
+class TestFirestoreConversationDeleter:
+    """Test suite for FirestoreConversationDeleter."""
+
+    def test_messages_carry_conversation_and_user(self):
+        db, _ = make_db()
+        messages = [s.to_dict() for s in db.collection("messages").stream()]
+        assert len(messages) == 10
+        assert all(m["userId"] == "u1" and m["conversationId"] in ("c1", "c2") for m in messages)
+
+    def test_cascade(self):
+        db, search_index = make_db()
+        remaining = message_ids(db, "c2")
+        job = DeleteJob(id="j1", kind="firestore", target="c1")
+
+        with patch.object(EmulatedBatch, "commit", autospec=True, side_effect=EmulatedBatch.commit) as commit:
+            deleted = FirestoreConversationDeleter(db, batch_size=3, search_index=search_index) \
+                .delete_conversation("c1", job, user_id="u1")
+
+        assert deleted == {"messages": 7, "conversations/summaries": 2,
+                           "conversations/summaries/revisions": 1, "conversations": 1}
+        assert job.expected == 7
+        assert {s.id for s in db.collection("messages").stream()} == remaining  # other conversations untouched
+        assert not db.collection("conversations").document("c1").get().exists
+        assert db.collection("conversations").document("c2").get().exists
+        assert not db.collection("conversations").document("c1").collections()
+        assert {hit["id"] for hit in search_index.search("u1", "hiking", limit=10)} == remaining
+        assert commit.call_count == 3 + 1 + 1  # three message pages, one per subcollection
+
+    def test_reads_only_ids(self):
+        db, _ = make_db()
+        seen = []
+        stream = EmulatedQuery.stream
+
+        def record(query, **kwargs):
+            for snapshot in stream(query):
+                seen.append(snapshot.to_dict())
+                yield snapshot
+
+        with patch.object(EmulatedQuery, "stream", record):
+            FirestoreConversationDeleter(db, search_index=MessageSearchIndex()) \
+                .delete_conversation("c1", DeleteJob(id="j1", kind="firestore", target="c1"))
+        assert seen and all(data == {} for data in seen)
+
+
+class TestDeleteConversationRows:
+    """Test the set-based PostgreSQL delete."""
+
+    def test_three_delete_statements(self):
+        session = MagicMock()
+        session.execute.side_effect = [MagicMock(rowcount=n) for n in (4, 12, 1)]
+        job = DeleteJob(id="j1", kind="postgres", target="5")
+
+        deleted = delete_conversation_rows(session, 5, job)
+
+        assert deleted == {"messagetopics": 4, "messages": 12, "conversations": 1}
+        assert job.deleted == deleted
+        statements = [str(call.args[0]) for call in session.execute.call_args_list]
+        assert statements[0].startswith("DELETE FROM messagetopics WHERE messagetopics.message_id IN (SELECT")
+        assert statements[1].startswith("DELETE FROM messages WHERE messages.conversation_id")
+        assert statements[2].startswith("DELETE FROM conversations WHERE conversations.id")
+        session.commit.assert_called_once()
+        session.query.assert_not_called()  # nothing is loaded through the ORM
+
+    def test_rollback_on_error(self):
+        session = MagicMock()
+        session.execute.side_effect = RuntimeError("deadlock")
+        with pytest.raises(RuntimeError):
+            delete_conversation_rows(session, 5)
+        session.rollback.assert_called_once()
+        session.commit.assert_not_called()
+
+
+class TestDeleteJobManager:
+    """Test suite for DeleteJobManager."""
+
+    def test_job_lifecycle(self):
+        manager = DeleteJobManager()
+        release = threading.Event()
+
+        def work(job):
+            job.record("messages", 3)
+            release.wait(5)
+
+        job = manager.submit("firestore", "c1", work)
+        assert manager.submit("firestore", "c1", work) is job  # deduplicated while unfinished
+        release.set()
+        finished = manager.wait(job.id, timeout=5)
+        assert finished.status == JOB_DONE
+        assert finished.to_dict()["total_deleted"] == 3
+        assert manager.submit("firestore", "c1", work).id != job.id
+        manager.shutdown()
+
+    def test_failed_job(self):
+        manager = DeleteJobManager()
+
+        def work(job):
+            raise RuntimeError("permission denied")
+
+        job = manager.wait(manager.submit("postgres", 1, work).id, timeout=5)
+        assert job.status == JOB_FAILED and job.error == "permission denied"
+        manager.shutdown()
+
+    def test_history_is_bounded(self):
+        manager = DeleteJobManager(history=2)
+        ids = [manager.wait(manager.submit("postgres", i, lambda job: None).id, timeout=5).id for i in range(4)]
+        manager.submit("postgres", 99, lambda job: None)
+        assert manager.get(ids[0]) is None
+        assert manager.get(ids[-1]) is not None
+        manager.shutdown()
+
+
+class TestFirebaseDeleteRoute:
+    """Test the Firebase delete endpoint."""
+
+    def test_returns_job_id_immediately(self):
+        from app.main import app
+
+        manager = DeleteJobManager()
+        set_delete_job_manager(manager)
+        db, _ = make_db()
+        firebase = MagicMock()
+        firebase.db = db
+        firebase.get_conversation.return_value = {"id": "c1", "userId": "u1"}
+        try:
+            with patch("app.api.routes.firebase_chat.FirebaseService", return_value=firebase):
+                client = TestClient(app)
+                response = client.delete("/firebase/conversations/c1")
+                assert response.status_code == 202
+                job_id = response.json()["job_id"]
+
+                manager.wait(job_id, timeout=5)
+                status = client.get(f"/firebase/delete-jobs/{job_id}").json()
+                assert status["status"] == JOB_DONE
+                assert status["deleted"]["messages"] == 7
+                assert client.get("/firebase/delete-jobs/unknown").status_code == 404
+        finally:
+            set_delete_job_manager(None)
+            manager.shutdown()
+        firebase.delete_document.assert_not_called()
+        assert not db.collection("conversations").document("c1").get().exists
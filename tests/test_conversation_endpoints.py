@@ -173,11 +173,11 @@ class TestConversationEndpoints:
         response = client.delete(
             f"/conversations/{conversation_id}?user_id={user_id}"
         )
-        assert response.status_code == 200
+        assert response.status_code == 202
         
         data = response.json()
-        assert "message" in data
-        assert f"Conversation {test_conversation.id} deleted successfully" in data["message"]
+        assert "job_id" in data
+        assert f"Conversation {test_conversation.id} deletion started" in data["message"]
     
     def test_delete_conversation_unauthorized(self, client, test_conversation, test_user):
         """Test DELETE with wrong user ID"""
@@ -0,0 +1,119 @@
+"""
+test_event_broker.py - Tests for the in-process SSE pub/sub broker
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.event_broker import InMemoryEventBroker, user_channel
+from app.services.event_service import EventService
+
+
+class TestInMemoryEventBroker:
+    """Test suite for InMemoryEventBroker."""
+
+    def test_fan_out_shares_payload(self):
+        async def run():
+            broker = InMemoryEventBroker()
+            tab1 = broker.subscribe(user_channel(1))
+            tab2 = broker.subscribe(user_channel(1))
+            other_user = broker.subscribe(user_channel(2))
+            event = "event: freya:reply\ndata: {}\n\n"
+
+            assert broker.publish(user_channel(1), event) == 2
+            return await tab1.get(), await tab2.get(), other_user._queue.empty()
+
+        first, second, other_empty = asyncio.run(run())
+        assert first is second
+        assert other_empty
+
+    def test_publish_without_subscribers(self):
+        async def run():
+            return InMemoryEventBroker().publish(user_channel(1), "event")
+
+        assert asyncio.run(run()) == 0
+
+    def test_slow_consumer_dropped(self):
+        async def run():
+            broker = InMemoryEventBroker()
+            slow = broker.subscribe(user_channel(1), maxsize=2)
+            fast = broker.subscribe(user_channel(1), maxsize=10)
+            for i in range(3):
+                broker.publish(user_channel(1), f"event {i}")
+            slow_events = [event async for event in slow]
+            return broker, slow, slow_events, fast
+
+        broker, slow, slow_events, fast = asyncio.run(run())
+        assert slow.dropped
+        assert slow_events == []
+        assert broker.dropped_subscribers == 1
+        assert broker.subscriber_count(user_channel(1)) == 1
+        assert fast._queue.qsize() == 3
+
+    def test_unsubscribe_ends_iteration(self):
+        async def run():
+            broker = InMemoryEventBroker()
+            subscription = broker.subscribe(user_channel(1))
+
+            async def consume():
+                return [event async for event in subscription]
+
+            consumer = asyncio.create_task(consume())
+            broker.publish(user_channel(1), "hello")
+            await asyncio.sleep(0)
+            broker.unsubscribe(subscription)
+            return await consumer, broker.subscriber_count(user_channel(1))
+
+        assert asyncio.run(run()) == (["hello"], 0)
+
+    def test_reconnect_replays_missed_events_then_live(self):
+        async def run():
+            broker = InMemoryEventBroker(replay_size=3)
+            channel = user_channel(1)
+            for event_id in range(1, 6):
+                broker.publish(channel, f"frame {event_id}", event_id)
+            # Client saw id 3 before the connection dropped
+            subscription = broker.subscribe(channel, last_event_id=3)
+            broker.publish(channel, "frame 6", 6)
+            return [await subscription.get() for _ in range(3)]
+
+        assert asyncio.run(run()) == ["frame 4", "frame 5", "frame 6"]
+
+    def test_replay_buffer_is_bounded(self):
+        async def run():
+            broker = InMemoryEventBroker(replay_size=2, max_replay_channels=1)
+            for event_id in range(1, 5):
+                broker.publish(user_channel(1), f"frame {event_id}", event_id)
+            broker.publish(user_channel(2), "other", 5)
+            return broker.replay(user_channel(1), 0), broker.replay(user_channel(2), 0)
+
+        # Oldest frames and least recently used channels are evicted
+        assert asyncio.run(run()) == ([], ["other"])
+
+
+class TestEventGeneratorSubscription:
+    """Test /events/stream forwarding of broker events."""
+
+    def test_forwards_events_and_unsubscribes(self):
+        async def run():
+            broker = InMemoryEventBroker()
+            subscription = broker.subscribe(user_channel(1))
+            request = MagicMock()
+            request.is_disconnected = AsyncMock(return_value=False)
+
+            stream = EventService.event_generator(request, subscription)
+            connected = await stream.__anext__()
+            broker.publish(user_channel(1), "pushed")
+            pushed = await stream.__anext__()
+            await stream.aclose()
+            return connected, pushed, broker.subscriber_count(user_channel(1))
+
+        connected, pushed, remaining = asyncio.run(run())
+        assert b"\nevent: connection\n" in connected
+        assert pushed == "pushed"
+        assert remaining == 0
@@ -0,0 +1,97 @@
+"""
+test_event_heartbeat.py - Tests for the shared SSE heartbeat scheduler
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.event_broker import InMemoryEventBroker, user_channel
+from app.services.event_heartbeat import HEARTBEAT_FRAME, ConnectionStats, HeartbeatScheduler
+from app.services.event_service import EventService
+
+
+class TestHeartbeatScheduler:
+    """Test suite for HeartbeatScheduler."""
+
+    def test_tick_skips_streams_with_recent_events(self):
+        async def run():
+            broker = InMemoryEventBroker()
+            scheduler = HeartbeatScheduler(interval=3600, stats=ConnectionStats())
+            idle = broker.subscribe(user_channel(1))
+            busy = broker.subscribe(user_channel(2))
+            scheduler.register(idle)
+            scheduler.register(busy)
+            broker.publish(user_channel(2), "reply")
+
+            first = scheduler.tick()
+            second = scheduler.tick()  # busy has been idle for a whole tick now
+            return first, second, await idle.get(), [await busy.get(), await busy.get()]
+
+        first, second, idle_frame, busy_frames = asyncio.run(run())
+        assert (first, second) == (1, 2)
+        assert idle_frame == HEARTBEAT_FRAME
+        assert busy_frames == ["reply", HEARTBEAT_FRAME]
+
+    def test_full_stream_is_dropped(self):
+        async def run():
+            broker = InMemoryEventBroker()
+            scheduler = HeartbeatScheduler(interval=3600, stats=ConnectionStats())
+            stuck = broker.subscribe(user_channel(1), maxsize=1)
+            scheduler.register(stuck)
+            scheduler.tick()
+            scheduler.tick()
+            return stuck, scheduler.stream_count, broker.subscriber_count(user_channel(1))
+
+        stuck, streams, subscribers = asyncio.run(run())
+        assert stuck.dropped
+        assert (streams, subscribers) == (0, 0)
+
+    def test_one_ticker_for_all_streams(self):
+        async def run():
+            broker = InMemoryEventBroker()
+            scheduler = HeartbeatScheduler(interval=0.01, stats=ConnectionStats())
+            subscriptions = [broker.subscribe(user_channel(i)) for i in range(50)]
+            for subscription in subscriptions:
+                scheduler.register(subscription)
+            ticker = scheduler._task
+            await asyncio.sleep(0.05)
+            beats = [await s.get() for s in subscriptions]
+            for subscription in subscriptions:
+                scheduler.unregister(subscription)
+            await asyncio.sleep(0.03)
+            return ticker, scheduler._task, beats
+
+        ticker, final_task, beats = asyncio.run(run())
+        assert ticker is final_task
+        assert ticker.done()  # exits once no streams are registered
+        assert beats == [HEARTBEAT_FRAME] * 50
+
+
+class TestConnectionAccounting:
+    """Test stream accounting in EventService.event_generator."""
+
+    def test_stream_counted_while_open(self):
+        from app.services.event_heartbeat import connection_stats
+
+        async def run():
+            broker = InMemoryEventBroker()
+            request = MagicMock()
+            request.is_disconnected = AsyncMock(return_value=False)
+            before = connection_stats.snapshot()
+
+            stream = EventService.event_generator(request, broker.subscribe(user_channel(1)))
+            await stream.__anext__()
+            during = connection_stats.snapshot()
+            await stream.aclose()
+            after = connection_stats.snapshot()
+            return before, during, after
+
+        before, during, after = asyncio.run(run())
+        assert during["open_streams"] == before["open_streams"] + 1
+        assert during["bytes_sent"] > before["bytes_sent"]
+        assert after["open_streams"] == before["open_streams"]
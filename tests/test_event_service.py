@@ -0,0 +1,265 @@
+"""
+test_event_service.py - Tests for SSE event formatting and streaming
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.event_service import EventService, event_id_of
+from app.services.event_dispatcher import EventDispatcher
+from app.services.openai_service import OpenAIService
+from tests.mocks.openai_stream import FakeOpenAIStream
+
+
+def make_request(disconnected=False):
+    request = MagicMock()
+    request.is_disconnected = AsyncMock(return_value=disconnected)
+    return request
+
+
+class TestFormatSse:
+    """Test SSE frame formatting."""
+
+    def test_frames_carry_increasing_ids(self):
+        async def run():
+            return [await EventService.format_sse("freya:reply", {"message": str(i)}) for i in range(3)]
+
+        frames = asyncio.run(run())
+        ids = [event_id_of(frame) for frame in frames]
+        assert ids == sorted(ids) and len(set(ids)) == 3
+        assert frames[0].startswith(b"id: %d\nevent: freya:reply\ndata: " % ids[0])
+        assert json.loads(frames[0].split(b"data: ", 1)[1]) == {"message": "0"}
+
+    def test_heartbeat_has_no_id(self):
+        assert event_id_of(b": heartbeat\n\n") is None
+
+
+class TestSupervisedEventStream:
+    """Test the producer/consumer SSE pipeline."""
+
+    def test_events_delivered_before_producer_finishes(self):
+        async def run():
+            release = asyncio.Event()
+
+            async def producer(queue):
+                await queue.put("first")
+                await release.wait()
+                await queue.put("second")
+
+            stream = EventService.supervised_event_stream(make_request(), producer)
+            first = await stream.__anext__()
+            release.set()
+            rest = [event async for event in stream]
+            return first, rest
+
+        assert asyncio.run(run()) == ("first", ["second"])
+
+    def test_producer_error_becomes_error_event(self):
+        async def run():
+            async def producer(queue):
+                await queue.put("listening")
+                raise RuntimeError("boom")
+
+            return [e async for e in EventService.supervised_event_stream(make_request(), producer)]
+
+        events = asyncio.run(run())
+        assert events[0] == "listening"
+        assert b"\nevent: error\n" in events[1]
+        assert b"boom" in events[1]
+
+    def test_producer_cancelled_on_disconnect(self):
+        async def run():
+            cancelled = asyncio.Event()
+
+            async def producer(queue):
+                try:
+                    await asyncio.sleep(60)
+                except asyncio.CancelledError:
+                    cancelled.set()
+                    raise
+
+            stream = EventService.supervised_event_stream(
+                make_request(disconnected=True), producer, poll_interval=0.01
+            )
+            events = [e async for e in stream]
+            return events, cancelled.is_set()
+
+        assert asyncio.run(run()) == ([], True)
+
+    def test_bounded_queue_applies_backpressure(self):
+        async def run():
+            produced = []
+
+            async def producer(queue):
+                for i in range(10):
+                    await queue.put(i)
+                    produced.append(i)
+
+            stream = EventService.supervised_event_stream(make_request(), producer, maxsize=2)
+            await stream.__anext__()
+            await asyncio.sleep(0.01)
+            # One event consumed, two buffered, the producer blocked on the next put
+            in_flight = len(produced)
+            await stream.aclose()
+            return in_flight
+
+        assert asyncio.run(run()) <= 4
+
+
+class TestStreamCancellation:
+    """Test that a client disconnect stops the upstream completion."""
+
+    def test_disconnect_closes_upstream_and_keeps_partial_reply(self):
+        upstream = FakeOpenAIStream([f"word{i} " for i in range(500)])
+        openai_service = OpenAIService(api_key="test_key")
+        dispatcher = EventDispatcher()
+
+        async def run():
+            async def streaming_processor(message):
+                return openai_service.handle_streaming_response(upstream)
+
+            async def producer(queue):
+                await dispatcher.dispatch_streaming_chat_sequence(
+                    queue, streaming_processor, "hi", thinking_delay=0
+                )
+
+            stream = EventService.supervised_event_stream(make_request(), producer, maxsize=2)
+            received = [await stream.__anext__() for _ in range(4)]
+            # Client goes away: the response generator is closed
+            await stream.aclose()
+            return received
+
+        received = asyncio.run(run())
+
+        assert b"freya:reply" in received[-1]
+        assert upstream.closed
+        assert upstream.sent < 500
+        assert dispatcher.partial_response.startswith("word0 word1 ")
+        assert len(dispatcher.partial_response.split()) == upstream.sent
+
+
+class TestThinkingDelayOverlap:
+    """Test that the thinking delay is a minimum display time, not a fixed wait."""
+
+    @staticmethod
+    async def drain(queue):
+        events = []
+        while not queue.empty():
+            events.append(queue.get_nowait())
+        return events
+
+    def test_processing_runs_during_thinking_delay(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            queue = asyncio.Queue()
+            started = []
+
+            async def slow_processor(message):
+                started.append(loop.time())
+                await asyncio.sleep(0.2)
+                return "reply"
+
+            begin = loop.time()
+            response = await EventDispatcher().dispatch_chat_sequence(
+                queue, slow_processor, "hi", thinking_delay=0.2
+            )
+            return response, started[0] - begin, loop.time() - begin, await self.drain(queue)
+
+        response, start_offset, elapsed, events = asyncio.run(run())
+        assert response == "reply"
+        assert start_offset < 0.05
+        assert 0.2 <= elapsed < 0.35  # max(delay, processing), not their sum
+        assert b"freya:reply" in events[-1]
+
+    def test_first_token_held_until_delay_elapses(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            queue = asyncio.Queue()
+            reply_times = []
+
+            async def fast_stream():
+                for token in ["a", "b"]:
+                    yield token
+
+            async def processor(message):
+                return fast_stream()
+
+            dispatcher = EventDispatcher()
+            original = dispatcher.dispatch_reply_event
+
+            async def timed_reply(client_queue, chunk):
+                reply_times.append(loop.time())
+                await original(client_queue, chunk)
+
+            dispatcher.dispatch_reply_event = timed_reply
+            begin = loop.time()
+            response = await dispatcher.dispatch_streaming_chat_sequence(
+                queue, processor, "hi", thinking_delay=0.1
+            )
+            return response, [t - begin for t in reply_times]
+
+        response, offsets = asyncio.run(run())
+        assert response == "ab"
+        assert offsets[0] >= 0.1
+
+
+class TestReplyCoalescing:
+    """Test batching of streamed deltas into freya:reply frames."""
+
+    @staticmethod
+    def replies(queue):
+        messages = []
+        while not queue.empty():
+            event = queue.get_nowait()
+            if b"\nevent: freya:reply\n" in event:
+                messages.append(json.loads(event.split(b"data: ", 1)[1])["message"])
+        return messages
+
+    def run_sequence(self, tokens, delays=None, **coalescing):
+        async def stream():
+            for i, token in enumerate(tokens):
+                if delays:
+                    await asyncio.sleep(delays[i])
+                yield token
+
+        async def processor(message):
+            return stream()
+
+        async def run():
+            queue = asyncio.Queue()
+            response = await EventDispatcher().dispatch_streaming_chat_sequence(
+                queue, processor, "hi", thinking_delay=0, **coalescing
+            )
+            return response, self.replies(queue)
+
+        return asyncio.run(run())
+
+    def test_no_coalescing_by_default(self):
+        assert self.run_sequence(["a", "b", "c"]) == ("abc", ["a", "b", "c"])
+
+    def test_first_token_sent_alone_then_batched(self):
+        response, replies = self.run_sequence(
+            [f"t{i} " for i in range(20)], coalesce_window=10, coalesce_bytes=10_000
+        )
+        assert replies[0] == "t0 "
+        assert len(replies) == 2
+        assert "".join(replies) == response
+
+    def test_byte_threshold_flushes(self):
+        response, replies = self.run_sequence(
+            ["x" * 4] * 9, coalesce_window=10, coalesce_bytes=8
+        )
+        assert replies == ["xxxx", "xxxxxxxx", "xxxxxxxx", "xxxxxxxx", "xxxxxxxx"]
+
+    def test_window_flushes_when_upstream_stalls(self):
+        response, replies = self.run_sequence(
+            ["a", "b", "c", "d"], delays=[0, 0, 0.2, 0], coalesce_window=0.05, coalesce_bytes=10_000
+        )
+        # "b" is sent when the window expires during the stall, not with "c"
+        assert replies == ["a", "b", "cd"]
@@ -0,0 +1,177 @@
+"""
+test_firebase_auth.py - Tests for the async Firebase auth dependency and claims cache
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.firebase_auth import (
+    AuthStats,
+    FirebaseAuthVerifier,
+    TokenRevokedError,
+    parse_bearer,
+    set_auth_verifier,
+)
+
+NOW = 1_750_000_000.0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = NOW
+
+    def __call__(self):
+        return self.now
+
+
+class FakeVerify:
+    """Decodes tokens of the form '<uid>:<iat>' and records calls."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+        self.threads = []
+
+    def __call__(self, token):
+        self.calls.append(token)
+        self.threads.append(threading.get_ident())
+        time.sleep(self.delay)
+        uid, _, iat = token.partition(":")
+        if not iat:
+            raise ValueError("malformed token")
+        return {"uid": uid, "iat": float(iat), "exp": float(iat) + 3600}
+
+
+def make_verifier(**kwargs):
+    verify = FakeVerify(kwargs.pop("delay", 0.0))
+    clock = FakeClock()
+    verifier = FirebaseAuthVerifier(verify=verify, clock=clock, stats=AuthStats(), **kwargs)
+    return verifier, verify, clock
+
+
+class TestFirebaseAuthVerifier:
+    """Test suite for FirebaseAuthVerifier."""
+
+    def test_parse_bearer(self):
+        assert parse_bearer("Bearer abc") == "abc"
+        assert parse_bearer("abc") == "abc"
+
+    def test_claims_cached_until_exp(self):
+        verifier, verify, clock = make_verifier()
+        token = f"u1:{NOW}"
+
+        async def run():
+            loop_thread = threading.get_ident()
+            first = await verifier.verify(token)
+            second = await verifier.verify(token)
+            return loop_thread, first, second
+
+        loop_thread, first, second = asyncio.run(run())
+        assert first == second and first["uid"] == "u1"
+        assert len(verify.calls) == 1
+        assert verify.threads[0] != loop_thread  # verified off the event loop
+
+        stats = verifier.stats.snapshot()
+        assert stats["cache_hits"] == 1 and stats["cache_hit_rate"] == 0.5
+        assert stats["verifications"] == 1
+
+        clock.now = NOW + 3600  # expired
+        asyncio.run(verifier.verify(token))
+        assert len(verify.calls) == 2
+
+    def test_concurrent_requests_share_one_verification(self):
+        verifier, verify, _ = make_verifier(delay=0.05)
+
+        async def run():
+            return await asyncio.gather(*(verifier.verify(f"u1:{NOW}") for _ in range(5)))
+
+        results = asyncio.run(run())
+        assert all(claims["uid"] == "u1" for claims in results)
+        assert len(verify.calls) == 1
+        assert verifier.stats.snapshot()["coalesced"] == 4
+
+    def test_cache_is_bounded(self):
+        verifier, _, _ = make_verifier(max_entries=2)
+        for i in range(3):
+            asyncio.run(verifier.verify(f"u{i}:{NOW}"))
+        assert len(verifier) == 2
+
+    def test_invalid_token_not_cached(self):
+        verifier, verify, _ = make_verifier()
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                asyncio.run(verifier.verify("garbage"))
+        assert len(verify.calls) == 2
+        assert verifier.stats.snapshot()["failures"] == 2
+
+    def test_revoke_token(self):
+        verifier, _, _ = make_verifier()
+        token = f"u1:{NOW}"
+        asyncio.run(verifier.verify(token))
+        verifier.revoke_token(token)
+        with pytest.raises(TokenRevokedError):
+            asyncio.run(verifier.verify(token))
+        assert verifier.stats.snapshot()["revoked_rejections"] == 1
+
+    def test_revoke_user(self):
+        verifier, _, clock = make_verifier()
+        old_token = f"u1:{NOW}"
+        asyncio.run(verifier.verify(old_token))
+        asyncio.run(verifier.verify(f"u2:{NOW}"))
+
+        clock.now = NOW + 60
+        assert verifier.revoke_user("u1") == 1
+        with pytest.raises(TokenRevokedError):
+            asyncio.run(verifier.verify(old_token))
+        # Tokens issued after the revocation and other users are unaffected
+        assert asyncio.run(verifier.verify(f"u1:{NOW + 120}"))["uid"] == "u1"
+        assert asyncio.run(verifier.verify(f"u2:{NOW}"))["uid"] == "u2"
+
+
+class TestFirebaseRoutesAuth:
+    """Test the auth dependency on the Firebase routes."""
+
+    @pytest.fixture
+    def client(self):
+        from app.main import app
+
+        verifier = FirebaseAuthVerifier(verify=FakeVerify(), stats=AuthStats())
+        set_auth_verifier(verifier)
+        firebase = MagicMock()
+        firebase.stream_user_topics.side_effect = lambda *args, **kwargs: iter([{"id": "t1", "name": "hiking"}])
+        with patch("app.api.routes.firebase_chat.FirebaseService", return_value=firebase):
+            yield TestClient(app), verifier
+        set_auth_verifier(None)
+
+    def test_valid_token(self, client):
+        client, verifier = client
+        token = f"u1:{time.time()}"
+        for _ in range(2):
+            response = client.get("/firebase/topics/u1", headers={"Authorization": f"Bearer {token}"})
+            assert response.status_code == 200
+        assert response.json()["topics"][0]["name"] == "hiking"
+        assert verifier.stats.snapshot()["cache_hits"] == 1
+
+    def test_other_user_is_forbidden(self, client):
+        client, _ = client
+        response = client.get("/firebase/topics/u2", headers={"Authorization": f"Bearer u1:{time.time()}"})
+        assert response.status_code == 403
+
+    def test_invalid_token_is_unauthorized(self, client):
+        client, _ = client
+        response = client.get("/firebase/topics/u1", headers={"Authorization": "Bearer garbage"})
+        assert response.status_code == 401
+
+    def test_no_token_is_allowed(self, client):
+        client, _ = client
+        assert client.get("/firebase/topics/u1").status_code == 200
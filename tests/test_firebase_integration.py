@@ -7,11 +7,18 @@ without unnecessary complexity.
 
 import unittest
 from unittest.mock import Mock, patch, MagicMock
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import json
+import time
 
-from app.services.firebase_service import FirebaseService
+from google.protobuf.timestamp_pb2 import Timestamp
+
+from app.services.firebase_service import (
+    FACT_FIELDS, MESSAGE_FIELDS, TOPIC_FIELDS, FirebaseService, aggregation_cache, array_query_stats,
+    group_by_array_field, to_epoch
+)
 from app.services.firebase_memory_service import FirebaseMemoryService
+from app.services.firestore_emulator import InMemoryFirestore, LatencyModel, create_emulated_firebase_service
 from app.api.routes.firebase_chat import chat_endpoint, ChatMessageRequest
 
 
@@ -60,6 +67,31 @@ class TestFirebaseService(unittest.TestCase):
         mock_firestore.client().collection.assert_called()
 
 
+class TestTimestampNormalization(unittest.TestCase):
+    """Test that decoded documents carry epoch-second timestamps."""
+    
+    def test_to_epoch(self):
+        """Datetimes and protobuf timestamps become epoch seconds."""
+        self.assertEqual(to_epoch(datetime(1970, 1, 2, tzinfo=timezone.utc)), 86400.0)
+        self.assertEqual(to_epoch(datetime(1970, 1, 2)), 86400.0)  # naive is UTC
+        self.assertEqual(to_epoch(Timestamp(seconds=10, nanos=500000000)), 10.5)
+        self.assertEqual(to_epoch("2024-01-01"), "2024-01-01")
+    
+    def test_doc_to_dict_normalizes_timestamp_fields(self):
+        """Every timestamp field is converted once, other fields are untouched."""
+        doc = Mock()
+        doc.id = 'msg1'
+        doc.to_dict.return_value = {
+            'content': 'hi',
+            'timestamp': datetime(1970, 1, 1, 0, 1, tzinfo=timezone.utc),
+            'lastUsed': Timestamp(seconds=120),
+        }
+        
+        data = FirebaseService._doc_to_dict(Mock(), doc)
+        
+        self.assertEqual(data, {'content': 'hi', 'timestamp': 60.0, 'lastUsed': 120.0, 'id': 'msg1'})
+
+
 class TestFirebaseMemoryService(unittest.TestCase):
     """Test the Firebase memory service."""
     
@@ -82,6 +114,24 @@ class TestFirebaseMemoryService(unittest.TestCase):
         assert 'Diligent Robotics' in context
         assert 'job' in context.lower()
     
+    @patch('app.services.firebase_memory_service.FirebaseService')
+    def test_recent_messages_filtered_and_sorted_by_epoch(self, mock_firebase_service):
+        """Recent messages are filtered by cutoff and sorted newest first."""
+        now = datetime.now(timezone.utc).timestamp()
+        mock_instance = Mock()
+        mock_instance.get_user_conversations.return_value = [{'id': 'c1'}]
+        mock_instance.get_conversation_messages.return_value = [
+            {'content': 'old', 'timestamp': now - 40 * 86400},
+            {'content': 'older', 'timestamp': now - 2 * 86400},
+            {'content': 'undated'},
+            {'content': 'newest', 'timestamp': now - 60},
+        ]
+        mock_firebase_service.return_value = mock_instance
+        
+        messages = FirebaseMemoryService().get_recent_messages('test_user', max_age_days=30)
+        
+        self.assertEqual([m['content'] for m in messages], ['newest', 'older', 'undated'])
+    
     def test_detect_memory_query(self):
         """Test memory query detection."""
         service = FirebaseMemoryService()
@@ -93,6 +143,292 @@ class TestFirebaseMemoryService(unittest.TestCase):
         self.assertFalse(service.is_memory_query("What's the weather like?"))
 
 
+class TestArrayContainsAnyQueries(unittest.TestCase):
+    """Test grouped array_contains_any topic queries."""
+    
+    def _service(self, results):
+        service = object.__new__(FirebaseService)
+        service.query_collection = MagicMock(side_effect=results)
+        return service
+    
+    def test_group_by_array_field(self):
+        docs = [
+            {'id': 'm1', 'topicIds': ['a', 'b']},
+            {'id': 'm2', 'topicIds': ['a']},
+            {'id': 'm3', 'topicIds': ['a', 'z']},
+        ]
+        groups = group_by_array_field(docs, 'topicIds', ['a', 'b', 'c'], per_value_limit=2)
+        assert [d['id'] for d in groups['a']] == ['m1', 'm2']
+        assert [d['id'] for d in groups['b']] == ['m1']
+        assert groups['c'] == []
+    
+    def test_one_query_for_all_topics(self):
+        service = self._service([[
+            {'id': 'm1', 'topicIds': ['t1', 't2'], 'timestamp': 30},
+            {'id': 'm2', 'topicIds': ['t1'], 'timestamp': 20},
+        ]])
+        before = array_query_stats.snapshot()
+        
+        groups = service.query_grouped_by_array_values(
+            'messages', 'topicIds', ['t1', 't2', 't3'], per_value_limit=3, order_by='timestamp', desc=True
+        )
+        
+        service.query_collection.assert_called_once_with(
+            'messages', filters=[('topicIds', 'array_contains_any', ['t1', 't2', 't3'])],
+            order_by='timestamp', desc=True, limit=9, select=None
+        )
+        assert [m['id'] for m in groups['t1']] == ['m1', 'm2']
+        assert [m['id'] for m in groups['t2']] == ['m1']
+        assert groups['t3'] == []
+        
+        after = array_query_stats.snapshot()
+        assert after['queries'] - before['queries'] == 1
+        assert after['queries_saved'] - before['queries_saved'] == 2
+        # Per-topic queries would read 2 + 1 + 1 (empty) documents instead of 2
+        assert after['reads_saved'] - before['reads_saved'] == 2
+    
+    def test_values_chunked_at_firestore_limit(self):
+        topic_ids = [f"t{i}" for i in range(12)]
+        service = self._service([
+            [{'id': 'm1', 'topicIds': ['t0'], 'timestamp': 10}],
+            [{'id': 'm2', 'topicIds': ['t11'], 'timestamp': 20}],
+        ])
+        groups = service.query_grouped_by_array_values(
+            'messages', 'topicIds', topic_ids, per_value_limit=2, order_by='timestamp', desc=True
+        )
+        chunks = [call.kwargs['filters'][0][2] for call in service.query_collection.call_args_list]
+        assert chunks == [topic_ids[:10], topic_ids[10:]]
+        assert groups['t0'][0]['id'] == 'm1' and groups['t11'][0]['id'] == 'm2'
+    
+    def test_crowded_out_values_are_requeried(self):
+        db = InMemoryFirestore()
+        db.load('messages', {
+            **{f"busy{i}": {'topicIds': ['t1'], 'timestamp': 100 + i} for i in range(5)},
+            'quiet1': {'topicIds': ['t2'], 'timestamp': 2},
+            'quiet2': {'topicIds': ['t2', 't3'], 'timestamp': 1},
+        })
+        service = create_emulated_firebase_service(db)
+        before = db.stats.snapshot()['rpcs']
+        
+        groups = service.query_grouped_by_array_values(
+            'messages', 'topicIds', ['t1', 't2', 't3'], per_value_limit=2, order_by='timestamp', desc=True
+        )
+        
+        assert [m['id'] for m in groups['t1']] == ['busy4', 'busy3']
+        assert [m['id'] for m in groups['t2']] == ['quiet1', 'quiet2']
+        assert [m['id'] for m in groups['t3']] == ['quiet2']
+        # t1 filled the shared query; only t2 and t3 were queried again
+        assert db.stats.snapshot()['rpcs'] - before == 3
+    
+    def test_complete_query_is_not_repeated(self):
+        db = InMemoryFirestore()
+        db.load('messages', {
+            'm1': {'topicIds': ['t1'], 'timestamp': 2},
+            'm2': {'topicIds': ['t2'], 'timestamp': 1},
+        })
+        service = create_emulated_firebase_service(db)
+        before = db.stats.snapshot()['rpcs']
+        groups = service.query_grouped_by_array_values('messages', 'topicIds', ['t1', 't2'], per_value_limit=2)
+        assert [m['id'] for m in groups['t2']] == ['m2']
+        assert db.stats.snapshot()['rpcs'] - before == 1
+    
+    @patch('app.services.firebase_memory_service.FirebaseService')
+    def test_topic_memories_use_single_query(self, mock_firebase_class):
+        from app.services.message_search_index import MessageSearchIndex
+        
+        firebase = mock_firebase_class.return_value
+        firebase.get_user_topics.return_value = [
+            {'id': 't1', 'name': 'hiking'}, {'id': 't2', 'name': 'work'}
+        ]
+        firebase.query_grouped_by_array_values.return_value = {
+            't1': [{'id': 'm1', 'content': 'Went hiking'}], 't2': []
+        }
+        
+        service = FirebaseMemoryService(search_index=MessageSearchIndex())
+        memories = service.get_topic_memories('user', 'hiking and work', topic_limit=2, message_limit=3)
+        
+        firebase.query_grouped_by_array_values.assert_called_once()
+        firebase.query_collection.assert_not_called()
+        by_name = {m['topic']['name']: m['messages'] for m in memories}
+        assert by_name['hiking'][0]['id'] == 'm1'
+
+
+class TestFieldProjection(unittest.TestCase):
+    """Test select projections and lazily streamed queries."""
+    
+    def _service(self, pages):
+        service = object.__new__(FirebaseService)
+        query = MagicMock()
+        for method in ('where', 'order_by', 'limit', 'select', 'start_after'):
+            getattr(query, method).return_value = query
+        query.stream.side_effect = pages
+        service.db = MagicMock()
+        service.db.collection.return_value = query
+        return service, query
+    
+    def _doc(self, doc_id, data):
+        doc = Mock()
+        doc.id = doc_id
+        doc.to_dict.return_value = data
+        return doc
+    
+    def test_query_collection_select(self):
+        service, query = self._service([[self._doc('f1', {'type': 'job', 'value': 'nurse'})]])
+        facts = service.query_collection('userFacts', [], order_by='timestamp', select=FACT_FIELDS)
+        
+        query.select.assert_called_once_with(FACT_FIELDS)
+        self.assertEqual(facts, [{'type': 'job', 'value': 'nurse', 'id': 'f1'}])
+    
+    def test_no_select_fetches_whole_documents(self):
+        service, query = self._service([[]])
+        service.query_collection('userFacts', [])
+        query.select.assert_not_called()
+    
+    def test_stream_collection_pages_lazily(self):
+        docs = [self._doc(f"m{i}", {'user': f"message {i}", 'timestamp': i}) for i in range(3)]
+        service, query = self._service([docs[:2], docs[2:]])
+        
+        stream = service.stream_collection('messages', order_by='timestamp', select=['user'], page_size=2)
+        self.assertEqual(next(stream)['id'], 'm0')
+        self.assertEqual(query.stream.call_count, 1)
+        
+        self.assertEqual([doc['id'] for doc in stream], ['m1', 'm2'])
+        self.assertEqual(query.stream.call_count, 2)
+        query.start_after.assert_called_once_with(docs[1])
+        # Resuming after a document needs its order_by field
+        query.select.assert_called_once_with(['user', 'timestamp'])
+    
+    @patch('app.services.firebase_memory_service.FirebaseService')
+    def test_memory_retrieval_uses_projections(self, mock_firebase_class):
+        from app.services.message_search_index import MessageSearchIndex
+        
+        firebase = mock_firebase_class.return_value
+        firebase.get_user_facts.return_value = []
+        firebase.get_user_conversations.return_value = [{'id': 'c1'}]
+        firebase.get_conversation_messages.return_value = []
+        firebase.get_user_topics.return_value = [{'id': 't1', 'name': 'hiking'}]
+        firebase.query_grouped_by_array_values.return_value = {'t1': []}
+        
+        FirebaseMemoryService(search_index=MessageSearchIndex()).assemble_memory_context('user', 'hiking')
+        
+        firebase.get_user_facts.assert_called_with('user', fields=FACT_FIELDS)
+        firebase.get_conversation_messages.assert_called_with('c1', limit=10, fields=MESSAGE_FIELDS)
+        firebase.get_user_topics.assert_called_with('user', fields=TOPIC_FIELDS)
+        self.assertEqual(firebase.query_grouped_by_array_values.call_args.kwargs['select'], MESSAGE_FIELDS)
+
+
+class TestAggregationQueries(unittest.TestCase):
+    """Test server-side count/sum/avg aggregations and their cache."""
+    
+    def setUp(self):
+        aggregation_cache.invalidate()
+    
+    def _service(self, value):
+        service = object.__new__(FirebaseService)
+        query = MagicMock()
+        for method in ('where', 'limit'):
+            getattr(query, method).return_value = query
+        for kind in ('count', 'sum', 'avg'):
+            getattr(query, kind).return_value.get.return_value = [[Mock(value=value)]]
+        query.add.return_value = (None, Mock(id='new'))
+        service.db = MagicMock()
+        service.db.collection.return_value = query
+        return service, query
+    
+    def test_count_is_cached_until_a_write(self):
+        service, query = self._service(42)
+        filters = [('userId', '==', 'u1')]
+        
+        self.assertEqual(service.count_documents('userFacts', filters), 42)
+        self.assertEqual(service.count_documents('userFacts', filters), 42)
+        query.count.assert_called_once_with(alias='count')
+        self.assertEqual(aggregation_cache.snapshot()['hits'], 1)
+        
+        service.add_document('userFacts', {'value': 'hi'})
+        service.count_documents('userFacts', filters)
+        self.assertEqual(query.count.call_count, 2)
+    
+    def test_new_messages_keep_cached_counts(self):
+        service, query = self._service(42)
+        service.count_documents('messages', [('topicIds', 'array_contains', 't1')])
+        service.add_document('messages', {'user': 'hi'})
+        service.count_documents('messages', [('topicIds', 'array_contains', 't1')])
+        query.count.assert_called_once()
+        
+        service.update_document('messages', 'm1', {'user': 'edited'})
+        service.count_documents('messages', [('topicIds', 'array_contains', 't1')])
+        self.assertEqual(query.count.call_count, 2)
+    
+    def test_sum_avg_and_exists(self):
+        service, query = self._service(3.5)
+        self.assertEqual(service.avg_field('userFacts', 'confidence'), 3.5)
+        self.assertEqual(service.sum_field('userFacts', 'confidence'), 3.5)
+        query.avg.assert_called_once_with('confidence', alias='avg')
+        
+        self.assertTrue(service.document_exists('topics', [('name', '==', 'hiking')]))
+        query.limit.assert_called_once_with(1)
+    
+    def test_failed_aggregation_is_not_cached(self):
+        service, query = self._service(1)
+        query.count.side_effect = Exception("index missing")
+        self.assertEqual(service.count_documents('messages'), 0)
+        query.count.side_effect = None
+        self.assertEqual(service.count_documents('messages'), 1)
+    
+    def test_count_by_array_values(self):
+        service = object.__new__(FirebaseService)
+        service.count_documents = MagicMock(
+            side_effect=lambda collection, filters, use_cache: {'t1': 5}.get(filters[-1][2], 0)
+        )
+        counts = service.count_by_array_values('messages', 'topicIds', ['t1', 't2', 't1'])
+        
+        self.assertEqual(counts, {'t1': 5, 't2': 0})
+        self.assertEqual(service.count_documents.call_count, 2)
+        service.count_documents.assert_any_call('messages', [('topicIds', 'array_contains', 't1')], use_cache=True)
+    
+    def test_counts_run_concurrently(self):
+        db = InMemoryFirestore(latency=LatencyModel(base_ms=100))
+        db.load('messages', {f"m{i}": {'topicIds': [f"t{i % 5}"]} for i in range(20)})
+        service = create_emulated_firebase_service(db)
+        
+        started = time.monotonic()
+        counts = service.count_by_array_values('messages', 'topicIds', [f"t{i}" for i in range(5)], use_cache=False)
+        
+        self.assertEqual(counts, {f"t{i}": 4 for i in range(5)})
+        self.assertLess(time.monotonic() - started, 0.3)  # Sequential counts would take 0.5 s
+    
+    @patch('app.services.firebase_memory_service.FirebaseService')
+    def test_topic_frequency_breaks_ties(self, mock_firebase_class):
+        from app.services.message_search_index import MessageSearchIndex
+        
+        firebase = mock_firebase_class.return_value
+        firebase.get_user_topics.return_value = [{'id': 't1', 'name': 'cooking'}, {'id': 't2', 'name': 'gardening'}]
+        firebase.count_by_array_values.return_value = {'t1': 2, 't2': 8}
+        firebase.query_grouped_by_array_values.return_value = {}
+        
+        service = FirebaseMemoryService(search_index=MessageSearchIndex())
+        memories = service.get_topic_memories('user', 'weekend plans', topic_limit=1)
+        
+        self.assertEqual(memories[0]['topic']['id'], 't2')
+        firebase.query_collection.assert_not_called()
+    
+    @patch('app.services.firebase_memory_service.FirebaseService')
+    def test_topic_frequency_skipped_without_tagged_messages(self, mock_firebase_class):
+        from app.services.message_search_index import MessageSearchIndex
+        
+        firebase = mock_firebase_class.return_value
+        firebase.get_user_topics.return_value = [{'id': 't1', 'name': 'cooking'}, {'id': 't2', 'name': 'gardening'}]
+        firebase.document_exists.return_value = False
+        firebase.query_grouped_by_array_values.return_value = {}
+        
+        service = FirebaseMemoryService(search_index=MessageSearchIndex())
+        memories = service.get_topic_memories('user', 'weekend plans', topic_limit=1)
+        
+        self.assertEqual(memories[0]['topic']['id'], 't1')
+        firebase.document_exists.assert_called_once_with('messages', [('topicIds', '!=', None)])
+        firebase.count_by_array_values.assert_not_called()
+
+
 class TestFirebaseChatEndpoint(unittest.TestCase):
     """Test the Firebase chat endpoint."""
     
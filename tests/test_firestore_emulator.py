@@ -0,0 +1,212 @@
+"""
+test_firestore_emulator.py - Tests for the indexed in-memory Firestore emulator
+"""
+
+import random
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.firestore_emulator import (
+    InMemoryFirestore,
+    LatencyModel,
+    create_emulated_firebase_service,
+    value_key,
+)
+from google.cloud.firestore_v1 import transforms
+
+
+def ids(query):
+    return [snapshot.id for snapshot in query.stream()]
+
+
+@pytest.fixture
+def db():
+    db = InMemoryFirestore()
+    items = db.collection("items")
+    items.document("a").set({"n": 1, "tags": ["x", "y"], "owner": "u1"})
+    items.document("b").set({"n": 2.5, "tags": ["y"], "owner": "u1"})
+    items.document("c").set({"n": "text", "owner": "u2"})
+    items.document("d").set({"n": None, "tags": ["z"], "owner": "u2"})
+    items.document("e").set({"other": True, "owner": "u1"})
+    return db
+
+
+class TestQuerySemantics:
+    """Where/order_by/limit/cursor behaviour matches Firestore."""
+
+    def test_order_by_uses_type_order_and_skips_missing_fields(self, db):
+        items = db.collection("items")
+        assert ids(items.order_by("n")) == ["d", "a", "b", "c"]
+        assert ids(items.order_by("n", direction="DESCENDING")) == ["c", "b", "a", "d"]
+        assert ids(items) == ["a", "b", "c", "d", "e"]
+
+    def test_filters(self, db):
+        items = db.collection("items")
+        assert ids(items.where("n", ">", 0)) == ["a", "b"]  # Strings and null are not numbers
+        assert ids(items.where("n", "!=", 1)) == ["b", "c"]  # Null and missing never match !=
+        assert ids(items.where("n", "not-in", [1, 2.5])) == ["c"]
+        assert ids(items.where("n", "==", None)) == ["d"]
+        assert ids(items.where("tags", "array_contains", "y")) == ["a", "b"]
+        assert ids(items.where("tags", "array_contains_any", ["x", "z"])) == ["a", "d"]
+        assert ids(items.where("owner", "==", "u1").where("tags", "array_contains", "y").limit(1)) == ["a"]
+        assert ids(items.where("owner", "in", ["u2"]).order_by("n", direction="DESCENDING")) == ["c", "d"]
+
+    def test_invalid_filters_are_rejected(self, db):
+        items = db.collection("items")
+        with pytest.raises(api_exceptions.InvalidArgument):
+            items.where("tags", "array_contains_any", list(range(31)))
+        with pytest.raises(api_exceptions.InvalidArgument):
+            items.where("tags", "array_contains", "x").where("tags", "array_contains_any", ["y"])
+
+    def test_cursors(self, db):
+        items = db.collection("items")
+        b = items.document("b").get()
+        assert ids(items.order_by("n").start_after(b)) == ["c"]
+        assert ids(items.order_by("n").start_at(b)) == ["b", "c"]
+        assert ids(items.order_by("n").end_before(b)) == ["d", "a"]
+        assert ids(items.order_by("__name__").start_after({"__name__": "b"}).limit(2)) == ["c", "d"]
+        assert ids(items.order_by("n", direction="DESCENDING").start_after({"n": 2.5})) == ["a", "d"]
+
+    def test_several_order_fields(self, db):
+        items = db.collection("items").where("owner", "in", ["u1", "u2"])
+        ordered = items.order_by("owner", direction="DESCENDING").order_by("n")
+        assert ids(ordered) == ["d", "c", "a", "b"]
+        assert ids(ordered.start_after({"owner": "u2", "n": "text"}).limit(1)) == ["a"]
+
+    def test_select_projects_fields(self, db):
+        [snapshot] = db.collection("items").where("owner", "==", "u2").order_by("n").select(["n"]).limit(1).get()
+        assert snapshot.id == "d" and snapshot.to_dict() == {"n": None}
+
+    def test_aggregations(self, db):
+        items = db.collection("items")
+        assert items.count(alias="all").get()[0][0].value == 5
+        assert items.where("owner", "==", "u1").count().get()[0][0].value == 3
+        assert items.sum("n").get()[0][0].value == 3.5
+        assert items.avg("n", alias="avg").get()[0][0].value == 1.75
+
+
+class TestWrites:
+    """Writes resolve transforms and keep indexes current."""
+
+    def test_merge_update_and_transforms(self):
+        db = InMemoryFirestore(clock=lambda: datetime(2024, 1, 1, tzinfo=timezone.utc))
+        ref = db.collection("users").document("u1")
+        ref.set({"profile": {"name": "A", "age": 1}, "tags": ["x"]})
+        ref.set({"profile": {"age": 2}}, merge=True)
+        ref.update({"profile.city": "Oslo", "visits": transforms.Increment(2),
+                    "tags": transforms.ArrayUnion(["x", "y"]), "seen": transforms.SERVER_TIMESTAMP})
+        assert ref.get().to_dict() == {
+            "profile": {"name": "A", "age": 2, "city": "Oslo"}, "tags": ["x", "y"], "visits": 2,
+            "seen": datetime(2024, 1, 1, tzinfo=timezone.utc),
+        }
+        with pytest.raises(api_exceptions.NotFound):
+            db.collection("users").document("missing").update({"a": 1})
+
+    def test_batch_is_atomic(self):
+        db = InMemoryFirestore()
+        batch = db.batch()
+        batch.set(db.collection("c").document("a"), {"v": 1})
+        batch.update(db.collection("c").document("missing"), {"v": 2})
+        with pytest.raises(api_exceptions.NotFound):
+            batch.commit()
+        assert not db.collection("c").document("a").get().exists
+
+    def test_indexes_follow_writes(self, db):
+        items = db.collection("items")
+        assert ids(items.where("owner", "==", "u2").order_by("n")) == ["d", "c"]  # Builds both indexes
+        items.document("c").update({"owner": "u1"})
+        items.document("f").set({"n": 0, "owner": "u2"})
+        items.document("d").delete()
+        assert ids(items.where("owner", "==", "u2").order_by("n")) == ["f"]
+        assert ids(items.order_by("n").limit(2)) == ["f", "a"]
+
+    def test_subcollections(self):
+        db = InMemoryFirestore()
+        conversation = db.collection("conversations").document("c1")
+        conversation.set({"title": "t"})
+        _, ref = conversation.collection("summaries").add({"text": "s"})
+        assert [c.id for c in conversation.collections()] == ["summaries"]
+        assert ref.path.startswith("conversations/c1/summaries/")
+
+
+class TestIndexes:
+    """Indexed plans agree with a brute-force scan and avoid scanning."""
+
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        docs = {
+            f"d{i:04d}": {"score": rng.choice([rng.randint(0, 50), rng.random() * 50, None, "s"]),
+                          "group": rng.choice("abc"), "tags": rng.sample("wxyz", rng.randint(0, 3))}
+            for i in range(500)
+        }
+        db = InMemoryFirestore()
+        db.load("docs", docs)
+        for _ in range(50):
+            group, tag, limit = rng.choice("abc"), rng.choice("wxyz"), rng.randint(1, 40)
+            descending = rng.random() < 0.5
+            query = (db.collection("docs").where("group", "==", group).where("tags", "array_contains", tag)
+                     .where("score", ">=", 10).order_by("score", direction="DESCENDING" if descending else "ASCENDING")
+                     .limit(limit))
+            expected = sorted(
+                ((value_key(d["score"]), doc_id) for doc_id, d in docs.items()
+                 if d["group"] == group and tag in d["tags"]
+                 and isinstance(d["score"], (int, float)) and d["score"] >= 10),
+                reverse=descending,
+            )
+            assert ids(query) == [doc_id for _, doc_id in expected[:limit]]
+
+    def test_limit_stops_the_ordered_walk(self):
+        db = InMemoryFirestore()
+        db.load("messages", {f"m{i:05d}": {"timestamp": i, "userId": f"u{i % 2}"} for i in range(20000)})
+        newest = db.collection("messages").where("userId", "==", "u1").order_by("timestamp", direction="DESCENDING")
+        assert ids(newest.limit(3)) == ["m19999", "m19997", "m19995"]
+        before = db.stats.snapshot()
+        ids(newest.limit(3))
+        after = db.stats.snapshot()
+        assert after["scanned"] - before["scanned"] <= 6 and after["ordered_walks"] == before["ordered_walks"] + 1
+        assert db.collection("messages").where("userId", "==", "u0").count().get()[0][0].value == 10000
+
+
+class TestLatencyModel:
+    """Latency and error injection are reproducible with a seed."""
+
+    def test_delay_and_errors(self):
+        model = LatencyModel(base_ms=5, per_doc_ms=1, jitter_ms=2, error_rate=0.5, seed=1)
+        delays = [model.delay(10) for _ in range(200)]
+        assert min(delays) >= 0.015 and sum(delays) / len(delays) == pytest.approx(0.017, abs=0.001)
+        errors = [model.error() for _ in range(1000)]
+        assert 400 < sum(e is not None for e in errors) < 600
+        assert LatencyModel(error_rate=0.5, seed=1).delay() == 0
+
+    def test_injected_errors_surface_as_api_errors(self):
+        db = InMemoryFirestore(latency=LatencyModel(error_rate=1.0, seed=3))
+        with pytest.raises((api_exceptions.ServiceUnavailable, api_exceptions.DeadlineExceeded)):
+            db.collection("c").document("a").get()
+        assert db.stats.snapshot()["errors"] == 1
+
+
+class TestEmulatedFirebaseService:
+    """FirebaseService runs unchanged on the emulator."""
+
+    def test_service_methods(self):
+        db = InMemoryFirestore()
+        service = create_emulated_firebase_service(db)
+        assert service.db is db  # An empty client is still used
+        for i in range(5):
+            service.set_document("conversations", f"c{i}", {"userId": "u1" if i % 2 else "u2", "updatedAt": i})
+        message_id = service.add_message("c1", {"user": "hello", "conversationId": "c1"})
+
+        assert [c["id"] for c in service.get_user_conversations("u1", limit=5)] == ["c3", "c1"]
+        [message] = service.get_conversation_messages("c1")
+        assert message["id"] == message_id and isinstance(message["timestamp"], float)
+        assert service.count_documents("conversations", [("userId", "==", "u2")], use_cache=False) == 3
+        assert [d["id"] for d in service.stream_collection("conversations", order_by="updatedAt", page_size=2)] == \
+            ["c0", "c1", "c2", "c3", "c4"]
+        assert service.update_document("conversations", "missing", {"a": 1}) is False
@@ -0,0 +1,130 @@
+"""
+test_firestore_migration.py - Tests for the resumable Firestore migration engine
+"""
+
+import json
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.firestore_emulator import EmulatedBatch, InMemoryFirestore
+from app.services.firestore_migration import FirestoreMigrationEngine, MigrationCheckpoint
+
+
+def make_db(count=10):
+    # Every third fact already has a userId
+    db = InMemoryFirestore()
+    db.load("userFacts", {f"f{i:02d}": {"value": f"fact {i}", **({"userId": "u1"} if i % 3 == 0 else {})}
+                          for i in range(count)})
+    return db
+
+
+def facts(db):
+    return {snapshot.id: snapshot.to_dict() for snapshot in db.collection("userFacts").stream()}
+
+
+def counting_commits():
+    return patch.object(EmulatedBatch, "commit", autospec=True, side_effect=EmulatedBatch.commit)
+
+
+def add_user_id(fact):
+    return None if "userId" in fact else {"userId": "u1"}
+
+
+class TestFirestoreMigrationEngine:
+    """Test suite for FirestoreMigrationEngine (batched-write path)."""
+
+    def test_run_updates_only_documents_that_need_it(self):
+        db = make_db()
+        pages = []
+        engine = FirestoreMigrationEngine(db, page_size=4, on_progress=lambda p: pages.append(p.processed))
+
+        with counting_commits() as commit:
+            progress = engine.run("userFacts", add_user_id, select=["userId"])
+
+        assert progress.done and progress.processed == 10 and progress.updated == 6
+        assert progress.errors == 0 and progress.last_id == "f09"
+        stats = db.stats.snapshot()
+        assert all(doc["userId"] == "u1" for doc in facts(db).values())
+        assert pages == [4, 8, 10]
+        assert stats["reads"] == 10 and stats["writes"] == 6
+        assert commit.call_count == 3  # one flush per page
+        assert stats["rpcs"] == 3 + 3  # page queries and commits
+
+    def test_resume_from_checkpoint_file(self, tmp_path):
+        path = str(tmp_path / "checkpoint.json")
+        db = make_db()
+
+        def interrupt(progress):
+            raise KeyboardInterrupt
+
+        engine = FirestoreMigrationEngine(db, MigrationCheckpoint(path), page_size=4, on_progress=interrupt)
+        with pytest.raises(KeyboardInterrupt):
+            engine.run("userFacts", add_user_id)
+
+        saved = json.loads(Path(path).read_text())["userFacts"]
+        assert saved["last_id"] == "f03" and saved["processed"] == 4 and not saved["done"]
+
+        before = db.stats.snapshot()
+        engine = FirestoreMigrationEngine(db, MigrationCheckpoint(path), page_size=4)
+        progress = engine.run("userFacts", add_user_id)
+        assert progress.done and progress.processed == 10 and progress.updated == 6
+        assert db.stats.snapshot()["reads"] - before["reads"] == 6  # the first page was not read again
+
+        before = db.stats.snapshot()
+        assert engine.run("userFacts", add_user_id).done
+        assert db.stats.snapshot()["rpcs"] == before["rpcs"]
+
+        engine.checkpoint.reset("userFacts")
+        assert engine.run("userFacts", add_user_id).updated == 0
+
+    def test_failed_commit_counts_errors(self, monkeypatch):
+        monkeypatch.setattr("app.services.firestore_migration.time.sleep", lambda _: None)
+        db = make_db(4)
+
+        # Every attempt of the only batch fails
+        with patch.object(EmulatedBatch, "commit", side_effect=api_exceptions.ServiceUnavailable("down")) as commit:
+            progress = FirestoreMigrationEngine(db, page_size=10).run("userFacts", add_user_id)
+
+        assert progress.done and progress.errors == 2
+        assert commit.call_count > 1
+        assert "userId" not in facts(db)["f01"]
+
+    def test_failed_commit_is_retried_with_its_writes(self, monkeypatch):
+        monkeypatch.setattr("app.services.firestore_migration.time.sleep", lambda _: None)
+        db = make_db(4)
+        commit = EmulatedBatch.commit
+        failures = iter([api_exceptions.ServiceUnavailable("down")])
+
+        def flaky_commit(batch, **kwargs):
+            error = next(failures, None)
+            if error is not None:
+                raise error
+            return commit(batch, **kwargs)
+
+        with patch.object(EmulatedBatch, "commit", autospec=True, side_effect=flaky_commit):
+            progress = FirestoreMigrationEngine(db, page_size=10).run("userFacts", add_user_id)
+
+        assert progress.errors == 0 and progress.updated == 2
+        assert all(doc["userId"] == "u1" for doc in facts(db).values())
+
+    def test_estimate(self):
+        db = make_db(30)
+        engine = FirestoreMigrationEngine(db, page_size=6, max_ops_per_second=1000)
+
+        estimate = engine.estimate("userFacts", add_user_id, examples=2)
+
+        assert estimate.documents == 30 and estimate.sampled == 6
+        assert estimate.sample_updates == 4 and estimate.estimated_updates == 20
+        assert estimate.reads == 31 and estimate.writes == 20
+        assert estimate.cost_usd == pytest.approx((31 * 0.06 + 20 * 0.18) / 100_000)
+        assert estimate.seconds >= 20 / 1000
+        assert estimate.examples == [{"id": "f01", "updates": {"userId": "u1"}},
+                                     {"id": "f02", "updates": {"userId": "u1"}}]
+        assert db.stats.snapshot()["writes"] == 0
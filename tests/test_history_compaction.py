@@ -0,0 +1,170 @@
+"""
+test_history_compaction.py - Tests for rolling-summary history compaction
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.history_compaction import (
+    CompactionStats,
+    ConversationSummary,
+    FirestoreSummaryStore,
+    HistoryCompactor,
+    InMemorySummaryStore,
+    SUMMARY_HEADER,
+    estimate_tokens,
+)
+from tests.mocks.summarizer import FakeSummarizer
+
+
+def make_history(count):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"message number {i} " + "word " * 20}
+        for i in range(count)
+    ]
+
+
+def make_compactor(summarizer=None, store=None):
+    return HistoryCompactor(
+        summarizer=summarizer or FakeSummarizer(),
+        store=store or InMemorySummaryStore(),
+        keep_last=4,
+        summarize_every=3,
+        stats=CompactionStats(),
+    )
+
+
+class TestHistoryCompactor:
+    """Test suite for HistoryCompactor."""
+
+    def test_short_history_sent_unchanged(self):
+        compactor = make_compactor()
+        history = make_history(5)
+        compacted = compactor.compact("c1", history)
+        assert compacted.messages == history
+        assert compacted.tokens_saved == 0
+        assert not compactor.needs_update("c1", history)
+
+    def test_update_folds_messages_outside_window(self):
+        summarizer = FakeSummarizer()
+        compactor = make_compactor(summarizer)
+        history = make_history(10)
+
+        summary = asyncio.run(compactor.update("c1", history))
+        assert summary.message_count == 6
+        assert summarizer.calls == [(None, history[:6])]
+
+        compacted = compactor.compact("c1", history)
+        assert compacted.messages[0]["content"].startswith(SUMMARY_HEADER)
+        assert compacted.messages[1:] == history[6:]
+        assert compacted.summarized_messages == 6
+        assert compacted.tokens_saved > 0
+        assert compacted.usage()["prompt_tokens_saved"] == compacted.tokens_saved
+
+    def test_summary_is_rolling(self):
+        summarizer = FakeSummarizer()
+        compactor = make_compactor(summarizer)
+        history = make_history(10)
+        first = asyncio.run(compactor.update("c1", history))
+
+        # Two more messages keep the window short of another update
+        history += make_history(12)[10:]
+        assert asyncio.run(compactor.update("c1", history)) is None
+        assert compactor.compact("c1", history).messages[1:] == history[6:]
+
+        history += make_history(13)[12:]
+        second = asyncio.run(compactor.update("c1", history))
+        assert summarizer.calls[-1] == (first.text, history[6:9])
+        assert second.message_count == 9
+        assert compactor.compact("c1", history).messages[1:] == history[9:]
+
+    def test_raw_part_capped_while_summary_is_behind(self):
+        compactor = make_compactor()
+        history = make_history(40)
+        asyncio.run(compactor.update("c1", history[:10]))
+        compacted = compactor.compact("c1", history)
+        assert compacted.messages[0]["content"].startswith(SUMMARY_HEADER)
+        assert compacted.messages[1:] == history[-4:]
+        assert compacted.summarized_messages == 36
+
+    def test_raw_history_sent_until_first_summary(self):
+        compactor = make_compactor()
+        history = make_history(40)
+        compacted = compactor.compact("c1", history)
+        assert compacted.messages == history
+        assert compacted.compacted_tokens == estimate_tokens(history)
+        assert compactor.needs_update("c1", history)
+
+    def test_sliding_window_uses_message_ids(self):
+        compactor = make_compactor()
+        history = make_history(10)
+        ids = [f"m{i}" for i in range(10)]
+        asyncio.run(compactor.update("c1", history, ids))
+
+        # The oldest messages fell out of the fetch window
+        compacted = compactor.compact("c1", history[3:], ids[3:])
+        assert compacted.messages[1:] == history[6:]
+
+    def test_schedule_update_runs_once(self):
+        summarizer = FakeSummarizer()
+        compactor = make_compactor(summarizer)
+        history = make_history(10)
+
+        async def run():
+            first = compactor.schedule_update("c1", history)
+            second = compactor.schedule_update("c1", history)
+            await first
+            return first, second, compactor.schedule_update("c1", history)
+
+        first, second, third = asyncio.run(run())
+        assert first is not None
+        assert second is None and third is None
+        assert len(summarizer.calls) == 1
+        assert compactor.stats.snapshot()["summaries_written"] == 1
+
+    def test_failed_update_is_counted(self):
+        summarizer = MagicMock()
+        summarizer.summarize.side_effect = RuntimeError("model down")
+        compactor = make_compactor(summarizer)
+
+        async def run():
+            await compactor.schedule_update("c1", make_history(10))
+
+        asyncio.run(run())
+        assert compactor.stats.snapshot()["summary_failures"] == 1
+        assert compactor.store.get("c1") is None
+
+
+class TestSummaryStores:
+    """Test suite for the summary stores."""
+
+    def test_in_memory_store_evicts_least_recent(self):
+        store = InMemorySummaryStore(max_conversations=2)
+        store.put("a", ConversationSummary("a"))
+        store.put("b", ConversationSummary("b"))
+        store.get("a")
+        store.put("c", ConversationSummary("c"))
+        assert store.get("b") is None
+        assert store.get("a").text == "a"
+
+    def test_firestore_store_reads_once(self):
+        firebase = MagicMock()
+        firebase.get_document.return_value = {"title": "No summary yet"}
+        store = FirestoreSummaryStore(firebase)
+
+        assert store.get("conv") is None
+        assert store.get("conv") is None
+        assert firebase.get_document.call_count == 1
+
+        store.put("conv", ConversationSummary("text", "m5", 6))
+        firebase.update_document.assert_called_once_with("conversations", "conv", {
+            "historySummary": "text",
+            "historySummaryThrough": "m5",
+            "historySummaryCount": 6,
+        })
+        assert store.get("conv").through == "m5"
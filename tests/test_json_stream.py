@@ -0,0 +1,158 @@
+"""
+test_json_stream.py - Tests for streamed JSON list responses
+"""
+
+import json
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from google.api_core import exceptions as api_exceptions
+
+from app.services.firestore_emulator import EmulatedQuery, InMemoryFirestore, create_emulated_firebase_service
+from app.services.json_stream import (
+    MAX_LIST_PAGE_SIZE,
+    NDJSON_MEDIA_TYPE,
+    CursorPage,
+    json_array_chunks,
+    ndjson_chunks,
+    page_size,
+)
+
+ITEMS = [{"id": f"t{i}", "name": f"topic {i}"} for i in range(5)]
+
+
+def generate(items):
+    """Lazy iterator that records how far it was read."""
+    generate.read = 0
+    for item in items:
+        generate.read += 1
+        yield item
+
+
+class TestJsonStream:
+    """Test suite for the JSON/NDJSON chunk writers."""
+
+    def test_page_size_is_capped(self):
+        assert page_size(None) > 0
+        assert page_size(10 ** 6) == MAX_LIST_PAGE_SIZE
+        assert page_size(0) == 1
+        assert page_size(None, default=50) == 50
+
+    def test_json_array_with_next_cursor(self):
+        page = CursorPage(generate(ITEMS), 3)
+        chunks = list(json_array_chunks("topics", page, chunk_items=2))
+        assert len(chunks) > 1  # streamed in pieces
+        body = json.loads(b"".join(chunks))
+        assert body == {"topics": ITEMS[:3], "next_cursor": "t2"}
+        assert generate.read == 4  # one item past the page, never the rest
+
+    def test_last_page_has_no_cursor(self):
+        body = json.loads(b"".join(json_array_chunks("topics", CursorPage(iter(ITEMS), 5))))
+        assert body == {"topics": ITEMS, "next_cursor": None}
+        assert json.loads(b"".join(json_array_chunks("topics", CursorPage(iter([]), 5)))) == \
+            {"topics": [], "next_cursor": None}
+
+    def test_ndjson(self):
+        lines = b"".join(ndjson_chunks(CursorPage(iter(ITEMS), 2))).splitlines()
+        assert [json.loads(line) for line in lines] == ITEMS[:2] + [{"next_cursor": "t1"}]
+        lines = b"".join(ndjson_chunks(CursorPage(iter(ITEMS), 10))).splitlines()
+        assert [json.loads(line) for line in lines] == ITEMS
+
+    def test_values_the_encoder_does_not_support(self):
+        item = {"id": "t1", "tags": {"a"}, "at": datetime(2025, 5, 1, tzinfo=timezone.utc)}
+        body = json.loads(b"".join(json_array_chunks("topics", CursorPage(iter([item]), 5))))
+        assert body["topics"][0]["tags"] == ["a"]
+
+
+class TestStreamCollectionCursor:
+    """Test cursor support in FirebaseService.stream_collection."""
+
+    def test_start_after(self):
+        db = InMemoryFirestore()
+        db.load("topics", {item["id"]: {"name": item["name"], "userId": "u1"} for item in ITEMS})
+        service = create_emulated_firebase_service(db)
+        first = list(service.stream_user_topics("u1", limit=2))
+        assert [doc["id"] for doc in first] == ["t0", "t1"]
+        rest = list(service.stream_user_topics("u1", start_after="t1"))
+        assert [doc["id"] for doc in rest] == ["t2", "t3", "t4"]
+        assert list(service.stream_user_topics("u1", start_after="missing")) == []
+
+    def test_error_while_paging_is_raised(self):
+        db = InMemoryFirestore()
+        db.load("topics", {item["id"]: {"name": item["name"], "userId": "u1"} for item in ITEMS})
+        service = create_emulated_firebase_service(db)
+        stream = EmulatedQuery.stream
+        calls = []
+
+        def failing_second_page(query, **kwargs):
+            calls.append(query)
+            if len(calls) == 2:
+                raise api_exceptions.ServiceUnavailable("down")
+            return stream(query, **kwargs)
+
+        with patch.object(EmulatedQuery, "stream", autospec=True, side_effect=failing_second_page):
+            pages = service.stream_collection("topics", [("userId", "==", "u1")], page_size=2)
+            assert [next(pages)["id"], next(pages)["id"]] == ["t0", "t1"]
+            with pytest.raises(api_exceptions.ServiceUnavailable):
+                next(pages)
+
+    def test_failed_page_has_no_closing_cursor(self):
+        def failing():
+            yield ITEMS[0]
+            raise api_exceptions.ServiceUnavailable("down")
+
+        chunks = json_array_chunks("topics", CursorPage(failing(), 5), chunk_items=1)
+        assert next(chunks).startswith(b'{"topics":[')
+        with pytest.raises(api_exceptions.ServiceUnavailable):
+            list(chunks)
+
+
+class TestStreamingRoutes:
+    """Test the streamed Firebase list endpoints."""
+
+    @pytest.fixture
+    def client(self):
+        from app.main import app
+
+        firebase = MagicMock()
+        firebase.stream_user_facts.side_effect = lambda user_id, limit=None, start_after=None: generate(
+            [{"id": f"f{i}", "value": f"fact {i}"} for i in range(10)][:limit]
+        )
+        firebase.stream_user_topics.side_effect = lambda user_id, limit=None, start_after=None: iter(ITEMS[:limit])
+        firebase.stream_conversation_messages.side_effect = \
+            lambda conversation_id, limit=None, start_after=None: iter([{"id": "m1", "user": "hi"}])
+        firebase.get_conversation.return_value = {"id": "c1", "userId": "u1"}
+        with patch("app.api.routes.firebase_chat.FirebaseService", return_value=firebase):
+            yield TestClient(app), firebase
+
+    def test_facts_page_and_cursor(self, client):
+        client, firebase = client
+        response = client.get("/firebase/facts/u1?limit=4&cursor=f3")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        body = response.json()
+        assert [fact["id"] for fact in body["facts"]] == ["f0", "f1", "f2", "f3"]
+        assert body["next_cursor"] == "f3"
+        firebase.stream_user_facts.assert_called_once_with("u1", limit=5, start_after="f3")
+
+    def test_topics_ndjson(self, client):
+        client, _ = client
+        response = client.get("/firebase/topics/u1", headers={"Accept": NDJSON_MEDIA_TYPE})
+        assert response.headers["content-type"] == NDJSON_MEDIA_TYPE
+        assert [json.loads(line) for line in response.text.splitlines()] == ITEMS
+
+    def test_messages_page_size_cap(self, client):
+        client, firebase = client
+        body = client.get(f"/firebase/conversations/c1/messages?limit={10 ** 6}").json()
+        assert body == {"messages": [{"id": "m1", "user": "hi"}], "next_cursor": None}
+        firebase.stream_conversation_messages.assert_called_once_with(
+            "c1", limit=MAX_LIST_PAGE_SIZE + 1, start_after=None
+        )
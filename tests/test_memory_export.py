@@ -0,0 +1,170 @@
+"""
+test_memory_export.py - Tests for the streaming per-user export and batched import
+"""
+
+import gzip
+import json
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.memory_export import (
+    decode_value,
+    encode_value,
+    export_records,
+    firestore_records,
+    import_firestore,
+    import_postgres,
+    postgres_records,
+    read_records,
+)
+from app.services.firestore_emulator import InMemoryFirestore, create_emulated_firebase_service
+from app.services.message_search_index import MessageSearchIndex
+
+SENT_AT = datetime(2025, 5, 1, 12, 30, tzinfo=timezone.utc)
+
+
+def firestore_source():
+    """Two users' documents, written the way the app writes them."""
+    db = InMemoryFirestore()
+    service = create_emulated_firebase_service(db)
+    service.set_document("conversations", "c1", {"userId": "u1", "updatedAt": SENT_AT})
+    service.set_document("conversations", "c2", {"userId": "u2"})
+    service.set_document("userFacts", "f1", {"userId": "u1", "type": "pet", "value": "a cat named Miso"})
+    service.set_document("userFacts", "f2", {"userId": "u2", "type": "job", "value": "nurse"})
+    service.set_document("topics", "t1", {"userId": "u1", "name": "pets"})
+    with patch("app.services.firebase_service.get_message_search_index", return_value=MessageSearchIndex()):
+        for i in range(3):
+            service.add_message("c1", {"user": f"message {i}", "timestamp": SENT_AT}, user_id="u1")
+        service.add_message("c2", {"user": "other user", "timestamp": SENT_AT}, user_id="u2")
+    # Older messages have no userId; scripts/migrate_firestore_fields.py added their conversationId
+    for i in range(3, 5):
+        db.collection("messages").document(f"legacy{i}").set(
+            {"user": f"message {i}", "timestamp": SENT_AT, "conversationId": "c1"}
+        )
+    return db
+
+
+class TestValueEncoding:
+    """Test the tagged JSON encoding of field values."""
+
+    def test_round_trip(self):
+        value = {"at": SENT_AT, "nested": [{"raw": b"\x00\x01"}], "n": 1.5}
+        encoded = encode_value(value)
+        assert encoded["at"] == {"$date": "2025-05-01T12:30:00+00:00"}
+        assert json.loads(json.dumps(encoded)) == encoded
+        assert decode_value(encoded) == value
+
+
+class TestFirestoreExport:
+    """Test export and import against the in-memory Firestore client."""
+
+    def test_round_trip(self, tmp_path):
+        source = firestore_source()
+        rpcs = source.stats.snapshot()["rpcs"]
+        progress = []
+        stats = export_records(firestore_records(source, "u1", page_size=2), str(tmp_path),
+                               {"backend": "firestore", "user_id": "u1"},
+                               progress_every=3, on_progress=lambda s: progress.append(s.records))
+
+        assert stats.counts == {"conversations": 1, "messages": 5, "facts": 1, "topics": 1}
+        assert progress == [3, 6]
+        assert stats.bytes > 0 and stats.records_per_second > 0
+        assert source.stats.snapshot()["rpcs"] - rpcs == 1 + 1 + 3 + 1  # messages read in pages of two
+        manifest = json.loads((tmp_path / "manifest.json").read_text())
+        assert manifest["counts"]["messages"] == 5 and manifest["format"] == "jsonl"
+        with gzip.open(tmp_path / "messages.jsonl.gz", "rt") as f:
+            messages = [json.loads(line) for line in f]
+        assert sorted(m["user"] for m in messages) == [f"message {i}" for i in range(5)]
+        assert all(m["conversationId"] == "c1" and m["timestamp"] == {"$date": SENT_AT.isoformat()}
+                   for m in messages)
+
+        target = InMemoryFirestore()
+        imported = import_firestore(target, read_records(str(tmp_path)), user_id="u9", batch_size=2)
+        assert imported.counts == stats.counts
+        assert target.stats.snapshot()["rpcs"] == 1 + 1 + 3 + 1
+        legacy = source.collection("messages").document("legacy3").get().to_dict()
+        assert target.collection("messages").document("legacy3").get().to_dict() == {**legacy, "userId": "u9"}
+        assert target.collection("conversations").document("c1").get().to_dict()["updatedAt"] == SENT_AT
+        assert not target.collection("userFacts").document("f2").get().exists
+
+    def test_parquet(self, tmp_path):
+        pyarrow = pytest.importorskip("pyarrow.parquet")
+        export_records(firestore_records(firestore_source(), "u1"), str(tmp_path),
+                       {"backend": "firestore", "user_id": "u1"}, fmt="parquet")
+        table = pyarrow.read_table(tmp_path / "messages.parquet")
+        assert table.num_rows == 5
+        with pytest.raises(ValueError):
+            next(read_records(str(tmp_path)))
+
+
+SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, email TEXT, hashed_password TEXT)",
+    "CREATE TABLE conversations (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, started_at DATETIME NOT NULL)",
+    "CREATE TABLE messages (id INTEGER PRIMARY KEY, conversation_id INTEGER NOT NULL, user_id INTEGER NOT NULL,"
+    " role TEXT NOT NULL, content TEXT NOT NULL, timestamp DATETIME NOT NULL)",
+    "CREATE TABLE topics (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)",
+    "CREATE TABLE messagetopics (message_id INTEGER, topic_id INTEGER, PRIMARY KEY (message_id, topic_id))",
+    "CREATE TABLE userfacts (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, fact_type TEXT NOT NULL,"
+    " value TEXT NOT NULL)",
+]
+
+
+@pytest.fixture
+def sql_session():
+    # The messages table is declared without its PostgreSQL-only content_tsv column
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        for statement in SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(text(
+            "INSERT INTO users VALUES (1, 'a', 'a@x', 'h'), (2, 'b', 'b@x', 'h'), (3, 'c', 'c@x', 'h');"
+        ))
+        connection.execute(text("INSERT INTO conversations VALUES (10, 1, '2025-05-01 12:30:00'), "
+                                "(11, 1, '2025-05-02 08:00:00'), (12, 2, '2025-05-02 08:00:00')"))
+        for i in range(7):
+            conversation = 10 if i < 4 else 11
+            connection.execute(text(
+                f"INSERT INTO messages VALUES ({100 + i}, {conversation}, 1, 'user', 'message {i}', '2025-05-01 12:30:00')"
+            ))
+        connection.execute(text("INSERT INTO messages VALUES (200, 12, 2, 'user', 'other user', '2025-05-01')"))
+        connection.execute(text("INSERT INTO topics VALUES (1, 'pets'), (2, 'work'), (3, 'travel')"))
+        connection.execute(text("INSERT INTO messagetopics VALUES (100, 1), (101, 2), (105, 1), (200, 3)"))
+        connection.execute(text("INSERT INTO userfacts VALUES (1, 1, 'pet', 'a cat'), (2, 2, 'job', 'nurse')"))
+    with Session(engine) as session:
+        yield session
+
+
+class TestPostgresExport:
+    """Test export and import of PostgreSQL rows."""
+
+    def test_round_trip(self, sql_session, tmp_path):
+        stats = export_records(postgres_records(sql_session, 1, page_size=3), str(tmp_path),
+                               {"backend": "postgres", "user_id": 1})
+        assert stats.counts == {"conversations": 2, "topics": 2, "messages": 7, "facts": 1, "message_topics": 3}
+
+        # Only travel is new to the target user; pets and work are matched by name
+        sql_session.execute(text("DELETE FROM topics WHERE name = 'work'"))
+        sql_session.commit()
+        imported = import_postgres(sql_session, read_records(str(tmp_path)), user_id=3, batch_size=3)
+        assert imported.counts == stats.counts
+
+        rows = sql_session.execute(text(
+            "SELECT m.content, c.user_id, t.name FROM messages m JOIN conversations c ON c.id = m.conversation_id "
+            "LEFT JOIN messagetopics mt ON mt.message_id = m.id LEFT JOIN topics t ON t.id = mt.topic_id "
+            "WHERE m.user_id = 3 ORDER BY m.content"
+        )).all()
+        assert [tuple(row) for row in rows] == [
+            ("message 0", 3, "pets"), ("message 1", 3, "work"), ("message 2", 3, None), ("message 3", 3, None),
+            ("message 4", 3, None), ("message 5", 3, "pets"), ("message 6", 3, None),
+        ]
+        assert sql_session.execute(text("SELECT count(*) FROM conversations WHERE user_id = 3")).scalar() == 2
+        assert sql_session.execute(text("SELECT value FROM userfacts WHERE user_id = 3")).scalar() == "a cat"
@@ -0,0 +1,105 @@
+"""
+test_memory_formatter.py - Tests for the shared memory context formatter
+"""
+
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+import pytest
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.memory_formatter import MemoryFormatter, parse_timestamp
+
+
+class TestParseTimestamp:
+    """Test timestamp normalization."""
+
+    def test_iso_string_with_z(self):
+        assert parse_timestamp("2023-05-15T10:00:00Z") == datetime(2023, 5, 15, 10, tzinfo=timezone.utc)
+
+    def test_datetime_passthrough(self):
+        dt = datetime(2023, 5, 15, 10)
+        assert parse_timestamp(dt) is dt
+
+    def test_firestore_timestamp(self):
+        assert parse_timestamp(SimpleNamespace(seconds=0)) == datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+    def test_epoch_seconds(self):
+        assert parse_timestamp(86400) == datetime(1970, 1, 2, tzinfo=timezone.utc)
+
+    def test_unparseable(self):
+        assert parse_timestamp("yesterday") is None
+        assert parse_timestamp(None) is None
+
+
+class TestMemoryFormatter:
+    """Test suite for MemoryFormatter."""
+
+    @pytest.fixture
+    def formatter(self):
+        return MemoryFormatter(fact_cache_size=2)
+
+    @pytest.fixture
+    def facts(self):
+        return [
+            {"type": "job", "value": "Software Engineer", "confidence": 90},
+            {"type": "pet", "value": "Dog named Max", "confidence": 40},
+        ]
+
+    def test_fact_block_cached_per_user(self, formatter, facts):
+        first = formatter.format_user_facts(facts, user_id=1)
+        with patch.object(formatter, "_render_user_facts") as render:
+            assert formatter.format_user_facts(facts, user_id=1) == first
+            render.assert_not_called()
+
+    def test_fact_cache_refreshes_when_facts_change(self, formatter, facts):
+        formatter.format_user_facts(facts, user_id=1)
+        facts[1]["value"] = "Cat named Luna"
+        assert "Cat named Luna" in formatter.format_user_facts(facts, user_id=1)
+
+    def test_fact_cache_is_bounded(self, formatter, facts):
+        for user_id in range(5):
+            formatter.format_user_facts(facts, user_id=user_id)
+        assert list(formatter._fact_cache) == [3, 4]
+
+    def test_invalidate_user_facts(self, formatter, facts):
+        formatter.format_user_facts(facts, user_id=1)
+        formatter.invalidate_user_facts(1)
+        assert 1 not in formatter._fact_cache
+
+    def test_timeline_mixes_timestamp_types(self, formatter):
+        recent = [
+            {"content": "Oldest", "timestamp": "2023-05-14T10:00:00Z"},
+            {"content": "Firestore", "timestamp": SimpleNamespace(seconds=1684317600)},  # 2023-05-17 10:00 UTC
+            {"content": "Unknown", "timestamp": "not a date"},
+        ]
+        topics = [{"topic": {"name": "Work"}, "messages": [
+            {"content": "Newest", "timestamp": datetime(2023, 5, 18, 9, tzinfo=timezone.utc)}
+        ]}]
+
+        formatted = formatter.format_memories_with_timestamps(recent, topics)
+        lines = formatted.strip().split("\n")
+
+        assert lines[0] == "## Conversation Timeline"
+        assert lines[1] == "- May 18, 2023 at 09:00 AM (Topic: Work): Newest"
+        assert lines[2] == "- May 17, 2023 at 10:00 AM: Firestore"
+        assert lines[3] == "- May 14, 2023 at 10:00 AM: Oldest"
+        assert lines[4] == "- not a date: Unknown"
+
+    def test_topics_sorted_once_for_recall(self, formatter):
+        context = {
+            "user_facts": [],
+            "recent_memories": [],
+            "topic_memories": [
+                {"topic": {"name": "Low", "relevance": 40}, "messages": [{"content": "a"}]},
+                {"topic": {"name": "High", "relevance": 90}, "messages": [{"content": "b"}]},
+            ],
+            "is_memory_query": True,
+            "memory_query_type": "content_recall",
+        }
+        formatted = formatter.format_memory_context(context)
+        assert formatted.index("### High") < formatted.index("### Low")
@@ -0,0 +1,98 @@
+"""
+test_memory_query_classifier.py - Tests for the shared memory query classifier
+"""
+
+import re
+import sys
+from pathlib import Path
+import pytest
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.memory_query_classifier import (
+    MemoryQueryClassifier,
+    MEMORY_QUERY_PATTERNS,
+    MEMORY_KEYWORDS,
+    MEMORY_QUERY_TYPE_RULES,
+    classify_memory_query,
+)
+
+
+QUERIES = [
+    "Do you remember what I told you about my job?",
+    "What did I say about my family?",
+    "When did we discuss my health?",
+    "Have we talked about my hobbies before?",
+    "What do you know about my education?",
+    "Last time we talked about my vacation plans.",
+    "Didn't I tell you about my new car?",
+    "Tell me what you remember about me.",
+    "In our previous conversation you gave me a recipe",
+    "Am I right that you said the meeting was Monday?",
+    "What did you say?",
+    "I went hiking before work today",
+    "What's the weather like today?",
+    "Can you help me write a poem?",
+    "",
+]
+
+
+def legacy_query_type(query):
+    """Reference implementation of _classify_memory_query_type's if/elif chain."""
+    for name, pattern in MEMORY_QUERY_TYPE_RULES:
+        if re.search(pattern, query, re.IGNORECASE):
+            return name
+    return "general_memory_query"
+
+
+def legacy_classify(query):
+    """Reference implementation: the per-pattern loops the classifier replaced."""
+    is_memory = any(re.search(p, query, re.IGNORECASE) for p in MEMORY_QUERY_PATTERNS)
+    is_memory = is_memory or any(k in query.lower() for k in MEMORY_KEYWORDS)
+    return is_memory, legacy_query_type(query) if is_memory else "general_memory_query"
+
+
+class TestMemoryQueryClassifier:
+    """Test suite for the compiled memory query classifier."""
+
+    @pytest.fixture
+    def classifier(self):
+        return MemoryQueryClassifier()
+
+    @pytest.mark.parametrize("query", QUERIES)
+    def test_matches_legacy_behaviour(self, classifier, query):
+        """The compiled alternations give the same answers as looping over every pattern."""
+        assert classifier.classify(query) == legacy_classify(query)
+        assert classifier.is_memory_query(query) == legacy_classify(query)[0]
+        assert classifier.classify_query_type(query) == legacy_query_type(query)
+
+    def test_keywords_match_inside_words(self, classifier):
+        assert classifier.is_memory_query("That trip was unforgettable")
+
+    def test_type_found_where_memory_pattern_starts(self, classifier):
+        assert classifier.classify("do you remember when we met") == (True, "recall_verification")
+
+    def test_highest_priority_type_wins(self, classifier):
+        """Later, higher-priority rules beat earlier, lower-priority ones."""
+        query = "Before you answer, do you remember my dog?"
+        assert classifier.classify(query) == (True, "recall_verification")
+
+    def test_non_memory_query(self, classifier):
+        assert classifier.classify("What's the capital of France?") == (False, "general_memory_query")
+
+    def test_custom_rules(self):
+        classifier = MemoryQueryClassifier(
+            memory_patterns=[r'flashback'],
+            memory_keywords=["reminisce"],
+            type_rules=[("nostalgia", r'good old days')]
+        )
+        assert classifier.classify("let's reminisce about the good old days") == (True, "nostalgia")
+        assert classifier.classify("do you remember") == (False, "general_memory_query")
+
+    def test_cached_classification(self):
+        query = "Do you remember my sister?"
+        assert classify_memory_query(query) == (True, "recall_verification")
+        hits = classify_memory_query.cache_info().hits
+        classify_memory_query(query)
+        assert classify_memory_query.cache_info().hits == hits + 1
@@ -0,0 +1,136 @@
+"""
+test_message_search_index.py - Tests for the Firestore-mode BM25 message index
+"""
+
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.firebase_service import FirebaseService
+from app.services.message_search_index import MessageSearchIndex, UserBM25Index, tokenize
+
+MESSAGES = {
+    "m1": "I went hiking in the mountains with my sister",
+    "m2": "My sister's wedding is next month",
+    "m3": "Work has been busy with the product launch",
+    "m4": "The mountains were covered in snow, best hiking trip ever",
+}
+
+
+def build_index():
+    index = UserBM25Index()
+    for message_id, text in MESSAGES.items():
+        index.add(message_id, text, 1.0)
+    return index
+
+
+class TestUserBM25Index:
+    """Test suite for UserBM25Index."""
+
+    def test_tokenize(self):
+        assert tokenize("My sister's Wedding is NEXT month!") == ["sister", "wedding", "next", "month"]
+
+    def test_ranking(self):
+        hits = build_index().search("hiking mountains snow", limit=2)
+        assert [hit["id"] for hit in hits] == ["m4", "m1"]
+        assert hits[0]["content"] == MESSAGES["m4"]
+        assert hits[0]["score"] > hits[1]["score"] > 0
+
+    def test_no_match(self):
+        assert build_index().search("guitar") == []
+        assert build_index().search("the and of") == []
+
+    def test_incremental_replace_and_remove(self):
+        index = build_index()
+        assert not index.add("m3", MESSAGES["m3"])  # unchanged
+        assert index.add("m3", "Launching a guitar podcast")
+        assert index.search("guitar")[0]["id"] == "m3"
+        assert index.search("product") == []
+
+        assert index.remove("m3")
+        assert index.search("guitar") == []
+        assert "guitar" not in index.postings
+        assert index.total_length == sum(len(tokenize(t)) for i, t in MESSAGES.items() if i != "m3")
+
+
+class TestMessageSearchIndex:
+    """Test suite for MessageSearchIndex."""
+
+    def test_users_are_isolated(self):
+        search_index = MessageSearchIndex()
+        search_index.add_message("u1", "m1", MESSAGES["m1"])
+        assert search_index.search("u2", "hiking") == []
+        assert search_index.search("u1", "hiking")[0]["id"] == "m1"
+
+    def test_snapshot_round_trip(self, tmp_path):
+        search_index = MessageSearchIndex(str(tmp_path), snapshot_every=1000)
+        for message_id, text in MESSAGES.items():
+            search_index.add_message("u1", message_id, text, 1.0)
+        assert list(tmp_path.iterdir()) == []  # below the snapshot threshold
+
+        search_index.flush()
+        reloaded = MessageSearchIndex(str(tmp_path))
+        assert len(reloaded.for_user("u1")) == 4
+        assert reloaded.search("u1", "wedding")[0]["id"] == "m2"
+
+    def test_snapshot_every_n_updates(self, tmp_path):
+        search_index = MessageSearchIndex(str(tmp_path), snapshot_every=2)
+        search_index.add_message("u1", "m1", MESSAGES["m1"])
+        assert list(tmp_path.iterdir()) == []
+        search_index.add_message("u1", "m2", MESSAGES["m2"])
+        assert len(list(tmp_path.glob("*.json.gz"))) == 1
+
+    def test_evicted_user_is_saved(self, tmp_path):
+        search_index = MessageSearchIndex(str(tmp_path), snapshot_every=1000, max_loaded_users=1)
+        search_index.add_message("u1", "m1", MESSAGES["m1"])
+        search_index.add_message("u2", "m2", MESSAGES["m2"])  # evicts u1
+        assert search_index.search("u1", "hiking")[0]["id"] == "m1"
+
+    def test_add_loaded_messages(self):
+        search_index = MessageSearchIndex()
+        loaded = [{"id": "m1", "user": MESSAGES["m1"]}, {"id": "m2", "content": MESSAGES["m2"]}, {"user": "no id"}]
+        assert search_index.add_messages("u1", loaded) == 2
+        assert search_index.add_messages("u1", loaded) == 0
+
+
+class TestFirestoreIntegration:
+    """Test index updates from FirebaseService and reads from FirebaseMemoryService."""
+
+    def test_add_message_updates_index(self):
+        search_index = MessageSearchIndex()
+        service = object.__new__(FirebaseService)
+        service.add_document = MagicMock(return_value="m1")
+        sent_at = datetime(2025, 5, 1, tzinfo=timezone.utc)
+
+        with patch("app.services.firebase_service.get_message_search_index", return_value=search_index):
+            service.add_message("c1", {"user": MESSAGES["m1"], "timestamp": sent_at}, user_id="u1")
+            service.add_message("c1", {"user": "not indexed without a user"})
+
+        hits = search_index.search("u1", "hiking")
+        assert [hit["id"] for hit in hits] == ["m1"]
+        assert hits[0]["timestamp"] == sent_at.timestamp()
+        assert search_index.search("u1", "indexed") == []
+
+    @patch("app.services.firebase_memory_service.FirebaseService")
+    def test_topic_and_recall_lookups_use_index(self, mock_firebase):
+        from app.services.firebase_memory_service import FirebaseMemoryService
+
+        search_index = MessageSearchIndex()
+        for message_id, text in MESSAGES.items():
+            search_index.add_message("u1", message_id, text, 1.0)
+        firebase = mock_firebase.return_value
+        firebase.get_user_facts.return_value = []
+        firebase.get_user_conversations.return_value = []
+        firebase.get_user_topics.return_value = [{"id": "t1", "name": "hiking"}]
+
+        service = FirebaseMemoryService(search_index=search_index)
+        topic_memories = service.get_topic_memories("u1", "any trips lately?")
+        assert {m["id"] for m in topic_memories[0]["messages"]} == {"m1", "m4"}
+        firebase.query_collection.assert_not_called()
+
+        context = service.assemble_memory_context("u1", "Do you remember my sister's wedding?")
+        assert any(memory["content"] == MESSAGES["m2"] for memory in context["recent_memories"])
@@ -1,11 +1,14 @@
 """
 Unit tests for the OpenAI service wrapper
 """
+import asyncio
+import time
 import unittest
 from unittest.mock import patch, MagicMock, Mock
 
-from app.services.openai_service import OpenAIService
+from app.services.openai_service import OpenAIService, stream_cancellation_stats
 from app.core.openai_constants import DEFAULT_MODEL, DEFAULT_TEMPERATURE, MAX_TOKENS
+from tests.mocks.openai_stream import FakeOpenAIStream
 
 
 class TestOpenAIService(unittest.TestCase):
@@ -224,6 +227,91 @@ class TestOpenAIService(unittest.TestCase):
         content = self.openai_service.get_message_content(mock_completion)
         self.assertEqual(content, "")
 
+    def test_streaming_response_complete(self):
+        """A fully consumed stream yields every delta and is not cancelled."""
+        upstream = FakeOpenAIStream(["Hel", "lo", "!"])
+        
+        async def consume():
+            return [c async for c in self.openai_service.handle_streaming_response(upstream)]
+        
+        self.assertEqual(asyncio.run(consume()), ["Hel", "lo", "!"])
+        self.assertFalse(upstream.closed)
+    
+    def test_streaming_response_closed_early_cancels_upstream(self):
+        """Closing the generator early closes the upstream stream and counts saved tokens."""
+        upstream = FakeOpenAIStream([f"t{i} " for i in range(100)])
+        before = stream_cancellation_stats.snapshot()
+        
+        async def consume_two():
+            stream = self.openai_service.handle_streaming_response(upstream, max_tokens=100)
+            chunks = [await stream.__anext__(), await stream.__anext__()]
+            await stream.aclose()
+            return chunks
+        
+        self.assertEqual(asyncio.run(consume_two()), ["t0 ", "t1 "])
+        self.assertTrue(upstream.closed)
+        self.assertEqual(upstream.sent, 2)
+        
+        after = stream_cancellation_stats.snapshot()
+        self.assertEqual(after["cancelled_streams"] - before["cancelled_streams"], 1)
+        self.assertEqual(after["tokens_saved"] - before["tokens_saved"], 98)
+
+    
+    def test_cancel_while_waiting_for_a_chunk(self):
+        """A stalled stream does not block the event loop and is closed when the wait is cancelled."""
+        upstream = FakeOpenAIStream(["t0 ", "t1 "], stall_after=1)
+        
+        async def consume():
+            stream = self.openai_service.handle_streaming_response(upstream, max_tokens=10)
+            first = await stream.__anext__()
+            ticks = 0
+            
+            async def tick():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.01)
+            
+            ticker = asyncio.create_task(tick())
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(stream.__anext__(), 0.2)
+            ticker.cancel()
+            return first, ticks
+        
+        first, ticks = asyncio.run(consume())
+        self.assertEqual(first, "t0 ")
+        self.assertGreater(ticks, 5)
+        self.assertTrue(upstream.closed)
+        self.assertEqual(upstream.sent, 1)
+
+    
+    def test_cancelled_read_hands_out_its_chunk(self):
+        """A chunk already taken from the stream when the read is cancelled is not lost."""
+        class SlowStream(FakeOpenAIStream):
+            def __iter__(self):
+                for chunk in super().__iter__():
+                    time.sleep(0.1)
+                    yield chunk
+        
+        upstream = SlowStream(["t0 ", "t1 "])
+        
+        async def consume():
+            stream = self.openai_service.handle_streaming_response(upstream, max_tokens=10)
+            read = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0.02)
+            read.cancel()
+            [late] = await asyncio.gather(read, return_exceptions=True)
+            await stream.aclose()
+            return late
+        
+        before = stream_cancellation_stats.snapshot()
+        self.assertEqual(asyncio.run(consume()), "t0 ")
+        self.assertTrue(upstream.closed)
+        self.assertEqual(upstream.sent, 1)
+        after = stream_cancellation_stats.snapshot()
+        self.assertEqual(after["cancelled_streams"] - before["cancelled_streams"], 1)
+        self.assertEqual(after["tokens_saved"] - before["tokens_saved"], 9)
+
 
 if __name__ == "__main__":
     unittest.main()
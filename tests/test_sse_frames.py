@@ -0,0 +1,89 @@
+"""
+test_sse_frames.py - Tests for the pre-encoded SSE frame builder
+"""
+
+import json
+import sys
+from pathlib import Path
+import pytest
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services import sse_frames
+from app.services.sse_frames import (
+    build_frame,
+    event_id_of,
+    listening_frame,
+    reply_frame,
+    set_json_encoder,
+    stdlib_json_encoder,
+    thinking_frame,
+)
+
+
+def parse(frame):
+    """Split an encoded frame into (id, event, data)."""
+    assert frame.endswith(b"\n\n")
+    lines = frame[:-2].decode("utf-8").split("\n")
+    fields = dict(line.split(": ", 1) for line in lines)
+    return int(fields["id"]), fields["event"], json.loads(fields["data"])
+
+
+@pytest.fixture(params=["default", "stdlib"])
+def encoder(request):
+    """Run each test with the default encoder and with the stdlib fallback."""
+    if request.param == "stdlib":
+        set_json_encoder(stdlib_json_encoder)
+    yield request.param
+    set_json_encoder(None)
+
+
+class TestFrameBuilder:
+    """Test suite for sse_frames."""
+
+    def test_build_frame(self, encoder):
+        event_id, event, data = parse(build_frame("connection", {"status": "established"}))
+        assert event == "connection"
+        assert data == {"status": "established"}
+
+    def test_non_dict_data_wrapped_as_message(self, encoder):
+        assert parse(build_frame("error", 42))[2] == {"message": "42"}
+
+    def test_state_frames(self, encoder):
+        _, event, data = parse(listening_frame())
+        assert event == "freya:listening"
+        assert data["state"] == "listening" and "timestamp" in data
+        assert parse(thinking_frame())[2]["state"] == "thinking"
+
+    def test_reply_escapes_message(self, encoder):
+        message = 'She said "hi"\nthen left ✨'
+        _, event, data = parse(reply_frame(message))
+        assert event == "freya:reply"
+        assert data["message"] == message
+        assert data["state"] == "reply"
+
+    def test_reply_from_chunks(self, encoder):
+        assert parse(reply_frame(["Hel", "lo"]))[2]["message"] == "Hello"
+
+    def test_ids_increase(self):
+        ids = [event_id_of(frame) for frame in (listening_frame(), reply_frame("a"), build_frame("x", {}))]
+        assert ids == sorted(ids) and len(set(ids)) == 3
+
+    def test_heartbeat(self):
+        assert sse_frames.HEARTBEAT_FRAME.startswith(b":")
+        assert event_id_of(sse_frames.HEARTBEAT_FRAME) is None
+
+    def test_custom_encoder(self):
+        calls = []
+
+        def encoder(obj):
+            calls.append(obj)
+            return json.dumps(obj, sort_keys=True).encode()
+
+        set_json_encoder(encoder)
+        try:
+            build_frame("x", {"b": 1, "a": 2})
+        finally:
+            set_json_encoder(None)
+        assert calls == [{"b": 1, "a": 2}]
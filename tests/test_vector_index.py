@@ -0,0 +1,271 @@
+"""
+test_vector_index.py - Tests for the local vector index and semantic memory tier
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+import pytest
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.vector_index import (
+    HashingEmbedder,
+    UserVectorIndex,
+    VectorIndex,
+    fact_item,
+    merge_semantic_hits,
+    message_item,
+    quantize,
+)
+
+MESSAGES = [
+    "I went hiking in the mountains last weekend",
+    "My sister Maya just started university",
+    "Work has been stressful because of the deadline",
+    "I adopted a cat named Pixel",
+]
+
+
+class SlowEmbedder(HashingEmbedder):
+    def embed(self, texts):
+        time.sleep(0.2)
+        return super().embed(texts)
+
+
+class TestHashingEmbedder:
+    """Test suite for the deterministic embedder."""
+
+    def test_deterministic_unit_vectors(self):
+        first = HashingEmbedder(dim=64).embed(MESSAGES)
+        second = HashingEmbedder(dim=64).embed(MESSAGES)
+        assert first.dtype == np.float32 and first.shape == (4, 64)
+        assert np.array_equal(first, second)
+        assert np.allclose(np.linalg.norm(first, axis=1), 1.0)
+
+    def test_related_word_forms_are_close(self):
+        hike, hiking, cat = HashingEmbedder().embed(["hike", "hiking", "cat"])
+        assert hike @ hiking > hike @ cat
+
+
+class TestUserVectorIndex:
+    """Test suite for UserVectorIndex."""
+
+    @pytest.mark.parametrize("dtype", ["float32", "int8"])
+    def test_top_k_search(self, tmp_path, dtype):
+        embedder = HashingEmbedder()
+        index = UserVectorIndex(str(tmp_path), embedder.dim, dtype)
+        items = [message_item(i, text) for i, text in enumerate(MESSAGES)]
+        index.add(items, embedder.embed(MESSAGES))
+
+        queries = embedder.embed(["hiking trip to the mountains", "my cat Pixel"])
+        results = index.search(queries, k=2)
+        assert [hit[0]["text"] for hit in results[0]][0] == MESSAGES[0]
+        assert [hit[0]["text"] for hit in results[1]][0] == MESSAGES[3]
+        assert all(len(hits) == 2 for hits in results)
+        assert results[0][0][1] >= results[0][1][1]
+
+    def test_blocked_search_matches_full_scan(self, tmp_path):
+        embedder = HashingEmbedder(dim=32)
+        texts = [f"memory number {i} about topic {i % 7}" for i in range(300)]
+        index = UserVectorIndex(str(tmp_path), embedder.dim)
+        index.add([message_item(i, t) for i, t in enumerate(texts)], embedder.embed(texts))
+        query = embedder.embed(["topic 3 memory"])
+
+        with patch("app.services.vector_index.SEARCH_BLOCK_ROWS", 17):
+            blocked = [hit[1] for hit in index.search(query, k=10)[0]]
+        expected = np.sort(embedder.embed(texts) @ query[0])[::-1][:10]
+        assert np.allclose(blocked, expected, atol=1e-5)
+
+    def test_reopen_from_disk_and_skip_duplicates(self, tmp_path):
+        embedder = HashingEmbedder()
+        items = [message_item(i, text) for i, text in enumerate(MESSAGES)]
+        UserVectorIndex(str(tmp_path), embedder.dim, "int8").add(items, embedder.embed(MESSAGES))
+
+        reopened = UserVectorIndex(str(tmp_path), embedder.dim, "int8")
+        assert len(reopened) == 4
+        assert reopened.add(items[:2], embedder.embed(MESSAGES[:2])) == 0
+        assert (tmp_path / "vectors.i8").stat().st_size == 4 * embedder.dim
+
+    def test_orphan_rows_truncated(self, tmp_path):
+        embedder = HashingEmbedder(dim=8)
+        index = UserVectorIndex(str(tmp_path), embedder.dim)
+        index.add([message_item(1, "a")], embedder.embed(["a"]))
+        with open(tmp_path / "vectors.f32", "ab") as f:
+            f.write(b"\0" * 32)  # vector row whose metadata was never written
+
+        reopened = UserVectorIndex(str(tmp_path), embedder.dim)
+        reopened.add([message_item(2, "b")], embedder.embed(["b"]))
+        assert reopened.search(embedder.embed(["b"]), k=1)[0][0][0]["id"] == "message:2"
+
+    def test_partial_trailing_meta_line_dropped(self, tmp_path):
+        embedder = HashingEmbedder(dim=8)
+        index = UserVectorIndex(str(tmp_path), embedder.dim)
+        index.add([message_item(1, "a")], embedder.embed(["a"]))
+        with open(tmp_path / "vectors.f32", "ab") as f:
+            f.write(b"\0" * 32)
+        with open(tmp_path / "meta.jsonl", "a", encoding="utf-8") as f:
+            f.write('{"id": "message:2", "ki')  # crash while writing the metadata line
+
+        reopened = UserVectorIndex(str(tmp_path), embedder.dim)
+        assert len(reopened) == 1 and "message:2" not in reopened
+        reopened.add([message_item(2, "b")], embedder.embed(["b"]))
+        assert len(UserVectorIndex(str(tmp_path), embedder.dim)) == 2
+
+    def test_quantization_error_is_small(self):
+        vectors = HashingEmbedder().embed(MESSAGES)
+        rows, scales = quantize(vectors)
+        assert rows.dtype == np.int8
+        assert np.abs(rows * scales[:, None] - vectors).max() < 0.01
+
+
+class TestVectorIndex:
+    """Test suite for VectorIndex."""
+
+    def test_background_batches(self, tmp_path):
+        vector_index = VectorIndex(str(tmp_path), HashingEmbedder(), batch_size=8, batch_delay=0.01)
+        queued = vector_index.enqueue("u1", [message_item(i, text) for i, text in enumerate(MESSAGES)])
+        assert queued == 4
+        assert vector_index.flush(timeout=5)
+        assert len(vector_index.user_index("u1")) == 4
+        assert vector_index.stats.snapshot()["embedded"] == 4
+
+        # Known ids are not queued again
+        assert vector_index.enqueue("u1", [message_item(0, MESSAGES[0])]) == 0
+
+    def test_users_are_isolated(self, tmp_path):
+        vector_index = VectorIndex(str(tmp_path), HashingEmbedder())
+        vector_index.add("u1", [message_item(1, MESSAGES[0])])
+        vector_index.add("u2", [message_item(1, MESSAGES[3])])
+        assert vector_index.search("u1", "cat Pixel", k=5)[0]["text"] == MESSAGES[0]
+        assert vector_index.search("u3", "cat", k=5) == []
+
+    def test_batched_queries_and_kind_filter(self, tmp_path):
+        vector_index = VectorIndex(str(tmp_path), HashingEmbedder())
+        vector_index.add("u1", [message_item(i, t) for i, t in enumerate(MESSAGES)]
+                         + [fact_item(1, "pet", "cat named Pixel")])
+        hits = vector_index.search("u1", ["cat", "hiking"], k=1, kinds=["message"])
+        assert [h[0]["text"] for h in hits] == [MESSAGES[3], MESSAGES[0]]
+
+    def test_indexes_in_use_are_not_evicted(self, tmp_path):
+        vector_index = VectorIndex(str(tmp_path), HashingEmbedder(), max_open_users=1)
+        vector_index.add("u1", [message_item(1, MESSAGES[0])])
+        with vector_index._using_index("u1") as in_use:
+            vector_index.add("u2", [message_item(1, MESSAGES[3])])
+            assert vector_index.user_index("u1") is in_use  # still the only open index for u1
+
+        # Idle indexes are closed past the limit and reopen from disk
+        vector_index.user_index("u2")
+        assert "u1" not in vector_index._indexes
+        assert vector_index.search("u1", "hiking", k=1)[0]["text"] == MESSAGES[0]
+
+    def test_search_within_budget(self, tmp_path):
+        vector_index = VectorIndex(str(tmp_path), SlowEmbedder())
+        vector_index.add("u1", [message_item(1, MESSAGES[0])])
+        assert vector_index.search_within("u1", "hiking", budget=0.01) == []
+        assert vector_index.stats.snapshot()["budget_misses"] == 1
+
+        time.sleep(0.3)  # the late search warmed the query cache
+        hits = vector_index.search_within("u1", "hiking", budget=0.1, min_score=0.0)
+        assert hits[0]["text"] == MESSAGES[0]
+
+    def test_search_within_async_leaves_the_loop_free(self, tmp_path):
+        vector_index = VectorIndex(str(tmp_path), SlowEmbedder())
+        vector_index.add("u1", [message_item(1, MESSAGES[0])])
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        async def run():
+            ticker = asyncio.create_task(tick())
+            hits = await vector_index.search_within_async("u1", "hiking", budget=0.1)
+            ticker.cancel()
+            return hits
+
+        assert asyncio.run(run()) == []
+        assert ticks > 5
+        assert vector_index.stats.snapshot()["budget_misses"] == 1
+
+        time.sleep(0.3)
+        hits = asyncio.run(vector_index.search_within_async("u1", "hiking", budget=0.1, min_score=0.0))
+        assert hits[0]["text"] == MESSAGES[0]
+
+
+class TestSemanticTier:
+    """Test merging semantic hits into memory contexts."""
+
+    def test_merge_semantic_hits(self):
+        context = {
+            "user_facts": [{"type": "pet", "value": "cat", "confidence": 90}],
+            "recent_memories": [{"content": "already here"}],
+            "topic_memories": [],
+        }
+        hits = [
+            {"kind": "message", "text": "already here", "score": 0.9},
+            {"kind": "message", "text": "I went hiking", "timestamp": 1.0, "score": 0.8},
+            {"kind": "fact", "type": "pet", "value": "cat", "score": 0.7},
+            {"kind": "fact", "type": "sister", "value": "Maya", "score": 0.6},
+        ]
+        merge_semantic_hits(context, hits)
+        assert [m["content"] for m in context["recent_memories"]] == ["I went hiking", "already here"]
+        assert context["recent_memories"][0]["relevance"] == 80
+        assert [f["value"] for f in context["user_facts"]] == ["cat", "Maya"]
+        assert context["semantic_memories"] == hits
+
+    @patch("app.services.firebase_memory_service.FirebaseService")
+    def test_firebase_memory_service_uses_tier(self, mock_firebase, tmp_path):
+        from app.services.firebase_memory_service import FirebaseMemoryService
+
+        vector_index = VectorIndex(str(tmp_path), HashingEmbedder(), batch_delay=0.01)
+        vector_index.add("u1", [message_item("old", "Finally climbed to the summit of the peak on Saturday")])
+        firebase = mock_firebase.return_value
+        firebase.get_user_facts.return_value = [{"id": "f1", "type": "pet", "value": "cat named Pixel"}]
+        firebase.get_user_conversations.return_value = []
+        firebase.get_user_topics.return_value = []
+
+        service = FirebaseMemoryService(vector_index=vector_index)
+        context = service.assemble_memory_context("u1", "remember when I climbed the peak?")
+        assert context["recent_memories"][0]["source"] == "semantic"
+        assert "summit" in context["formatted_context"]
+
+        # Facts loaded for the context were queued for embedding
+        assert vector_index.flush(timeout=5)
+        assert "fact:f1" in vector_index.user_index("u1")
+
+    def test_async_context_searches_outside_run_sync(self, tmp_path):
+        from app.core.memory_context_service import MemoryContextBuilder, assemble_memory_context_async
+
+        vector_index = VectorIndex(str(tmp_path), HashingEmbedder())
+        vector_index.add("u1", [message_item("old", "Finally climbed to the summit of the peak on Saturday")])
+        db = MagicMock()
+        inside_run_sync = []
+
+        async def run_sync(fn):
+            inside_run_sync.append(True)
+            try:
+                return fn(db.sync_session)
+            finally:
+                inside_run_sync.pop()
+
+        async def search(*args, **kwargs):
+            assert not inside_run_sync
+            return await VectorIndex.search_within_async(vector_index, *args, **kwargs)
+
+        db.run_sync = AsyncMock(side_effect=run_sync)
+        context = {"user_facts": [], "recent_memories": [], "topic_memories": [], "is_memory_query": True}
+        with patch("app.core.memory_context_service.get_vector_index", return_value=vector_index), \
+                patch.object(MemoryContextBuilder, "collect_memory_context", return_value=context), \
+                patch.object(vector_index, "search_within_async", side_effect=search) as search_mock:
+            result = asyncio.run(assemble_memory_context_async(db, "u1", "remember when I climbed the peak?"))
+        search_mock.assert_called_once()
+        assert result["recent_memories"][0]["source"] == "semantic"
+        assert "summit" in result["formatted_context"]
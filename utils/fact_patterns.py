@@ -54,7 +54,8 @@ USER_FACT_PATTERNS = {
     ]
 }
 
-# Memory query patterns for topic-based retrieval
+# Memory query patterns for topic-based retrieval (these capture the topic being asked about;
+# detecting whether a query is a memory query is done by app.services.memory_query_classifier)
 MEMORY_QUERY_PATTERNS = [
     re.compile(r"(?:do\s+you\s+)?(?:remember|recall|know)\s+(?:when|what|how|where|why|who|if|that|about|our|my|the)\s+([^?]+)", re.I),
     re.compile(r"(?:what|who|where|when|how)\s+(?:did|do|does|is|was|were)\s+(?:I|we|my|you|us|our)\s+([^?]+?)(?:\s+again|\s+before)?", re.I),